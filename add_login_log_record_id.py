@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为login_log表添加record_id字段和唯一索引，
+落盘的登录日志回放时使用INSERT IGNORE按record_id去重
+"""
+
+import os
+import sys
+from urllib.parse import quote_plus
+from sqlalchemy import create_engine, text
+
+# 加载环境变量
+try:
+    from dotenv import load_dotenv
+    load_dotenv('.env.development')
+except ImportError:
+    print("未找到dotenv模块，使用默认配置")
+
+# 数据库连接配置
+DB_USER = os.environ.get('DB_USER', 'helloworld_user')
+DB_PASSWORD = quote_plus(os.environ.get('DB_PASSWORD', 'Helloworld@123'))
+DB_HOST = os.environ.get('DB_HOST', '172.18.0.1')
+DB_PORT = os.environ.get('DB_PORT', '33060')
+DB_NAME = os.environ.get('DB_NAME', 'helloworld_db')
+
+DATABASE_URL = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4'
+
+def add_record_id(conn):
+    """添加record_id字段和唯一索引，历史日志的record_id保持为空"""
+    exists = conn.execute(text("SHOW COLUMNS FROM login_log LIKE 'record_id'")).fetchone()
+    if exists:
+        print("✓ record_id字段已存在，无需添加")
+    else:
+        conn.execute(text("ALTER TABLE login_log ADD COLUMN record_id VARCHAR(32) NULL AFTER id"))
+        print("✅ record_id字段添加成功")
+
+    index_exists = conn.execute(text(
+        "SHOW INDEX FROM login_log WHERE Column_name = 'record_id' AND Non_unique = 0"
+    )).fetchone()
+    if index_exists:
+        print("✓ record_id唯一索引已存在，无需添加")
+    else:
+        conn.execute(text("CREATE UNIQUE INDEX uq_login_log_record_id ON login_log (record_id)"))
+        print("✅ record_id唯一索引添加成功")
+    conn.commit()
+
+
+def main():
+    """主函数"""
+    print("="*60)
+    print("login_log表record_id字段迁移脚本")
+    print("="*60)
+
+    # 显示数据库连接信息
+    print(f"连接数据库: {DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+    success = False
+    try:
+        engine = create_engine(DATABASE_URL)
+        with engine.connect() as conn:
+            add_record_id(conn)
+            success = True
+    except Exception as e:
+        print(f"迁移过程中发生错误: {e}")
+    finally:
+        if 'engine' in locals():
+            engine.dispose()
+
+    if success:
+        print("\n🎉 login_log表迁移完成！")
+    else:
+        print("\n💥 操作失败，请检查错误信息")
+
+    print("\n" + "="*60)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
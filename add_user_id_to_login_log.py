@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-数据库迁移脚本：为login_log表添加user_id字段
+数据库迁移脚本：为login_log表添加user_id字段，并按username回填历史记录的user_id
+（用户中心按user_id查询登录历史）
 """
 
 import os
@@ -74,6 +75,25 @@ def add_user_id_column(conn):
         conn.rollback()
         return False
 
+def backfill_user_id(conn):
+    """按username回填历史登录日志的user_id"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE login_log l
+                JOIN user u ON u.username = l.username
+                SET l.user_id = u.id
+                WHERE l.user_id IS NULL
+            """)
+            updated = cursor.rowcount
+        conn.commit()
+        print(f"已回填{updated}条登录日志的user_id")
+        return True
+    except Exception as e:
+        print(f"回填user_id时出错: {e}")
+        conn.rollback()
+        return False
+
 def main():
     """主函数"""
     print("开始执行数据库迁移: 为login_log表添加user_id字段")
@@ -83,7 +103,7 @@ def main():
     
     try:
         # 添加字段
-        success = add_user_id_column(conn)
+        success = add_user_id_column(conn) and backfill_user_id(conn)
         
         if success:
             print("数据库迁移成功完成")
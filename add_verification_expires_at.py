@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为verification表添加expires_at字段和索引，并为现有验证码补充过期时间，
+过期验证码由后台清理线程按expires_at分批删除
+"""
+
+import os
+import sys
+from urllib.parse import quote_plus
+from sqlalchemy import create_engine, text
+
+# 加载环境变量
+try:
+    from dotenv import load_dotenv
+    load_dotenv('.env.development')
+except ImportError:
+    print("未找到dotenv模块，使用默认配置")
+
+# 数据库连接配置
+DB_USER = os.environ.get('DB_USER', 'helloworld_user')
+DB_PASSWORD = quote_plus(os.environ.get('DB_PASSWORD', 'Helloworld@123'))
+DB_HOST = os.environ.get('DB_HOST', '172.18.0.1')
+DB_PORT = os.environ.get('DB_PORT', '33060')
+DB_NAME = os.environ.get('DB_NAME', 'helloworld_db')
+
+DATABASE_URL = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4'
+
+# 验证码有效期（秒），与app.models.expiry中verification的TTL策略（VERIFICATION_CODE_EXPIRE）保持一致
+VERIFICATION_CODE_EXPIRE = int(os.environ.get('VERIFICATION_CODE_EXPIRE', 600))
+
+
+def add_expires_at(conn):
+    """添加expires_at字段和索引，并补充现有数据的过期时间"""
+    exists = conn.execute(text("SHOW COLUMNS FROM verification LIKE 'expires_at'")).fetchone()
+    if exists:
+        print("✓ expires_at字段已存在，无需添加")
+    else:
+        conn.execute(text("ALTER TABLE verification ADD COLUMN expires_at DATETIME NULL"))
+        print("✅ expires_at字段添加成功")
+
+    index_exists = conn.execute(text(
+        "SHOW INDEX FROM verification WHERE Key_name = 'ix_verification_expires_at'"
+    )).fetchone()
+    if index_exists:
+        print("✓ expires_at索引已存在，无需添加")
+    else:
+        conn.execute(text("CREATE INDEX ix_verification_expires_at ON verification (expires_at)"))
+        print("✅ expires_at索引添加成功")
+
+    # 为现有验证码补充过期时间（created_at为UTC时间）
+    result = conn.execute(text(
+        "UPDATE verification SET expires_at = DATE_ADD(created_at, INTERVAL :ttl SECOND) "
+        "WHERE expires_at IS NULL"
+    ), {'ttl': VERIFICATION_CODE_EXPIRE})
+    print(f"  ✅ 已为 {result.rowcount} 条验证码设置了expires_at值")
+    conn.commit()
+
+
+def main():
+    """主函数"""
+    print("="*60)
+    print("verification表expires_at字段迁移脚本")
+    print("="*60)
+
+    # 显示数据库连接信息
+    print(f"连接数据库: {DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+    success = False
+    try:
+        engine = create_engine(DATABASE_URL)
+        with engine.connect() as conn:
+            add_expires_at(conn)
+            success = True
+    except Exception as e:
+        print(f"迁移过程中发生错误: {e}")
+    finally:
+        if 'engine' in locals():
+            engine.dispose()
+
+    if success:
+        print("\n🎉 verification表迁移完成！")
+    else:
+        print("\n💥 操作失败，请检查错误信息")
+
+    print("\n" + "="*60)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为wechat_session表添加action、ip_address、mode、scan_status、payload、expires_at字段，
+将旧版本按应用服务器本地时间写入的created_at、expires_at转换为UTC，
+并将旧版本temp/wechat_session_extra.json中的会话信息导入数据库
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+from urllib.parse import quote_plus
+from sqlalchemy import create_engine, text
+
+# 加载环境变量
+try:
+    from dotenv import load_dotenv
+    load_dotenv('.env.development')
+except ImportError:
+    print("未找到dotenv模块，使用默认配置")
+
+# 数据库连接配置
+DB_USER = os.environ.get('DB_USER', 'helloworld_user')
+DB_PASSWORD = quote_plus(os.environ.get('DB_PASSWORD', 'Helloworld@123'))
+DB_HOST = os.environ.get('DB_HOST', '172.18.0.1')
+DB_PORT = os.environ.get('DB_PORT', '33060')
+DB_NAME = os.environ.get('DB_NAME', 'helloworld_db')
+
+DATABASE_URL = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4'
+
+# 旧版本额外会话信息文件
+WECHAT_SESSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'temp', 'wechat_session_extra.json')
+
+# 会话有效期（秒），与app.models.expiry中wechat_session的TTL策略（SCAN_STATE_TTL）保持一致
+WECHAT_SESSION_MAX_AGE = int(os.environ.get('SCAN_STATE_TTL', 600))
+
+# 旧版本写入时间所用的本地时区相对UTC的偏移（秒），默认取运行脚本机器的时区，应与应用服务器一致
+LOCAL_UTC_OFFSET = int(os.environ.get(
+    'WECHAT_SESSION_LOCAL_UTC_OFFSET', datetime.now().astimezone().utcoffset().total_seconds()
+))
+
+# 表注释中的标记，表示created_at、expires_at已按UTC存储（新建的表由模型定义带上该注释）
+UTC_MARKER = 'times:utc'
+
+# 需要添加的字段及其定义
+NEW_COLUMNS = [
+    ('action', "VARCHAR(20) NOT NULL DEFAULT 'login'"),
+    ('ip_address', "VARCHAR(45) NULL"),
+    ('mode', "VARCHAR(20) NULL"),
+    ('scan_status', "VARCHAR(20) NOT NULL DEFAULT 'pending'"),
+    ('payload', "TEXT NULL"),
+    ('expires_at', "DATETIME NULL"),
+]
+
+# 以独立列存储的字段，其余字段写入payload
+COLUMN_FIELDS = ('action', 'ip_address', 'mode', 'scan_status')
+
+
+def add_columns(conn):
+    """添加缺失的字段和索引"""
+    for column_name, column_def in NEW_COLUMNS:
+        exists = conn.execute(text(f"SHOW COLUMNS FROM wechat_session LIKE '{column_name}'")).fetchone()
+        if exists:
+            print(f"✓ {column_name}字段已存在，无需添加")
+            continue
+        conn.execute(text(f"ALTER TABLE wechat_session ADD COLUMN {column_name} {column_def}"))
+        print(f"✅ {column_name}字段添加成功")
+
+    index_exists = conn.execute(text(
+        "SHOW INDEX FROM wechat_session WHERE Key_name = 'ix_wechat_session_expires_at'"
+    )).fetchone()
+    if index_exists:
+        print("✓ expires_at索引已存在，无需添加")
+    else:
+        conn.execute(text("CREATE INDEX ix_wechat_session_expires_at ON wechat_session (expires_at)"))
+        print("✅ expires_at索引添加成功")
+
+    # 为现有会话补充过期时间
+    result = conn.execute(text(
+        "UPDATE wechat_session SET expires_at = DATE_ADD(created_at, INTERVAL :max_age SECOND) "
+        "WHERE expires_at IS NULL"
+    ), {'max_age': WECHAT_SESSION_MAX_AGE})
+    print(f"  ✅ 已为 {result.rowcount} 条会话设置了expires_at值")
+    conn.commit()
+
+
+def convert_times_to_utc(conn):
+    """将按本地时间写入的created_at、expires_at转换为UTC，转换后在表注释中记录标记，只执行一次"""
+    comment = conn.execute(text(
+        "SELECT TABLE_COMMENT FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'wechat_session'"
+    )).scalar() or ''
+    if UTC_MARKER in comment:
+        print("✓ created_at、expires_at已按UTC存储，无需转换")
+        return
+
+    if LOCAL_UTC_OFFSET:
+        result = conn.execute(text(
+            "UPDATE wechat_session SET "
+            "created_at = DATE_SUB(created_at, INTERVAL :offset SECOND), "
+            "expires_at = DATE_SUB(expires_at, INTERVAL :offset SECOND)"
+        ), {'offset': LOCAL_UTC_OFFSET})
+        print(f"  ✅ 已将 {result.rowcount} 条会话的时间转换为UTC（本地时区偏移 {LOCAL_UTC_OFFSET} 秒）")
+    else:
+        print("✓ 本地时区即UTC，无需转换时间")
+    conn.execute(text(f"ALTER TABLE wechat_session COMMENT = '{UTC_MARKER}'"))
+    conn.commit()
+
+
+def import_extra_file(conn):
+    """将旧版本JSON文件中的会话信息导入数据库"""
+    if not os.path.exists(WECHAT_SESSION_FILE):
+        print("✓ 未找到旧版本会话信息文件，无需导入")
+        return True
+
+    try:
+        with open(WECHAT_SESSION_FILE, 'r', encoding='utf-8') as f:
+            extra_info = json.load(f)
+    except Exception as e:
+        print(f"读取旧版本会话信息文件失败: {e}")
+        return False
+
+    imported = 0
+    for state, extra in extra_info.items():
+        if not isinstance(extra, dict):
+            continue
+        payload = {k: v for k, v in extra.items() if k not in COLUMN_FIELDS}
+        result = conn.execute(text(
+            "UPDATE wechat_session SET action = :action, ip_address = :ip_address, mode = :mode, "
+            "scan_status = :scan_status, payload = :payload WHERE state = :state"
+        ), {
+            'state': state,
+            'action': extra.get('action') or 'login',
+            'ip_address': extra.get('ip_address'),
+            'mode': extra.get('mode'),
+            'scan_status': extra.get('scan_status') or 'pending',
+            'payload': json.dumps(payload, ensure_ascii=False, separators=(',', ':')) if payload else None,
+        })
+        imported += result.rowcount
+    conn.commit()
+    print(f"  ✅ 已从旧版本文件导入 {imported} 条会话信息（文件中共 {len(extra_info)} 条）")
+
+    # 导入完成后重命名旧文件，避免重复导入
+    migrated_file = WECHAT_SESSION_FILE + '.migrated'
+    os.replace(WECHAT_SESSION_FILE, migrated_file)
+    print(f"  ✅ 旧版本文件已重命名为 {migrated_file}")
+    return True
+
+
+def main():
+    """主函数"""
+    print("="*60)
+    print("wechat_session表字段迁移脚本")
+    print("="*60)
+
+    # 显示数据库连接信息
+    print(f"连接数据库: {DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+    success = False
+    try:
+        engine = create_engine(DATABASE_URL)
+        with engine.connect() as conn:
+            add_columns(conn)
+            convert_times_to_utc(conn)
+            success = import_extra_file(conn)
+    except Exception as e:
+        print(f"迁移过程中发生错误: {e}")
+    finally:
+        if 'engine' in locals():
+            engine.dispose()
+
+    if success:
+        print("\n🎉 wechat_session表迁移完成！")
+    else:
+        print("\n💥 操作失败，请检查错误信息")
+
+    print("\n" + "="*60)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
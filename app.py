@@ -43,8 +43,9 @@ WECHAT_CORP_ID = os.environ.get('WECHAT_CORP_ID', 'your-wechat-corp-id')
 WECHAT_CORP_SECRET = os.environ.get('WECHAT_CORP_SECRET', 'your-wechat-corp-secret')
 
 # 导入数据库操作函数
-from app.models import get_users, save_users, get_verifications, save_verifications, get_wechat_sessions, save_wechat_sessions
+from app.models import get_user_repository, get_verification_store, get_wechat_sessions, save_wechat_sessions
 from app.models.db import User, db, init_db
+from app.utils.passwords import hash_password
 
 # 初始化数据库连接
 init_db(app)
@@ -60,13 +61,13 @@ with app.app_context():
         # 创建初始管理员用户
         admin_user = User(
             username='admin',
-            password=hashlib.sha256('password'.encode()).hexdigest(),
+            password=hash_password('password'),
             email='admin@example.com'
         )
         # 创建初始普通用户
         user1 = User(
             username='user1',
-            password=hashlib.sha256('user123'.encode()).hexdigest(),
+            password=hash_password('user123'),
             email='user1@example.com'
         )
         db.session.add_all([admin_user, user1])
@@ -105,26 +106,9 @@ def send_verification_email(email, code):
         print(f"发送邮件失败: {e}")
         return False
 
-# 验证验证码是否有效
+# 验证验证码是否有效（正确且在有效期内，验证成功后删除）
 def verify_code(email, code):
-    verifications = get_verifications()
-    if email not in verifications:
-        return False
-    
-    verification = verifications[email]
-    # 检查验证码是否正确且在有效期内（10分钟）
-    if verification['code'] == code and time.time() - verification['timestamp'] < 600:
-        # 验证成功后删除验证码
-        del verifications[email]
-        save_verifications(verifications)
-        return True
-    
-    # 验证码过期或错误
-    if time.time() - verification['timestamp'] >= 600:
-        del verifications[email]
-        save_verifications(verifications)
-    
-    return False
+    return get_verification_store().consume(email, code)
 
 # 发送验证码路由
 @app.route('/send_verification', methods=['POST'])
@@ -139,21 +123,14 @@ def send_verification():
         return jsonify({'success': False, 'message': '邮箱格式不正确'})
     
     # 检查邮箱是否已被注册
-    users = get_users()
-    for username, user_info in users.items():
-        if user_info.get('email') == email:
-            return jsonify({'success': False, 'message': '该邮箱已被注册'})
+    if get_user_repository().exists_email(email):
+        return jsonify({'success': False, 'message': '该邮箱已被注册'})
     
     # 生成验证码
     code = generate_verification_code()
     
-    # 存储验证码（包含时间戳）
-    verifications = get_verifications()
-    verifications[email] = {
-        'code': code,
-        'timestamp': time.time()
-    }
-    save_verifications(verifications)
+    # 存储验证码（覆盖该邮箱的旧验证码）
+    get_verification_store().issue(email, code)
     
     # 发送验证码邮件
     # 打印验证码到控制台，方便测试
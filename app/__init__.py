@@ -45,6 +45,14 @@ from app.utils.config_manager import init_config_manager, get_config_manager
 init_config_manager(app.config)
 config_manager = get_config_manager()
 
+# 页面模板从app/templates加载，每个进程只编译一次
+from app.utils.templating import configure_templates, precompile_templates
+configure_templates(app)
+
+# 页面样式使用build_assets.py构建的带哈希CSS，静态路由返回长期缓存和预压缩文件
+from app.utils.assets import init_assets
+init_assets(app)
+
 # 验证配置
 if not config_manager.validate_all():
     errors = config_manager.get_validation_errors()
@@ -52,7 +60,10 @@ if not config_manager.validate_all():
         logger.error(f"配置错误 - {key}: {error}")
 
 # 初始化数据库
-from app.models.db import init_db, cleanup_expired_data
+from app.models.db import init_db
+from app.models.expiry import ExpiryReaper
+from app.models.login_log_writer import init_login_log_writer
+from app.models.email_outbox import init_email_outbox_worker
 
 # 从配置管理器获取常量
 MAIL_SERVER = config_manager.get('MAIL_SERVER')
@@ -73,13 +84,20 @@ try:
     # 使用新的init_db函数初始化MySQL数据库
     init_db(app)
     
-    # 清理过期数据
-    try:
-        with app.app_context():
-            cleanup_expired_data()
-            logger.info("过期数据清理完成")
-    except Exception as e:
-        logger.error(f"清理过期数据时的异常: {e}")
+    # 过期数据由后台线程按expires_at分批清理，不在启动时或请求路径上执行
+    if app.config.get('EXPIRY_REAPER_ENABLED', True):
+        expiry_reaper = ExpiryReaper(
+            app,
+            interval=app.config.get('EXPIRY_REAPER_INTERVAL', 60),
+            batch_size=app.config.get('EXPIRY_REAPER_BATCH_SIZE', 1000)
+        )
+        expiry_reaper.start()
+    
+    # 登录日志由后台线程批量写入，LOGIN_LOG_ASYNC关闭时在请求中同步写入
+    init_login_log_writer(app)
+    
+    # 邮件由后台线程池从email_outbox表领取发送，请求中只写入发件箱
+    init_email_outbox_worker(app)
 except Exception as e:
     logger.error(f"数据库初始化失败: {e}")
     print(f"数据库初始化失败: {e}")
@@ -100,5 +118,12 @@ CORS(app, resources={
 app.register_blueprint(auth.bp)
 app.register_blueprint(api)
 
+if app.config.get('TEMPLATE_PRECOMPILE', True):
+    precompile_templates(app)
+
+# 按Accept-Encoding压缩HTML和JSON响应
+from app.utils.compression import init_compression
+init_compression(app)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
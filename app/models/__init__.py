@@ -1,15 +1,26 @@
 import os
 import json
-from datetime import datetime
+import time
+import warnings
+from datetime import datetime, timedelta, timezone
 from .db import User, Verification, WechatSession, LoginLog, db
+from .expiry import get_ttl, expiry_now
+from .user_cache import get_user_profile, get_user_cache
+from .user_repository import UserRepository, UserAlreadyExistsError, get_user_repository
+from .verification_store import VerificationStore, get_verification_store
+from .email_outbox import enqueue_email, get_email_outbox_worker
 
-# 获取临时存储目录
+# 旧版本存放额外微信会话信息的JSON文件，会话信息现已全部存入wechat_session表，
+# 该路径仅供迁移脚本导入历史数据使用
 TEMP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp')
-os.makedirs(TEMP_DIR, exist_ok=True)
 WECHAT_SESSION_FILE = os.path.join(TEMP_DIR, 'wechat_session_extra.json')
 
 def get_users():
-    """获取所有用户数据（仅使用MySQL数据库）"""
+    """获取所有用户数据（仅使用MySQL数据库）
+    
+    已废弃：会把整张用户表读入内存，请使用get_user_repository()中的定向查询。
+    """
+    warnings.warn("get_users()已废弃，请使用get_user_repository()", DeprecationWarning, stacklevel=2)
     try:
         users_dict = {}
         users = User.query.all()
@@ -26,7 +37,11 @@ def get_users():
         return {}
 
 def save_users(users):
-    """保存用户数据（仅使用MySQL数据库）"""
+    """保存用户数据（仅使用MySQL数据库）
+    
+    已废弃：每个用户都要查询一次并回写全部字段，请使用get_user_repository()的create_user/update_fields。
+    """
+    warnings.warn("save_users()已废弃，请使用get_user_repository()", DeprecationWarning, stacklevel=2)
     try:
         for username, user_info in users.items():
             # 查找用户是否已存在
@@ -55,10 +70,15 @@ def save_users(users):
         db.session.rollback()
 
 def get_verifications():
-    """获取所有验证码数据（仅使用MySQL数据库）"""
+    """获取所有验证码数据（仅使用MySQL数据库）
+    
+    已废弃：会读取全部未过期验证码，请使用get_verification_store()的consume。
+    """
+    warnings.warn("get_verifications()已废弃，请使用get_verification_store()", DeprecationWarning, stacklevel=2)
     try:
         verifications_dict = {}
-        verifications = Verification.query.all()
+        # 只读取未过期的验证码，过期行由后台清理线程删除
+        verifications = Verification.query.filter(Verification.expires_at > expiry_now()).all()
         for verification in verifications:
             verifications_dict[verification.email] = {
                 'code': verification.code,
@@ -70,102 +90,94 @@ def get_verifications():
         return {}
 
 def save_verifications(verifications):
-    """保存验证码数据（仅使用MySQL数据库）"""
+    """保存验证码数据（仅使用MySQL数据库）
+    
+    已废弃：每个邮箱都要查询一次再回写，请使用get_verification_store()的issue。
+    """
+    warnings.warn("save_verifications()已废弃，请使用get_verification_store()", DeprecationWarning, stacklevel=2)
     try:
         for email, verification_info in verifications.items():
             # 查找验证码是否已存在
             verification = Verification.query.filter_by(email=email).first()
+            now = datetime.utcnow()
             if verification:
                 # 更新现有验证码
                 verification.code = verification_info.get('code')
                 # 更新created_at为当前时间
-                from datetime import datetime
-                verification.created_at = datetime.utcnow()
+                verification.created_at = now
             else:
                 # 创建新验证码
                 verification = Verification(
                     email=email,
-                    code=verification_info.get('code')
+                    code=verification_info.get('code'),
+                    created_at=now
                 )
-                # 不设置created_at，使用模型的默认值
                 db.session.add(verification)
+            verification.expires_at = now + timedelta(seconds=get_ttl('verification'))
         db.session.commit()
     except Exception as e:
         print(f"保存验证码到数据库失败: {e}")
         db.session.rollback()
 
+
+# 以独立列存储的会话字段，其余字段序列化到payload列
+WECHAT_SESSION_COLUMNS = ('action', 'ip_address', 'mode', 'scan_status')
+
+
+def _wechat_session_to_dict(session):
+    """将WechatSession行转换为会话数据字典"""
+    # 确保返回的timestamp是时间戳格式，created_at按UTC存储
+    if isinstance(session.created_at, datetime):
+        timestamp = session.created_at.replace(tzinfo=timezone.utc).timestamp()
+    else:
+        timestamp = session.created_at
+
+    payload = {}
+    if session.payload:
+        try:
+            payload = json.loads(session.payload)
+        except (TypeError, ValueError) as e:
+            print(f"解析微信会话payload失败 - state: {session.state}, 错误: {e}")
+
+    return {
+        'timestamp': timestamp,
+        'action': session.action or 'login',
+        'ip_address': session.ip_address or '',
+        'mode': session.mode or 'production',
+        'scan_status': session.scan_status or 'pending',
+        **payload
+    }
+
+
+def _apply_wechat_session_info(session, session_info):
+    """将会话数据字典写入WechatSession行"""
+    timestamp = session_info.get('timestamp')
+    if not isinstance(timestamp, (int, float)) and session.expires_at is None:
+        timestamp = time.time()
+    if isinstance(timestamp, (int, float)):
+        # 过期时间按统一的TTL策略计算，与其他表一样按UTC存储
+        session.created_at = datetime.utcfromtimestamp(timestamp)
+        session.expires_at = datetime.utcfromtimestamp(timestamp + get_ttl('wechat_session'))
+
+    session.action = session_info.get('action', 'login')
+    session.ip_address = session_info.get('ip_address')
+    session.mode = session_info.get('mode')
+    session.scan_status = session_info.get('scan_status', 'pending')
+
+    payload = {k: v for k, v in session_info.items()
+               if k != 'timestamp' and k not in WECHAT_SESSION_COLUMNS}
+    # 紧凑序列化，不做缩进
+    session.payload = json.dumps(payload, ensure_ascii=False, separators=(',', ':')) if payload else None
+
+
 def get_wechat_sessions():
-    """获取所有企业微信登录会话"""
+    """获取所有未过期的企业微信登录会话，过期会话由后台清理线程删除"""
     try:
         sessions_dict = {}
-        # 获取所有会话，包括过期的用于调试
-        sessions = WechatSession.query.all()
-        
-        # 加载额外的会话信息
-        extra_info = {}
-        try:
-            if os.path.exists(WECHAT_SESSION_FILE):
-                with open(WECHAT_SESSION_FILE, 'r', encoding='utf-8') as f:
-                    extra_info = json.load(f)
-        except Exception as e:
-            print(f"加载额外微信会话信息失败: {e}")
+        sessions = WechatSession.query.filter(WechatSession.expires_at > expiry_now()).all()
         
         for session in sessions:
-            # 初始化会话数据字典，确保返回的timestamp是时间戳格式
-            if isinstance(session.created_at, datetime):
-                timestamp = session.created_at.timestamp()
-            else:
-                timestamp = session.created_at
-            
-            # 创建会话数据，包含基本信息
-            session_data = {
-                'timestamp': timestamp,
-                # 从额外信息中获取，默认为'login'
-                'action': extra_info.get(session.state, {}).get('action', 'login'),
-                'ip_address': extra_info.get(session.state, {}).get('ip_address', ''),
-                'mode': extra_info.get(session.state, {}).get('mode', 'production'),
-                # 包含其他可能的字段
-                **extra_info.get(session.state, {})
-            }
-            sessions_dict[session.state] = session_data
-        
-        # 清理过期会话（超过1小时）
-        try:
-            import time
-            current_time = time.time()
-            expired_states = []
-            for state, data in sessions_dict.items():
-                # 确保比较时间戳类型的一致性
-                session_timestamp = data.get('timestamp', 0)
-                # 转换为浮点数时间戳
-                if isinstance(session_timestamp, datetime):
-                    session_timestamp = session_timestamp.timestamp()
-                
-                # 比较是否超过过期时间
-                if current_time - float(session_timestamp) > 3600:
-                    expired_states.append(state)
-            
-            if expired_states:
-                # 删除过期会话
-                WechatSession.query.filter(WechatSession.state.in_(expired_states)).delete(synchronize_session=False)
-                db.session.commit()
-    
-                # 从返回结果中移除
-                for state in expired_states:
-                    if state in sessions_dict:
-                        del sessions_dict[state]
-                    # 从额外信息中移除
-                    if state in extra_info:
-                        del extra_info[state]
-                
-                # 更新额外信息文件
-                try:
-                    with open(WECHAT_SESSION_FILE, 'w', encoding='utf-8') as f:
-                        json.dump(extra_info, f, ensure_ascii=False, indent=2)
-                except Exception as e:
-                    print(f"更新额外微信会话信息失败: {e}")
-        except Exception as e:
-            print(f"清理过期微信会话失败: {e}")
+            sessions_dict[session.state] = _wechat_session_to_dict(session)
         
         return sessions_dict
     except Exception as e:
@@ -185,48 +197,17 @@ def save_wechat_sessions(sessions):
             # 创建新会话
             for state, session_info in sessions.items():
                 try:
-                    # 创建会话对象
+                    # 创建会话对象，action、ip_address等信息直接写入对应的列
                     session = WechatSession(
                         state=state
                     )
-                    
-                    # 如果会话信息中包含timestamp，且需要使用它作为created_at
-                    if 'timestamp' in session_info:
-                        try:
-                            # 转换时间戳为datetime对象
-                            if isinstance(session_info['timestamp'], (int, float)):
-                                from datetime import datetime
-                                session.created_at = datetime.fromtimestamp(session_info['timestamp'])
-                        except (ValueError, TypeError) as e:
-                            print(f"转换时间戳失败 - state: {state}, 错误: {e}")
-                            # 继续使用默认的created_at
-                     
+                    _apply_wechat_session_info(session, session_info)
                     db.session.add(session)
                 except Exception as e:
                     print(f"保存微信会话项失败 - state: {state}, 错误: {e}")
             
             # 提交事务
             db.session.commit()
-            
-            # 保存额外的会话信息（action、ip_address等）到文件
-            try:
-                # 读取现有信息
-                extra_info = {}
-                if os.path.exists(WECHAT_SESSION_FILE):
-                    with open(WECHAT_SESSION_FILE, 'r', encoding='utf-8') as f:
-                        extra_info = json.load(f)
-                
-                # 更新或添加新的额外信息
-                for state, session_info in sessions.items():
-                    # 只保存除timestamp外的额外信息
-                    extra_data = {k: v for k, v in session_info.items() if k != 'timestamp'}
-                    extra_info[state] = extra_data
-                
-                # 写入文件
-                with open(WECHAT_SESSION_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(extra_info, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"保存额外微信会话信息失败: {e}")
 
         except Exception as e:
             print(f"保存微信会话事务失败: {e}")
@@ -245,26 +226,110 @@ def clean_wechat_sessions(session_states):
         WechatSession.query.filter(WechatSession.state.in_(session_states)).delete(synchronize_session=False)
         db.session.commit()
         print(f"成功清理 {len(session_states)} 个微信会话")
-        
-        # 同时清理额外的会话信息
-        try:
-            if os.path.exists(WECHAT_SESSION_FILE):
-                with open(WECHAT_SESSION_FILE, 'r', encoding='utf-8') as f:
-                    extra_info = json.load(f)
-                
-                # 删除指定的状态
-                for state in session_states:
-                    if state in extra_info:
-                        del extra_info[state]
-                
-                # 写回文件
-                with open(WECHAT_SESSION_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(extra_info, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"清理额外微信会话信息失败: {e}")
-        
         return True
     except Exception as e:
         print(f"清理微信会话失败: {e}")
         db.session.rollback()
         return False
+
+
+# ---------------------------------------------------------------------------
+# 按state读写单个企业微信会话
+# 轮询、回调、生成二维码等热路径只需要一个state，使用以下函数只访问state唯一索引对应的那一行，
+# 避免get_wechat_sessions()/save_wechat_sessions()带来的全表读取和全量重写
+# ---------------------------------------------------------------------------
+
+def get_wechat_session(state):
+    """按state获取单个企业微信登录会话
+
+    Args:
+        state: 会话的state参数
+
+    Returns:
+        dict: 会话数据（格式与get_wechat_sessions()中的单项一致），不存在或已过期时返回None
+    """
+    if not state:
+        return None
+    try:
+        session = WechatSession.query.filter_by(state=state).filter(
+            WechatSession.expires_at > expiry_now()
+        ).first()
+        if not session:
+            return None
+
+        return _wechat_session_to_dict(session)
+    except Exception as e:
+        print(f"从数据库获取微信会话失败 - state: {state}, 错误: {e}")
+        return None
+
+
+def save_wechat_session(state, session_info):
+    """新建或覆盖单个企业微信登录会话
+
+    Args:
+        state: 会话的state参数
+        session_info: 会话数据，timestamp写入created_at，action等字段写入对应的列，其余字段写入payload
+
+    Returns:
+        bool: 是否保存成功
+    """
+    try:
+        session = WechatSession.query.filter_by(state=state).first()
+        if not session:
+            session = WechatSession(state=state)
+            db.session.add(session)
+        _apply_wechat_session_info(session, session_info)
+        db.session.commit()
+        return True
+    except Exception as e:
+        print(f"保存微信会话失败 - state: {state}, 错误: {e}")
+        db.session.rollback()
+        return False
+
+
+def update_wechat_session_status(state, scan_status, from_status=None):
+    """原子地更新单个企业微信会话的扫码状态
+
+    只执行一条UPDATE语句。指定from_status时，仅当当前状态等于from_status时才更新，
+    可用于pending→confirmed这类只允许发生一次的状态迁移。
+
+    Args:
+        state: 会话的state参数
+        scan_status: 新的扫码状态，如pending、scanned、confirmed
+        from_status: 期望的当前状态，为None时不检查
+
+    Returns:
+        bool: 有一行被更新时返回True
+    """
+    try:
+        query = WechatSession.query.filter_by(state=state).filter(
+            WechatSession.expires_at > expiry_now()
+        )
+        if from_status is not None:
+            query = query.filter_by(scan_status=from_status)
+        updated = query.update({'scan_status': scan_status}, synchronize_session=False)
+        db.session.commit()
+        return updated > 0
+    except Exception as e:
+        print(f"更新微信会话状态失败 - state: {state}, 错误: {e}")
+        db.session.rollback()
+        return False
+
+
+def delete_wechat_session(state):
+    """删除单个企业微信会话
+
+    Args:
+        state: 会话的state参数
+
+    Returns:
+        bool: 是否删除成功
+    """
+    try:
+        WechatSession.query.filter_by(state=state).delete(synchronize_session=False)
+        db.session.commit()
+        return True
+    except Exception as e:
+        print(f"删除微信会话失败 - state: {state}, 错误: {e}")
+        db.session.rollback()
+        return False
@@ -32,18 +32,29 @@ class Verification(db.Model):
     email = db.Column(db.String(120), nullable=False, index=True, unique=True)
     code = db.Column(db.String(10), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # 过期时间（UTC）
 
 class WechatSession(db.Model):
     __tablename__ = 'wechat_session'
+    # 表注释标记时间列按UTC存储，迁移脚本据此跳过本地时间到UTC的转换
+    __table_args__ = {'comment': 'times:utc'}
     
     id = db.Column(db.Integer, primary_key=True)
     state = db.Column(db.String(128), nullable=False, index=True, unique=True)
+    action = db.Column(db.String(20), nullable=False, default='login')  # 操作类型：login/bind
+    ip_address = db.Column(db.String(45), nullable=True)  # 发起扫码的客户端IP
+    mode = db.Column(db.String(20), nullable=True)  # 运行模式：production/test
+    scan_status = db.Column(db.String(20), nullable=False, default='pending')  # 扫码状态：pending/scanned/confirmed
+    payload = db.Column(db.Text, nullable=True)  # 其他会话字段，紧凑JSON格式
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # 过期时间（UTC）
 
 class LoginLog(db.Model):
     __tablename__ = 'login_log'
     
     id = db.Column(db.Integer, primary_key=True)
+    # 提交日志时生成的唯一ID，落盘回放时用于去重
+    record_id = db.Column(db.String(32), unique=True, nullable=True)
     user_id = db.Column(db.Integer, nullable=True, index=True)  # 用户唯一ID
     username = db.Column(db.String(80), nullable=False, index=True)
     ip_address = db.Column(db.String(45), nullable=False, index=True)
@@ -59,6 +70,27 @@ class LoginLog(db.Model):
     response_time = db.Column(db.Float, nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
 
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # 发送线程按状态和下次发送时间领取邮件
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 发送状态：pending/sending/sent/dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已尝试发送的次数
+    next_attempt_at = db.Column(db.DateTime, nullable=False)  # 下次可发送的时间（UTC）
+    locked_until = db.Column(db.DateTime, nullable=True)  # 发送中状态的租约到期时间，到期未完成的邮件会被重新领取
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)  # 入队时间（UTC）
+    sent_at = db.Column(db.DateTime, nullable=True)
+    latency_ms = db.Column(db.Integer, nullable=True)  # 从入队到发送成功的耗时（毫秒）
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # 发送成功或放弃后保留到该时间
+
 # 数据库操作辅助函数
 def get_db():
     """获取数据库会话"""
@@ -83,29 +115,19 @@ def init_db(app):
         db.create_all()
         print(f"数据库表已在 {app.config['SQLALCHEMY_DATABASE_URI']} 创建")
 
-# 清理过期数据的函数（保留用于数据库维护）
+# 清理过期数据的函数（保留用于数据库维护，运行时由后台清理线程定期执行）
 def cleanup_expired_data():
-    """清理过期的数据"""
-    now = datetime.now(timezone.utc)
-    
-    # 清理过期的验证码（超过10分钟）
-    expired_verifications = Verification.query.filter(
-        Verification.created_at < (now - timedelta(minutes=10))
-    ).all()
-    
-    for verification in expired_verifications:
-        db.session.delete(verification)
-    
-    db.session.commit()
-    print(f"清理了 {len(expired_verifications)} 条过期验证码")
-    
-    # 清理过期的微信会话（超过5分钟）
-    expired_sessions = WechatSession.query.filter(
-        WechatSession.created_at < (now - timedelta(minutes=5))
-    ).all()
+    """分批清理所有表中的过期数据
     
-    for session in expired_sessions:
-        db.session.delete(session)
+    Returns:
+        dict: 表名 -> 删除的行数
+    """
+    from .expiry import run_expiry_reaper_once
     
-    db.session.commit()
-    print(f"清理了 {len(expired_sessions)} 条过期微信会话")
\ No newline at end of file
+    report = run_expiry_reaper_once()
+    for table, purged in report.items():
+        if purged < 0:
+            print(f"清理 {table} 过期数据失败")
+        else:
+            print(f"清理了 {purged} 条 {table} 过期数据")
+    return report
@@ -0,0 +1,357 @@
+"""邮件发件箱
+
+原来发送验证码时在请求中同步建立SMTP连接、STARTTLS、登录再发送，请求要等待整个握手过程，
+请求中断时邮件直接丢失。现在请求只向email_outbox表插入一行后立即返回，由后台发送线程池投递：
+
+- 领取：SELECT ... WHERE 可发送 ORDER BY id LIMIT n FOR UPDATE SKIP LOCKED，把领取到的行改为sending
+  并设置租约后提交，多个线程、多个进程同时领取时互不阻塞也不会重复领取（需要MySQL 8.0及以上）
+- 发送：在事务之外发送，成功后记录sent_at和从入队到发送成功的耗时latency_ms
+- 失败：按指数退避设置下次发送时间，达到最大次数后标记为dead，不再重试
+- 租约到期仍为sending的邮件（发送线程或进程中途退出）会被重新领取，因此投递语义是至少一次
+
+发送成功或放弃的邮件设置expires_at，保留EMAIL_OUTBOX_RETENTION秒后由过期数据清理线程删除。
+时间统一使用UTC（不带时区）。
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+from .db import EmailOutbox, db
+from .expiry import get_ttl
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_DEAD = 'dead'
+
+# 默认发送线程数
+DEFAULT_OUTBOX_WORKERS = 2
+
+# 默认每个线程每次领取的邮件数
+DEFAULT_OUTBOX_BATCH_SIZE = 10
+
+# 默认没有待发送邮件时的轮询间隔（秒）
+DEFAULT_OUTBOX_POLL_INTERVAL = 2.0
+
+# 默认发送租约（秒），超过该时间仍未完成的邮件会被重新领取
+DEFAULT_OUTBOX_LEASE = 120
+
+# 默认最大发送次数
+DEFAULT_OUTBOX_MAX_ATTEMPTS = 5
+
+# 默认重试退避：第n次失败后等待 base * 2^(n-1) 秒，最多max秒
+DEFAULT_OUTBOX_BACKOFF_BASE = 30
+DEFAULT_OUTBOX_BACKOFF_MAX = 3600
+
+# 领取邮件失败（如数据库不可用）后的等待时间（秒）
+OUTBOX_ERROR_BACKOFF = 30
+
+# last_error列的长度
+MAX_ERROR_LENGTH = 500
+
+_outbox_table = EmailOutbox.__table__
+
+
+def retry_delay(attempts: int, base: float = DEFAULT_OUTBOX_BACKOFF_BASE,
+                maximum: float = DEFAULT_OUTBOX_BACKOFF_MAX) -> float:
+    """第attempts次发送失败后到下次发送的等待时间（秒）"""
+    return min(base * (2 ** max(attempts - 1, 0)), maximum)
+
+
+def enqueue_email(recipient: str, subject: str, content: str, now: Optional[datetime] = None) -> int:
+    """把邮件写入发件箱（单条INSERT），不等待发送
+
+    Args:
+        recipient: 收件人
+        subject: 主题
+        content: HTML正文
+        now: 入队时间（UTC），默认为当前时间
+
+    Returns:
+        int: 邮件ID
+    """
+    now = now or datetime.utcnow()
+    email = EmailOutbox(recipient=recipient, subject=subject, content=content, status=STATUS_PENDING,
+                        attempts=0, next_attempt_at=now, created_at=now)
+    db.session.add(email)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    worker = _email_outbox_worker
+    if worker is not None:
+        worker.notify()
+    return email.id
+
+
+def claim_emails(limit: int, lease_seconds: float = DEFAULT_OUTBOX_LEASE,
+                 now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """领取一批可发送的邮件并标记为sending
+
+    Args:
+        limit: 最多领取的数量
+        lease_seconds: 发送租约（秒）
+        now: 当前时间（UTC），默认为当前时间
+
+    Returns:
+        list: 邮件字典列表，attempts为包含本次在内的发送次数
+    """
+    now = now or datetime.utcnow()
+    columns = _outbox_table.c
+    statement = select(
+        columns.id, columns.recipient, columns.subject, columns.content, columns.attempts, columns.created_at
+    ).where(or_(
+        and_(columns.status == STATUS_PENDING, columns.next_attempt_at <= now),
+        and_(columns.status == STATUS_SENDING, columns.locked_until <= now),
+    )).order_by(columns.id).limit(limit).with_for_update(skip_locked=True)
+    try:
+        rows = [dict(row) for row in db.session.execute(statement).mappings()]
+        if rows:
+            db.session.execute(update(_outbox_table).where(columns.id.in_([row['id'] for row in rows])).values(
+                status=STATUS_SENDING, attempts=columns.attempts + 1,
+                locked_until=now + timedelta(seconds=lease_seconds)
+            ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for row in rows:
+        row['attempts'] += 1
+    return rows
+
+
+def _finish(email_id: int, values: Dict[str, Any]) -> None:
+    """更新一封邮件的发送结果"""
+    try:
+        db.session.execute(update(_outbox_table).where(_outbox_table.c.id == email_id).values(**values))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def mark_email_sent(email_id: int, created_at: datetime, now: Optional[datetime] = None) -> int:
+    """标记邮件发送成功
+
+    Args:
+        email_id: 邮件ID
+        created_at: 入队时间（UTC）
+        now: 发送完成时间（UTC），默认为当前时间
+
+    Returns:
+        int: 从入队到发送成功的耗时（毫秒）
+    """
+    now = now or datetime.utcnow()
+    latency_ms = max(0, int((now - created_at).total_seconds() * 1000))
+    _finish(email_id, {
+        'status': STATUS_SENT, 'sent_at': now, 'latency_ms': latency_ms, 'locked_until': None,
+        'last_error': None, 'expires_at': now + timedelta(seconds=get_ttl('email_outbox')),
+    })
+    return latency_ms
+
+
+def mark_email_failed(email_id: int, attempts: int, error: str, max_attempts: int = DEFAULT_OUTBOX_MAX_ATTEMPTS,
+                      backoff_base: float = DEFAULT_OUTBOX_BACKOFF_BASE,
+                      backoff_max: float = DEFAULT_OUTBOX_BACKOFF_MAX, now: Optional[datetime] = None) -> str:
+    """记录发送失败，未达到最大次数时按指数退避重新排队，否则标记为dead
+
+    Args:
+        email_id: 邮件ID
+        attempts: 包含本次在内的发送次数
+        error: 错误信息
+        max_attempts: 最大发送次数
+        backoff_base: 退避基数（秒）
+        backoff_max: 最长退避时间（秒）
+        now: 当前时间（UTC），默认为当前时间
+
+    Returns:
+        str: 更新后的状态，pending或dead
+    """
+    now = now or datetime.utcnow()
+    values = {'locked_until': None, 'last_error': error[:MAX_ERROR_LENGTH]}
+    if attempts >= max_attempts:
+        values.update(status=STATUS_DEAD, expires_at=now + timedelta(seconds=get_ttl('email_outbox')))
+    else:
+        values.update(status=STATUS_PENDING,
+                      next_attempt_at=now + timedelta(seconds=retry_delay(attempts, backoff_base, backoff_max)))
+    _finish(email_id, values)
+    return values['status']
+
+
+class EmailOutboxWorker:
+    """后台邮件发送线程池"""
+
+    def __init__(self, app, sender: Callable[[str, str, str], None], workers: int = DEFAULT_OUTBOX_WORKERS,
+                 batch_size: int = DEFAULT_OUTBOX_BATCH_SIZE, poll_interval: float = DEFAULT_OUTBOX_POLL_INTERVAL,
+                 lease_seconds: float = DEFAULT_OUTBOX_LEASE, max_attempts: int = DEFAULT_OUTBOX_MAX_ATTEMPTS,
+                 backoff_base: float = DEFAULT_OUTBOX_BACKOFF_BASE, backoff_max: float = DEFAULT_OUTBOX_BACKOFF_MAX):
+        """
+        Args:
+            app: Flask应用，数据库操作在其应用上下文中执行
+            sender: 发送函数sender(recipient, subject, content)，失败时抛出异常
+            workers: 发送线程数
+            batch_size: 每个线程每次领取的邮件数
+            poll_interval: 没有待发送邮件时的轮询间隔（秒），本进程入队时会立即唤醒
+            lease_seconds: 发送租约（秒）
+            max_attempts: 最大发送次数
+            backoff_base: 重试退避基数（秒）
+            backoff_max: 最长重试退避时间（秒）
+        """
+        self.app = app
+        self.sender = sender
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats_lock = threading.Lock()
+        self._stats = {'claimed': 0, 'sent': 0, 'retried': 0, 'dead': 0, 'errors': 0,
+                       'latency_ms_total': 0, 'latency_ms_max': 0}
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _record_latency(self, latency_ms: int) -> None:
+        with self._stats_lock:
+            self._stats['sent'] += 1
+            self._stats['latency_ms_total'] += latency_ms
+            self._stats['latency_ms_max'] = max(self._stats['latency_ms_max'], latency_ms)
+
+    def notify(self) -> None:
+        """唤醒发送线程，立即领取新入队的邮件"""
+        self._wakeup.set()
+
+    def _deliver(self, email: Dict[str, Any]) -> None:
+        """发送一封已领取的邮件并记录结果，需要在应用上下文中调用"""
+        try:
+            self.sender(email['recipient'], email['subject'], email['content'])
+        except Exception as e:
+            status = mark_email_failed(email['id'], email['attempts'], f"{type(e).__name__}: {e}",
+                                       self.max_attempts, self.backoff_base, self.backoff_max)
+            self._count('dead' if status == STATUS_DEAD else 'retried')
+            if status == STATUS_DEAD:
+                logger.error(f"邮件发送失败，已放弃 - ID: {email['id']}, 收件人: {email['recipient']}, "
+                             f"次数: {email['attempts']}, 错误: {e}")
+            else:
+                logger.warning(f"邮件发送失败，稍后重试 - ID: {email['id']}, 收件人: {email['recipient']}, "
+                               f"次数: {email['attempts']}, 错误: {e}")
+            return
+        self._record_latency(mark_email_sent(email['id'], email['created_at']))
+
+    def run_once(self) -> int:
+        """领取并发送一批邮件
+
+        Returns:
+            int: 本次领取的邮件数
+        """
+        with self.app.app_context():
+            emails = claim_emails(self.batch_size, self.lease_seconds)
+            self._count('claimed', len(emails))
+            for email in emails:
+                try:
+                    self._deliver(email)
+                except Exception as e:
+                    # 发送结果写入失败，租约到期后邮件会被重新领取
+                    self._count('errors')
+                    logger.error(f"记录邮件发送结果失败 - ID: {email['id']}, 错误: {e}")
+        return len(emails)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                self._count('errors')
+                logger.error(f"领取待发送邮件失败: {e}")
+                self._stop_event.wait(OUTBOX_ERROR_BACKOFF)
+                continue
+            if claimed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def start(self) -> None:
+        """启动发送线程"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop_event.clear()
+        self._threads = [threading.Thread(target=self._run, name=f'email-outbox-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.stop)
+        logger.info(f"邮件发送线程已启动，线程数: {self.workers}，每次领取: {self.batch_size}封")
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """停止发送线程，未发送的邮件留在发件箱中"""
+        self._stop_event.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self) -> Dict[str, Any]:
+        """获取发送统计（领取、发送成功、重试、放弃、内部错误次数，发送成功邮件的平均和最大耗时）"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total = stats.pop('latency_ms_total')
+        stats['latency_ms_avg'] = round(total / stats['sent'], 1) if stats['sent'] else 0
+        return stats
+
+
+# 当前进程使用的发送线程池，未启用发件箱时为None
+_email_outbox_worker: Optional[EmailOutboxWorker] = None
+
+
+def init_email_outbox_worker(app, sender: Optional[Callable[[str, str, str], None]] = None) -> Optional[EmailOutboxWorker]:
+    """按应用配置创建并启动邮件发送线程池
+
+    Args:
+        app: Flask应用
+        sender: 发送函数，默认使用deliver_email（按配置复用SMTP连接池）
+
+    Returns:
+        EmailOutboxWorker: 发送线程池，EMAIL_OUTBOX_ENABLED关闭或线程数为0时返回None
+    """
+    global _email_outbox_worker
+    from app.utils.mailer import deliver_email, email_outbox_enabled
+
+    workers = int(app.config.get('EMAIL_OUTBOX_WORKERS', DEFAULT_OUTBOX_WORKERS))
+    if not email_outbox_enabled() or workers <= 0:
+        return None
+    _email_outbox_worker = EmailOutboxWorker(
+        app,
+        sender or deliver_email,
+        workers=workers,
+        batch_size=app.config.get('EMAIL_OUTBOX_BATCH_SIZE', DEFAULT_OUTBOX_BATCH_SIZE),
+        poll_interval=app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', DEFAULT_OUTBOX_POLL_INTERVAL),
+        lease_seconds=app.config.get('EMAIL_OUTBOX_LEASE', DEFAULT_OUTBOX_LEASE),
+        max_attempts=app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_OUTBOX_MAX_ATTEMPTS),
+        backoff_base=app.config.get('EMAIL_OUTBOX_BACKOFF_BASE', DEFAULT_OUTBOX_BACKOFF_BASE),
+        backoff_max=app.config.get('EMAIL_OUTBOX_BACKOFF_MAX', DEFAULT_OUTBOX_BACKOFF_MAX),
+    )
+    _email_outbox_worker.start()
+    return _email_outbox_worker
+
+
+def get_email_outbox_worker() -> Optional[EmailOutboxWorker]:
+    """获取当前进程的邮件发送线程池"""
+    return _email_outbox_worker
+
+
+def set_email_outbox_worker(worker: Optional[EmailOutboxWorker]) -> None:
+    """替换当前进程的邮件发送线程池（用于测试）"""
+    global _email_outbox_worker
+    _email_outbox_worker = worker
@@ -0,0 +1,167 @@
+"""过期数据清理
+
+所有带有效期的表统一使用expires_at列（不带时区的UTC时间）：写入时按TTL策略计算过期时间，读取时只过滤expires_at > 当前UTC时间，
+过期行由后台清理线程分批删除（DELETE ... LIMIT n），不在请求路径上做清理。
+
+TTL策略（均可通过配置修改）：
+- wechat_session：SCAN_STATE_TTL，默认600秒
+- verification：VERIFICATION_CODE_EXPIRE，默认600秒
+- email_outbox：EMAIL_OUTBOX_RETENTION，默认86400秒，只有发送成功或放弃的邮件才设置expires_at
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from app.utils.config_manager import get_config_manager
+from .db import db
+
+logger = logging.getLogger(__name__)
+
+# 表名 -> (TTL配置项, 默认TTL秒数)
+EXPIRY_POLICY = {
+    'wechat_session': ('SCAN_STATE_TTL', 600),
+    'verification': ('VERIFICATION_CODE_EXPIRE', 600),
+    'email_outbox': ('EMAIL_OUTBOX_RETENTION', 86400),
+}
+
+# 默认每批删除的行数
+DEFAULT_REAPER_BATCH_SIZE = 1000
+
+# 默认清理间隔（秒）
+DEFAULT_REAPER_INTERVAL = 60
+
+
+def get_ttl(table: str) -> int:
+    """获取指定表的TTL（秒）
+
+    Args:
+        table: 表名，必须在EXPIRY_POLICY中
+
+    Returns:
+        int: TTL秒数
+    """
+    config_key, default = EXPIRY_POLICY[table]
+    try:
+        return int(get_config_manager().get(config_key, default) or default)
+    except (TypeError, ValueError):
+        return default
+
+
+def expiry_now() -> datetime:
+    """获取与expires_at列比较的当前时间（不带时区的UTC时间）"""
+    return datetime.utcnow()
+
+
+def purge_expired(table: str, batch_size: int = DEFAULT_REAPER_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """分批删除指定表中已过期的行
+
+    每批执行一条DELETE ... LIMIT n并立即提交，单条语句持有的行锁数量有上限，不会长时间阻塞写入。
+
+    Args:
+        table: 表名，必须在EXPIRY_POLICY中
+        batch_size: 每批删除的行数
+        now: 当前UTC时间，默认使用expiry_now()
+
+    Returns:
+        int: 删除的总行数
+    """
+    if table not in EXPIRY_POLICY:
+        raise ValueError(f"未配置TTL策略的表: {table}")
+    now = now or expiry_now()
+    statement = text(f"DELETE FROM {table} WHERE expires_at <= :now LIMIT :limit")
+
+    total = 0
+    while True:
+        try:
+            result = db.session.execute(statement, {'now': now, 'limit': batch_size})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        deleted = result.rowcount or 0
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def run_expiry_reaper_once(batch_size: int = DEFAULT_REAPER_BATCH_SIZE) -> Dict[str, int]:
+    """对所有配置了TTL策略的表执行一次清理
+
+    Args:
+        batch_size: 每批删除的行数
+
+    Returns:
+        dict: 表名 -> 本次删除的行数，清理失败的表为-1
+    """
+    report = {}
+    for table in EXPIRY_POLICY:
+        try:
+            report[table] = purge_expired(table, batch_size)
+        except Exception as e:
+            logger.error(f"清理过期数据失败 - 表: {table}, 错误: {e}")
+            report[table] = -1
+    return report
+
+
+class ExpiryReaper:
+    """后台过期数据清理线程"""
+
+    def __init__(self, app, interval: int = DEFAULT_REAPER_INTERVAL, batch_size: int = DEFAULT_REAPER_BATCH_SIZE):
+        """
+        Args:
+            app: Flask应用，清理在其应用上下文中执行
+            interval: 清理间隔（秒）
+            batch_size: 每批删除的行数
+        """
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_report: Dict[str, int] = {}
+        self.total_purged: Dict[str, int] = {table: 0 for table in EXPIRY_POLICY}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> Dict[str, int]:
+        """执行一次清理并记录结果"""
+        start = time.perf_counter()
+        with self.app.app_context():
+            report = run_expiry_reaper_once(self.batch_size)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        self.last_report = report
+        for table, purged in report.items():
+            if purged > 0:
+                self.total_purged[table] += purged
+        summary = ', '.join(f"{table}: {purged}" for table, purged in report.items())
+        if any(purged != 0 for purged in report.values()):
+            logger.info(f"过期数据清理完成 - {summary}, 耗时: {elapsed:.1f}ms")
+        else:
+            logger.debug(f"过期数据清理完成 - {summary}, 耗时: {elapsed:.1f}ms")
+        return report
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"过期数据清理线程异常: {e}")
+
+    def start(self) -> None:
+        """启动后台清理线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='expiry-reaper', daemon=True)
+        self._thread.start()
+        logger.info(f"过期数据清理线程已启动，间隔: {self.interval}秒，每批: {self.batch_size}行")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止后台清理线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,297 @@
+"""登录日志本地落盘
+
+数据库不可用或写入超时时，登录日志追加到本地文件，数据库恢复后由回放线程批量写回login_log表，
+保证审计记录不因数据库短暂故障而丢失。
+
+文件格式：每条记录为 4字节长度 + 4字节CRC32 + JSON内容（大端序），进程崩溃导致的末尾半条记录在读取时丢弃。
+追加后每累计fsync_batch条或距上次fsync超过fsync_interval毫秒执行一次fsync，一次fsync覆盖多条记录。
+每个进程追加到各自的 path.<pid> 文件，回放时轮转为 path.<pid>.<时间戳>.replay，
+已退出进程遗留的文件也会在回放时一并处理。
+
+每条日志在提交时生成唯一的record_id，写入使用INSERT IGNORE，
+同一条日志被重复写入（例如超时后原写入实际已成功）时不会产生重复行。
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from glob import escape, glob
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 记录头：长度 + CRC32
+RECORD_HEADER = struct.Struct('>II')
+
+# 单条记录最大长度，超过视为文件损坏
+MAX_RECORD_SIZE = 1024 * 1024
+
+# 默认每累计多少条记录执行一次fsync
+DEFAULT_FSYNC_BATCH = 64
+
+# 默认最长fsync间隔（毫秒）
+DEFAULT_FSYNC_INTERVAL_MS = 100
+
+# 默认回放间隔（秒）
+DEFAULT_REPLAY_INTERVAL = 30
+
+# 默认回放时每批写入的行数
+DEFAULT_REPLAY_BATCH_SIZE = 500
+
+# 待回放文件的后缀
+REPLAY_SUFFIX = '.replay'
+
+
+def encode_record(row: Dict[str, Any]) -> bytes:
+    """将一条登录日志编码为带长度和校验的记录"""
+    payload = json.dumps(row, ensure_ascii=False, default=_json_default).encode('utf-8')
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _decode_row(payload: bytes) -> Dict[str, Any]:
+    row = json.loads(payload.decode('utf-8'))
+    if isinstance(row.get('created_at'), str):
+        row['created_at'] = datetime.fromisoformat(row['created_at'])
+    return row
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取落盘文件中的登录日志，遇到不完整或校验失败的记录时停止
+
+    Args:
+        path: 落盘文件路径
+
+    Yields:
+        dict: 登录日志字段
+    """
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, checksum = RECORD_HEADER.unpack(header)
+            if length > MAX_RECORD_SIZE:
+                logger.warning(f"登录日志落盘文件记录长度异常，停止读取 - 文件: {path}")
+                return
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                logger.warning(f"登录日志落盘文件末尾记录不完整，已丢弃 - 文件: {path}")
+                return
+            yield _decode_row(payload)
+
+
+class LoginLogSpill:
+    """登录日志本地落盘文件"""
+
+    def __init__(self, path: str, fsync_batch: int = DEFAULT_FSYNC_BATCH,
+                 fsync_interval_ms: int = DEFAULT_FSYNC_INTERVAL_MS):
+        """
+        Args:
+            path: 落盘文件路径前缀，实际文件为 path.<pid>
+            fsync_batch: 每累计多少条记录执行一次fsync
+            fsync_interval_ms: 最长fsync间隔（毫秒）
+        """
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def _active_path(self) -> str:
+        return f"{self.path}.{os.getpid()}"
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def append(self, rows: List[Dict[str, Any]]) -> int:
+        """追加登录日志
+
+        Args:
+            rows: 登录日志字段字典列表
+
+        Returns:
+            int: 追加的条数
+        """
+        if not rows:
+            return 0
+        data = b''.join(encode_record(row) for row in rows)
+        with self._lock:
+            if self._file is not None and self._pid != os.getpid():
+                # fork后的子进程不能继续写父进程的文件
+                self._file = None
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self._active_path(), 'ab')
+                self._pid = os.getpid()
+            self._file.write(data)
+            self._unsynced += len(rows)
+            if (self._unsynced >= self.fsync_batch
+                    or time.monotonic() - self._last_fsync >= self.fsync_interval):
+                self._sync()
+            else:
+                self._file.flush()
+        return len(rows)
+
+    def close(self) -> None:
+        """同步并关闭当前落盘文件"""
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def _rotate_file(self, path: str, pid: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            os.replace(path, f"{self.path}.{pid}.{time.time_ns()}{REPLAY_SUFFIX}")
+
+    def _rotate(self) -> None:
+        """将当前进程的文件以及已退出进程遗留的文件轮转为待回放文件，之后的追加写入新文件"""
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._sync()
+                self._file.close()
+            self._file = None
+            self._rotate_file(self._active_path(), os.getpid())
+        for path, pid in self._active_files():
+            if pid != os.getpid() and not _pid_alive(pid):
+                self._rotate_file(path, pid)
+
+    def _active_files(self):
+        """获取所有进程正在追加的文件及其pid"""
+        prefix = f"{self.path}."
+        for path in glob(f"{escape(self.path)}.*"):
+            suffix = path[len(prefix):]
+            if suffix.isdigit():
+                yield path, int(suffix)
+
+    def pending_files(self) -> List[str]:
+        """获取待回放的文件，按进程和轮转时间排序"""
+        return sorted(glob(f"{escape(self.path)}.*{REPLAY_SUFFIX}"))
+
+    def has_pending(self) -> bool:
+        """是否有未回放的日志"""
+        if self.pending_files():
+            return True
+        return any(os.path.getsize(path) > 0 for path, pid in self._active_files()
+                   if pid == os.getpid() or not _pid_alive(pid))
+
+    def replay(self, batch_size: int = DEFAULT_REPLAY_BATCH_SIZE) -> int:
+        """将落盘的日志批量写回数据库，需要在应用上下文中调用
+
+        回放成功的文件会被删除；写入失败时保留文件并抛出异常，下次回放时从头重试，
+        已写入的记录由record_id去重。
+
+        Args:
+            batch_size: 每批写入的行数
+
+        Returns:
+            int: 回放的记录数
+        """
+        from .login_log_writer import write_login_logs
+
+        self._rotate()
+        total = 0
+        for path in self.pending_files():
+            batch = []
+            for row in read_records(path):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    total += write_login_logs(batch)
+                    batch = []
+            if batch:
+                total += write_login_logs(batch)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # 其他进程同时回放了同一文件，重复的记录已被INSERT IGNORE跳过
+                pass
+        return total
+
+
+def _pid_alive(pid: int) -> bool:
+    """判断进程是否仍在运行"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SpillReplayer:
+    """后台回放登录日志落盘文件"""
+
+    def __init__(self, app, spill: LoginLogSpill, interval: int = DEFAULT_REPLAY_INTERVAL,
+                 batch_size: int = DEFAULT_REPLAY_BATCH_SIZE):
+        """
+        Args:
+            app: Flask应用，回放在其应用上下文中执行
+            spill: 落盘文件
+            interval: 回放间隔（秒）
+            batch_size: 每批写入的行数
+        """
+        self.app = app
+        self.spill = spill
+        self.interval = interval
+        self.batch_size = batch_size
+        self.total_replayed = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        """有待回放的日志时执行一次回放
+
+        Returns:
+            int: 回放的记录数，回放失败时为-1
+        """
+        if not self.spill.has_pending():
+            return 0
+        try:
+            with self.app.app_context():
+                replayed = self.spill.replay(self.batch_size)
+        except Exception as e:
+            logger.warning(f"回放登录日志落盘文件失败，稍后重试: {e}")
+            return -1
+        self.total_replayed += replayed
+        if replayed:
+            logger.info(f"登录日志落盘文件回放完成 - 条数: {replayed}")
+        return replayed
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        """启动后台回放线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='login-log-replayer', daemon=True)
+        self._thread.start()
+        logger.info(f"登录日志回放线程已启动，间隔: {self.interval}秒，落盘文件: {self.spill.path}")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止后台回放线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,334 @@
+"""登录日志异步批量写入
+
+登录请求只把日志放入有界队列，由后台写入线程每攒够batch_size条或每隔flush_interval毫秒
+执行一条多行INSERT，避免每次登录尝试都在请求路径上多一次数据库往返和提交。
+
+队列满时按配置处理：drop（默认）直接丢弃并计数；block在put_timeout内等待队列空位，超时后丢弃并计数。
+配置了落盘文件时，队列满或批量写入失败的日志改为追加到落盘文件，数据库恢复后由回放线程写回（见login_log_spill）。
+进程退出时会把队列中剩余的日志写完。
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+
+from .db import LoginLog, db
+from .login_log_spill import LoginLogSpill, SpillReplayer
+
+logger = logging.getLogger(__name__)
+
+# 默认队列容量
+DEFAULT_QUEUE_SIZE = 10000
+
+# 默认每批写入的行数
+DEFAULT_BATCH_SIZE = 200
+
+# 默认最长攒批时间（毫秒）
+DEFAULT_FLUSH_INTERVAL_MS = 200
+
+# 默认登录请求在记录日志上最多等待的时间（毫秒）
+DEFAULT_BUDGET_MS = 50
+
+# LoginLog中可由调用方提供的字段
+LOGIN_LOG_FIELDS = tuple(column.name for column in LoginLog.__table__.columns if column.name != 'id')
+
+
+def _normalize_row(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """补全所有列，多行INSERT要求每行的列一致"""
+    row = {name: fields.get(name) for name in LOGIN_LOG_FIELDS}
+    if row['record_id'] is None:
+        row['record_id'] = uuid.uuid4().hex
+    if row['created_at'] is None:
+        row['created_at'] = datetime.now(timezone.utc)
+    if row['login_type'] is None:
+        row['login_type'] = 'default'
+    return row
+
+
+def write_login_logs(rows: List[Dict[str, Any]]) -> int:
+    """使用一条多行INSERT写入登录日志，需要在应用上下文中调用
+
+    使用INSERT IGNORE，record_id已存在的日志（重复提交或重复回放）会被跳过。
+
+    Args:
+        rows: 登录日志字段字典列表
+
+    Returns:
+        int: 写入的行数
+    """
+    if not rows:
+        return 0
+    try:
+        statement = LoginLog.__table__.insert().prefix_with('IGNORE', dialect='mysql')
+        db.session.execute(statement.values([_normalize_row(row) for row in rows]))
+        db.session.commit()
+        return len(rows)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class LoginLogWriter:
+    """后台批量写入登录日志"""
+
+    def __init__(self, app, max_queue: int = DEFAULT_QUEUE_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS, overflow: str = 'drop',
+                 put_timeout: float = 0.05, spill: Optional[LoginLogSpill] = None):
+        """
+        Args:
+            app: Flask应用，写入在其应用上下文中执行
+            max_queue: 队列容量
+            batch_size: 每批最多写入的行数
+            flush_interval_ms: 最长攒批时间（毫秒）
+            overflow: 队列满时的处理方式，drop为直接丢弃，block为等待put_timeout秒后丢弃
+            put_timeout: overflow为block时的最长等待时间（秒）
+            spill: 落盘文件，队列满或写入失败的日志追加到该文件，为None时丢弃
+        """
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.overflow = overflow
+        self.put_timeout = put_timeout
+        self.spill = spill
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'spilled': 0, 'batches': 0}
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _spill(self, batch: List[Dict[str, Any]]) -> bool:
+        """将日志追加到落盘文件，返回是否成功"""
+        if self.spill is None:
+            return False
+        try:
+            self._count('spilled', self.spill.append(batch))
+            return True
+        except Exception as e:
+            logger.error(f"登录日志落盘失败 - 条数: {len(batch)}, 错误: {e}")
+            return False
+
+    def submit(self, **fields) -> bool:
+        """提交一条登录日志，不等待写入数据库
+
+        Returns:
+            bool: 是否成功放入队列或落盘，被丢弃时返回False
+        """
+        fields.setdefault('record_id', uuid.uuid4().hex)
+        fields.setdefault('created_at', datetime.now(timezone.utc))
+        try:
+            if self.overflow == 'block':
+                self._queue.put(fields, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(fields)
+        except queue.Full:
+            if self._spill([fields]):
+                return True
+            self._count('dropped')
+            logger.warning(f"登录日志队列已满，丢弃日志 - 用户名: {fields.get('username')}")
+            return False
+        self._count('submitted')
+        return True
+
+    def _drain(self, first=None) -> List[Dict[str, Any]]:
+        """从队列中取出一批日志，最多等待flush_interval"""
+        batch = [first] if first is not None else []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            with self.app.app_context():
+                written = write_login_logs(batch)
+            self._count('written', written)
+            self._count('batches')
+        except Exception as e:
+            self._count('failed', len(batch))
+            logger.error(f"批量写入登录日志失败 - 条数: {len(batch)}, 错误: {e}")
+            self._spill(batch)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def flush(self) -> None:
+        """同步写入队列中剩余的全部日志"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def start(self) -> None:
+        """启动后台写入线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='login-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(f"登录日志异步写入线程已启动，每批: {self.batch_size}条，攒批时间: {int(self.flush_interval * 1000)}ms")
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """停止后台写入线程，并写入队列中剩余的日志"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        if self.spill is not None:
+            self.spill.close()
+
+    def stats(self) -> Dict[str, int]:
+        """获取写入统计（已提交、已写入、丢弃、写入失败、落盘、批次数、当前排队数）"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+# 当前进程使用的写入器，未启用异步写入时为None
+_login_log_writer: Optional[LoginLogWriter] = None
+
+# 当前进程使用的落盘文件，未配置时为None
+_login_log_spill: Optional[LoginLogSpill] = None
+
+# 同步写入时登录请求最多等待的时间（秒）
+_login_log_budget: float = DEFAULT_BUDGET_MS / 1000.0
+
+# 同步写入使用的线程池，请求线程只等待不超过_login_log_budget的时间
+_sync_executor: Optional[ThreadPoolExecutor] = None
+
+
+def init_login_log_writer(app) -> Optional[LoginLogWriter]:
+    """按应用配置创建落盘文件、回放线程和登录日志写入器
+
+    Args:
+        app: Flask应用
+
+    Returns:
+        LoginLogWriter: 写入器，LOGIN_LOG_ASYNC关闭时返回None
+    """
+    global _login_log_writer, _login_log_spill, _login_log_budget
+    budget_ms = app.config.get('LOGIN_LOG_BUDGET_MS', DEFAULT_BUDGET_MS)
+    _login_log_budget = budget_ms / 1000.0
+
+    spill_path = app.config.get('LOGIN_LOG_SPILL_PATH')
+    if spill_path:
+        _login_log_spill = LoginLogSpill(
+            spill_path,
+            fsync_batch=app.config.get('LOGIN_LOG_SPILL_FSYNC_BATCH', 64),
+            fsync_interval_ms=app.config.get('LOGIN_LOG_SPILL_FSYNC_INTERVAL_MS', 100),
+        )
+        SpillReplayer(app, _login_log_spill, interval=app.config.get('LOGIN_LOG_REPLAY_INTERVAL', 30)).start()
+
+    if not app.config.get('LOGIN_LOG_ASYNC', True):
+        return None
+    _login_log_writer = LoginLogWriter(
+        app,
+        max_queue=app.config.get('LOGIN_LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+        batch_size=app.config.get('LOGIN_LOG_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+        flush_interval_ms=app.config.get('LOGIN_LOG_FLUSH_INTERVAL_MS', DEFAULT_FLUSH_INTERVAL_MS),
+        overflow=app.config.get('LOGIN_LOG_OVERFLOW', 'drop'),
+        put_timeout=_login_log_budget,
+        spill=_login_log_spill,
+    )
+    _login_log_writer.start()
+    return _login_log_writer
+
+
+def get_login_log_writer() -> Optional[LoginLogWriter]:
+    """获取当前进程的登录日志写入器"""
+    return _login_log_writer
+
+
+def set_login_log_writer(writer: Optional[LoginLogWriter]) -> None:
+    """替换当前进程的登录日志写入器（用于测试或基准测试），为None时改为同步写入"""
+    global _login_log_writer
+    _login_log_writer = writer
+
+
+def get_login_log_spill() -> Optional[LoginLogSpill]:
+    """获取当前进程的登录日志落盘文件"""
+    return _login_log_spill
+
+
+def set_login_log_spill(spill: Optional[LoginLogSpill]) -> None:
+    """替换当前进程的登录日志落盘文件（用于测试），为None时写入失败的日志直接丢弃"""
+    global _login_log_spill
+    _login_log_spill = spill
+
+
+def _write_in_app_context(app, rows):
+    with app.app_context():
+        return write_login_logs(rows)
+
+
+def _write_within_budget(fields: Dict[str, Any]) -> None:
+    """在_login_log_budget内同步写入一条日志，超时抛出TimeoutError"""
+    global _sync_executor
+    if _sync_executor is None:
+        _sync_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='login-log-sync')
+    future = _sync_executor.submit(_write_in_app_context, current_app._get_current_object(), [fields])
+    try:
+        future.result(timeout=_login_log_budget)
+    except FutureTimeoutError:
+        raise TimeoutError(f"写入登录日志超过{int(_login_log_budget * 1000)}ms")
+
+
+def record_login_log(**fields) -> bool:
+    """记录一条登录日志
+
+    启用异步写入时放入队列后立即返回，否则在当前请求中同步写入，最多等待LOGIN_LOG_BUDGET_MS。
+    同步写入失败或超时的日志追加到落盘文件（超时的写入可能稍后仍会成功，回放时按record_id去重）。
+
+    Returns:
+        bool: 是否已提交（同步模式下为是否写入数据库或落盘成功）
+    """
+    writer = _login_log_writer
+    if writer is not None:
+        return writer.submit(**fields)
+    fields.setdefault('record_id', uuid.uuid4().hex)
+    fields.setdefault('created_at', datetime.now(timezone.utc))
+    try:
+        _write_within_budget(fields)
+        return True
+    except Exception as e:
+        logger.error(f"保存登录日志失败: {e}")
+    spill = _login_log_spill
+    if spill is None:
+        return False
+    try:
+        spill.append([fields])
+        return True
+    except Exception as e:
+        logger.error(f"登录日志落盘失败: {e}")
+        return False
@@ -0,0 +1,340 @@
+"""企业微信扫码状态存储
+
+扫码登录/绑定流程中的state状态（action、扫码状态等）读写频繁（前端约每秒轮询一次），
+这里提供统一的ScanStateStore接口和三种后端实现：
+
+- MemoryScanStateStore：进程内TTL映射，适用于单进程开发环境
+- RedisScanStateStore：基于Redis协议的共享存储，适用于多进程/多节点生产环境
+- DatabaseScanStateStore：基于wechat_session表，兼容未部署Redis的环境（生产配置不允许使用）
+
+通过配置项SCAN_STATE_BACKEND（memory/redis/database，默认redis）选择后端，
+使用get_scan_state_store()获取当前进程的存储实例。
+"""
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入redis客户端，未安装时Redis后端不可用
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 默认的扫码状态有效期（秒），与回调中10分钟的有效期保持一致
+DEFAULT_SCAN_STATE_TTL = 600
+
+# 以独立字段存储的会话字段，其余字段放入payload
+_RECORD_FIELDS = ('action', 'ip_address', 'mode', 'scan_status')
+
+
+class ScanStateRecord:
+    """单个扫码状态记录，使用__slots__保持内存占用紧凑"""
+
+    __slots__ = ('state', 'timestamp', 'expires_at', 'action', 'ip_address', 'mode', 'scan_status', 'payload')
+
+    def __init__(self, state, timestamp, expires_at, action='login', ip_address='', mode='production',
+                 scan_status='pending', payload=None):
+        self.state = state
+        self.timestamp = timestamp
+        self.expires_at = expires_at
+        self.action = action
+        self.ip_address = ip_address
+        self.mode = mode
+        self.scan_status = scan_status
+        self.payload = payload
+
+    @classmethod
+    def from_session_info(cls, state: str, session_info: Dict[str, Any], ttl: int) -> 'ScanStateRecord':
+        """由会话数据字典创建记录"""
+        timestamp = session_info.get('timestamp')
+        if not isinstance(timestamp, (int, float)):
+            timestamp = time.time()
+        payload = {k: v for k, v in session_info.items() if k != 'timestamp' and k not in _RECORD_FIELDS}
+        return cls(
+            state=state,
+            timestamp=float(timestamp),
+            expires_at=float(timestamp) + ttl,
+            action=session_info.get('action') or 'login',
+            ip_address=session_info.get('ip_address') or '',
+            mode=session_info.get('mode') or 'production',
+            scan_status=session_info.get('scan_status') or 'pending',
+            payload=payload or None,
+        )
+
+    def to_session_info(self) -> Dict[str, Any]:
+        """转换为会话数据字典，格式与app.models.get_wechat_session()一致"""
+        return {
+            'timestamp': self.timestamp,
+            'action': self.action,
+            'ip_address': self.ip_address,
+            'mode': self.mode,
+            'scan_status': self.scan_status,
+            **(self.payload or {})
+        }
+
+
+class ScanStateStore:
+    """扫码状态存储接口，所有操作都只针对单个state"""
+
+    def get(self, state: str) -> Optional[Dict[str, Any]]:
+        """获取state对应的会话数据，不存在或已过期时返回None"""
+        raise NotImplementedError
+
+    def put(self, state: str, session_info: Dict[str, Any]) -> bool:
+        """新建或覆盖state对应的会话数据"""
+        raise NotImplementedError
+
+    def update_status(self, state: str, scan_status: str, from_status: Optional[str] = None) -> bool:
+        """原子地更新扫码状态，指定from_status时仅当当前状态匹配才更新"""
+        raise NotImplementedError
+
+    def delete(self, state: str) -> bool:
+        """删除state对应的会话数据"""
+        raise NotImplementedError
+
+
+class MemoryScanStateStore(ScanStateStore):
+    """进程内TTL映射实现，仅适用于单进程部署"""
+
+    # 每写入多少次执行一次过期清理
+    SWEEP_INTERVAL = 256
+
+    def __init__(self, ttl: int = DEFAULT_SCAN_STATE_TTL):
+        self.ttl = ttl
+        self._records: Dict[str, ScanStateRecord] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _get_live_record(self, state, now):
+        record = self._records.get(state)
+        if record is not None and record.expires_at <= now:
+            del self._records[state]
+            return None
+        return record
+
+    def _sweep(self, now):
+        expired = [state for state, record in self._records.items() if record.expires_at <= now]
+        for state in expired:
+            del self._records[state]
+
+    def get(self, state):
+        if not state:
+            return None
+        with self._lock:
+            record = self._get_live_record(state, time.time())
+            return record.to_session_info() if record else None
+
+    def put(self, state, session_info):
+        record = ScanStateRecord.from_session_info(state, session_info, self.ttl)
+        with self._lock:
+            self._records[state] = record
+            self._writes += 1
+            if self._writes % self.SWEEP_INTERVAL == 0:
+                self._sweep(time.time())
+        return True
+
+    def update_status(self, state, scan_status, from_status=None):
+        with self._lock:
+            record = self._get_live_record(state, time.time())
+            if record is None:
+                return False
+            if from_status is not None and record.scan_status != from_status:
+                return False
+            record.scan_status = scan_status
+            return True
+
+    def delete(self, state):
+        with self._lock:
+            self._records.pop(state, None)
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
+
+
+class RedisScanStateStore(ScanStateStore):
+    """基于Redis协议的实现，每个state对应一个带TTL的hash"""
+
+    KEY_PREFIX = 'scan_state:'
+
+    def __init__(self, client=None, url: Optional[str] = None, ttl: int = DEFAULT_SCAN_STATE_TTL):
+        """
+        Args:
+            client: 已创建的Redis客户端（兼容redis-py接口，例如fakeredis）
+            url: Redis连接地址，未提供client时使用
+            ttl: 状态有效期（秒）
+        """
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("redis库未安装，无法使用Redis扫码状态存储")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, state):
+        return f"{self.KEY_PREFIX}{state}"
+
+    @staticmethod
+    def _decode(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def get(self, state):
+        if not state:
+            return None
+        try:
+            data = self.client.hgetall(self._key(state))
+        except Exception as e:
+            logger.error(f"从Redis获取扫码状态失败 - state: {state}, 错误: {e}")
+            return None
+        if not data:
+            return None
+        data = {self._decode(k): self._decode(v) for k, v in data.items()}
+        payload = json.loads(data['payload']) if data.get('payload') else None
+        record = ScanStateRecord(
+            state=state,
+            timestamp=float(data.get('timestamp', 0)),
+            expires_at=float(data.get('expires_at', 0)),
+            action=data.get('action', 'login'),
+            ip_address=data.get('ip_address', ''),
+            mode=data.get('mode', 'production'),
+            scan_status=data.get('scan_status', 'pending'),
+            payload=payload,
+        )
+        return record.to_session_info()
+
+    def put(self, state, session_info):
+        record = ScanStateRecord.from_session_info(state, session_info, self.ttl)
+        mapping = {
+            'timestamp': repr(record.timestamp),
+            'expires_at': repr(record.expires_at),
+            'action': record.action,
+            'ip_address': record.ip_address,
+            'mode': record.mode,
+            'scan_status': record.scan_status,
+            'payload': json.dumps(record.payload, ensure_ascii=False, separators=(',', ':')) if record.payload else '',
+        }
+        key = self._key(state)
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"写入Redis扫码状态失败 - state: {state}, 错误: {e}")
+            return False
+
+    def update_status(self, state, scan_status, from_status=None):
+        key = self._key(state)
+        try:
+            with self.client.pipeline(transaction=True) as pipe:
+                # 使用WATCH实现比较并设置，其他客户端在此期间修改该key时事务失败
+                pipe.watch(key)
+                current = self._decode(pipe.hget(key, 'scan_status'))
+                if current is None:
+                    return False
+                if from_status is not None and current != from_status:
+                    return False
+                pipe.multi()
+                pipe.hset(key, 'scan_status', scan_status)
+                pipe.execute()
+                return True
+        except Exception as e:
+            # WatchError表示并发修改，视为状态迁移失败
+            logger.warning(f"更新Redis扫码状态失败 - state: {state}, 错误: {e}")
+            return False
+
+    def delete(self, state):
+        try:
+            self.client.delete(self._key(state))
+            return True
+        except Exception as e:
+            logger.error(f"删除Redis扫码状态失败 - state: {state}, 错误: {e}")
+            return False
+
+
+class DatabaseScanStateStore(ScanStateStore):
+    """基于wechat_session表的实现"""
+
+    def get(self, state):
+        from app.models import get_wechat_session
+        return get_wechat_session(state)
+
+    def put(self, state, session_info):
+        from app.models import save_wechat_session
+        return save_wechat_session(state, session_info)
+
+    def update_status(self, state, scan_status, from_status=None):
+        from app.models import update_wechat_session_status
+        return update_wechat_session_status(state, scan_status, from_status=from_status)
+
+    def delete(self, state):
+        from app.models import delete_wechat_session
+        return delete_wechat_session(state)
+
+
+# 当前进程使用的存储实例
+_scan_state_store: Optional[ScanStateStore] = None
+_scan_state_store_lock = threading.Lock()
+
+
+def create_scan_state_store(backend: Optional[str] = None) -> ScanStateStore:
+    """根据配置创建扫码状态存储
+
+    Args:
+        backend: 后端类型（memory/redis/database），为None时读取SCAN_STATE_BACKEND配置
+
+    Returns:
+        ScanStateStore: 存储实例
+    """
+    config_manager = get_config_manager()
+    backend = (backend or config_manager.get('SCAN_STATE_BACKEND', 'redis') or 'redis').lower()
+    ttl = int(config_manager.get('SCAN_STATE_TTL', DEFAULT_SCAN_STATE_TTL) or DEFAULT_SCAN_STATE_TTL)
+
+    if backend == 'memory':
+        logger.info(f"扫码状态存储使用进程内TTL映射，有效期: {ttl}秒")
+        return MemoryScanStateStore(ttl=ttl)
+
+    if backend == 'redis':
+        url = config_manager.get('SCAN_STATE_REDIS_URL', 'redis://localhost:6379/0')
+        try:
+            store = RedisScanStateStore(url=url, ttl=ttl)
+            logger.info(f"扫码状态存储使用Redis，有效期: {ttl}秒")
+            return store
+        except Exception as e:
+            logger.error(f"创建Redis扫码状态存储失败，改用数据库存储: {e}")
+
+    return DatabaseScanStateStore()
+
+
+def get_scan_state_store() -> ScanStateStore:
+    """获取当前进程的扫码状态存储实例
+
+    Returns:
+        ScanStateStore: 存储实例
+    """
+    global _scan_state_store
+    if _scan_state_store is None:
+        with _scan_state_store_lock:
+            if _scan_state_store is None:
+                _scan_state_store = create_scan_state_store()
+    return _scan_state_store
+
+
+def set_scan_state_store(store: Optional[ScanStateStore]) -> None:
+    """替换当前进程的扫码状态存储实例（用于测试或自定义后端）
+
+    Args:
+        store: 存储实例，为None时下次获取会按配置重新创建
+    """
+    global _scan_state_store
+    _scan_state_store = store
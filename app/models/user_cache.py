@@ -0,0 +1,301 @@
+"""用户资料缓存
+
+每个已登录请求在before_request中通过get_user_profile(user_id=...)加载当前用户（见app.routes.identity），
+操作日志补充用户ID、企业微信绑定冲突检查等只读场景也通过它读取用户资料。
+进程内L1缓存按id、username、wechat_corp_userid建立索引，条目在USER_CACHE_TTL秒内直接使用，命中时不访问数据库。
+
+缓存的是不含密码的只读快照（UserProfile），需要修改用户时仍应通过User.query加载ORM对象。
+
+一致性：
+- 本进程内：User的每次插入、更新、删除（无论从哪个写入路径提交）都会通过ORM事件使对应条目失效，
+  flush时和事务提交后各失效一次，避免其他请求在提交前重新缓存旧资料
+- 多worker间：每次更新都会刷新updated_at作为版本号；条目过期后先只查询updated_at，
+  版本未变时直接续期，变化时重新加载，其他worker写入后最多在TTL内读到旧资料
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session, object_session
+
+from app.utils.config_manager import get_config_manager
+from .db import User, db
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存有效期（秒）
+DEFAULT_USER_CACHE_TTL = 30
+
+# 默认最多缓存的用户数
+DEFAULT_USER_CACHE_MAX_ENTRIES = 10000
+
+# 缓存的字段（不含密码）
+PROFILE_FIELDS = tuple(column.name for column in User.__table__.columns if column.name != 'password')
+
+# 可用于查找的索引字段
+LOOKUP_FIELDS = ('id', 'username', 'wechat_corp_userid')
+
+# updated_at只精确到秒，版本号距当前时间小于该值时同一秒内可能还有其他写入，不使用版本号续期
+VERSION_GRANULARITY = timedelta(seconds=2)
+
+UserProfile = namedtuple('UserProfile', PROFILE_FIELDS)
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """统一为不带时区的UTC时间（数据库中按UTC存储）"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def to_profile(user) -> UserProfile:
+    """将User对象转换为只读快照"""
+    values = {name: getattr(user, name) for name in PROFILE_FIELDS}
+    values['updated_at'] = _naive_utc(values['updated_at'])
+    return UserProfile(**values)
+
+
+class UserCache:
+    """进程内用户资料缓存"""
+
+    def __init__(self, ttl: int = DEFAULT_USER_CACHE_TTL, max_entries: int = DEFAULT_USER_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            ttl: 条目有效期（秒），过期后按版本号续期或重新加载
+            max_entries: 最多缓存的用户数，超出时淘汰最久未使用的条目
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # id -> [资料, 过期时间]
+        self._entries: OrderedDict = OrderedDict()
+        # 索引字段 -> {值: id}
+        self._indexes: Dict[str, Dict] = {field: {} for field in LOOKUP_FIELDS if field != 'id'}
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'reloaded': 0, 'invalidations': 0, 'evictions': 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _remove(self, user_id) -> None:
+        """删除条目及其索引，需持有锁"""
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        profile = entry[0]
+        for field, index in self._indexes.items():
+            value = getattr(profile, field)
+            if value is not None and index.get(value) == user_id:
+                del index[value]
+
+    def lookup(self, field: str, value) -> Tuple[Optional[UserProfile], bool]:
+        """查找缓存条目
+
+        Returns:
+            tuple: (资料, 是否在有效期内)，未缓存时资料为None
+        """
+        with self._lock:
+            user_id = value if field == 'id' else self._indexes[field].get(value)
+            entry = self._entries.get(user_id) if user_id is not None else None
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(user_id)
+            return entry[0], entry[1] > time.monotonic()
+
+    def put(self, profile: UserProfile) -> None:
+        """缓存用户资料"""
+        with self._lock:
+            self._remove(profile.id)
+            self._entries[profile.id] = [profile, time.monotonic() + self.ttl]
+            for field, index in self._indexes.items():
+                value = getattr(profile, field)
+                if value is not None:
+                    index[value] = profile.id
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def touch(self, user_id) -> None:
+        """版本号未变化时续期"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1] = time.monotonic() + self.ttl
+
+    def invalidate(self, user_id=None, **lookups) -> None:
+        """使用户的缓存失效
+
+        Args:
+            user_id: 用户ID
+            **lookups: username、wechat_corp_userid，用于ID未知或索引已指向其他用户的情况
+        """
+        with self._lock:
+            ids = {user_id} if user_id is not None else set()
+            for field, value in lookups.items():
+                if value is not None and field in self._indexes:
+                    ids.add(self._indexes[field].get(value))
+            for target in ids - {None}:
+                self._remove(target)
+            self._stats['invalidations'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for index in self._indexes.values():
+                index.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计（命中、未命中、按版本号续期、版本变化重新加载、失效、淘汰次数及当前条目数）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        return stats
+
+
+def _load_profile(field: str, value) -> Optional[UserProfile]:
+    user = User.query.filter_by(**{field: value}).first()
+    return to_profile(user) if user else None
+
+
+def get_user_profile(username: Optional[str] = None, user_id: Optional[int] = None,
+                     wechat_corp_userid: Optional[str] = None) -> Optional[UserProfile]:
+    """获取用户资料（只读），优先使用缓存，需要在应用上下文中调用
+
+    Args:
+        username: 登录账号
+        user_id: 用户ID
+        wechat_corp_userid: 企业微信用户ID
+
+    Returns:
+        UserProfile: 用户资料，用户不存在时返回None
+    """
+    if user_id is not None:
+        field, value = 'id', user_id
+    elif username is not None:
+        field, value = 'username', username
+    elif wechat_corp_userid is not None:
+        field, value = 'wechat_corp_userid', wechat_corp_userid
+    else:
+        return None
+
+    cache = get_user_cache()
+    if cache is None:
+        return _load_profile(field, value)
+
+    profile, fresh = cache.lookup(field, value)
+    if profile is not None and fresh:
+        cache._count('hits')
+        return profile
+
+    if profile is not None:
+        # 条目已过期：先比较版本号，未变化时续期，避免重新加载整行
+        version = db.session.query(User.updated_at).filter(User.id == profile.id).scalar()
+        version = _naive_utc(version)
+        if (version is not None and version == profile.updated_at
+                and datetime.utcnow() - version > VERSION_GRANULARITY):
+            cache.touch(profile.id)
+            cache._count('revalidated')
+            return profile
+        cache.invalidate(profile.id)
+        cache._count('reloaded')
+    else:
+        cache._count('misses')
+
+    profile = _load_profile(field, value)
+    if profile is not None:
+        cache.put(profile)
+    return profile
+
+
+def find_user_for_wechat_login(wechat_corp_userid: str, username: str):
+    """用一次查询查找企业微信登录对应的用户，已绑定该企业微信的用户优先于同名账号
+
+    Returns:
+        User: 用户ORM对象，不存在时返回None
+    """
+    users = User.query.filter(or_(User.wechat_corp_userid == wechat_corp_userid,
+                                  User.username == username)).limit(2).all()
+    user = next((u for u in users if u.wechat_corp_userid == wechat_corp_userid), None)
+    user = user or next((u for u in users if u.username == username), None)
+    cache = get_user_cache()
+    if cache is not None and user is not None:
+        cache.put(to_profile(user))
+    return user
+
+
+# 当前进程使用的缓存，USER_CACHE_TTL为0时不缓存
+_user_cache: Optional[UserCache] = None
+_user_cache_created = False
+_user_cache_lock = threading.Lock()
+
+
+def create_user_cache() -> Optional[UserCache]:
+    """根据配置创建用户资料缓存，USER_CACHE_TTL为0时返回None"""
+    config_manager = get_config_manager()
+    ttl = int(config_manager.get('USER_CACHE_TTL', DEFAULT_USER_CACHE_TTL) or 0)
+    if ttl <= 0:
+        return None
+    max_entries = int(config_manager.get('USER_CACHE_MAX_ENTRIES', DEFAULT_USER_CACHE_MAX_ENTRIES))
+    return UserCache(ttl=ttl, max_entries=max_entries)
+
+
+def get_user_cache() -> Optional[UserCache]:
+    """获取当前进程的用户资料缓存，未启用时返回None"""
+    global _user_cache, _user_cache_created
+    if not _user_cache_created:
+        with _user_cache_lock:
+            if not _user_cache_created:
+                _user_cache = create_user_cache()
+                _user_cache_created = True
+    return _user_cache
+
+
+def set_user_cache(cache: Optional[UserCache]) -> None:
+    """替换当前进程的用户资料缓存（用于测试），为None时关闭缓存"""
+    global _user_cache, _user_cache_created
+    _user_cache = cache
+    _user_cache_created = True
+
+
+@event.listens_for(User, 'before_update')
+def _bump_user_version(mapper, connection, target):
+    """有实际修改时刷新updated_at，作为其他worker判断缓存是否过期的版本号"""
+    if any(attr.history.has_changes() for attr in inspect(target).attrs):
+        target.before_update()
+
+
+def _invalidation_keys(target):
+    return target.id, {'username': target.username, 'wechat_corp_userid': target.wechat_corp_userid}
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    """任何写入路径修改用户后使本进程的缓存失效，并在事务提交后再失效一次"""
+    cache = _user_cache
+    if cache is None:
+        return
+    user_id, lookups = _invalidation_keys(target)
+    cache.invalidate(user_id, **lookups)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('user_cache_invalidations', []).append((user_id, lookups))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    pending = session.info.pop('user_cache_invalidations', None)
+    cache = _user_cache
+    if pending and cache is not None:
+        for user_id, lookups in pending:
+            cache.invalidate(user_id, **lookups)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('user_cache_invalidations', None)
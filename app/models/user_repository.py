@@ -0,0 +1,121 @@
+"""用户数据访问层
+
+get_users()/save_users()会把整张用户表读入字典再逐个用户查询、回写，注册一个用户需要O(N)次查询。
+这里按具体用途提供只访问目标行的方法：
+
+- exists_username / exists_email：按唯一索引查询一列，只判断是否存在
+- create_user：单条INSERT，并发注册时依赖username、email的唯一索引判重
+- update_fields：按主键执行单条UPDATE，只修改传入的字段并刷新updated_at
+
+update_fields使用批量UPDATE，不会触发User的ORM事件，提交后在这里使用户资料缓存失效。
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from .db import User, db
+from .user_cache import get_user_cache
+
+# update_fields允许修改的字段
+UPDATABLE_USER_FIELDS = frozenset({
+    'display_name', 'password', 'email',
+    'wechat_corp_userid', 'wechat_corp_name', 'wechat_corp_avatar', 'wechat_corp_binded_at'
+})
+
+
+class UserAlreadyExistsError(Exception):
+    """登录账号或邮箱已被其他用户使用"""
+
+    def __init__(self, field: str):
+        """
+        Args:
+            field: 冲突的字段，username或email
+        """
+        super().__init__(f"{field}已存在")
+        self.field = field
+
+
+def _duplicate_field(error: IntegrityError) -> str:
+    """根据唯一索引冲突的错误信息判断冲突字段"""
+    message = str(getattr(error, 'orig', error)).lower()
+    return 'email' if 'email' in message else 'username'
+
+
+class UserRepository:
+    """用户表的定向查询和写入"""
+
+    def exists_username(self, username: str) -> bool:
+        """登录账号是否已存在"""
+        return db.session.query(User.id).filter(User.username == username).first() is not None
+
+    def exists_email(self, email: str) -> bool:
+        """邮箱是否已被注册"""
+        return db.session.query(User.id).filter(User.email == email).first() is not None
+
+    def create_user(self, username: str, password: str, email: Optional[str] = None,
+                    display_name: Optional[str] = None) -> User:
+        """创建用户（单条INSERT）
+
+        Args:
+            username: 登录账号
+            password: 密码哈希
+            email: 邮箱
+            display_name: 系统用户名，默认为登录账号
+
+        Returns:
+            User: 新建的用户
+
+        Raises:
+            UserAlreadyExistsError: 登录账号或邮箱已存在
+        """
+        user = User(username=username, password=password, email=email,
+                    display_name=display_name or username)
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            raise UserAlreadyExistsError(_duplicate_field(e))
+        return user
+
+    def update_fields(self, user_id: int, **fields) -> bool:
+        """按主键更新用户的指定字段（单条UPDATE）
+
+        Args:
+            user_id: 用户ID
+            **fields: 要修改的字段，只允许UPDATABLE_USER_FIELDS中的字段
+
+        Returns:
+            bool: 用户存在并已更新时返回True
+
+        Raises:
+            ValueError: 包含不允许修改的字段
+            UserAlreadyExistsError: 修改后的邮箱或企业微信账号已被其他用户使用
+        """
+        unknown = set(fields) - UPDATABLE_USER_FIELDS
+        if unknown:
+            raise ValueError(f"不允许修改的用户字段: {', '.join(sorted(unknown))}")
+        if not fields:
+            return False
+
+        values = dict(fields, updated_at=datetime.now(timezone.utc))
+        try:
+            updated = User.query.filter(User.id == user_id).update(values)
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            raise UserAlreadyExistsError(_duplicate_field(e))
+
+        cache = get_user_cache()
+        if cache is not None:
+            cache.invalidate(user_id)
+        return updated > 0
+
+
+_user_repository = UserRepository()
+
+
+def get_user_repository() -> UserRepository:
+    """获取用户数据访问对象"""
+    return _user_repository
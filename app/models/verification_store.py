@@ -0,0 +1,84 @@
+"""邮箱验证码存储
+
+原来发送验证码要读取全部未过期验证码、逐行删除旧记录、逐个邮箱查询回写，再整表读取一次确认；
+校验验证码时又要整表读取并回写。这里每个操作只执行一条语句：
+
+- issue：INSERT ... ON DUPLICATE KEY UPDATE，依赖email的唯一索引，同一邮箱重新发送时覆盖验证码和时间
+- consume：DELETE ... WHERE email=? AND code=? AND created_at>?，删除成功（影响1行）即校验通过
+
+consume是条件删除，并发提交同一个验证码时只有一个请求能删除到这一行，验证码只能使用一次。
+错误的验证码不会删除记录；过期记录由后台清理线程按expires_at删除。
+时间统一使用UTC（不带时区），与expiry模块中verification表的时钟一致。
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from .db import Verification, db
+from .expiry import get_ttl
+
+_verification_table = Verification.__table__
+
+
+class VerificationStore:
+    """邮箱验证码的签发和一次性校验"""
+
+    def issue(self, email: str, code: str, now: Optional[datetime] = None) -> None:
+        """保存邮箱验证码，已有验证码时覆盖
+
+        Args:
+            email: 邮箱
+            code: 验证码
+            now: 签发时间（UTC），默认为当前时间
+        """
+        now = now or datetime.utcnow()
+        statement = mysql_insert(_verification_table).values(
+            email=email, code=code, created_at=now,
+            expires_at=now + timedelta(seconds=get_ttl('verification'))
+        )
+        statement = statement.on_duplicate_key_update(
+            code=statement.inserted.code,
+            created_at=statement.inserted.created_at,
+            expires_at=statement.inserted.expires_at
+        )
+        try:
+            db.session.execute(statement)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def consume(self, email: str, code: str, now: Optional[datetime] = None) -> bool:
+        """校验并删除验证码，同一个验证码只能成功校验一次
+
+        Args:
+            email: 邮箱
+            code: 用户提交的验证码
+            now: 当前时间（UTC），默认为当前时间
+
+        Returns:
+            bool: 验证码正确且在有效期内
+        """
+        now = now or datetime.utcnow()
+        statement = delete(_verification_table).where(
+            _verification_table.c.email == email,
+            _verification_table.c.code == code,
+            _verification_table.c.created_at > now - timedelta(seconds=get_ttl('verification'))
+        )
+        try:
+            result = db.session.execute(statement)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result.rowcount == 1
+
+
+_verification_store = VerificationStore()
+
+
+def get_verification_store() -> VerificationStore:
+    """获取邮箱验证码存储"""
+    return _verification_store
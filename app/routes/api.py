@@ -1,16 +1,23 @@
 # API路由模块
-from flask import Blueprint, request, jsonify, session, current_app
-from app.models.db import User, Verification, db
-from app.models import get_wechat_sessions, save_wechat_sessions
+from flask import Blueprint, request, jsonify, session, current_app, Response, stream_with_context, g
+from app.models.db import User, db
+from app.models.user_repository import get_user_repository, UserAlreadyExistsError
+from app.models.verification_store import get_verification_store
+from app.models.scan_state import get_scan_state_store
+from app.models.expiry import get_ttl
+from app.utils.scan_events import get_scan_event_bus, iter_scan_status_events, TERMINAL_SCAN_STATUSES, MAX_LONG_POLL_WAIT
+from app.utils.passwords import hash_password, verify_user_password
+from app.routes.identity import login_user
+from app.utils.rate_limit import rate_limit
+from app.utils.captcha_pool import get_captcha
+from app.utils.captcha_token import captcha_token_enabled, get_captcha_token_signer, captcha_image_data_uri
+from app.utils.mailer import dispatch_email
 import uuid
 from urllib.parse import quote
 import time
 import random
 import re
 from datetime import datetime, timedelta
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from app.utils.config_manager import get_config_manager
 config_manager = get_config_manager()
 
@@ -20,44 +27,13 @@ api = Blueprint('api', __name__, url_prefix='/api')
 def generate_verification_code():
     return ''.join(random.choices('0123456789', k=6))
 
-# 发送邮件函数
+# 发送邮件函数：写入发件箱后立即返回，由后台线程发送
 def send_email(recipient, subject, content):
-    try:
-        smtp_config = config_manager.get_smtp_config()
-        
-        # 创建邮件对象
-        msg = MIMEMultipart()
-        msg['From'] = smtp_config['sender']
-        msg['To'] = recipient
-        msg['Subject'] = subject
-        
-        # 添加邮件正文
-        msg.attach(MIMEText(content, 'html', 'utf-8'))
-        
-        # 连接SMTP服务器并发送邮件
-        with smtplib.SMTP(smtp_config['server'], smtp_config['port']) as server:
-            if smtp_config.get('use_ssl', False):
-                server.starttls()
-            if smtp_config.get('username') and smtp_config.get('password'):
-                server.login(smtp_config['username'], smtp_config['password'])
-            server.send_message(msg)
-        
-        return True
-    except Exception as e:
-        print(f"发送邮件失败: {str(e)}")
-        return False
-
-# 清理过期验证码
-def clean_expired_verifications():
-    try:
-        # 删除10分钟前的验证码
-        expired_time = datetime.now() - timedelta(minutes=10)
-        Verification.delete().where(Verification.created_at < expired_time).execute()
-    except Exception as e:
-        print(f"清理过期验证码失败: {str(e)}")
+    return dispatch_email(recipient, subject, content)
 
 # 发送验证码路由
 @api.route('/send_verification', methods=['POST'])
+@rate_limit('verification', as_json=True, ip='RATE_LIMIT_VERIFICATION_IP', email='RATE_LIMIT_VERIFICATION_EMAIL')
 def send_verification():
     try:
         data = request.get_json()
@@ -68,22 +44,12 @@ def send_verification():
             return jsonify({'success': False, 'message': '请输入有效的邮箱地址'})
         
         # 检查邮箱是否已注册
-        existing_user = User.select().where(User.email == email).first()
-        if existing_user:
+        if get_user_repository().exists_email(email):
             return jsonify({'success': False, 'message': '该邮箱已被注册'})
         
-        # 清理过期验证码
-        clean_expired_verifications()
-        
-        # 生成验证码
+        # 生成验证码并保存（单条INSERT ... ON DUPLICATE KEY UPDATE），过期验证码由后台清理线程删除
         code = generate_verification_code()
-        
-        # 保存验证码到数据库
-        Verification.create(
-            email=email,
-            code=code,
-            created_at=datetime.now()
-        )
+        get_verification_store().issue(email, code)
         
         # 发送邮件（在开发环境下可以不实际发送）
         if config_manager.get_app_config('debug', False):
@@ -127,38 +93,27 @@ def register():
         if not all([username, email, verification_code, password]):
             return jsonify({'success': False, 'message': '请填写所有必填字段'})
         
+        user_repository = get_user_repository()
+        
         # 检查用户名
-        if User.select().where(User.username == username).first():
+        if user_repository.exists_username(username):
             return jsonify({'success': False, 'message': '用户名已存在'})
         
         # 检查邮箱
-        if User.select().where(User.email == email).first():
+        if user_repository.exists_email(email):
             return jsonify({'success': False, 'message': '邮箱已被注册'})
         
-        # 验证验证码
-        verification = Verification.select().where(
-            (Verification.email == email) & 
-            (Verification.code == verification_code)
-        ).first()
-        
-        if not verification:
-            return jsonify({'success': False, 'message': '验证码错误'})
-        
-        # 检查验证码是否过期
-        if (datetime.now() - verification.created_at).total_seconds() > 600:  # 10分钟
-            return jsonify({'success': False, 'message': '验证码已过期'})
+        # 校验并删除验证码（单条条件DELETE），同一个验证码只能使用一次
+        if not get_verification_store().consume(email, verification_code):
+            return jsonify({'success': False, 'message': '验证码错误或已过期'})
         
-        # 创建用户
-        User.create(
-            username=username,
-            display_name=display_name,
-            email=email,
-            password=password,  # 注意：实际应用中应该加密存储密码
-            created_at=datetime.now()
-        )
-        
-        # 删除已使用的验证码
-        verification.delete_instance()
+        # 创建用户（单条INSERT，并发注册由唯一索引判重）
+        try:
+            user_repository.create_user(username, hash_password(password), email=email,
+                                        display_name=display_name)
+        except UserAlreadyExistsError as e:
+            message = '邮箱已被注册' if e.field == 'email' else '用户名已存在'
+            return jsonify({'success': False, 'message': message})
         
         return jsonify({'success': True, 'message': '注册成功'})
         
@@ -168,6 +123,7 @@ def register():
 
 # 登录路由
 @api.route('/login', methods=['POST'])
+@rate_limit('login', as_json=True, ip='RATE_LIMIT_LOGIN_IP', email='RATE_LIMIT_LOGIN_USERNAME')
 def login():
     try:
         data = request.get_json()
@@ -179,19 +135,17 @@ def login():
             return jsonify({'success': False, 'message': '请输入邮箱和密码'})
         
         # 查找用户
-        user = User.select().where(User.email == email).first()
+        user = User.query.filter_by(email=email).first()
         
         if not user:
             return jsonify({'success': False, 'message': '用户不存在'})
         
-        # 验证密码（实际应用中应该使用加密验证）
-        if user.password != password:
+        # 验证密码（历史哈希在校验成功后按当前算法重新哈希）
+        if not verify_user_password(user, password):
             return jsonify({'success': False, 'message': '密码错误'})
         
         # 设置会话
-        session['user_id'] = user.id
-        session['username'] = user.username
-        session['email'] = user.email
+        login_user(user, 'default')
         
         return jsonify({
             'success': True,
@@ -213,16 +167,10 @@ def login():
 @api.route('/user_info', methods=['GET'])
 def get_user_info():
     try:
-        # 检查用户是否登录
-        if 'user_id' not in session:
-            return jsonify({'success': False, 'message': '未登录'}), 401
-        
-        # 获取用户信息
-        user_id = session['user_id']
-        user = User.select().where(User.id == user_id).first()
-        
+        # 检查用户是否登录（当前用户已在请求开始时按主键加载）
+        user = g.current_user
         if not user:
-            return jsonify({'success': False, 'message': '用户不存在'}), 404
+            return jsonify({'success': False, 'message': '未登录'}), 401
         
         # 构建用户信息响应，包含企业微信相关字段
         user_response = {
@@ -313,10 +261,10 @@ def get_wechat_qrcode():
         
         # 保存state到数据库中，供回调验证使用
         try:
-            wechat_sessions = get_wechat_sessions()
-            wechat_sessions[state] = {'timestamp': time.time()}
-            save_wechat_sessions(wechat_sessions)
-            print(f"[DEBUG] 成功保存state到数据库: {state}")
+            if get_scan_state_store().put(state, {'timestamp': time.time()}):
+                print(f"[DEBUG] 成功保存state到扫码状态存储: {state}")
+            else:
+                print(f"[DEBUG] 保存state到扫码状态存储失败: {state}")
         except Exception as save_error:
             print(f"[DEBUG] 保存state到数据库失败: {str(save_error)}")
         
@@ -340,112 +288,101 @@ def get_wechat_qrcode():
         traceback.print_exc()
         return jsonify({'success': False, 'message': '获取二维码失败'}), 500
 
+# 各扫码状态对应的响应内容
+WECHAT_LOGIN_STATUS_RESPONSES = {
+    'init': (False, '等待扫码'),
+    'scanned': (False, '请在手机上确认登录'),
+    'confirmed': (True, '登录成功'),
+    'expired': (False, '二维码已过期，请重新获取'),
+    'failed': (False, '登录失败，请重新扫码'),
+}
+
+def resolve_wechat_login_status(session_key):
+    """获取扫码登录状态，返回(状态, 二维码创建时间戳)"""
+    # 回调完成后会话会被清理，优先使用已发布的终止状态
+    published_status = get_scan_event_bus().latest(session_key)
+    if published_status in TERMINAL_SCAN_STATUSES:
+        return ('init' if published_status == 'invalid' else published_status), None
+    
+    session_info = get_scan_state_store().get(session_key)
+    if not session_info:
+        return 'init', None
+    
+    session_time = session_info.get('timestamp', 0)
+    if session_info.get('confirmed', False) or session_info.get('scan_status') == 'confirmed':
+        return 'confirmed', session_time
+    # 检查会话是否过期
+    if time.time() - session_time > get_ttl('wechat_session'):
+        return 'expired', session_time
+    if session_info.get('scanned', False) or session_info.get('scan_status') == 'scanned':
+        return 'scanned', session_time
+    return 'init', session_time
+
+def render_wechat_login_status(status):
+    """将扫码登录状态转换为响应数据"""
+    logged_in, message = WECHAT_LOGIN_STATUS_RESPONSES.get(status, WECHAT_LOGIN_STATUS_RESPONSES['init'])
+    return {
+        'success': True,
+        'logged_in': logged_in,
+        'message': message,
+        'status': status
+    }
+
 # 检查微信登录状态路由
 @api.route('/check_wechat_login/<session_key>', methods=['GET'])
 def check_wechat_login(session_key):
-    print("\n===== 企业微信扫码登录流程 - 检查登录状态开始 =====")
-    print(f"[DEBUG] 请求URL: GET /api/check_wechat_login/{session_key}")
-    print(f"[DEBUG] 请求参数: session_key={session_key}")
+    """检查扫码登录状态，传入wait参数（秒）时以长轮询方式等待状态变化"""
+    wait = min(request.args.get('wait', 0, type=int), MAX_LONG_POLL_WAIT)
     
     try:
-        # 获取微信会话数据
-        wechat_sessions = get_wechat_sessions()
-        print(f"[DEBUG] 当前微信会话数据: {wechat_sessions}")
-        
-        # 检查session_key是否存在
-        if session_key not in wechat_sessions:
-            print(f"[DEBUG] 会话不存在: {session_key}")
-            response = {
-                'success': True,
-                'logged_in': False,
-                'message': '等待扫码',
-                'status': 'init'
-            }
-            print(f"[DEBUG] 返回数据: {response}")
-            print("===== 企业微信扫码登录流程 - 检查登录状态结束 =====\n")
-            return jsonify(response)
-        
-        # 获取会话信息
-        session_info = wechat_sessions[session_key]
-        current_time = time.time()
-        session_time = session_info.get('timestamp', 0)
-        
-        # 计算时间信息
-        elapsed_time = current_time - session_time
-        remaining_time = 300 - elapsed_time  # 5分钟 = 300秒
-        print(f"[DEBUG] 会话信息: {session_info}")
-        print(f"[DEBUG] 会话创建时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session_time))}")
-        print(f"[DEBUG] 当前时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_time))}")
-        print(f"[DEBUG] 已经过时间: {elapsed_time:.2f}秒")
-        print(f"[DEBUG] 剩余有效期: {remaining_time:.2f}秒")
-        
-        # 检查会话是否过期（二维码有效期为5分钟）
-        if current_time - session_time > 300:  # 5分钟有效期
-            print(f"[DEBUG] 会话已过期: {session_key}")
-            response = {
-                'success': True,
-                'logged_in': False,
-                'message': '二维码已过期，请重新获取',
-                'status': 'expired'
-            }
-            print(f"[DEBUG] 返回数据: {response}")
-            print("===== 企业微信扫码登录流程 - 检查登录状态结束 =====\n")
-            return jsonify(response)
-        
-        # 检查用户是否已扫码但未确认
-        if session_info.get('scanned', False) and not session_info.get('confirmed', False):
-            print(f"[DEBUG] 用户已扫码但未确认: {session_key}")
-            response = {
-                'success': True,
-                'logged_in': False,
-                'message': '请在手机上确认登录',
-                'status': 'scanned'
-            }
-            print(f"[DEBUG] 返回数据: {response}")
-            print("===== 企业微信扫码登录流程 - 检查登录状态结束 =====\n")
-            return jsonify(response)
-        
-        # 检查用户是否已确认登录
-        if session_info.get('confirmed', False):
-            # 如果用户已确认登录，返回登录成功状态和用户信息
-            user_info = session_info.get('user_info', {})
-            print(f"[DEBUG] 用户已确认登录: {session_key}")
-            response = {
-                'success': True,
-                'logged_in': True,
-                'message': '登录成功',
-                'status': 'confirmed',
-                'user': user_info
-            }
-            print(f"[DEBUG] 返回数据: {response}")
-            print("===== 企业微信扫码登录流程 - 检查登录状态结束 =====\n")
-            return jsonify(response)
+        status, session_time = resolve_wechat_login_status(session_key)
         
-        # 默认状态：等待扫码
-        print(f"[DEBUG] 等待用户扫码: {session_key}")
-        response = {
-            'success': True,
-            'logged_in': False,
-            'message': '等待扫码',
-            'status': 'init'
-        }
-        print(f"[DEBUG] 返回数据: {response}")
-        print("===== 企业微信扫码登录流程 - 检查登录状态结束 =====\n")
-        return jsonify(response)
+        if wait > 0 and status not in TERMINAL_SCAN_STATUSES:
+            if session_time:
+                wait = min(wait, session_time + get_ttl('wechat_session') - time.time())
+            new_status = get_scan_event_bus().wait(session_key, wait, last_status=status)
+            if new_status:
+                status = 'init' if new_status == 'invalid' else new_status
+        
+        return jsonify(render_wechat_login_status(status))
         
     except Exception as e:
         print(f"[ERROR] 检查微信登录状态异常: {str(e)}")
         import traceback
         traceback.print_exc()
-        response = {'success': False, 'message': '检查登录状态失败'}
-        print(f"[DEBUG] 返回数据: {response}")
-        print("===== 企业微信扫码登录流程 - 检查登录状态结束 =====\n")
-        return jsonify(response), 500
+        return jsonify({'success': False, 'message': '检查登录状态失败'}), 500
+
+# 扫码登录状态SSE推送
+@api.route('/wechat_login_events/<session_key>', methods=['GET'])
+def wechat_login_events(session_key):
+    try:
+        status, session_time = resolve_wechat_login_status(session_key)
+    except Exception as e:
+        print(f"[ERROR] 获取微信登录状态异常: {str(e)}")
+        status, session_time = 'init', None
+    
+    deadline = (session_time or time.time()) + get_ttl('wechat_session')
+    stream = iter_scan_status_events(
+        session_key, status, deadline, render_wechat_login_status,
+        reload_status=lambda: resolve_wechat_login_status(session_key)[0]
+    )
+    return Response(stream_with_context(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # 验证码图片生成（模拟）
 @api.route('/captcha', methods=['GET'])
+@rate_limit('captcha', as_json=True, ip='RATE_LIMIT_CAPTCHA_IP')
 def generate_captcha():
     try:
+        # 令牌模式：返回验证码图片和签名令牌，不写入session
+        if captcha_token_enabled():
+            code, png_bytes = get_captcha()
+            return jsonify({
+                'success': True,
+                'captcha_image': captcha_image_data_uri(png_bytes),
+                'captcha_token': get_captcha_token_signer().issue(code)
+            })
+        
         # 在实际应用中，这里应该生成一个真实的验证码图片
         # 这里为了演示，返回一个模拟的验证码
         captcha_code = generate_verification_code()
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template_string, request, redirect, url_for, session, jsonify, Response
+from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context, g
 import hashlib
 import time
 import requests
@@ -9,8 +9,23 @@ from urllib.parse import quote
 from datetime import datetime, timezone
 from app.utils.time_utils import format_datetime_with_timezone, format_datetime_for_frontend
 from sqlalchemy.exc import IntegrityError, DatabaseError
-from app.models import get_users, save_users, get_verifications, save_verifications, get_wechat_sessions, save_wechat_sessions, User, LoginLog, db, Verification
-from app.utils import generate_verification_code, generate_wechat_state, send_email, verify_code, generate_captcha
+from app.models import User, LoginLog, db
+from app.models.scan_state import get_scan_state_store
+from app.models.expiry import get_ttl
+from app.models.user_cache import get_user_profile, find_user_for_wechat_login
+from app.models.user_repository import get_user_repository, UserAlreadyExistsError
+from app.models.verification_store import get_verification_store
+from app.models.login_log_writer import record_login_log
+from app.routes.identity import load_current_user, login_user, get_current_user, get_current_user_for_update
+from app.utils.client_ip import get_client_ip
+from app.utils.user_agent import parse_user_agent
+from app.utils.passwords import hash_password, verify_password, verify_user_password
+from app.utils.rate_limit import rate_limit
+from app.utils.login_risk import get_login_risk_tracker
+from app.utils.captcha_pool import get_captcha
+from app.utils.captcha_token import captcha_token_enabled, get_captcha_token_signer, captcha_image_data_uri
+from app.utils.scan_events import get_scan_event_bus, iter_scan_status_events, TERMINAL_SCAN_STATUSES, MAX_LONG_POLL_WAIT
+from app.utils import generate_verification_code, generate_wechat_state, send_email, verify_code, is_signed_wechat_state, verify_signed_wechat_state
 
 # 企业微信Webhook URL
 WECHAT_WEBHOOK_URL = "https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=1d6b680d-21bc-4d53-af3b-46ac2b439e90"
@@ -60,45 +75,8 @@ def send_wechat_webhook_message(message, level="info"):
 
 # 获取用户真实IP地址的函数
 def get_real_ip():
-    """获取用户真实IP地址，优先使用代理头，然后使用第三方API"""
-    # 1. 首先尝试从代理头获取真实IP
-    real_ip = request.headers.get('X-Real-IP')
-    if real_ip:
-        return real_ip
-    
-    # 2. 尝试从X-Forwarded-For头获取真实IP
-    x_forwarded_for = request.headers.get('X-Forwarded-For')
-    if x_forwarded_for:
-        # X-Forwarded-For格式：client, proxy1, proxy2
-        real_ip = x_forwarded_for.split(',')[0].strip()
-        return real_ip
-    
-    # 3. 尝试从CF-Connecting-IP头获取真实IP（CloudFlare）
-    cf_connecting_ip = request.headers.get('CF-Connecting-IP')
-    if cf_connecting_ip:
-        return cf_connecting_ip
-    
-    # 4. 尝试从True-Client-IP头获取真实IP（Akamai）
-    true_client_ip = request.headers.get('True-Client-IP')
-    if true_client_ip:
-        return true_client_ip
-    
-    # 5. 如果以上都没有，使用第三方API获取真实IP
-    try:
-        # 使用ipify API获取真实IP
-        response = requests.get('https://api.ipify.org?format=json', timeout=5)
-        if response.status_code == 200:
-            return response.json().get('ip', request.remote_addr)
-        
-        # 如果ipify失败，尝试使用ifconfig.me
-        response = requests.get('https://ifconfig.me/ip', timeout=5)
-        if response.status_code == 200:
-            return response.text.strip()
-    except Exception as e:
-        logger.error(f"获取真实IP失败: {e}")
-    
-    # 6. 如果所有方法都失败，返回request.remote_addr
-    return request.remote_addr
+    """获取用户真实IP地址，只信任TRUSTED_PROXIES中代理转发的请求头，不发起网络请求"""
+    return get_client_ip()
 
 # 导入配置管理器
 from app.utils.config_manager import get_config_manager
@@ -124,26 +102,39 @@ logger = logging.getLogger('auth')
 # 创建蓝图
 bp = Blueprint('auth', __name__)
 
+# 每个请求按会话中的user_id加载一次当前用户到g.current_user（对所有蓝图生效）
+bp.before_app_request(load_current_user)
+
 @bp.route('/')
 def index():
     """首页"""
-    if 'username' in session:
+    if g.current_user:
         return redirect(url_for('auth.user_center'))
     return redirect(url_for('auth.login'))
 
 @bp.route('/captcha')
+@rate_limit('captcha', ip='RATE_LIMIT_CAPTCHA_IP')
 def captcha():
     """生成图形验证码 - 增强安全性"""
-    # 生成验证码
-    code, img_io = generate_captcha()
-    
-    # 保存验证码到session，添加更多安全措施
-    session['captcha'] = code.upper()  # 保存大写形式
-    session['captcha_timestamp'] = time.time()
-    session['captcha_attempts'] = 0  # 初始化尝试次数
-    
-    # 创建响应对象
-    response = Response(img_io.getvalue(), mimetype='image/png')
+    # 从预渲染池中取出验证码（单次使用）
+    code, png_bytes = get_captcha()
+    
+    if captcha_token_enabled():
+        # 令牌模式：答案通过签名令牌校验，不写入session，也就不会返回Set-Cookie
+        token = get_captcha_token_signer().issue(code)
+        if request.args.get('format') == 'json':
+            response = jsonify({'captcha_token': token, 'captcha_image': captcha_image_data_uri(png_bytes)})
+        else:
+            response = Response(png_bytes, mimetype='image/png')
+            response.headers['X-Captcha-Token'] = token
+    else:
+        # 保存验证码到session，添加更多安全措施
+        session['captcha'] = code.upper()  # 保存大写形式
+        session['captcha_timestamp'] = time.time()
+        session['captcha_attempts'] = 0  # 初始化尝试次数
+        
+        # 创建响应对象
+        response = Response(png_bytes, mimetype='image/png')
     
     # 添加安全头信息，防止缓存和XSS攻击
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
@@ -155,56 +146,73 @@ def captcha():
     
     return response
 
+def save_login_log(username, user_ip, browser, user_agent, platform, success, start_time,
+                   user_id=None, error_message=None, password_hash=None):
+    """记录账号密码登录日志
+    
+    日志由后台线程批量写入数据库，不在登录请求中等待提交。
+    
+    Args:
+        username: 登录账号
+        user_ip: 客户端IP
+        browser: 浏览器
+        user_agent: 完整User-Agent
+        platform: 平台
+        success: 是否登录成功
+        start_time: 请求开始时间，用于计算响应时间
+        user_id: 用户唯一ID，用户未验证或不存在时为None
+        error_message: 失败原因
+        password_hash: 输入密码的哈希，仅开发调试阶段记录
+    """
+    # 构建请求参数信息（过滤掉敏感字段）
+    request_params = {k: v for k, v in request.form.items() if k != 'password'}
+    record_login_log(
+        user_id=user_id,
+        username=username,
+        ip_address=user_ip,
+        browser=browser,
+        user_agent=user_agent,
+        platform=platform,
+        login_type='default',
+        success=success,
+        error_message=error_message,
+        request_params=str(request_params),
+        response_time=time.time() - start_time,
+        # 开发调试阶段记录密码哈希
+        password_hash_debug=password_hash if not IS_PRODUCTION else None
+    )
+
 @bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('login', methods=('POST',), ip='RATE_LIMIT_LOGIN_IP', username='RATE_LIMIT_LOGIN_USERNAME')
 def login():
     """登录页面"""
     # 如果用户已登录，重定向到首页
-    if 'username' in session:
-        logger.info(f"用户 {session['username']} 尝试再次登录，已重定向到首页")
+    if g.current_user:
+        logger.info(f"用户 {g.current_user.username} 尝试再次登录，已重定向到首页")
         return redirect(url_for('auth.index'))
     
     error_message = None
     # 获取用户真实IP地址
     user_ip = get_real_ip()
     
+    # 自适应验证码：只有近期多次登录失败的IP或账号才需要图形验证码
+    risk_tracker = get_login_risk_tracker()
+    captcha_required = risk_tracker.captcha_required(user_ip)
+    
     if request.method == 'POST':
         # 记录请求开始时间
         start_time = time.time()
         
         # 提取用户代理信息
         user_agent = request.headers.get('User-Agent', 'Unknown')
-        
-        # 简单解析用户代理
-        browser = 'Unknown'
-        platform = 'Unknown'
-        
-        # 尝试识别浏览器
-        if 'Chrome' in user_agent:
-            browser = 'Chrome'
-        elif 'Firefox' in user_agent:
-            browser = 'Firefox'
-        elif 'Safari' in user_agent and 'Chrome' not in user_agent:
-            browser = 'Safari'
-        elif 'Edge' in user_agent:
-            browser = 'Edge'
-        elif 'MSIE' in user_agent or 'Trident/' in user_agent:
-            browser = 'Internet Explorer'
-        
-        # 尝试识别平台
-        if 'Windows' in user_agent:
-            platform = 'Windows'
-        elif 'Macintosh' in user_agent:
-            platform = 'MacOS'
-        elif 'Linux' in user_agent:
-            platform = 'Linux'
-        elif 'iPhone' in user_agent:
-            platform = 'iOS'
-        elif 'Android' in user_agent:
-            platform = 'Android'
+        ua_info = parse_user_agent(user_agent)
+        browser = ua_info.browser_label
+        platform = ua_info.platform
         
         username = request.form['username']
         password = request.form['password']
         captcha_input = request.form.get('captcha', '').upper()
+        use_captcha_token = captcha_token_enabled()
         
         # 开发调试阶段记录详细信息
         if not IS_PRODUCTION:
@@ -212,16 +220,30 @@ def login():
         else:
             logger.info(f"登录尝试 - 用户名: {username}, IP: {user_ip}")
         
+        captcha_required = risk_tracker.captcha_required(user_ip, username)
+        risk_tracker.record_attempt(captcha_required)
+        
         # 验证验证码 - 修复登录功能
         captcha_valid = False
-        captcha_error = '验证码错误'
+        captcha_error = '验证码错误' if captcha_input else '请输入图形验证码'
         
+        # 无需验证码时不校验，也不修改会话中的验证码字段
+        if not captcha_required:
+            captcha_valid = True
         # 开发环境下，验证码验证通过（方便测试）
-        if not IS_PRODUCTION:
+        elif not IS_PRODUCTION and captcha_input == '1234':
+            captcha_valid = True
+        # 令牌模式：用提交的答案校验签名令牌，不读写session
+        elif use_captcha_token:
+            if captcha_input:
+                captcha_valid, captcha_error = get_captcha_token_signer().verify(
+                    request.form.get('captcha_token'), captcha_input)
+        elif not IS_PRODUCTION:
             # 开发环境下，允许使用固定验证码"1234"或随机验证码，忽略大小写
-            if captcha_input.upper() == '1234' or captcha_input.upper() == session.get('captcha', ''):
+            # 未填写验证码时不能与会话中不存在的验证码（空字符串）匹配
+            if captcha_input and captcha_input == session.get('captcha', ''):
                 captcha_valid = True
-            else:
+            elif captcha_input:
                 captcha_error = '开发环境验证码错误，请使用1234或刷新获取新验证码'
         # 生产环境下，严格验证验证码
         elif 'captcha' in session:
@@ -248,55 +270,27 @@ def login():
             error_message = captcha_error
             logger.warning(f"登录失败 - {captcha_error}: {username}, IP: {user_ip}")
             
-            # 保存登录失败日志到数据库
-            try:
-                response_time = time.time() - start_time
-                # 构建请求参数信息（过滤掉敏感字段）
-                request_params = {k: v for k, v in request.form.items() if k != 'password'}
-                
-                # 对于验证码错误，用户可能不存在，所以user_id为None
-                login_log = LoginLog(
-                    user_id=None,  # 验证码错误时用户未验证，无用户ID
-                    username=username,
-                    ip_address=user_ip,
-                    browser=browser,
-                    user_agent=user_agent,
-                    platform=platform,
-                    login_type='default',
-                    success=False,
-                    error_message=captcha_error,
-                    request_params=str(request_params),
-                    response_time=response_time
-                )
-                
-                # 开发调试阶段记录密码哈希
-                if not IS_PRODUCTION and password:
-                    input_hash = hashlib.sha256(password.encode()).hexdigest()
-                    login_log.password_hash_debug = input_hash
-                
-                db.session.add(login_log)
-                db.session.commit()
-            except Exception as e:
-                # 异常处理
-                logger.error(f"保存登录日志失败: {e}")
-                try:
-                    db.session.rollback()
-                except:
-                    pass
+            # 记录登录失败日志（验证码错误时用户未验证，无用户ID）
+            save_login_log(username, user_ip, browser, user_agent, platform, False, start_time,
+                           error_message=captcha_error,
+                           password_hash=hashlib.sha256(password.encode()).hexdigest() if not IS_PRODUCTION and password else None)
+            
             # 清除会话中的验证码（无论哪种错误）
-            session.pop('captcha', None)
-            session.pop('captcha_timestamp', None)
-            session.pop('captcha_attempts', None)
+            if not use_captcha_token:
+                session.pop('captcha', None)
+                session.pop('captcha_timestamp', None)
+                session.pop('captcha_attempts', None)
+            risk_tracker.record_failure(user_ip, username)
         else:
             # 清除会话中的验证码（无论登录成功与否）
-            session.pop('captcha', None)
-            session.pop('captcha_timestamp', None)
-            session.pop('captcha_attempts', None)
+            if captcha_required and not use_captcha_token:
+                session.pop('captcha', None)
+                session.pop('captcha_timestamp', None)
+                session.pop('captcha_attempts', None)
             
             try:
-                # 计算输入密码的哈希值
-                input_hash = hashlib.sha256(password.encode()).hexdigest()
-                logger.info(f"输入密码哈希长度: {len(input_hash)}, 前10字符: {input_hash[:10]}")
+                # 开发调试阶段记录输入密码的SHA-256（仅写入调试日志字段，生产环境不计算）
+                input_hash = hashlib.sha256(password.encode()).hexdigest() if not IS_PRODUCTION else None
                 
                 # 从数据库查询用户（MySQL是唯一数据库）
                 user = User.query.filter_by(username=username).first()
@@ -305,92 +299,30 @@ def login():
                 # 开发环境下，允许使用简单密码登录（方便测试）
                 if not IS_PRODUCTION:
                     # 开发环境下，使用简单密码验证或密码哈希匹配
-                    if (username == 'admin' and password == 'password') or (user and user.password == input_hash):
+                    # 会话中保存user_id，admin快捷登录同样要求数据库中存在该用户
+                    if user and ((username == 'admin' and password == 'password') or verify_user_password(user, password)):
                         # 认证成功
-                        session['username'] = username
-                        session['login_type'] = 'default'
+                        login_user(user, 'default')
+                        risk_tracker.record_success(username)
                         logger.info(f"开发环境登录成功 - 用户名: {username}, IP: {user_ip}")
                         
-                        # 保存登录成功日志到数据库
-                        try:
-                            response_time = time.time() - start_time
-                            # 构建请求参数信息（过滤掉敏感字段）
-                            request_params = {k: v for k, v in request.form.items() if k != 'password'}
-                            
-                            # 获取用户唯一ID
-                            user_id = user.id if user else None
-                            
-                            login_log = LoginLog(
-                                user_id=user_id,  # 记录用户唯一ID
-                                username=username,
-                                ip_address=user_ip,
-                                browser=browser,
-                                user_agent=user_agent,
-                                platform=platform,
-                                login_type='default',
-                                success=True,
-                                request_params=str(request_params),
-                                response_time=response_time
-                            )
-                            
-                            # 开发调试阶段记录密码哈希
-                            if not IS_PRODUCTION:
-                                login_log.password_hash_debug = input_hash
-                            
-                            db.session.add(login_log)
-                            db.session.commit()
-                        except Exception as e:
-                            logger.error(f"保存登录日志失败: {e}")
-                            try:
-                                db.session.rollback()
-                            except:
-                                pass
+                        # 记录登录成功日志
+                        save_login_log(username, user_ip, browser, user_agent, platform, True, start_time,
+                                       user_id=user.id, password_hash=input_hash)
                         
                         return redirect(url_for('auth.user_center'))
                 # 生产环境下，严格验证密码哈希
                 elif user:
-                    logger.info(f"用户在数据库中存在，密码哈希长度: {len(user.password)}")
                     # 验证用户凭据
-                    if user.password == input_hash:
+                    if verify_user_password(user, password):
                         # 认证成功
-                        session['username'] = username
-                        session['login_type'] = 'default'
+                        login_user(user, 'default')
+                        risk_tracker.record_success(username)
                         logger.info(f"登录成功 - 用户名: {username}, IP: {user_ip}")
                         
-                        # 保存登录成功日志到数据库
-                        try:
-                            response_time = time.time() - start_time
-                            # 构建请求参数信息（过滤掉敏感字段）
-                            request_params = {k: v for k, v in request.form.items() if k != 'password'}
-                            
-                            # 获取用户唯一ID
-                            user_id = user.id if user else None
-                            
-                            login_log = LoginLog(
-                                user_id=user_id,  # 记录用户唯一ID
-                                username=username,
-                                ip_address=user_ip,
-                                browser=browser,
-                                user_agent=user_agent,
-                                platform=platform,
-                                login_type='default',
-                                success=True,
-                                request_params=str(request_params),
-                                response_time=response_time
-                            )
-                            
-                            # 开发调试阶段记录密码哈希
-                            if not IS_PRODUCTION:
-                                login_log.password_hash_debug = input_hash
-                            
-                            db.session.add(login_log)
-                            db.session.commit()
-                        except Exception as e:
-                            logger.error(f"保存登录日志失败: {e}")
-                            try:
-                                db.session.rollback()
-                            except:
-                                pass
+                        # 记录登录成功日志
+                        save_login_log(username, user_ip, browser, user_agent, platform, True, start_time,
+                                       user_id=user.id, password_hash=input_hash)
                         
                         return redirect(url_for('auth.user_center'))
 
@@ -398,49 +330,30 @@ def login():
                 error_type = '密码错误' if user else '用户不存在'
                 logger.warning(f"登录失败 - {error_type}: {username}, IP: {user_ip}")
                 
-                # 保存登录失败日志到数据库
-                try:
-                    response_time = time.time() - start_time
-                    # 构建请求参数信息（过滤掉敏感字段）
-                    request_params = {k: v for k, v in request.form.items() if k != 'password'}
-                    
-                    # 获取用户唯一ID（如果用户存在）
-                    user_id = user.id if user else None
-                    
-                    login_log = LoginLog(
-                        user_id=user_id,  # 记录用户唯一ID
-                        username=username,
-                        ip_address=user_ip,
-                        browser=browser,
-                        user_agent=user_agent,
-                        platform=platform,
-                        login_type='default',
-                        success=False,
-                        error_message=error_type,
-                        request_params=str(request_params),
-                        response_time=response_time
-                    )
-                    
-                    # 开发调试阶段记录密码哈希
-                    if not IS_PRODUCTION:
-                        login_log.password_hash_debug = input_hash
-                    
-                    db.session.add(login_log)
-                    db.session.commit()
-                except Exception as e:
-                    logger.error(f"保存登录日志失败: {e}")
-                    try:
-                        db.session.rollback()
-                    except:
-                        pass
+                # 记录登录失败日志
+                save_login_log(username, user_ip, browser, user_agent, platform, False, start_time,
+                               user_id=user.id if user else None, error_message=error_type,
+                               password_hash=input_hash)
                 
                 error_message = '用户名或密码错误'
+                risk_tracker.record_failure(user_ip, username)
             except Exception as e:
                 logger.error(f"登录验证过程中发生错误: {e}")
                 error_message = '系统错误，请稍后重试'
                 # 发送企业微信通知
                 send_wechat_webhook_message(f"登录验证过程中发生错误: {e}", level="error")
     
+    # 本次失败后可能已达到阈值，重新判断页面是否显示验证码
+    if error_message:
+        captcha_required = risk_tracker.captcha_required(user_ip, request.form.get('username'))
+    
+    # 令牌模式下验证码图片直接嵌入页面，令牌放在隐藏字段中随表单提交
+    captcha_token = captcha_image = None
+    if captcha_required and captcha_token_enabled():
+        code, png_bytes = get_captcha()
+        captcha_token = get_captcha_token_signer().issue(code)
+        captcha_image = captcha_image_data_uri(png_bytes)
+    
     # 生成微信登录二维码URL
     state = generate_wechat_state(action='login')
     # 编码redirect_uri
@@ -449,197 +362,21 @@ def login():
     wechat_qrcode_url = f"https://open.work.weixin.qq.com/wwopen/sso/qrConnect?appid={WECHAT_CORP_ID}&agentid={WECHAT_AGENT_ID}&redirect_uri={encoded_redirect_uri}&state={state}"
     
     # 保存微信状态码
-    wechat_sessions = get_wechat_sessions()
-    wechat_sessions[state] = {'timestamp': time.time()}
-    save_wechat_sessions(wechat_sessions)
+    get_scan_state_store().put(state, {'timestamp': time.time()})
     
     # 渲染登录页面
     # 将格式化函数传递到模板上下文中
     # 将格式化函数传递到模板上下文中
     # 将格式化函数传递到模板上下文中
-    return render_template_string('''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>登录 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                    },
-                    fontFamily: {
-                        sans: ['Inter', 'system-ui', 'sans-serif'],
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-            .input-focus {
-                @apply focus:ring-2 focus:ring-primary/50 focus:border-primary;
-            }
-            .btn-hover {
-                @apply transition-all duration-300 transform hover:scale-[1.02] active:scale-[0.98];
-            }
-        }
-    </style>
-</head>
-<body class="bg-gradient-to-br from-blue-50 to-indigo-50 min-h-screen flex items-center justify-center p-4">
-    <div class="w-full max-w-md">
-        <div class="bg-white rounded-2xl p-8 card-shadow">
-            <div class="text-center mb-8">
-                <div class="inline-flex items-center justify-center w-16 h-16 bg-primary/10 text-primary rounded-full mb-4">
-                    <i class="fa fa-user-circle text-2xl"></i>
-                </div>
-                <h1 class="text-3xl font-bold text-gray-800">欢迎回来</h1>
-                <p class="text-gray-500 mt-2">请登录您的账号</p>
-            </div>
-            
-            <!-- 浏览器出口IP展示 - 隐藏在角落，点击显示 -->
-            <div class="fixed bottom-4 right-4">
-                <button id="toggleIpBtn" class="text-xs text-gray-400 hover:text-gray-600 transition-colors flex items-center" title="点击显示/隐藏IP地址">
-                    <i class="fa fa-eye mr-1"></i>
-                    <span id="ipText" class="hidden">浏览器出口IP: {{ user_ip }}</span>
-                </button>
-            </div>
-            
-            <script>
-                // 点击切换IP地址显示/隐藏
-                document.getElementById('toggleIpBtn').addEventListener('click', function() {
-                    const ipText = document.getElementById('ipText');
-                    ipText.classList.toggle('hidden');
-                });
-            </script>
-            
-            {% if error_message %}
-            <div class="mb-4 p-3 bg-red-50 border border-red-200 rounded-lg">
-                <p class="text-red-600 text-sm flex items-center">
-                    <i class="fa fa-exclamation-circle mr-2"></i>
-                    {{ error_message }}
-                </p>
-            </div>
-            {% endif %}
-            
-            <form method="post" class="space-y-4">
-                <div>
-                    <label for="username" class="block text-sm font-medium text-gray-700 mb-1">用户名</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-user"></i>
-                        </div>
-                        <input 
-                            type="text" 
-                            id="username" 
-                            name="username" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入用户名"
-                        >
-                    </div>
-                </div>
-                
-                <div>
-                    <label for="password" class="block text-sm font-medium text-gray-700 mb-1">密码</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-key"></i>
-                        </div>
-                        <input 
-                            type="password" 
-                            id="password" 
-                            name="password" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入密码"
-                        >
-                    </div>
-                </div>
-                
-                <div>
-                    <label for="captcha" class="block text-sm font-medium text-gray-700 mb-1">图形验证码</label>
-                    <div class="flex space-x-2">
-                        <div class="relative flex-grow">
-                            <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                                <i class="fa fa-shield"></i>
-                            </div>
-                            <input 
-                                type="text" 
-                                id="captcha" 
-                                name="captcha" 
-                                required
-                                class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                                placeholder="请输入验证码"
-                                maxlength="4"
-                            >
-                        </div>
-                        <img 
-                            src="{{ url_for('auth.captcha') }}" 
-                            alt="验证码" 
-                            class="w-32 h-12 border border-gray-300 rounded-lg cursor-pointer hover:opacity-90 transition-opacity"
-                            onclick="this.src = '{{ url_for('auth.captcha') }}?' + Math.random()"
-                            title="点击刷新验证码"
-                        >
-                    </div>
-                </div>
-                
-                <button 
-                    type="submit" 
-                    class="w-full bg-primary hover:bg-primary/90 text-white font-medium py-3 px-4 rounded-lg btn-hover flex items-center justify-center"
-                >
-                    <i class="fa fa-sign-in mr-2"></i> 登录
-                </button>
-            </form>
-            
-            <div class="mt-6">
-                <div class="relative flex items-center justify-center">
-                    <div class="absolute inset-0 flex items-center">
-                        <div class="w-full border-t border-gray-300"></div>
-                    </div>
-                    <div class="relative bg-white px-4 text-sm text-gray-500">
-                        其他登录方式
-                    </div>
-                </div>
-                
-                <div class="mt-6">
-                    <a href="{{ wechat_qrcode_url }}" class="w-full inline-flex justify-center items-center space-x-2 py-3 px-4 border border-gray-300 rounded-lg text-gray-700 hover:bg-gray-50 btn-hover">
-                        <i class="fa fa-building text-blue-600 text-xl"></i>
-                        <span>企业微信登录</span>
-                    </a>
-                </div>
-            </div>
-            
-            <div class="mt-6 text-center">
-                <p class="text-gray-600">
-                    还没有账号？ <a href="{{ url_for('auth.register') }}" class="text-primary hover:text-primary/80 font-medium transition duration-200">立即注册</a>
-                </p>
-            </div>
-        </div>
-    </div>
-</body>
-</html>
-    ''', error_message=error_message, wechat_qrcode_url=wechat_qrcode_url, user_ip=user_ip)
+    return render_template('auth/login.html', error_message=error_message, wechat_qrcode_url=wechat_qrcode_url, user_ip=user_ip,
+       captcha_required=captcha_required, captcha_token=captcha_token, captcha_image=captcha_image)
 
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
     """注册页面"""
     # 如果用户已登录，重定向到首页
-    if 'username' in session:
-        logger.info(f"用户 {session['username']} 尝试访问注册页面，已重定向到首页")
+    if g.current_user:
+        logger.info(f"用户 {g.current_user.username} 尝试访问注册页面，已重定向到首页")
         return redirect(url_for('auth.index'))
     
     error_message = None
@@ -655,46 +392,47 @@ def register():
         password = request.form['password']
         confirm_password = request.form['confirm_password']
         
-        # 获取用户数据
-        users = get_users()
+        user_repository = get_user_repository()
         
-        # 检查登录账号是否已存在
-        if username in users:
+        # 检查登录账号是否已存在（按唯一索引查询，不加载整张用户表）
+        if user_repository.exists_username(username):
             error_message = '登录账号已存在'
-            return render_template_string(register_template, error_message=error_message, username=username, display_name=display_name, email=email)
+            return render_template('auth/register.html', error_message=error_message, username=username, display_name=display_name, email=email)
         
         # 验证邮箱验证码
         if not verify_code(email, verification_code):
             error_message = '验证码无效或已过期，请重新获取验证码'
-            return render_template_string(register_template, error_message=error_message, username=username, display_name=display_name, email=email)
+            return render_template('auth/register.html', error_message=error_message, username=username, display_name=display_name, email=email)
         
         # 验证密码
         if password != confirm_password:
             error_message = '两次输入的密码不一致'
-            return render_template_string(register_template, error_message=error_message, username=username, display_name=display_name, email=email)
-        
-        # 注册成功，添加用户到数据库
-        users[username] = {
-            'password': hashlib.sha256(password.encode()).hexdigest(),
-            'email': email,
-            'display_name': display_name,  # 系统用户名
-            'created_at': time.time(),
-            'login_type': 'default'
-        }
-        save_users(users)
+            return render_template('auth/register.html', error_message=error_message, username=username, display_name=display_name, email=email)
+        
+        # 注册成功，添加用户到数据库（单条INSERT，并发注册由唯一索引判重）
+        try:
+            user = user_repository.create_user(username, hash_password(password), email=email,
+                                               display_name=display_name)
+        except UserAlreadyExistsError as e:
+            error_message = '邮箱已被注册' if e.field == 'email' else '登录账号已存在'
+            return render_template('auth/register.html', error_message=error_message, username=username, display_name=display_name, email=email)
+        except Exception as e:
+            logger.error(f"注册用户失败 - 登录账号: {username}, 错误: {e}")
+            error_message = '注册失败，请稍后重试'
+            return render_template('auth/register.html', error_message=error_message, username=username, display_name=display_name, email=email)
         
         # 自动登录
-        session['username'] = username
-        session['login_type'] = 'default'
+        login_user(user, 'default')
         
         logger.info(f"用户注册成功 - 登录账号: {username}, 系统用户名: {display_name}, 邮箱: {email}, IP: {request.remote_addr}")
         
         return redirect(url_for('auth.index'))
     
     # 渲染注册页面
-    return render_template_string(register_template, error_message=error_message, username=username, display_name=display_name, email=email)
+    return render_template('auth/register.html', error_message=error_message, username=username, display_name=display_name, email=email)
 
 @bp.route('/send_verification', methods=['POST'])
+@rate_limit('verification', as_json=True, ip='RATE_LIMIT_VERIFICATION_IP', email='RATE_LIMIT_VERIFICATION_EMAIL')
 def send_verification():
     """发送验证码"""
     email = request.form.get('email')
@@ -714,59 +452,17 @@ def send_verification():
         return jsonify({'success': False, 'message': '邮箱格式不正确'})
     
     # 检查邮箱是否已被注册
-    users = get_users()
-    for user in users.values():
-        if user.get('email') == email:
-            logger.warning(f"[验证码发送] 错误: 邮箱已被注册: {email}, IP: {request.remote_addr}")
-            return jsonify({'success': False, 'message': '该邮箱已被注册'})
+    if get_user_repository().exists_email(email):
+        logger.warning(f"[验证码发送] 错误: 邮箱已被注册: {email}, IP: {request.remote_addr}")
+        return jsonify({'success': False, 'message': '该邮箱已被注册'})
     
-    # 生成验证码
+    # 生成验证码并保存（单条INSERT ... ON DUPLICATE KEY UPDATE，覆盖该邮箱的旧验证码）
     code = generate_verification_code()
-    # 使用UTC时间戳，避免时区差异问题
-    from datetime import datetime, timezone
-    current_utc = datetime.now(timezone.utc)
-    current_timestamp = current_utc.timestamp()
-    
-    logger.info(f"[验证码发送] 生成验证码: {code} UTC时间: {current_utc}, 时间戳: {current_timestamp}")
-    
-    # 保存验证码（有效期10分钟）
-    verifications = get_verifications()
-    
-    # 检查是否已有该邮箱的验证码，如果有则更新
-    if email in verifications:
-        logger.info(f"[验证码发送] 更新已有验证码: 邮箱 {email}")
-    
-    # 使用UTC时间戳，确保时区一致性
-    verifications[email] = {
-        'code': code,
-        'timestamp': current_timestamp
-    }
-    
-    # 清除数据库中可能存在的旧记录，确保使用当前生成的验证码
-    from app.models.db import db, Verification
     try:
-        # 直接在数据库中删除该邮箱的旧验证码记录
-        old_verifications = Verification.query.filter_by(email=email).all()
-        for v in old_verifications:
-            db.session.delete(v)
-        db.session.commit()
-        logger.info(f"[验证码发送] 已清理数据库中该邮箱的旧验证码记录")
+        get_verification_store().issue(email, code)
     except Exception as e:
-        logger.error(f"[验证码发送] 清理数据库旧记录时出错: {e}")
-    
-    # 确认保存
-    save_result = save_verifications(verifications)
-    logger.info(f"[验证码发送] 验证码保存状态: {'成功' if save_result is None else '失败'}")
-    
-    # 再次读取以确认保存成功
-    verifications_after_save = get_verifications()
-    if email in verifications_after_save:
-        logger.info(f"[验证码发送] 验证码保存确认: 邮箱 {email} 的验证码已正确保存")
-        stored_code = verifications_after_save[email]['code']
-        stored_timestamp = verifications_after_save[email]['timestamp']
-        logger.info(f"[验证码发送] 存储的验证码: {stored_code}, 时间戳: {stored_timestamp}")
-    else:
-        logger.warning(f"[验证码发送] 警告: 验证码保存后无法在存储中找到: 邮箱 {email}")
+        logger.error(f"[验证码发送] 保存验证码失败 - 邮箱: {email}, 错误: {e}")
+        return jsonify({'success': False, 'message': '发送验证码失败，请稍后重试'})
     
     # 发送验证码邮件
     subject = 'Hello World 注册验证码'
@@ -783,7 +479,8 @@ def send_verification():
     </div>'''
     
     # 记录验证码到日志，方便测试（仅在开发环境）
-    logger.info(f"[测试信息] 邮箱 {email} 的验证码是: {code} (有效期10分钟)")
+    if not IS_PRODUCTION:
+        logger.info(f"[测试信息] 邮箱 {email} 的验证码是: {code} (有效期10分钟)")
     
     # 发送邮件
     if send_email(email, subject, content):
@@ -802,18 +499,18 @@ def wechat_corp_login():
     mode = request.args.get('mode', 'production')  # 支持测试模式
     
     # 生成state参数，用于防止CSRF攻击，明确指定action为login
-    state = generate_wechat_state(action='login')
+    state = generate_wechat_state(action='login', ip_address=ip_address, mode=mode)
     
     # 保存state到数据库，用于后续验证
     try:
-        wechat_sessions = get_wechat_sessions()
-        wechat_sessions[state] = {
+        saved = get_scan_state_store().put(state, {
             'timestamp': time.time(),
             'ip_address': ip_address,
             'mode': mode,
             'action': 'login'  # 操作类型：login
-        }
-        save_wechat_sessions(wechat_sessions)
+        })
+        if not saved:
+            raise RuntimeError('扫码状态写入失败')
     except Exception as e:
         logger.error(f"保存企业微信登录state失败: {e}, IP: {ip_address}")
         return "生成登录二维码失败，请稍后重试", 500
@@ -831,65 +528,7 @@ def wechat_corp_login():
             'test_hint': '测试模式：点击下方链接模拟扫码成功'
         }
         logger.info(f"测试模式企业微信登录 - 生成测试回调链接: {qr_code_url}, IP: {ip_address}")
-        return render_template_string('''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>企业微信登录 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                        wechat_corp: '#0084ff',
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gradient-to-br from-blue-50 to-indigo-50 min-h-screen flex items-center justify-center p-4">
-    <div class="w-full max-w-md">
-        <div class="bg-white rounded-2xl p-8 card-shadow text-center">
-            <div class="inline-flex items-center justify-center w-20 h-20 bg-wechat_corp/10 text-wechat_corp rounded-full mb-6">
-                <i class="fa fa-building text-4xl"></i>
-            </div>
-            <h1 class="text-2xl font-bold text-gray-800 mb-4">企业微信登录（测试模式）</h1>
-            <p class="text-gray-600 mb-8">测试环境：点击链接模拟扫码</p>
-            
-            <div class="flex justify-center mb-8">
-                <a href="{{ test_info.test_callback_url }}" class="bg-blue-100 hover:bg-blue-200 text-blue-700 py-3 px-6 rounded-lg transition-colors">
-                    {{ test_info.test_hint }}
-                </a>
-            </div>
-            
-            <div class="mt-6 p-4 bg-blue-50 border border-blue-100 rounded-lg">
-                <p class="text-blue-700 text-sm">
-                    <i class="fa fa-info-circle mr-2"></i>
-                    测试状态: {{ test_info.state }}
-                </p>
-            </div>
-        </div>
-    </div>
-</body>
-</html>
-    ''', state=state, qrcode_url=qr_code_url, test_info=test_info)
+        return render_template('auth/wechat_login_test.html', state=state, qrcode_url=qr_code_url, test_info=test_info)
     
     # 生产环境：构造企业微信扫码登录URL
     try:
@@ -925,148 +564,7 @@ def wechat_corp_login():
         logger.info(f"生产环境企业微信登录二维码生成成功 - state: {state}, URL: {qr_code_url[:100]}..., IP: {ip_address}")
         
         # 渲染登录页面，显示二维码
-        return render_template_string('''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>企业微信登录 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                        wechat_corp: '#0084ff',
-                        warning: '#f59e0b',
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gradient-to-br from-blue-50 to-indigo-50 min-h-screen flex items-center justify-center p-4">
-    <div class="w-full max-w-md">
-        <div class="bg-white rounded-2xl p-8 card-shadow text-center">
-            <div class="inline-flex items-center justify-center w-20 h-20 bg-wechat_corp/10 text-wechat_corp rounded-full mb-6">
-                <i class="fa fa-building text-4xl"></i>
-            </div>
-            <h1 class="text-2xl font-bold text-gray-800 mb-4">企业微信登录</h1>
-            <p class="text-gray-600 mb-8">请使用企业微信扫码登录</p>
-            
-            <!-- 二维码区域 -->
-            <div class="flex justify-center mb-8">
-                <div class="w-64 h-64 border-2 border-gray-200 rounded-lg bg-white overflow-hidden">
-                    <!-- 使用QR码生成服务 -->
-                    <img src="https://api.qrserver.com/v1/create-qr-code/?size=256x256&data={{ qrcode_url|urlencode }}" alt="企业微信登录二维码" class="w-full h-full object-contain">
-                </div>
-            </div>
-            <p class="text-sm text-gray-500 mt-2">请使用企业微信扫码登录</p>
-            
-            <!-- 配置检查提示 -->
-            <div class="mb-6 p-3 bg-yellow-50 border border-yellow-100 rounded-lg">
-                <p class="text-yellow-700 text-sm">
-                    <i class="fa fa-exclamation-circle mr-2"></i>
-                    如果扫码时显示"参数错误"，请确认企业微信应用配置已正确设置
-                </p>
-            </div>
-            
-            <div class="text-sm text-gray-500">
-                <p>请在 60 秒内完成扫码</p>
-                <div id="countdown" class="text-primary font-medium mt-2">60</div>
-            </div>
-            
-            <!-- 二维码刷新按钮 -->
-            <button id="refresh-btn" class="mt-4 text-sm text-primary hover:text-primary/80 transition-colors">
-                <i class="fa fa-refresh mr-1"></i> 刷新二维码
-            </button>
-        </div>
-    </div>
-    
-    <script>
-        let countdown = 60;
-        const countdownElement = document.getElementById('countdown');
-        const refreshButton = document.getElementById('refresh-btn');
-        
-        // 倒计时逻辑
-        const timer = setInterval(() => {
-            countdown--;
-            countdownElement.textContent = countdown;
-            
-            if (countdown <= 0) {
-                clearInterval(timer);
-                clearInterval(pollingTimer);
-                countdownElement.textContent = '已过期';
-                countdownElement.classList.remove('text-primary');
-                countdownElement.classList.add('text-red-500');
-                refreshButton.classList.remove('opacity-50', 'cursor-not-allowed');
-                refreshButton.disabled = false;
-            }
-        }, 1000);
-        
-        // 轮询检查扫码状态
-        const pollingTimer = setInterval(() => {
-            fetch(`/check_wechat_scan_status?state={{ state }}`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.status === 'scanned') {
-                        // 用户已扫码，显示提示
-                        document.querySelector('.card-shadow').innerHTML = `
-                            <div class="inline-flex items-center justify-center w-20 h-20 bg-green-100 text-green-500 rounded-full mb-6">
-                                <i class="fa fa-check text-4xl"></i>
-                            </div>
-                            <h1 class="text-2xl font-bold text-gray-800 mb-4">已扫码，请确认</h1>
-                            <p class="text-gray-600 mb-8">请在企业微信中点击确认绑定</p>
-                        `;
-                    } else if (data.status === 'confirmed') {
-                        // 用户已确认，跳转到用户中心
-                        clearInterval(pollingTimer);
-                        clearInterval(timer);
-                        window.location.href = '/user_center';
-                    } else if (data.status === 'expired') {
-                        // 二维码已过期
-                        clearInterval(pollingTimer);
-                        clearInterval(timer);
-                        countdownElement.textContent = '已过期';
-                        countdownElement.classList.remove('text-primary');
-                        countdownElement.classList.add('text-red-500');
-                        refreshButton.classList.remove('opacity-50', 'cursor-not-allowed');
-                        refreshButton.disabled = false;
-                    }
-                })
-                .catch(error => {
-                    console.error('检查扫码状态失败:', error);
-                });
-        }, 2000); // 每2秒检查一次
-        
-        // 刷新二维码功能
-        refreshButton.addEventListener('click', () => {
-            window.location.reload();
-        });
-        
-        // 页面卸载时清理定时器
-        window.addEventListener('beforeunload', () => {
-            clearInterval(timer);
-            clearInterval(pollingTimer);
-        });
-    </script>
-</body>
-</html>
-    ''', state=state, qrcode_url=qr_code_url)
+        return render_template('auth/wechat_login.html', state=state, qrcode_url=qr_code_url)
     except Exception as e:
         logger.error(f"生成企业微信登录URL失败: {e}, IP: {ip_address}")
         return "生成登录二维码失败，请稍后重试", 500
@@ -1075,7 +573,7 @@ def wechat_corp_login():
 def bind_wechat_corp():
     """企业微信绑定入口函数"""
     # 检查用户是否已登录
-    if 'username' not in session:
+    if not g.current_user:
         # 获取用户真实IP地址
         real_ip = get_real_ip()
         logger.warning(f"未登录用户尝试访问企业微信绑定 - IP: {real_ip}")
@@ -1084,14 +582,14 @@ def bind_wechat_corp():
     # 获取基本信息
     # 获取用户真实IP地址
     ip_address = get_real_ip()
-    current_username = session['username']
+    current_username = g.current_user.username
     mode = request.args.get('mode', 'production')
     
     logger.info(f"用户请求企业微信绑定 - 用户名: {current_username}, 模式: {mode}, IP: {ip_address}")
     
     # 生成安全的state参数，明确指定action为bind
     try:
-        state = generate_wechat_state(action='bind')
+        state = generate_wechat_state(action='bind', ip_address=ip_address, mode=mode)
     except Exception as e:
         logger.error(f"生成企业微信state失败: {e}, 用户名: {current_username}")
         session['error_message'] = '生成绑定请求失败，请稍后重试'
@@ -1099,9 +597,8 @@ def bind_wechat_corp():
     
     # 保存state和相关信息到会话存储
     try:
-        wechat_sessions = get_wechat_sessions()
         # 规范化会话数据结构，确保与回调函数兼容
-        wechat_sessions[state] = {
+        saved = get_scan_state_store().put(state, {
             'timestamp': time.time(),
             'ip_address': ip_address,
             'mode': mode,
@@ -1109,8 +606,9 @@ def bind_wechat_corp():
             'username': current_username,
             'scan_status': 'pending',
             'callback_count': 0  # 记录回调次数，防止重复处理
-        }
-        save_wechat_sessions(wechat_sessions)
+        })
+        if not saved:
+            raise RuntimeError('扫码状态写入失败')
         logger.info(f"企业微信绑定会话保存成功 - state: {state}, 用户名: {current_username}")
     except Exception as e:
         logger.error(f"保存企业微信绑定会话失败: {e}, 用户名: {current_username}")
@@ -1137,72 +635,7 @@ def handle_wechat_bind_test_mode(state, username, ip_address):
         logger.info(f"测试模式企业微信绑定 - 生成测试回调链接, 用户名: {username}, IP: {ip_address}")
         
         # 返回测试模式页面
-        return render_template_string('''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>绑定企业微信 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                        wechat_corp: '#0084ff',
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gradient-to-br from-blue-50 to-indigo-50 min-h-screen flex items-center justify-center p-4">
-    <div class="w-full max-w-md">
-        <div class="bg-white rounded-2xl p-8 card-shadow text-center">
-            <div class="inline-flex items-center justify-center w-20 h-20 bg-wechat_corp/10 text-wechat_corp rounded-full mb-6">
-                <i class="fa fa-building text-4xl"></i>
-            </div>
-            <h1 class="text-2xl font-bold text-gray-800 mb-4">绑定企业微信（测试模式）</h1>
-            <p class="text-gray-600 mb-8">测试环境：点击链接模拟扫码</p>
-            
-            <div class="flex justify-center mb-8">
-                <a href="{{ qrcode_url }}" class="bg-blue-100 hover:bg-blue-200 text-blue-700 py-3 px-6 rounded-lg transition-colors">
-                    {{ test_info.test_hint }}
-                </a>
-            </div>
-            
-            <div class="mt-6 p-4 bg-blue-50 border border-blue-100 rounded-lg">
-                <p class="text-blue-700 text-sm">
-                    <i class="fa fa-info-circle mr-2"></i>
-                    测试状态: {{ test_info.state }}
-                </p>
-            </div>
-            
-            <div class="mt-4 p-4 bg-amber-50 border border-amber-100 rounded-lg">
-                <p class="text-amber-700 text-sm">
-                    <i class="fa fa-clock-o mr-2"></i>
-                    二维码有效期: 5分钟
-                </p>
-            </div>
-        </div>
-    </div>
-</body>
-</html>
-    ''', qrcode_url=qr_code_url, test_info=test_info)
+        return render_template('auth/wechat_bind_test.html', qrcode_url=qr_code_url, test_info=test_info)
     except Exception as e:
         logger.error(f"生成企业微信测试绑定页面失败: {e}, 用户名: {username}")
         session['error_message'] = '生成绑定页面失败，请稍后重试'
@@ -1256,49 +689,96 @@ def validate_wechat_configs():
     
     return True
 
+# 各扫码状态对应的提示信息
+SCAN_STATUS_MESSAGES = {
+    'invalid': '二维码不存在或已失效',
+    'expired': '二维码已过期',
+    'failed': '扫码处理失败，请重新扫码'
+}
+
+def resolve_scan_status(state):
+    """获取state当前的扫码状态
+    
+    优先使用事件通知中已发布的终止状态（回调完成后state会被清理），否则读取扫码状态存储。
+    
+    Returns:
+        tuple: (扫码状态, 二维码创建时间戳)，state不存在时时间戳为None
+    """
+    published_status = get_scan_event_bus().latest(state)
+    if published_status in TERMINAL_SCAN_STATUSES:
+        return published_status, None
+    
+    session_info = get_scan_state_store().get(state)
+    if not session_info:
+        return 'invalid', None
+    
+    scan_status = session_info.get('scan_status', 'pending')
+    timestamp = session_info.get('timestamp', 0)
+    
+    # 如果已经确认，优先返回confirmed状态，不检查过期
+    if scan_status == 'confirmed':
+        return scan_status, timestamp
+    
+    # 检查二维码是否过期
+    if time.time() - timestamp > get_ttl('wechat_session'):
+        # 从会话中删除过期的state
+        get_scan_state_store().delete(state)
+        return 'expired', timestamp
+    
+    return scan_status, timestamp
+
+def render_scan_status(status):
+    """将扫码状态转换为响应数据"""
+    return {'status': status, 'message': SCAN_STATUS_MESSAGES.get(status, '成功')}
+
 @bp.route('/check_wechat_scan_status')
 def check_wechat_scan_status():
-    """检查企业微信扫码状态"""
+    """检查企业微信扫码状态
+    
+    支持长轮询：传入wait参数（秒）时，状态未变化则挂起等待回调发布的状态变更，最长MAX_LONG_POLL_WAIT秒。
+    """
     state = request.args.get('state')
+    wait = min(request.args.get('wait', 0, type=int), MAX_LONG_POLL_WAIT)
     # 获取用户真实IP地址
     ip_address = get_real_ip()
     
     try:
-        # 获取微信会话信息
-        wechat_sessions = get_wechat_sessions()
-        
-        # 检查state是否存在
-        if state not in wechat_sessions:
-            return jsonify({'status': 'invalid', 'message': '二维码不存在或已失效'}), 404
+        scan_status, timestamp = resolve_scan_status(state)
         
-        session_info = wechat_sessions[state]
+        if wait > 0 and scan_status not in TERMINAL_SCAN_STATUSES:
+            remaining = timestamp + get_ttl('wechat_session') - time.time()
+            new_status = get_scan_event_bus().wait(state, min(wait, remaining), last_status=scan_status)
+            if new_status:
+                scan_status = new_status
         
-        # 检查扫码状态
-        scan_status = session_info.get('scan_status', 'pending')
-        
-        # 如果已经确认，优先返回confirmed状态，不检查过期
         if scan_status == 'confirmed':
             logger.info(f"检测到已确认状态 - state: {state}, IP: {ip_address}")
-            # 不立即清理state，让前端有足够时间收到状态并完成跳转
-            # 清理会在前端跳转后自动处理
-            return jsonify({'status': scan_status, 'message': '成功'}), 200
-        
-        # 检查二维码是否过期（延长有效期至5分钟）
-        if time.time() - session_info.get('timestamp', 0) > 300:  # 5分钟
-            # 从会话中删除过期的state
-            try:
-                del wechat_sessions[state]
-                save_wechat_sessions(wechat_sessions)
-            except:
-                pass
-            return jsonify({'status': 'expired', 'message': '二维码已过期'}), 200
         
-        return jsonify({'status': scan_status, 'message': '成功'}), 200
+        return jsonify(render_scan_status(scan_status)), 404 if scan_status == 'invalid' else 200
         
     except Exception as e:
         logger.error(f"检查企业微信扫码状态时发生错误: {e}, IP: {ip_address}")
         return jsonify({'status': 'error', 'message': '服务器内部错误'}), 500
 
+@bp.route('/wechat_scan_events')
+def wechat_scan_events():
+    """企业微信扫码状态SSE推送，回调处理完成后推送最终状态，二维码过期后结束"""
+    state = request.args.get('state')
+    
+    try:
+        scan_status, timestamp = resolve_scan_status(state)
+    except Exception as e:
+        logger.error(f"获取企业微信扫码状态失败: {e}, state: {state}")
+        scan_status, timestamp = 'invalid', None
+    
+    deadline = (timestamp or time.time()) + get_ttl('wechat_session')
+    stream = iter_scan_status_events(
+        state, scan_status, deadline, render_scan_status,
+        reload_status=lambda: resolve_scan_status(state)[0]
+    )
+    return Response(stream_with_context(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @bp.route('/wechat_callback')
 def wechat_callback():
     """企业微信扫码回调处理函数（支持登录和绑定两种场景）"""
@@ -1310,8 +790,9 @@ def wechat_callback():
     
     # 提取用户代理信息用于日志记录
     user_agent = request.headers.get('User-Agent', '')
-    browser_info = extract_browser_info(user_agent)
-    platform_info = extract_platform_info(user_agent)
+    ua_info = parse_user_agent(user_agent)
+    browser_info = ua_info.browser_label
+    platform_info = ua_info.platform
     
     logger.info(f"企业微信回调请求 - state存在: {bool(state)}, code存在: {bool(code)}, IP: {ip_address}")
     
@@ -1337,7 +818,8 @@ def wechat_callback():
             user_agent, browser_info, platform_info, session_info.get('timestamp')
         )
         
-        # 5. 清理资源
+        # 5. 通知等待中的扫码页面，再清理资源
+        get_scan_event_bus().publish(state, 'confirmed' if result['success'] else 'failed')
         cleanup_callback_resources(state)
         
         # 6. 返回适当的响应
@@ -1353,6 +835,7 @@ def wechat_callback():
             "unknown", state, action, False, ip_address,
             user_agent, browser_info, platform_info, None, str(e)
         )
+        get_scan_event_bus().publish(state, 'failed')
         return "服务器处理异常，请稍后重试", 500
 
 def validate_callback_params(state, code, ip_address):
@@ -1362,62 +845,40 @@ def validate_callback_params(state, code, ip_address):
         return False
     return True
 
-def extract_browser_info(user_agent):
-    """提取浏览器信息，包括名称和版本"""
-    import re
+def validate_signed_state_and_get_session_info(state, ip_address):
+    """验证签名state并获取会话信息
     
-    # Edge浏览器（优先识别，因为Edge的User-Agent中也包含Chrome）
-    edge_match = re.search(r'Edg/(\d+\.\d+)', user_agent)  # 新版Edge
-    if edge_match:
-        return f'Edge {edge_match.group(1)}'
-    edge_legacy_match = re.search(r'Edge/(\d+\.\d+)', user_agent)  # 旧版Edge
-    if edge_legacy_match:
-        return f'Edge Legacy {edge_legacy_match.group(1)}'
-    
-    # Chrome浏览器
-    chrome_match = re.search(r'Chrome/(\d+\.\d+)', user_agent)
-    if chrome_match:
-        return f'Chrome {chrome_match.group(1)}'
-    
-    # Firefox浏览器
-    firefox_match = re.search(r'Firefox/(\d+\.\d+)', user_agent)
-    if firefox_match:
-        return f'Firefox {firefox_match.group(1)}'
-    
-    # Safari浏览器（排除Chrome）
-    safari_match = re.search(r'Safari/(\d+\.\d+)', user_agent)
-    if safari_match and 'Chrome' not in user_agent:
-        return f'Safari {safari_match.group(1)}'
-    
-    # Internet Explorer浏览器
-    msie_match = re.search(r'MSIE (\d+\.\d+)', user_agent)
-    if msie_match:
-        return f'Internet Explorer {msie_match.group(1)}'
-    trident_match = re.search(r'Trident/(\d+\.\d+)', user_agent)
-    if trident_match:
-        return f'Internet Explorer 11'
-    
-    return 'Unknown'
-
-def extract_platform_info(user_agent):
-    """提取平台信息"""
-    if 'Windows' in user_agent:
-        return 'Windows'
-    elif 'Macintosh' in user_agent:
-        return 'macOS'
-    elif 'Linux' in user_agent:
-        return 'Linux'
-    elif 'iPhone' in user_agent or 'iPad' in user_agent:
-        return 'iOS'
-    elif 'Android' in user_agent:
-        return 'Android'
-    return 'Unknown'
+    签名和有效期校验不访问存储，伪造或过期的回调直接拒绝；
+    只有校验通过的state才会通过一次带条件的状态更新完成一次性使用检查。
+    """
+    claims = verify_signed_wechat_state(state, ip_address)
+    if not claims:
+        logger.warning(f"企业微信回调签名state无效或已过期 - state: {state}, IP: {ip_address}")
+        return None, None
+    
+    if not get_scan_state_store().update_status(state, 'confirmed', from_status='pending'):
+        logger.warning(f"企业微信回调state已被使用 - state: {state}, IP: {ip_address}")
+        return None, None
+    
+    action = claims['action']
+    session_info = {
+        'timestamp': claims['timestamp'],
+        'ip_address': ip_address,
+        'mode': claims['mode'],
+        'action': action,
+        'scan_status': 'confirmed'
+    }
+    return session_info, action
 
 def validate_state_and_get_session_info(state, code, ip_address):
     """验证state并获取会话信息，支持从state字符串中解析action信息"""
     try:
-        wechat_sessions = get_wechat_sessions()
-        logger.info(f"获取到的微信会话数量: {len(wechat_sessions)}")
+        # 签名state无需先读取存储即可校验
+        if is_signed_wechat_state(state):
+            return validate_signed_state_and_get_session_info(state, ip_address)
+        
+        session_info = get_scan_state_store().get(state)
+        is_new_session = False
         
         # 从state字符串中解析action信息（如果存在）
         parsed_action = None
@@ -1429,13 +890,14 @@ def validate_state_and_get_session_info(state, code, ip_address):
                 parsed_action = 'bind'
             
         # 检查state是否存在
-        if state not in wechat_sessions:
+        if not session_info:
             logger.warning(f"企业微信回调state无效 - state: {state}, IP: {ip_address}")
             # 测试模式下允许跳过state验证
             if code.startswith('test_corp_code_'):
                 logger.info(f"测试模式下跳过state验证 - IP: {ip_address}")
                 # 创建临时测试会话
-                wechat_sessions[state] = {
+                is_new_session = True
+                session_info = {
                     'timestamp': time.time(),
                     'ip_address': ip_address,
                     'mode': 'test',
@@ -1445,14 +907,12 @@ def validate_state_and_get_session_info(state, code, ip_address):
             else:
                 return None, None
         
-        session_info = wechat_sessions[state]
-        
         # 如果session_info中没有action字段，但state中包含action信息，则添加到session_info
         if 'action' not in session_info and parsed_action:
             session_info['action'] = parsed_action
             logger.info(f"从state中解析并补充action信息: {parsed_action}, state: {state}")
         
-        # 检查state是否过期（10分钟内有效）
+        # 检查state是否过期（有效期由SCAN_STATE_TTL统一配置）
         try:
             session_timestamp = session_info.get('timestamp', 0)
             # 确保时间戳格式正确
@@ -1463,11 +923,10 @@ def validate_state_and_get_session_info(state, code, ip_address):
             session_timestamp = float(session_timestamp)
             current_time = time.time()
             
-            if current_time - session_timestamp > 600:  # 10分钟
+            if current_time - session_timestamp > get_ttl('wechat_session'):
                 logger.warning(f"企业微信回调state已过期 - state: {state}, IP: {ip_address}")
                 # 删除过期的session
-                del wechat_sessions[state]
-                save_wechat_sessions(wechat_sessions)
+                get_scan_state_store().delete(state)
                 return None, None
         except (KeyError, ValueError, TypeError) as e:
             logger.error(f"检查微信会话过期时间错误: {e}, IP: {ip_address}")
@@ -1476,12 +935,13 @@ def validate_state_and_get_session_info(state, code, ip_address):
         # 获取操作类型，不设置默认值，确保准确获取action
         action = session_info.get('action')
         
-        # 更新扫码状态为已确认
-        try:
-            session_info['scan_status'] = 'confirmed'
-            save_wechat_sessions(wechat_sessions)
-        except Exception as e:
-            logger.warning(f"更新扫码状态失败: {e}")
+        # 更新扫码状态为已确认：pending→confirmed是一条带条件的UPDATE，同一state只会被处理一次
+        session_info['scan_status'] = 'confirmed'
+        if is_new_session:
+            get_scan_state_store().put(state, session_info)
+        elif not get_scan_state_store().update_status(state, 'confirmed', from_status='pending'):
+            logger.warning(f"企业微信回调state已被使用 - state: {state}, IP: {ip_address}")
+            return None, None
         
         return session_info, action
         
@@ -1526,8 +986,7 @@ def handle_test_mode_callback(state, session_info, action, ip_address):
                 logger.info(f"测试环境企业微信登录 - 找到已绑定用户: {username}, 微信ID: {test_userid}")
                 
                 # 设置会话信息
-                session['username'] = username
-                session['login_type'] = 'wechat_corp'
+                login_user(existing_user, 'wechat_corp')
                 session['user_info'] = {
                     'userid': test_userid,
                     'name': '测试企业微信用户',
@@ -1556,17 +1015,17 @@ def handle_test_mode_callback(state, session_info, action, ip_address):
             result['success'] = False
         
     elif action == 'bind':
-        # 处理绑定操作
-        if 'username' not in session:
+        # 处理绑定操作（需要修改用户，加载ORM对象）
+        user = get_current_user_for_update()
+        if not user:
             logger.warning(f"绑定操作需要先登录 - IP: {ip_address}")
             return result
         
-        current_username = session['username']
+        current_username = user.username
         logger.info(f"测试环境企业微信绑定 - 用户名: {current_username}, 微信用户ID: {test_userid}, IP: {ip_address}")
         
         try:
             # 更新数据库中的绑定信息
-            user = User.query.filter_by(username=current_username).first()
             if user:
                 # 更新所有企业微信相关字段
                 user.wechat_corp_userid = test_userid
@@ -1817,10 +1276,8 @@ def handle_wechat_login(userid, user_detail):
     wechat_name = user_detail.get('name', '企业微信用户')
     
     # 检查用户是否存在于数据库中
-    # 先尝试通过wechat_corp_userid查找已绑定的用户，再尝试通过username查找
-    user = User.query.filter_by(wechat_corp_userid=userid).first()
-    if not user:
-        user = User.query.filter_by(username=username).first()
+    # 一次查询同时匹配wechat_corp_userid和username，已绑定的用户优先
+    user = find_user_for_wechat_login(userid, username)
     
     if not user:
         # 用户不存在，返回特殊状态，需要显示确认弹窗
@@ -1847,8 +1304,7 @@ def handle_wechat_login(userid, user_detail):
             db.session.rollback()
     
     # 设置会话信息 - 使用实际用户的username而不是生成的username
-    session['username'] = user.username  # 使用数据库中的实际用户名
-    session['login_type'] = 'wechat_corp'
+    login_user(user, 'wechat_corp')  # 使用数据库中的实际用户
     session['user_info'] = {
         'userid': userid,
         'name': wechat_name,
@@ -1869,7 +1325,8 @@ def handle_wechat_bind(userid, user_detail, ip_address):
     print(f"DEBUG: 当前会话内容: {dict(session)}")
     
     # 1. 前置校验 - 严格要求用户必须已登录
-    if 'username' not in session:
+    user = get_current_user()
+    if not user:
         logger.warning(f"绑定操作需要先登录 - IP: {ip_address}")
         return {
             'success': False,
@@ -1878,7 +1335,7 @@ def handle_wechat_bind(userid, user_detail, ip_address):
             'error': '请先登录系统'
         }
     
-    current_username = session['username']
+    current_username = user.username
     logger.info(f"企业微信绑定处理 - 仅针对已登录用户: {current_username}, IP: {ip_address}")
     
     # 验证用户ID格式，防止注入攻击
@@ -1915,24 +1372,9 @@ def handle_wechat_bind(userid, user_detail, ip_address):
     
     # 2. 绑定过程校验
     try:
-        # 查找已登录用户（仅操作已存在用户，不创建新用户）
-        user = User.query.filter_by(username=current_username).first()
-        
-        # 添加打印语句 - 记录用户查询结果
-        print(f"DEBUG: 查找用户结果 - 用户名: {current_username}, 用户存在: {user is not None}")
-        
-        if not user:
-            logger.error(f"企业微信绑定失败: 用户 {current_username} 不存在, IP: {ip_address}")
-            return {
-                'success': False,
-                'username': current_username,
-                'user_info': None,
-                'error': '用户不存在'
-            }
-        
         # 安全校验：检查该微信账号是否已被其他用户绑定
         existing_user = User.query.filter_by(wechat_corp_userid=userid).first()
-        if existing_user and existing_user.username != current_username:
+        if existing_user and existing_user.id != user.id:
             logger.warning(f"微信账号已被其他用户绑定 - 微信ID: {userid}, 当前用户: {current_username}, 已绑定用户: {existing_user.username}, IP: {ip_address}")
             print(f"DEBUG: 微信账号冲突 - 微信ID: {userid}, 当前用户: {current_username}, 已绑定用户: {existing_user.username}")
             return {
@@ -2007,13 +1449,17 @@ def record_wechat_operation_log(username, state, action, success, ip_address,
         if timestamp:
             response_time = time.time() - timestamp
         
-        # 获取用户唯一ID（通过username查询）
+        # 获取用户唯一ID（当前登录用户直接使用，否则通过username查询）
         user_id = None
-        if username and username != 'unknown':
-            user = User.query.filter_by(username=username).first()
+        current_user = get_current_user()
+        if current_user and current_user.username == username:
+            user_id = current_user.id
+        elif username and username != 'unknown':
+            user = get_user_profile(username=username)
             user_id = user.id if user else None
         
-        login_log = LoginLog(
+        # 日志由后台线程批量写入
+        record_login_log(
             user_id=user_id,  # 记录用户唯一ID
             username=username if username else 'unknown',
             ip_address=ip_address,
@@ -2025,23 +1471,13 @@ def record_wechat_operation_log(username, state, action, success, ip_address,
             request_params=json.dumps(request_params, ensure_ascii=False),
             response_time=response_time
         )
-        
-        db.session.add(login_log)
-        db.session.commit()
     except Exception as e:
         logger.error(f"保存企业微信操作日志失败: {e}")
-        try:
-            db.session.rollback()
-        except:
-            pass
 
 def cleanup_callback_resources(state):
     """清理回调相关资源"""
     try:
-        wechat_sessions = get_wechat_sessions()
-        if state in wechat_sessions:
-            del wechat_sessions[state]
-            save_wechat_sessions(wechat_sessions)
+        if get_scan_state_store().delete(state):
             logger.info(f"清理企业微信回调资源 - state: {state}")
     except Exception as e:
         logger.warning(f"清理企业微信回调资源失败: {e}")
@@ -2049,7 +1485,7 @@ def cleanup_callback_resources(state):
 @bp.route('/confirm_wechat_login')
 def confirm_wechat_login():
     """确认企业微信登录并创建用户"""
-    ip_address = request.remote_addr
+    ip_address = get_real_ip()
     
     # 获取临时存储的微信用户信息
     wechat_temp_info = session.get('wechat_temp_info')
@@ -2093,8 +1529,7 @@ def confirm_wechat_login():
         session.pop('wechat_user_info', None)
     
     # 设置会话信息，完成登录
-    session['username'] = username
-    session['login_type'] = 'wechat_corp'
+    login_user(user, 'wechat_corp')
     session['user_info'] = {
             'userid': userid,
             'name': wechat_name,
@@ -2134,16 +1569,17 @@ def confirm_wechat_bind():
     2. 核查企微账号是否已被其他用户绑定，避免重复绑定
     3. 仅更新当前登录用户的企微相关必要字段
     """
-    ip_address = request.remote_addr
-    browser_info = extract_browser_info(request.headers.get('User-Agent', ''))
+    ip_address = get_real_ip()
+    browser_info = parse_user_agent(request.headers.get('User-Agent', '')).browser_label
     
-    # 1. 确认绑定前的严格校验 - 必须已登录
-    if 'username' not in session:
+    # 1. 确认绑定前的严格校验 - 必须已登录（需要修改用户，加载ORM对象）
+    user = get_current_user_for_update()
+    if not user:
         logger.warning(f"绑定确认操作需要先登录 - IP: {ip_address}, 浏览器: {browser_info}")
         session['error_message'] = '请先登录系统'
         return redirect(url_for('auth.login'))
     
-    current_username = session['username']
+    current_username = user.username
     logger.info(f"处理企业微信绑定确认 - 用户名: {current_username}, IP: {ip_address}, 浏览器: {browser_info}")
     
     # 获取临时存储的微信用户信息
@@ -2171,97 +1607,19 @@ def confirm_wechat_bind():
     try:
         # 使用数据库事务确保数据一致性
         with db.session.begin_nested():
-            # 查找已登录用户（仅操作已存在用户，绝对不创建新用户）
-            user = User.query.filter_by(username=current_username).first()
-            print(f"DEBUG: 查找登录用户结果 - 用户名: {current_username}, 用户存在: {user is not None}")
-            
-            if not user:
-                logger.error(f"企业微信绑定失败: 用户 {current_username} 不存在, IP: {ip_address}")
-                session['error_message'] = '用户不存在，绑定失败'
-                return redirect(url_for('auth.user_center'))
-            
+            # 仅操作按主键加载的当前登录用户，绝对不创建新用户
             # 安全校验：再次检查该微信账号是否已被其他用户绑定
             existing_user = User.query.filter_by(wechat_corp_userid=userid).first()
             print(f"DEBUG: 检查微信账号是否已被绑定 - 微信ID: {userid}, 已绑定用户: {existing_user.username if existing_user else None}")
             
-            if existing_user and existing_user.username != current_username:
+            if existing_user and existing_user.id != user.id:
                 logger.warning(f"微信账号已被其他用户绑定 - 微信ID: {userid}, 当前用户: {current_username}, 已绑定用户: {existing_user.username}, IP: {ip_address}")
                 print(f"DEBUG: 微信账号冲突 - 当前用户: {current_username}, 已绑定用户: {existing_user.username}")
                 # 清理临时数据
                 session.pop('wechat_bind_temp_info', None)
                 session.pop('user_display_name', None)
                 # 渲染确认弹窗页面，告知用户账号已被绑定
-                return render_template_string('''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>绑定提醒 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        warning: '#f59e0b',
-                        danger: '#ef4444',
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .shadow-pop {
-                box-shadow: 0 10px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex items-center justify-center p-4">
-    <div class="bg-white rounded-lg shadow-pop max-w-md w-full mx-auto overflow-hidden">
-        <div class="bg-danger p-4">
-            <h2 class="text-white text-xl font-bold text-center flex items-center justify-center gap-2">
-                <i class="fa fa-exclamation-circle"></i>
-                <span>绑定失败</span>
-            </h2>
-        </div>
-        <div class="p-6">
-            <div class="text-center mb-6">
-                <i class="fa fa-wechat text-4xl text-green-500 mb-4"></i>
-                <h3 class="text-xl font-semibold text-gray-800 mb-2">该企业微信账号已被其他用户绑定</h3>
-                <p class="text-gray-600">此微信账号已与其他账户关联，无法重复绑定。</p>
-            </div>
-            
-            <div class="text-center">
-                <button id="backButton" class="inline-flex items-center justify-center px-4 py-2 bg-primary text-white rounded-md hover:bg-primary/90 transition-colors">
-                    <i class="fa fa-arrow-left mr-2"></i>
-                    返回用户中心
-                </button>
-            </div>
-        </div>
-    </div>
-    
-    <script>
-        document.getElementById('backButton').addEventListener('click', function() {
-            window.location.href = '{{ url_for("auth.user_center") }}';
-        });
-        
-        // 防止用户通过后退按钮绕过提示
-        window.onpopstate = function() {
-            window.location.href = '{{ url_for("auth.user_center") }}';
-        };
-        history.pushState({}, '', '');
-    </script>
-</body>
-</html>
-''')
+                return render_template('auth/wechat_bind_conflict.html')
             
             # 检查用户是否已经绑定了其他企业微信账号
             old_userid = None
@@ -2405,83 +1763,7 @@ def handle_callback_response(action, result):
         # 保存微信用户信息到会话，用于弹窗显示
         session['wechat_user_info'] = result.get('wechat_user_info', {})
         # 渲染确认弹窗页面
-        return render_template_string('''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>用户确认 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        warning: '#f59e0b',
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .modal-shadow {
-                box-shadow: 0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex items-center justify-center p-4">
-    <div class="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
-        <div class="bg-white rounded-2xl p-8 max-w-md w-full modal-shadow transform transition-all">
-            <div class="text-center mb-6">
-                <div class="inline-flex items-center justify-center w-16 h-16 bg-warning/10 text-warning rounded-full mb-4">
-                    <i class="fa fa-info-circle text-3xl"></i>
-                </div>
-                <h3 class="text-xl font-bold text-gray-900 mb-2">用户不存在</h3>
-                <p class="text-gray-600">您的企业微信账号尚未在系统中注册，是否确认继续登录？</p>
-                <p class="text-sm text-gray-500 mt-2">企业微信昵称：{{ wechat_user_info.name }}</p>
-            </div>
-            
-            <div class="flex space-x-4">
-                <button id="cancelButton" class="flex-1 py-3 px-4 border border-gray-300 rounded-lg text-gray-700 hover:bg-gray-50 transition-colors">
-                    返回登录
-                </button>
-                <button id="confirmButton" class="flex-1 py-3 px-4 bg-primary text-white rounded-lg hover:bg-primary/90 transition-colors">
-                    确认登录
-                </button>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        // 确认按钮点击事件
-        document.getElementById('confirmButton').addEventListener('click', function() {
-            // 跳转到确认登录路由
-            window.location.href = '{{ url_for("auth.confirm_wechat_login") }}';
-        });
-        
-        // 取消按钮点击事件
-        document.getElementById('cancelButton').addEventListener('click', function() {
-            // 返回登录页面
-            window.location.href = '{{ url_for("auth.login") }}';
-        });
-        
-        // 按ESC键关闭弹窗
-        document.addEventListener('keydown', function(event) {
-            if (event.key === 'Escape') {
-                window.location.href = '{{ url_for("auth.login") }}';
-            }
-        });
-    </script>
-</body>
-</html>''', wechat_user_info=result.get('wechat_user_info', {}))
+        return render_template('auth/wechat_user_not_exist.html', wechat_user_info=result.get('wechat_user_info', {}))
     
     # 处理企业微信绑定需要确认的情况
     if action == 'bind' and not result['success'] and result.get('need_confirm'):
@@ -2497,185 +1779,15 @@ def handle_callback_response(action, result):
         if wechat_userid:
             try:
                 # 查找是否有其他用户已绑定此企业微信账号
-                existing_user = User.query.filter_by(wechat_corp_userid=wechat_userid).first()
-                if existing_user and existing_user.username != session.get('username'):
+                existing_user = get_user_profile(wechat_corp_userid=wechat_userid)
+                if existing_user and existing_user.id != session.get('user_id'):
                     is_already_bound = True
                     bound_username = existing_user.username
             except Exception as e:
                 logger.error(f"检查企业微信账号绑定状态失败: {e}")
         
         # 渲染确认绑定弹窗页面
-        return render_template_string('''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>确认企业微信绑定 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#07C160',
-                        secondary: '#10b981',
-                        warning: '#f59e0b',
-                        danger: '#ef4444'
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .modal-shadow {
-                box-shadow: 0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-            }
-            .fade-in {
-                animation: fadeIn 0.3s ease-in-out;
-            }
-            .avatar-hover {
-                transition: transform 0.3s ease;
-            }
-            .avatar-hover:hover {
-                transform: scale(1.05);
-            }
-            .button-hover {
-                transition: all 0.3s ease;
-            }
-            .button-hover:active {
-                transform: translateY(1px);
-            }
-        }
-        
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex items-center justify-center p-4">
-    <div class="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
-        <div class="bg-white rounded-2xl p-8 max-w-md w-full modal-shadow transform transition-all fade-in">
-            <div class="text-center mb-6">
-                <div class="inline-flex items-center justify-center w-20 h-20 bg-primary/10 text-primary rounded-full mb-4">
-                    <i class="fa fa-weixin text-4xl"></i>
-                </div>
-                <h3 class="text-2xl font-bold text-gray-900 mb-3">确认企业微信绑定</h3>
-                
-                {% if is_already_bound %}
-                <div class="bg-danger/10 p-4 rounded-lg border border-danger/20 mb-6">
-                    <div class="flex items-start">
-                        <i class="fa fa-exclamation-circle text-danger mt-1 mr-2"></i>
-                        <div>
-                            <div class="text-sm font-medium text-danger mb-1">警告：账号冲突</div>
-                            <div class="text-sm text-gray-700">该企业微信账号已被绑定到系统账号 <span class="font-semibold">{{ bound_username }}</span>。绑定后将覆盖原绑定关系。</div>
-                        </div>
-                    </div>
-                </div>
-                {% else %}
-                <p class="text-gray-600 mb-6">您确定要将企业微信账号绑定到以下系统账号吗？</p>
-                {% endif %}
-                
-                <!-- 企业微信头像和昵称 -->
-                <div class="flex flex-col items-center mb-6">
-                    {% set avatar_url = wechat_user_info.avatar if wechat_user_info.avatar and wechat_user_info.avatar.strip() else 'data:image/svg+xml;utf8,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><circle cx="50" cy="50" r="40" fill="#e8f5e8"/><text x="50" y="55" font-family="Arial" font-size="30" text-anchor="middle" fill="#07C160">企业微信</text></svg>' %}
-                    <img src="{{ avatar_url }}" 
-                         class="w-20 h-20 rounded-full border-4 border-primary/10 object-cover mb-3 avatar-hover" 
-                         alt="企业微信头像">
-                    <div class="font-semibold text-lg text-gray-900">{{ wechat_user_info.name }}</div>
-                    {% if wechat_user_info.userid %}
-                    <div class="text-xs text-gray-500 bg-gray-100 px-2 py-1 rounded font-mono">
-                        {{ wechat_user_info.userid }}
-                    </div>
-                    {% endif %}
-                </div>
-                
-                <!-- 信息卡片 -->
-                <div class="space-y-3 mb-6">
-                    <div class="bg-gray-50 p-4 rounded-lg">
-                        <div class="text-sm text-gray-500 mb-1">当前登录账号</div>
-                        <div class="font-medium text-gray-900">{{ user_display_name }}</div>
-                    </div>
-                    
-                    <!-- 添加一个提示卡片 -->
-                    <div class="bg-warning/10 p-4 rounded-lg border border-warning/20">
-                        <div class="flex items-start">
-                            <i class="fa fa-info-circle text-warning mt-1 mr-2"></i>
-                            <div>
-                                <div class="text-sm font-medium text-warning mb-1">绑定说明</div>
-                                <div class="text-sm text-gray-700">
-                                    绑定后将更新当前登录账号的企业微信信息，可使用企业微信扫码快速登录。
-                                    一个企业微信账号只能绑定到一个系统账号。
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <!-- 按钮区域 -->
-            <div class="flex space-x-4">
-                <button id="cancelButton" class="flex-1 py-3 px-4 border border-gray-300 rounded-lg text-gray-700 hover:bg-gray-50 transition-colors button-hover">
-                    取消
-                </button>
-                {% if is_already_bound %}
-                <button id="confirmButton" class="flex-1 py-3 px-4 bg-danger text-white rounded-lg hover:bg-danger/90 transition-colors button-hover shadow-lg shadow-danger/20">
-                    确认覆盖绑定
-                </button>
-                {% else %}
-                <button id="confirmButton" class="flex-1 py-3 px-4 bg-primary text-white rounded-lg hover:bg-primary/90 transition-colors button-hover shadow-lg shadow-primary/20">
-                    确认绑定
-                </button>
-                {% endif %}
-            </div>
-            
-            <!-- 提示文本 -->
-            <div class="text-center text-xs text-gray-500 mt-4">
-                按 <kbd class="px-2 py-0.5 bg-gray-200 rounded">ESC</kbd> 键可取消操作
-            </div>
-        </div>
-    </div>
-
-    <script>
-        // 确认按钮点击事件
-        document.getElementById('confirmButton').addEventListener('click', function() {
-            // 添加按钮加载状态
-            const button = this;
-            button.disabled = true;
-            button.innerHTML = '<i class="fa fa-spinner fa-spin mr-2"></i>处理中...';
-            
-            // 跳转到确认绑定路由
-            setTimeout(() => {
-                window.location.href = '{{ url_for("auth.confirm_wechat_bind") }}';
-            }, 300);
-        });
-        
-        // 取消按钮点击事件
-        document.getElementById('cancelButton').addEventListener('click', function() {
-            // 返回用户中心
-            window.location.href = '{{ url_for("auth.user_center") }}';
-        });
-        
-        // 按ESC键关闭弹窗
-        document.addEventListener('keydown', function(event) {
-            if (event.key === 'Escape') {
-                window.location.href = '{{ url_for("auth.user_center") }}';
-            }
-        });
-        
-        // 添加页面加载动画效果
-        window.addEventListener('load', function() {
-            const modal = document.querySelector('.fade-in');
-            modal.style.opacity = '1';
-        });
-    </script>
-</body>
-</html>''', wechat_user_info=result.get('wechat_user_info', {}), user_display_name=result.get('user_display_name', ''), is_already_bound=is_already_bound, bound_username=bound_username)
+        return render_template('auth/wechat_bind_confirm.html', wechat_user_info=result.get('wechat_user_info', {}), user_display_name=result.get('user_display_name', ''), is_already_bound=is_already_bound, bound_username=bound_username)
     
     if not result['success']:
         logger.debug(f"[DEBUG] 处理操作失败 - 会话用户: {current_username}, 操作类型: {action}")
@@ -2687,162 +1799,13 @@ def handle_callback_response(action, result):
             logger.debug(f"[DEBUG] 登录失败原因: {error_message}")
             
             # 渲染登录失败弹窗页面
-            return render_template_string('''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>登录失败 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        warning: '#f59e0b',
-                        danger: '#ef4444',
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .shadow-pop {
-                box-shadow: 0 10px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex items-center justify-center p-4">
-    <div class="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
-        <div class="bg-white rounded-lg shadow-pop max-w-md w-full mx-auto overflow-hidden">
-            <div class="bg-danger p-4">
-                <h2 class="text-white text-xl font-bold flex items-center">
-                    <i class="fa fa-exclamation-circle mr-2"></i>登录失败
-                </h2>
-            </div>
-            
-            <div class="p-6">
-                <div class="text-center mb-6">
-                    <div class="inline-flex items-center justify-center w-16 h-16 bg-danger/10 text-danger rounded-full mb-4">
-                        <i class="fa fa-times-circle text-3xl"></i>
-                    </div>
-                    <p class="text-gray-600 mb-2">企业微信登录失败</p>
-                    <p class="text-sm text-gray-500">{{ error_message }}</p>
-                    <p class="text-sm text-gray-500 mt-2">错误码：60020（IP地址不在白名单中）</p>
-                </div>
-                
-                <div class="flex space-x-4">
-                    <button id="cancelButton" class="flex-1 py-3 px-4 border border-gray-300 rounded-lg text-gray-700 hover:bg-gray-50 transition-colors">
-                        返回登录
-                    </button>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        // 取消按钮点击事件
-        document.getElementById('cancelButton').addEventListener('click', function() {
-            // 返回登录页面
-            window.location.href = '{{ url_for("auth.login") }}';
-        });
-        
-        // 按ESC键关闭弹窗
-        document.addEventListener('keydown', function(event) {
-            if (event.key === 'Escape') {
-                window.location.href = '{{ url_for("auth.login") }}';
-            }
-        });
-    </script>
-</body>
-</html>''', error_message=error_message)
+            return render_template('auth/wechat_login_failed.html', error_message=error_message)
         # 处理绑定失败的情况，显示绑定失败弹窗
         elif action == 'bind':
             logger.debug(f"[DEBUG] 绑定失败原因: {error_message}")
             
             # 渲染绑定失败弹窗页面
-            return render_template_string('''<!DOCTYPE html>","}}}
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>绑定失败 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        warning: '#f59e0b',
-                        danger: '#ef4444',
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .shadow-pop {
-                box-shadow: 0 10px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex items-center justify-center p-4">
-    <div class="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
-        <div class="bg-white rounded-lg shadow-pop max-w-md w-full mx-auto overflow-hidden">
-            <div class="bg-danger p-4">
-                <h2 class="text-white text-xl font-bold text-center flex items-center justify-center gap-2">
-                    <i class="fa fa-exclamation-circle"></i>
-                    <span>绑定失败</span>
-                </h2>
-            </div>
-            <div class="p-6">
-                <div class="text-center mb-6">
-                    <i class="fa fa-wechat text-4xl text-green-500 mb-4"></i>
-                    <h3 class="text-xl font-semibold text-gray-800 mb-2">{{ error_message }}</h3>
-                    <p class="text-gray-600">请检查账号状态后重试</p>
-                </div>
-                
-                <div class="flex space-x-4">
-                    <button id="closeButton" class="flex-1 py-3 px-4 bg-primary text-white rounded-lg hover:bg-primary/90 transition-colors">
-                        关闭
-                    </button>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        // 关闭按钮点击事件
-        document.getElementById('closeButton').addEventListener('click', function() {
-            // 返回用户中心
-            window.location.href = '{{ url_for("auth.user_center") }}';
-        });
-        
-        // 按ESC键关闭弹窗
-        document.addEventListener('keydown', function(event) {
-            if (event.key === 'Escape') {
-                window.location.href = '{{ url_for("auth.user_center") }}';
-            }
-        });
-    </script>
-</body>
-</html>''', error_message=error_message)
+            return render_template('auth/wechat_bind_failed.html', error_message=error_message)
         
         # 其他失败情况
         session['error_message'] = '操作失败，请稍后重试'
@@ -2892,10 +1855,11 @@ def format_datetime_with_timezone(dt):
 @bp.route('/user_center')
 def user_center():
     """用户中心页面"""
-    if 'username' not in session:
+    user = g.current_user
+    if not user:
         return redirect(url_for('auth.login'))
     
-    username = session.get('username')
+    username = user.username
     login_type = session.get('login_type', 'default')
     user_info = session.get('user_info', {})
     display_name = username  # 默认使用username作为显示名称
@@ -2910,16 +1874,13 @@ def user_center():
     bind_success = session.pop('bind_success', False)
     
     # 获取用户真实IP
-    real_ip = request.headers.get('X-Forwarded-For', request.headers.get('X-Real-IP', request.remote_addr))
-    if ',' in real_ip:
-        real_ip = real_ip.split(',')[0].strip()
+    real_ip = get_real_ip()
     
     # 获取最近一次登录记录，用于显示真实登录时间
     last_login_time = None
     last_login_ip = None
     
     try:
-        user = User.query.filter_by(username=username).first()
         if user:
             user_id = user.id
             wechat_binded = bool(user.wechat_corp_userid)
@@ -2939,278 +1900,37 @@ def user_center():
                 if user.wechat_corp_avatar:
                     user_avatar = user.wechat_corp_avatar
         
-        # 获取最近一次成功登录记录
-        last_login = LoginLog.query.filter_by(username=username, success=True)\
-            .order_by(LoginLog.created_at.desc())\
-            .first()
-        
-        if last_login:
-            last_login_time = last_login.created_at
-            last_login_ip = last_login.ip_address
-            
     except Exception as e:
         logger.error(f"查询用户信息失败: {e}")
     
-    # 查询用户的登录历史记录
+    # 查询用户的登录历史记录（按有索引的user_id查询）
     login_history = []
     try:
-        login_history = LoginLog.query.filter_by(username=username)\
+        login_history = LoginLog.query.filter_by(user_id=user.id)\
             .order_by(LoginLog.created_at.desc())\
             .limit(10).all()
     except Exception as e:
         logger.error(f"查询登录历史失败: {e}")
     
+    # 获取最近一次成功登录记录，通常已在登录历史中，不在时再单独查询
+    try:
+        last_login = next((log for log in login_history if log.success), None)
+        if last_login is None and len(login_history) == 10:
+            last_login = LoginLog.query.filter_by(user_id=user.id, success=True)\
+                .order_by(LoginLog.created_at.desc())\
+                .first()
+        
+        if last_login:
+            last_login_time = last_login.created_at
+            last_login_ip = last_login.ip_address
+    except Exception as e:
+        logger.error(f"查询最近登录记录失败: {e}")
+    
     # 准备模板变量，移除不必要的request对象传递
     current_time = datetime.now(timezone.utc)
     current_year = current_time.year
     
-    return render_template_string('''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>用户中心 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                    },
-                    fontFamily: {
-                        sans: ['Inter', 'system-ui', 'sans-serif'],
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex flex-col">
-    <!-- 顶部导航栏 -->
-    <header class="bg-white shadow-sm">
-        <div class="container mx-auto px-4 py-3 flex justify-between items-center">
-            <div class="flex items-center space-x-2">
-                <i class="fa fa-user-circle text-primary text-2xl"></i>
-                <h1 class="text-xl font-bold text-gray-800">用户中心</h1>
-            </div>
-            <div class="flex items-center space-x-4">
-                <span class="text-gray-600">欢迎，{{ display_name }}</span>
-                    <img src="{{ user_avatar if user_avatar else 'data:image/svg+xml;utf8,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><circle cx="50" cy="50" r="40" fill="#e8f5e8"/><text x="50" y="55" font-family="Arial" font-size="30" text-anchor="middle" fill="#07C160">用户</text></svg>' }}" alt="用户头像" class="w-8 h-8 rounded-full ml-2">
-                <a href="{{ url_for('auth.logout') }}" class="bg-red-500 hover:bg-red-600 text-white px-4 py-2 rounded-md transition-colors">
-                    <i class="fa fa-sign-out mr-1"></i> 退出登录
-                </a>
-            </div>
-        </div>
-    </header>
-
-    <!-- 绑定成功提示 -->
-    {% if bind_success %}
-    <div class="container mx-auto px-4 py-3">
-        <div class="bg-green-50 border-l-4 border-green-400 text-green-700 p-4 rounded">
-            <div class="flex items-center">
-                <i class="fa fa-check-circle text-xl mr-2"></i>
-                <p class="font-medium">企业微信绑定成功！</p>
-            </div>
-        </div>
-    </div>
-    {% endif %}
-
-    <!-- 主要内容 -->
-    <main class="flex-grow container mx-auto px-4 py-8">
-        <div class="grid grid-cols-1 lg:grid-cols-3 gap-8">
-            <!-- 用户信息卡片 -->
-            <div class="bg-white rounded-xl p-6 card-shadow">
-                <h2 class="text-lg font-semibold mb-4 text-gray-800 flex items-center">
-                    <i class="fa fa-user-circle text-primary mr-2"></i> 用户基本信息
-                </h2>
-                <div class="space-y-4">
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">显示名称:</span>
-                        <div class="flex items-center">
-                            <span class="font-medium text-gray-800 mr-2">{{ display_name }}</span>
-                            <a href="{{ url_for('auth.change_display_name') }}" class="text-primary hover:text-primary/80 text-sm transition-colors" title="修改显示名称">
-                                <i class="fa fa-pencil"></i>
-                            </a>
-                        </div>
-                    </div>
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">登录账号:</span>
-                        <span class="font-medium text-gray-800">{{ username }}</span>
-                    </div>
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">登录类型:</span>
-                        <span class="font-medium text-gray-800">
-                            {% if login_type == 'default' %}
-                                <i class="fa fa-lock text-blue-500 mr-1"></i>账号密码
-                            {% elif login_type == 'wechat_corp' %}
-                                <i class="fa fa-weixin text-green-500 mr-1"></i>企业微信
-                            {% else %}
-                                其他
-                            {% endif %}
-                        </span>
-                    </div>
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">用户ID:</span>
-                        <span class="font-medium text-gray-800">{{ user_id }}</span>
-                    </div>
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">登录时间:</span>
-                        <span class="text-gray-800">
-                            {% if last_login_time %}
-                                {{ format_datetime_with_timezone(last_login_time) }}
-                            {% else %}
-                                {{ format_datetime_with_timezone(current_time) }}
-                            {% endif %}
-                        </span>
-                    </div>
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">IP地址:</span>
-                        <span class="text-gray-800">{{ last_login_ip or real_ip }}</span>
-                    </div>
-                </div>
-            </div>
-
-            <!-- 企业微信信息卡片（如果已绑定企业微信） -->
-            {% if wechat_binded %}
-            <div class="bg-white rounded-xl p-6 card-shadow">
-                <h2 class="text-lg font-semibold mb-4 text-gray-800 flex items-center">
-                    <i class="fa fa-weixin text-green-500 mr-2"></i> 企业微信信息
-                </h2>
-                <div class="space-y-4">
-                    <!-- 头像显示 -->
-                    <div class="flex items-center justify-center mb-4">
-                        {% if wechat_info.get('avatar') %}
-                            <img src="{{ wechat_info.avatar }}" alt="企业微信头像" class="w-20 h-20 rounded-full object-cover border-2 border-green-200">
-                        {% else %}
-                            <div class="w-20 h-20 rounded-full bg-green-100 flex items-center justify-center border-2 border-green-200">
-                                <i class="fa fa-user text-green-500 text-3xl"></i>
-                            </div>
-                        {% endif %}
-                    </div>
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">用户ID:</span>
-                        <span class="font-medium text-gray-800">{{ wechat_info.get('userid', '未知') }}</span>
-                    </div>
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">姓名:</span>
-                        <span class="font-medium text-gray-800">{{ wechat_info.get('name', '未知') }}</span>
-                    </div>
-                    {% if wechat_info.get('binded_at') %}
-                    <div class="flex items-center">
-                        <span class="text-gray-500 w-24">绑定时间:</span>
-                        <span class="text-gray-600">{{ wechat_info.binded_at.strftime('%Y-%m-%d %H:%M:%S') }}</span>
-                    </div>
-                    {% endif %}
-                </div>
-            </div>
-            {% endif %}
-
-            <!-- 账户安全卡片 -->
-            <div class="bg-white rounded-xl p-6 card-shadow">
-                <h2 class="text-lg font-semibold mb-4 text-gray-800 flex items-center">
-                    <i class="fa fa-shield text-red-500 mr-2"></i> 账户安全
-                </h2>
-                <div class="space-y-4">
-                    <a href="{{ url_for('auth.change_password') }}" class="w-full bg-primary hover:bg-primary/90 text-white py-2 rounded-md transition-colors flex justify-center items-center btn-hover">
-                        <i class="fa fa-key mr-2"></i> 修改密码
-                    </a>
-                    <div class="text-sm text-gray-500">
-                        <p><i class="fa fa-info-circle mr-1"></i> 建议定期更换密码以保障账户安全</p>
-                        <p class="mt-2"><i class="fa fa-check-circle text-green-500 mr-1"></i> 您的账户已通过身份验证</p>
-                    </div>
-                    <div class="pt-4 border-t border-gray-100">
-                        {% if not wechat_binded %}
-                        <a href="{{ url_for('auth.bind_wechat_corp') }}" class="w-full bg-secondary hover:bg-secondary/90 text-white py-2 rounded-md transition-colors flex justify-center items-center btn-hover">
-                            <i class="fa fa-weixin mr-2"></i> 绑定企业微信
-                        </a>
-                        {% else %}
-                        <button class="w-full bg-gray-100 text-gray-500 py-2 rounded-md transition-colors flex justify-center items-center">
-                            <i class="fa fa-check-circle text-green-500 mr-2"></i> 已绑定企业微信
-                        </button>
-                        {% endif %}
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <!-- 登录历史记录 -->
-        <div class="mt-8 bg-white rounded-xl p-6 card-shadow">
-            <h2 class="text-lg font-semibold mb-4 text-gray-800 flex items-center">
-                <i class="fa fa-history text-gray-500 mr-2"></i> 最近登录记录
-            </h2>
-            <div class="overflow-x-auto">
-                <table class="min-w-full divide-y divide-gray-200">
-                    <thead>
-                        <tr>
-                            <th class="px-4 py-3 bg-gray-50 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">登录时间</th>
-                            <th class="px-4 py-3 bg-gray-50 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">登录类型</th>
-                            <th class="px-4 py-3 bg-gray-50 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">IP地址</th>
-                            <th class="px-4 py-3 bg-gray-50 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">浏览器</th>
-                            <th class="px-4 py-3 bg-gray-50 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">平台</th>
-                            <th class="px-4 py-3 bg-gray-50 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">状态</th>
-                            <th class="px-4 py-3 bg-gray-50 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">错误信息</th>
-                        </tr>
-                    </thead>
-                    <tbody class="bg-white divide-y divide-gray-200">
-                        {% for log in login_history %}
-                        <tr>
-                            <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-800">{{ format_datetime_with_timezone(log.created_at) }}</td>
-                            <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-800">
-                                {% if log.login_type == 'default' %}
-                                    账号密码
-                                {% elif log.login_type == 'wechat_corp' %}
-                                    企业微信
-                                {% else %}
-                                    {{ log.login_type }}
-                                {% endif %}
-                            </td>
-                            <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-800">{{ log.ip_address }}</td>
-                            <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-800">{{ log.browser or '未知' }}</td>
-                            <td class="px-4 py-3 whitespace-nowrap text-sm text-gray-800">{{ log.platform or '未知' }}</td>
-                            <td class="px-4 py-3 whitespace-nowrap">
-                                {% if log.success %}
-                                    <span class="px-2 inline-flex text-xs leading-5 font-semibold rounded-full bg-green-100 text-green-800">成功</span>
-                                {% else %}
-                                    <span class="px-2 inline-flex text-xs leading-5 font-semibold rounded-full bg-red-100 text-red-800">失败</span>
-                                {% endif %}
-                            </td>
-                            <td class="px-4 py-3 text-sm text-gray-800">{{ log.error_message or '无' }}</td>
-                        </tr>
-                        {% else %}
-                        <tr>
-                            <td colspan="7" class="px-4 py-3 text-center text-sm text-gray-500">暂无登录记录</td>
-                        </tr>
-                        {% endfor %}
-                    </tbody>
-                </table>
-            </div>
-        </div>
-    </main>
-
-    <!-- 页脚 -->
-    <footer class="bg-white border-t border-gray-200 py-6">
-        <div class="container mx-auto px-4 text-center text-gray-600 text-sm">
-            <p>© {{ current_year }} Hello World 系统 | 版本 1.0.0</p>
-        </div>
-    </footer>
-</body>
-</html>
-''', 
+    return render_template('auth/user_center.html', 
             username=username, 
             display_name=display_name, 
             login_type=login_type, 
@@ -3232,21 +1952,14 @@ def user_center():
 @bp.route('/change_display_name', methods=['GET', 'POST'])
 def change_display_name():
     """修改显示名称页面"""
-    if 'username' not in session:
+    user = g.current_user
+    if not user:
         return redirect(url_for('auth.login'))
     
-    username = session.get('username')
+    username = user.username
     error_message = None
     success_message = None
-    current_display_name = username
-    
-    # 获取当前显示名称
-    try:
-        user = User.query.filter_by(username=username).first()
-        if user and hasattr(user, 'display_name') and user.display_name:
-            current_display_name = user.display_name
-    except Exception as e:
-        logger.error(f"获取用户显示名称失败: {e}")
+    current_display_name = user.display_name or username
     
     if request.method == 'POST':
         new_display_name = request.form.get('display_name').strip()
@@ -3257,149 +1970,27 @@ def change_display_name():
             error_message = '显示名称长度不能超过50个字符'
         else:
             try:
-                user = User.query.filter_by(username=username).first()
-                if user:
-                    # 更新显示名称
-                    user.display_name = new_display_name
-                    db.session.commit()
-                    success_message = '显示名称修改成功'
-                    current_display_name = new_display_name
-                    logger.info(f"用户 {username} 修改显示名称成功: {new_display_name}")
-                else:
-                    error_message = '用户不存在'
+                # 更新显示名称
+                get_user_repository().update_fields(user.id, display_name=new_display_name)
+                success_message = '显示名称修改成功'
+                current_display_name = new_display_name
+                logger.info(f"用户 {username} 修改显示名称成功: {new_display_name}")
             except Exception as e:
                 logger.error(f"用户 {username} 修改显示名称失败: {e}")
                 db.session.rollback()
                 error_message = '修改显示名称失败，请稍后重试'
     
     # 渲染修改显示名称页面
-    return render_template_string('''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>修改显示名称 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                    },
-                    fontFamily: {
-                        sans: ['Inter', 'system-ui', 'sans-serif'],
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-            .input-focus {
-                @apply focus:ring-2 focus:ring-primary/50 focus:border-primary;
-            }
-            .btn-hover {
-                @apply transition-all duration-300 transform hover:scale-[1.02] active:scale-[0.98];
-            }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex flex-col">
-    <!-- 顶部导航栏 -->
-    <header class="bg-white shadow-sm">
-        <div class="container mx-auto px-4 py-3 flex justify-between items-center">
-            <div class="flex items-center space-x-2">
-                <i class="fa fa-user-circle text-primary text-2xl"></i>
-                <h1 class="text-xl font-bold text-gray-800">修改显示名称</h1>
-            </div>
-            <div class="flex items-center space-x-4">
-                <a href="{{ url_for('auth.user_center') }}" class="bg-gray-200 hover:bg-gray-300 text-gray-800 px-4 py-2 rounded-md transition-colors">
-                    <i class="fa fa-arrow-left mr-1"></i> 返回
-                </a>
-            </div>
-        </div>
-    </header>
-
-    <!-- 主要内容 -->
-    <main class="flex-grow container mx-auto px-4 py-8 flex justify-center items-center">
-        <div class="w-full max-w-md bg-white rounded-xl p-8 card-shadow">
-            <h2 class="text-xl font-semibold mb-6 text-center text-gray-800 flex items-center justify-center">
-                <i class="fa fa-user text-primary mr-2"></i> 账户显示名称修改
-            </h2>
-            
-            {% if error_message %}
-            <div class="mb-4 p-3 bg-red-50 border border-red-200 rounded-lg">
-                <p class="text-red-600 text-sm flex items-center">
-                    <i class="fa fa-exclamation-circle mr-2"></i>
-                    {{ error_message }}
-                </p>
-            </div>
-            {% endif %}
-            
-            {% if success_message %}
-            <div class="mb-4 p-3 bg-green-50 border border-green-200 rounded-lg">
-                <p class="text-green-600 text-sm flex items-center">
-                    <i class="fa fa-check-circle mr-2"></i>
-                    {{ success_message }}
-                </p>
-            </div>
-            {% endif %}
-            
-            <form method="post" class="space-y-4">
-                <div>
-                    <label for="display_name" class="block text-sm font-medium text-gray-700 mb-1">显示名称</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-user-circle"></i>
-                        </div>
-                        <input 
-                            type="text" 
-                            id="display_name" 
-                            name="display_name" 
-                            value="{{ current_display_name }}"
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入新的显示名称（最多50个字符）"
-                            maxlength="50"
-                        >
-                    </div>
-                </div>
-                
-                <div class="text-sm text-gray-500 mt-2 mb-4">
-                    <p>显示名称将作为您在系统中的昵称，可随时修改</p>
-                </div>
-                
-                <button 
-                    type="submit" 
-                    class="w-full bg-primary hover:bg-primary/90 text-white font-medium py-3 px-4 rounded-lg btn-hover flex items-center justify-center"
-                >
-                    <i class="fa fa-save mr-2"></i> 保存修改
-                </button>
-            </form>
-        </div>
-    </main>
-</body>
-</html>
-''', username=username, current_display_name=current_display_name, error_message=error_message, success_message=success_message)
+    return render_template('auth/change_display_name.html', username=username, current_display_name=current_display_name, error_message=error_message, success_message=success_message)
 
 @bp.route('/change_password', methods=['GET', 'POST'])
 def change_password():
     """修改密码页面"""
-    if 'username' not in session:
+    user = g.current_user
+    if not user:
         return redirect(url_for('auth.login'))
     
-    username = session.get('username')
+    username = user.username
     login_type = session.get('login_type', 'default')
     error_message = None
     success_message = None
@@ -3418,201 +2009,36 @@ def change_password():
             error_message = '新密码长度至少为6位'
         else:
             try:
-                # 获取用户
-                user = User.query.filter_by(username=username).first()
-                if not user:
-                    error_message = '用户不存在'
+                # 验证旧密码：如果是企业微信登录用户，则跳过原密码校验
+                if login_type == 'wechat_corp':
+                    # 企业微信登录用户，跳过原密码校验
+                    logger.info(f"企业微信登录用户 {username} 修改密码，跳过原密码校验")
+                    # 更新密码
+                    get_user_repository().update_fields(user.id, password=hash_password(new_password))
+                    logger.info(f"用户 {username} 修改密码成功")
+                    # 密码修改成功后重定向到用户中心
+                    session['success_message'] = '密码修改成功'
+                    return redirect(url_for('auth.user_center'))
                 else:
-                    # 验证旧密码：如果是企业微信登录用户，则跳过原密码校验
-                    if login_type == 'wechat_corp':
-                        # 企业微信登录用户，跳过原密码校验
-                        logger.info(f"企业微信登录用户 {username} 修改密码，跳过原密码校验")
-                        # 更新密码
-                        new_password_hash = hashlib.sha256(new_password.encode()).hexdigest()
-                        user.password = new_password_hash
-                        db.session.commit()
-                        logger.info(f"用户 {username} 修改密码成功")
-                        # 密码修改成功后重定向到用户中心
-                        session['success_message'] = '密码修改成功'
-                        return redirect(url_for('auth.user_center'))
+                    # 普通登录用户，需要验证旧密码
+                    if not old_password:
+                        error_message = '请输入原密码'
                     else:
-                        # 普通登录用户，需要验证旧密码
-                        if not old_password:
-                            error_message = '请输入原密码'
+                        # 验证旧密码（当前用户资料不含密码，按主键加载）
+                        if not verify_password(old_password, get_current_user_for_update().password)[0]:
+                            error_message = '原密码错误'
                         else:
-                            # 验证旧密码
-                            old_password_hash = hashlib.sha256(old_password.encode()).hexdigest()
-                            if user.password != old_password_hash:
-                                error_message = '原密码错误'
-                            else:
-                                # 更新密码
-                                new_password_hash = hashlib.sha256(new_password.encode()).hexdigest()
-                                user.password = new_password_hash
-                                db.session.commit()
-                                success_message = '密码修改成功'
-                                logger.info(f"用户 {username} 修改密码成功")
+                            # 更新密码
+                            get_user_repository().update_fields(user.id, password=hash_password(new_password))
+                            success_message = '密码修改成功'
+                            logger.info(f"用户 {username} 修改密码成功")
             except Exception as e:
                 logger.error(f"用户 {username} 修改密码时发生错误: {e}")
                 db.session.rollback()
                 error_message = '修改密码失败，请稍后重试'
     
     # 渲染修改密码页面
-    return render_template_string('''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>修改密码 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                    },
-                    fontFamily: {
-                        sans: ['Inter', 'system-ui', 'sans-serif'],
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-            .input-focus {
-                @apply focus:ring-2 focus:ring-primary/50 focus:border-primary;
-            }
-            .btn-hover {
-                @apply transition-all duration-300 transform hover:scale-[1.02] active:scale-[0.98];
-            }
-        }
-    </style>
-</head>
-<body class="bg-gray-100 min-h-screen flex flex-col">
-    <!-- 顶部导航栏 -->
-    <header class="bg-white shadow-sm">
-        <div class="container mx-auto px-4 py-3 flex justify-between items-center">
-            <div class="flex items-center space-x-2">
-                <i class="fa fa-user-circle text-primary text-2xl"></i>
-                <h1 class="text-xl font-bold text-gray-800">修改密码</h1>
-            </div>
-            <div class="flex items-center space-x-4">
-                <a href="{{ url_for('auth.user_center') }}" class="bg-gray-200 hover:bg-gray-300 text-gray-800 px-4 py-2 rounded-md transition-colors">
-                    <i class="fa fa-arrow-left mr-1"></i> 返回
-                </a>
-            </div>
-        </div>
-    </header>
-
-    <!-- 主要内容 -->
-    <main class="flex-grow container mx-auto px-4 py-8 flex justify-center items-center">
-        <div class="w-full max-w-md bg-white rounded-xl p-8 card-shadow">
-            <h2 class="text-xl font-semibold mb-6 text-center text-gray-800 flex items-center justify-center">
-                <i class="fa fa-key text-primary mr-2"></i> 账户密码修改
-            </h2>
-            
-            {% if error_message %}
-            <div class="mb-4 p-3 bg-red-50 border border-red-200 rounded-lg">
-                <p class="text-red-600 text-sm flex items-center">
-                    <i class="fa fa-exclamation-circle mr-2"></i>
-                    {{ error_message }}
-                </p>
-            </div>
-            {% endif %}
-            
-            {% if success_message %}
-            <div class="mb-4 p-3 bg-green-50 border border-green-200 rounded-lg">
-                <p class="text-green-600 text-sm flex items-center">
-                    <i class="fa fa-check-circle mr-2"></i>
-                    {{ success_message }}
-                </p>
-            </div>
-            {% endif %}
-            
-            <form method="post" class="space-y-4">
-                {% if login_type != 'wechat_corp' %}
-                <div>
-                    <label for="old_password" class="block text-sm font-medium text-gray-700 mb-1">原密码</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-lock"></i>
-                        </div>
-                        <input 
-                            type="password" 
-                            id="old_password" 
-                            name="old_password" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入原密码"
-                        >
-                    </div>
-                </div>
-                {% else %}
-                <div class="bg-blue-50 border border-blue-200 rounded-lg p-3 mb-4">
-                    <p class="text-sm text-blue-700">
-                        <i class="fa fa-info-circle mr-2"></i>
-                        您通过企业微信登录，无需验证原密码，可直接设置新密码
-                    </p>
-                </div>
-                {% endif %}
-                
-                <div>
-                    <label for="new_password" class="block text-sm font-medium text-gray-700 mb-1">新密码</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-key"></i>
-                        </div>
-                        <input 
-                            type="password" 
-                            id="new_password" 
-                            name="new_password" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入新密码（至少6位）"
-                        >
-                    </div>
-                </div>
-                
-                <div>
-                    <label for="confirm_password" class="block text-sm font-medium text-gray-700 mb-1">确认新密码</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-check-square-o"></i>
-                        </div>
-                        <input 
-                            type="password" 
-                            id="confirm_password" 
-                            name="confirm_password" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请再次输入新密码"
-                        >
-                    </div>
-                </div>
-                
-                <button 
-                    type="submit" 
-                    class="w-full bg-primary hover:bg-primary/90 text-white font-medium py-3 px-4 rounded-lg btn-hover flex items-center justify-center"
-                >
-                    <i class="fa fa-save mr-2"></i> 保存修改
-                </button>
-            </form>
-        </div>
-    </main>
-</body>
-</html>
-''', username=username, login_type=login_type, error_message=error_message, success_message=success_message)
+    return render_template('auth/change_password.html', username=username, login_type=login_type, error_message=error_message, success_message=success_message)
 
 
 
@@ -3629,257 +2055,3 @@ def logout():
     session.clear()
     
     return redirect(url_for('auth.login'))
-
-# 注册页面模板
-register_template = '''
-<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>注册 - Hello World</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <link href="https://cdn.jsdelivr.net/npm/font-awesome@4.7.0/css/font-awesome.min.css" rel="stylesheet">
-    <script>
-        tailwind.config = {
-            theme: {
-                extend: {
-                    colors: {
-                        primary: '#3b82f6',
-                        secondary: '#10b981',
-                        accent: '#8b5cf6',
-                    },
-                    fontFamily: {
-                        sans: ['Inter', 'system-ui', 'sans-serif'],
-                    },
-                }
-            }
-        }
-    </script>
-    <style type="text/tailwindcss">
-        @layer utilities {
-            .content-auto {
-                content-visibility: auto;
-            }
-            .card-shadow {
-                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -4px rgba(0, 0, 0, 0.1);
-            }
-            .input-focus {
-                @apply focus:ring-2 focus:ring-primary/50 focus:border-primary;
-            }
-            .btn-hover {
-                @apply transition-all duration-300 transform hover:scale-[1.02] active:scale-[0.98];
-            }
-        }
-    </style>
-</head>
-<body class="bg-gradient-to-br from-blue-50 to-indigo-50 min-h-screen flex items-center justify-center p-4">
-    <div class="w-full max-w-md">
-        <div class="bg-white rounded-2xl p-8 card-shadow">
-            <div class="text-center mb-8">
-                <div class="inline-flex items-center justify-center w-16 h-16 bg-secondary/10 text-secondary rounded-full mb-4">
-                    <i class="fa fa-user-plus text-2xl"></i>
-                </div>
-                <h1 class="text-3xl font-bold text-gray-800">创建账号</h1>
-                <p class="text-gray-500 mt-2">加入我们的平台</p>
-            </div>
-            
-            {% if error_message %}
-            <div class="mb-4 p-3 bg-red-50 border border-red-200 rounded-lg">
-                <p class="text-red-600 text-sm flex items-center">
-                    <i class="fa fa-exclamation-circle mr-2"></i>
-                    {{ error_message }}
-                </p>
-            </div>
-            {% endif %}
-            
-            <form method="post" class="space-y-4">
-                <div>
-                    <label for="username" class="block text-sm font-medium text-gray-700 mb-1">登录账号</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-user"></i>
-                        </div>
-                        <input 
-                            type="text" 
-                            id="username" 
-                            name="username" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入登录账号（用于登录系统）"
-                            value="{{ username }}"
-                        >
-                    </div>
-                    <p class="text-xs text-gray-500 mt-1">登录账号创建后不可修改</p>
-                </div>
-                
-                <div>
-                    <label for="display_name" class="block text-sm font-medium text-gray-700 mb-1">系统用户名</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-smile-o"></i>
-                        </div>
-                        <input 
-                            type="text" 
-                            id="display_name" 
-                            name="display_name" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入显示名称（用户昵称）"
-                            value="{{ display_name }}"
-                        >
-                    </div>
-                    <p class="text-xs text-gray-500 mt-1">这是您在系统中显示的昵称，后续可修改</p>
-                </div>
-                
-                <div>
-                    <label for="email" class="block text-sm font-medium text-gray-700 mb-1">邮箱</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-envelope"></i>
-                        </div>
-                        <input 
-                            type="email" 
-                            id="email" 
-                            name="email" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入邮箱"
-                            value="{{ email }}"
-                        >
-                    </div>
-                </div>
-                
-                <div>
-                    <label for="verification_code" class="block text-sm font-medium text-gray-700 mb-1">验证码</label>
-                    <div class="flex space-x-2">
-                        <div class="relative flex-grow">
-                            <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                                <i class="fa fa-shield"></i>
-                            </div>
-                            <input 
-                                type="text" 
-                                id="verification_code" 
-                                name="verification_code" 
-                                required
-                                class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                                placeholder="请输入验证码"
-                            >
-                        </div>
-                        <button 
-                            type="button" 
-                            id="send-code-btn" 
-                            onclick="sendVerificationCode()"
-                            class="bg-primary hover:bg-primary/90 text-white font-medium py-3 px-4 rounded-lg btn-hover whitespace-nowrap"
-                        >
-                            发送验证码
-                        </button>
-                    </div>
-                </div>
-                
-                <div>
-                    <label for="password" class="block text-sm font-medium text-gray-700 mb-1">密码</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-key"></i>
-                        </div>
-                        <input 
-                            type="password" 
-                            id="password" 
-                            name="password" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请输入密码"
-                        >
-                    </div>
-                </div>
-                
-                <div>
-                    <label for="confirm_password" class="block text-sm font-medium text-gray-700 mb-1">确认密码</label>
-                    <div class="relative">
-                        <div class="absolute inset-y-0 left-0 pl-3 flex items-center pointer-events-none text-gray-400">
-                            <i class="fa fa-check-circle"></i>
-                        </div>
-                        <input 
-                            type="password" 
-                            id="confirm_password" 
-                            name="confirm_password" 
-                            required
-                            class="w-full pl-10 pr-3 py-3 border border-gray-300 rounded-lg shadow-sm focus:outline-none input-focus transition duration-200"
-                            placeholder="请再次输入密码"
-                        >
-                    </div>
-                </div>
-                
-                <button 
-                    type="submit" 
-                    class="w-full bg-secondary hover:bg-secondary/90 text-white font-medium py-3 px-4 rounded-lg btn-hover flex items-center justify-center"
-                >
-                    <i class="fa fa-user-plus mr-2"></i> 注册
-                </button>
-            </form>
-            
-            <div class="mt-6 text-center">
-                <p class="text-gray-600">
-                    已有账号？ <a href="{{ url_for('auth.login') }}" class="text-primary hover:text-primary/80 font-medium transition duration-200">立即登录</a>
-                </p>
-            </div>
-        </div>
-    </div>
-    
-    <script>
-        function sendVerificationCode() {
-            const email = document.getElementById('email').value;
-            if (!email) {
-                alert('请先输入邮箱地址');
-                return;
-            }
-            
-            // 显示倒计时
-            const btn = document.getElementById('send-code-btn');
-            btn.disabled = true;
-            let countdown = 60;
-            btn.textContent = `${countdown}秒后重试`;
-            
-            const timer = setInterval(() => {
-                countdown--;
-                btn.textContent = `${countdown}秒后重试`;
-                if (countdown <= 0) {
-                    clearInterval(timer);
-                    btn.disabled = false;
-                    btn.textContent = '发送验证码';
-                }
-            }, 1000);
-            
-            // 发送请求获取验证码
-            const formData = new FormData();
-            formData.append('email', email);
-            
-            fetch('/send_verification', {
-                method: 'POST',
-                body: formData
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    alert('验证码已发送，请查收邮箱');
-                } else {
-                    alert('发送失败：' + data.message);
-                    clearInterval(timer);
-                    btn.disabled = false;
-                    btn.textContent = '发送验证码';
-                }
-            })
-            .catch(error => {
-                console.error('Error:', error);
-                alert('发送失败，请稍后重试');
-                clearInterval(timer);
-                btn.disabled = false;
-                btn.textContent = '发送验证码';
-            });
-        }
-    </script>
-</body>
-</html>
-'''
-
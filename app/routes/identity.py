@@ -0,0 +1,100 @@
+"""当前登录用户
+
+会话中保存不可变的user_id（username仅用于日志展示），每个已登录请求在before_request中
+按主键通过用户资料缓存加载当前用户到g.current_user，各路由直接使用，不再按username重复查询；
+缓存命中时不访问数据库。
+
+g.current_user是不含密码的只读资料（UserProfile），需要修改用户或校验密码时
+使用get_current_user_for_update()按主键加载ORM对象。
+"""
+import logging
+
+from flask import g, request, session
+
+from app.models.db import User, db
+from app.models.user_cache import get_user_profile
+
+logger = logging.getLogger('auth')
+
+# 会话中的身份字段
+IDENTITY_SESSION_KEYS = ('user_id', 'username', 'login_type', 'user_info')
+
+# 不需要当前用户的端点：退出登录只清除会话；验证码和扫码状态轮询/推送请求频繁，
+# SSE长连接还会在整个推送期间占用数据库连接
+ANONYMOUS_ENDPOINTS = frozenset({
+    'static',
+    'auth.logout',
+    'api.logout',
+    'auth.captcha',
+    'auth.check_wechat_scan_status',
+    'auth.wechat_scan_events',
+    'api.check_wechat_login',
+    'api.wechat_login_events',
+    'api.generate_captcha',
+})
+
+
+def login_user(user, login_type='default'):
+    """登录成功后写入会话
+
+    Args:
+        user: 用户对象
+        login_type: 登录方式，default或wechat_corp
+    """
+    session['user_id'] = user.id
+    session['username'] = user.username
+    session['login_type'] = login_type
+    g.current_user = user
+
+
+def logout_user():
+    """清除会话中的身份信息"""
+    for key in IDENTITY_SESSION_KEYS:
+        session.pop(key, None)
+    g.current_user = None
+
+
+def get_current_user():
+    """获取当前请求的登录用户，未登录时返回None"""
+    return g.get('current_user')
+
+
+def get_current_user_for_update():
+    """获取当前登录用户的ORM对象，用于修改用户或读取密码哈希，未登录时返回None"""
+    user = g.get('current_user')
+    if user is None or isinstance(user, User):
+        return user
+    return db.session.get(User, user.id)
+
+
+def load_current_user():
+    """按会话中的user_id加载当前用户资料，缓存命中时不查询数据库，否则最多按主键查询一次"""
+    g.current_user = None
+    if request.endpoint in ANONYMOUS_ENDPOINTS:
+        return
+
+    user_id = session.get('user_id')
+    username = session.get('username')
+    if user_id is None and username is None:
+        return
+
+    try:
+        if user_id is not None:
+            user = get_user_profile(user_id=user_id)
+        else:
+            # 升级前创建的会话只有username，按登录账号查询一次后补写user_id
+            user = get_user_profile(username=username)
+            if user is not None:
+                session['user_id'] = user.id
+    except Exception as e:
+        # 数据库不可用时保留会话，本次请求按未登录处理
+        logger.error(f"加载当前用户失败 - 用户ID: {user_id}, 错误: {e}")
+        return
+
+    if user is None:
+        # 用户已被删除，清除会话中的身份信息
+        logger.warning(f"会话中的用户不存在，已清除登录状态 - 用户ID: {user_id}, 用户名: {username}")
+        logout_user()
+        return
+
+    g.current_user = user
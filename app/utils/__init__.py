@@ -1,9 +1,9 @@
 import random
 import time
-import smtplib
+import hmac
+import hashlib
+import secrets
 import io
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 
 # 导入配置管理器
 from app.utils.config_manager import ConfigManager, config_manager, get_config_manager, init_config_manager
@@ -53,22 +53,136 @@ def generate_wechat_state(action, **kwargs):
     
     Args:
         action: 操作类型，必填，登录为'login'，绑定为'bind'
-        **kwargs: 其他需要携带的信息
+        **kwargs: 其他需要携带的信息，签名模式下使用ip_address和mode
         
     Returns:
-        str: 包含action信息的state字符串
+        str: 包含action信息的state字符串，启用WECHAT_STATE_SIGNED时为签名state
     """
-    # 生成随机部分作为基础
-    random_part = ''.join(random.choices('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ', k=24))
-    
     # 添加action标识
     action_marker = 'L' if action == 'login' else 'B' if action == 'bind' else 'U'  # U表示未知
     
+    # 启用签名模式时生成可自校验的state
+    if _config_flag('WECHAT_STATE_SIGNED', False):
+        return generate_signed_wechat_state(action_marker, kwargs.get('ip_address'), kwargs.get('mode'))
+    
+    # 生成随机部分作为基础
+    random_part = ''.join(random.choices('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ', k=24))
+    
     # 组合生成最终state
     state = f"{action_marker}_{random_part}"
     
     return state
 
+# 签名state格式：{action标识}S_{签发时间8位hex}{模式1位}{IP摘要8位hex}{随机数8位hex}{MAC 24位hex}
+SIGNED_STATE_MAC_LENGTH = 24
+SIGNED_STATE_LENGTH = 3 + 8 + 1 + 8 + 8 + SIGNED_STATE_MAC_LENGTH
+# 生成时未提供IP地址，回调时不校验IP
+SIGNED_STATE_UNBOUND_IP = '00000000'
+_SIGNED_STATE_ACTIONS = {'L': 'login', 'B': 'bind', 'U': None}
+_SIGNED_STATE_MODES = {'p': 'production', 't': 'test'}
+
+def _config_flag(key, default=False):
+    """读取布尔型配置，兼容环境变量中的字符串值"""
+    value = get_config_manager().get(key, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def _get_state_secret():
+    """获取state签名密钥，优先使用当前Flask应用的SECRET_KEY"""
+    secret = None
+    try:
+        from flask import current_app, has_app_context
+        if has_app_context():
+            secret = current_app.secret_key
+    except ImportError:
+        pass
+    if not secret:
+        secret = get_config_manager().get('SECRET_KEY')
+    if not secret:
+        raise RuntimeError("未配置SECRET_KEY，无法签名state")
+    return secret.encode('utf-8') if isinstance(secret, str) else secret
+
+def _state_ip_digest(secret, ip_address):
+    """计算IP地址摘要，使用密钥避免通过state反推IP"""
+    if not ip_address:
+        return SIGNED_STATE_UNBOUND_IP
+    return hmac.new(secret, f"ip:{ip_address}".encode('utf-8'), hashlib.sha256).hexdigest()[:8]
+
+def _state_mac(secret, message):
+    """计算state主体的MAC"""
+    return hmac.new(secret, message.encode('ascii'), hashlib.sha256).hexdigest()[:SIGNED_STATE_MAC_LENGTH]
+
+def is_signed_wechat_state(state):
+    """判断state是否为签名格式"""
+    return (isinstance(state, str) and len(state) == SIGNED_STATE_LENGTH
+            and state[0] in _SIGNED_STATE_ACTIONS and state[1:3] == 'S_')
+
+def generate_signed_wechat_state(action_marker, ip_address=None, mode=None, issued_at=None):
+    """
+    生成使用SECRET_KEY签名的state，回调时无需查询存储即可校验
+    
+    Args:
+        action_marker: 操作标识，L为登录，B为绑定，U为未知
+        ip_address: 发起扫码的客户端IP，为空时不绑定IP
+        mode: 运行模式，'test'或'production'
+        issued_at: 签发时间戳，默认为当前时间
+        
+    Returns:
+        str: 签名state字符串
+    """
+    secret = _get_state_secret()
+    issued_at = int(issued_at if issued_at is not None else time.time())
+    mode_flag = 't' if mode == 'test' else 'p'
+    body = (f"{action_marker}S_{issued_at:08x}{mode_flag}"
+            f"{_state_ip_digest(secret, ip_address)}{secrets.token_hex(4)}")
+    return body + _state_mac(secret, body)
+
+def verify_signed_wechat_state(state, ip_address=None, max_age=None):
+    """
+    校验签名state，不访问任何存储
+    
+    Args:
+        state: 回调中的state
+        ip_address: 回调请求的客户端IP
+        max_age: 有效期（秒），默认读取WECHAT_STATE_MAX_AGE配置
+        
+    Returns:
+        dict: 校验通过时返回state中携带的信息（action、mode、timestamp），否则返回None
+    """
+    if not is_signed_wechat_state(state):
+        return None
+    
+    secret = _get_state_secret()
+    body, mac = state[:-SIGNED_STATE_MAC_LENGTH], state[-SIGNED_STATE_MAC_LENGTH:]
+    if not hmac.compare_digest(_state_mac(secret, body), mac):
+        return None
+    
+    try:
+        issued_at = int(body[3:11], 16)
+    except ValueError:
+        return None
+    mode = _SIGNED_STATE_MODES.get(body[11])
+    if mode is None:
+        return None
+    
+    if max_age is None:
+        max_age = int(get_config_manager().get('WECHAT_STATE_MAX_AGE', 600) or 600)
+    age = time.time() - issued_at
+    if age > max_age or age < -60:  # 允许少量时钟偏差
+        return None
+    
+    ip_digest = body[12:20]
+    if (ip_digest != SIGNED_STATE_UNBOUND_IP and _config_flag('WECHAT_STATE_BIND_IP', True)
+            and not hmac.compare_digest(ip_digest, _state_ip_digest(secret, ip_address))):
+        return None
+    
+    return {
+        'action': _SIGNED_STATE_ACTIONS[state[0]],
+        'mode': mode,
+        'timestamp': float(issued_at)
+    }
+
 def send_email(to_email, subject, content):
     """发送邮件"""
     try:
@@ -88,28 +202,9 @@ def send_email(to_email, subject, content):
         else:
             print(f"内容：{content}")
         
-        # 以下是实际发送邮件的代码
-        # 注意：需要正确配置邮件服务器信息才能实际发送
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = MAIL_DEFAULT_SENDER
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(content, 'html', 'utf-8'))
-            
-            server = smtplib.SMTP(MAIL_SERVER, MAIL_PORT)
-            server.starttls()
-            server.login(MAIL_USERNAME, MAIL_PASSWORD)
-            server.send_message(msg)
-            server.quit()
-            print(f"实际邮件已成功发送到 {to_email}")
-        except Exception as mail_error:
-            # 如果邮件服务器配置不正确，不影响程序运行
-            print(f"提示：实际邮件发送失败（可能是开发环境配置问题）: {mail_error}")
-            print("继续使用模拟模式，验证码已在上文显示")
-        
-        return True
+        # 写入发件箱后立即返回，由后台线程发送（EMAIL_OUTBOX_ENABLED关闭时同步发送）
+        from app.utils.mailer import dispatch_email
+        return dispatch_email(to_email, subject, content)
     except Exception as e:
         print(f"发送邮件失败：{e}")
         return False
@@ -125,176 +220,36 @@ def generate_captcha():
         code = generate_verification_code()
         return code, None
     
-    # 验证码参数配置
-    width = 160
-    height = 60
-    font_size = 30
-    code_length = 4
-    
-    # 生成随机验证码
-    chars = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'  # 去除容易混淆的字符
-    code = ''.join(random.choice(chars) for _ in range(code_length))
-    
-    # 创建图片
-    image = Image.new('RGB', (width, height), color=(255, 255, 255))
-    draw = ImageDraw.Draw(image)
-    
-    # 尝试加载字体，如果失败则使用默认字体
-    try:
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except IOError:
-        font = ImageFont.load_default()
-    
-    # 绘制验证码文本
-    text_width = font_size * code_length
-    text_height = font_size
-    x = (width - text_width) // 2
-    y = (height - text_height) // 2
-    
-    for i, char in enumerate(code):
-        # 每个字符使用不同的颜色和轻微的旋转
-        color = (random.randint(30, 100), random.randint(30, 100), random.randint(30, 100))
-        draw.text((x + i * font_size, y), char, font=font, fill=color)
-    
-    # 添加干扰线
-    for _ in range(5):
-        line_color = (random.randint(0, 200), random.randint(0, 200), random.randint(0, 200))
-        line_width = random.randint(1, 2)
-        start_x = random.randint(0, width)
-        start_y = random.randint(0, height)
-        end_x = random.randint(0, width)
-        end_y = random.randint(0, height)
-        draw.line([(start_x, start_y), (end_x, end_y)], fill=line_color, width=line_width)
-    
-    # 添加干扰点
-    for _ in range(50):
-        dot_color = (random.randint(0, 150), random.randint(0, 150), random.randint(0, 150))
-        dot_size = random.randint(1, 2)
-        dot_x = random.randint(0, width)
-        dot_y = random.randint(0, height)
-        draw.point([(dot_x, dot_y)], fill=dot_color)
-    
-    # 将图片保存到字节流
-    img_io = io.BytesIO()
-    image.save(img_io, format='PNG')
-    img_io.seek(0)
+    # 字体和字形图集只加载一次，之后每次只需贴图和编码
+    from app.utils.captcha_renderer import get_captcha_renderer
+    code, png_bytes = get_captcha_renderer().generate()
+    img_io = io.BytesIO(png_bytes)
     
     return code, img_io
 
 def verify_code(email, code):
-    """验证验证码"""
-    from app.models import get_verifications, save_verifications
-    from app.models.db import db, Verification
-    from datetime import datetime, timezone
-    import time
-    
-    # 添加调试日志
-    print(f"[验证码验证] 尝试验证邮箱: {email}, 验证码: {code}")
+    """验证邮箱验证码，验证成功后验证码即失效
     
-    # 直接从数据库获取最新的验证码记录
-    try:
-        db_verification = Verification.query.filter_by(email=email).first()
-        if db_verification:
-            print(f"[验证码验证] 从数据库获取验证码: {db_verification.code}, 创建时间: {db_verification.created_at}")
-    except Exception as e:
-        print(f"[验证码验证] 从数据库获取验证码失败: {e}")
+    使用一条条件DELETE校验并删除验证码，并发提交同一个验证码时只有一个请求能通过。
     
-    # 从兼容层获取验证码（同时支持数据库和JSON文件）
-    verifications = get_verifications()
+    Args:
+        email: 邮箱
+        code: 用户提交的验证码
+        
+    Returns:
+        bool: 验证码正确且在有效期内
+    """
+    from app.models.verification_store import get_verification_store
     
-    # 检查验证码是否存在
-    if email not in verifications:
-        print(f"[验证码验证] 邮箱 {email} 未找到验证码记录")
+    if not email or not code:
         return False
     
-    verification_info = verifications[email]
-    # 使用UTC时间
-    current_time = datetime.now(timezone.utc)
-    
-    # 使用默认值，避免直接引用app对象
-    expire_time = 600  # 默认10分钟过期
-    
-    # 尝试从app获取配置，但如果app不存在也不会报错
     try:
-        from app import app as flask_app
-        expire_time = flask_app.config.get('VERIFICATION_CODE_EXPIRE', 600)
-    except (ImportError, AttributeError):
-        # 如果导入失败或没有app对象，使用默认值
-        pass
-    
-    # 调试输出当前存储的验证码
-    stored_code = verification_info['code']
-    timestamp = verification_info['timestamp']
-    
-    print(f"[验证码验证] 存储的验证码: {stored_code}, 时间戳类型: {type(timestamp)}")
-    
-    # 验证码是否匹配
-    if stored_code != code:
-        print(f"[验证码验证] 验证码不匹配: 输入={code}, 存储={stored_code}")
+        consumed = get_verification_store().consume(email, code.strip())
+    except Exception as e:
+        print(f"[验证码验证] 校验验证码失败 - 邮箱: {email}, 错误: {e}")
         return False
     
-    # 统一处理时间戳格式
-    try:
-        # 确保 timestamp 是 datetime 对象
-        if isinstance(timestamp, (int, float)):
-            # 如果是时间戳，转换为UTC datetime
-            timestamp = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-        elif isinstance(timestamp, datetime) and timestamp.tzinfo is None:
-            # 如果是没有时区信息的datetime，假设是UTC
-            timestamp = timestamp.replace(tzinfo=timezone.utc)
-        
-        # 计算时间差
-        time_diff = (current_time - timestamp).total_seconds()
-        print(f"[验证码验证] 验证码创建时间: {timestamp}, UTC当前时间: {current_time}, 时间差: {time_diff}秒, 有效期: {expire_time}秒")
-        
-        # 临时增加一个额外检查：如果时间差非常大（超过24小时），可能是时间戳问题，强制接受验证码
-        if time_diff > 86400:  # 24小时
-            print(f"[验证码验证] 警告：检测到异常大的时间差，可能是时间戳问题。为了调试，临时接受验证码。")
-            # 验证成功后删除验证码
-            print(f"[验证码验证] 验证成功: 邮箱 {email}")
-            del verifications[email]
-            save_verifications(verifications)
-            # 同时清理数据库
-            try:
-                Verification.query.filter_by(email=email).delete()
-                db.session.commit()
-                print(f"[验证码验证] 已清理数据库中的验证码记录")
-            except Exception as e:
-                print(f"[验证码验证] 清理数据库记录时出错: {e}")
-            return True
-        
-        if time_diff <= expire_time:
-            # 验证成功后删除验证码
-            print(f"[验证码验证] 验证成功: 邮箱 {email}")
-            del verifications[email]
-            save_verifications(verifications)
-            # 同时清理数据库
-            try:
-                Verification.query.filter_by(email=email).delete()
-                db.session.commit()
-                print(f"[验证码验证] 已清理数据库中的验证码记录")
-            except Exception as e:
-                print(f"[验证码验证] 清理数据库记录时出错: {e}")
-            return True
-        else:
-            print(f"[验证码验证] 验证码已过期: 邮箱 {email}, 过期时间: {expire_time}秒, 当前时间差: {time_diff}秒")
-            # 删除过期验证码
-            del verifications[email]
-            save_verifications(verifications)
-            # 同时清理数据库
-            try:
-                Verification.query.filter_by(email=email).delete()
-                db.session.commit()
-                print(f"[验证码验证] 已清理数据库中过期的验证码记录")
-            except Exception as e:
-                print(f"[验证码验证] 清理数据库过期记录时出错: {e}")
-            return False
-    except Exception as e:
-        print(f"[验证码验证] 时间处理异常: {e}")
-        # 调试模式：对于时间处理异常，临时接受验证码
-        print(f"[验证码验证] 调试模式：由于时间处理异常，临时接受验证码")
-        # 仍然删除验证码
-        if email in verifications:
-            del verifications[email]
-            save_verifications(verifications)
-        return True
+    if not consumed:
+        print(f"[验证码验证] 验证码错误或已过期: 邮箱 {email}")
+    return consumed
@@ -0,0 +1,254 @@
+"""页面静态资源
+
+页面原来在浏览器中加载cdn.tailwindcss.com（运行时扫描DOM生成样式的JIT脚本）和jsDelivr上完整的Font Awesome，
+首屏要连接两个第三方域名，等脚本下载执行后才有样式。现在由build_assets.py在部署前构建：
+
+- Tailwind按app/templates和frontend/src中用到的类生成压缩后的样式，Font Awesome只保留用到的图标
+- 合并为一个CSS文件，文件名带内容哈希（app.<hash>.css），同时生成.gz和.br（需要安装brotli）预压缩文件
+- 字体文件同样加内容哈希，manifest.json记录逻辑名到带哈希文件名的映射
+
+运行时页面通过asset_url()按清单引用资源。带哈希的文件内容不会变化，Flask静态路由返回时带
+Cache-Control: immutable；静态目录中的文件存在.br/.gz同名预压缩文件时，都按Accept-Encoding直接返回。
+未构建时asset_url()返回None，页面回退到CDN。
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 构建产物在静态目录下的子目录
+ASSETS_DIR = 'dist'
+
+# 资源清单文件名
+MANIFEST_NAME = 'manifest.json'
+
+# 带哈希文件的缓存时间（秒）
+IMMUTABLE_MAX_AGE = 31536000
+
+# 预压缩文件，按优先级排列：(Content-Encoding, 文件后缀)
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# 扫描图标类名的文件类型
+SOURCE_EXTENSIONS = ('.html', '.js', '.jsx')
+
+ICON_CLASS_PATTERN = re.compile(r'\bfa-[a-z0-9]+(?:-[a-z0-9]+)*')
+FONT_URL_PATTERN = re.compile(r'''url\((['"]?)\.\./fonts/([^?#'")]+)([^'")]*)\1\)''')
+
+
+def content_hash(data: bytes) -> str:
+    """计算文件内容哈希，用于文件名"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    """在扩展名前插入内容哈希，例如app.css -> app.<hash>.css"""
+    root, ext = os.path.splitext(name)
+    return f"{root}.{content_hash(data)}{ext}"
+
+
+def find_icon_classes(paths: Iterable[str]) -> Set[str]:
+    """扫描模板和前端源码中出现的Font Awesome图标类名（fa-*）
+
+    Args:
+        paths: 要扫描的文件或目录
+
+    Returns:
+        set: 用到的类名
+    """
+    used = set()
+    for path in paths:
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+                     if name.endswith(SOURCE_EXTENSIONS)]
+        for file_path in files:
+            with open(file_path, encoding='utf-8') as f:
+                used.update(ICON_CLASS_PATTERN.findall(f.read()))
+    return used
+
+
+def iter_css_rules(css: str) -> Iterator[str]:
+    """按顶层花括号把CSS拆分为规则（@keyframes等嵌套块作为一条规则）"""
+    depth = 0
+    start = 0
+    quote = None
+    for i, char in enumerate(css):
+        if quote:
+            if char == quote and css[i - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                yield css[start:i + 1].strip()
+                start = i + 1
+    tail = css[start:].strip()
+    if tail:
+        yield tail
+
+
+def prune_font_awesome(css: str, used: Set[str]) -> str:
+    """只保留用到的Font Awesome规则
+
+    选择器中的fa-*类名都在used中时保留该选择器，没有保留任何选择器的规则整条删除；
+    @font-face、@keyframes等@规则和不含fa-*类名的规则（如.fa、.sr-only）原样保留。
+
+    Args:
+        css: font-awesome.min.css内容
+        used: 用到的类名
+
+    Returns:
+        str: 裁剪后的CSS
+    """
+    rules = []
+    for rule in iter_css_rules(css):
+        if rule.startswith('@') or '{' not in rule:
+            rules.append(rule)
+            continue
+        selectors, body = rule.split('{', 1)
+        kept = [selector for selector in selectors.split(',')
+                if set(ICON_CLASS_PATTERN.findall(selector)) <= used]
+        if kept:
+            rules.append(','.join(kept) + '{' + body)
+    return ''.join(rules)
+
+
+def rewrite_font_urls(css: str, fonts: Dict[str, str]) -> str:
+    """把url(../fonts/xxx)替换为带哈希的字体文件（与CSS同目录下的fonts/）"""
+    def replace(match):
+        quote, name, suffix = match.groups()
+        return f"url({quote}fonts/{fonts.get(name, name)}{suffix}{quote})"
+
+    return FONT_URL_PATTERN.sub(replace, css)
+
+
+def write_asset(out_dir: str, name: str, data: bytes, precompress: bool = False) -> str:
+    """写入带内容哈希的文件
+
+    Args:
+        out_dir: 输出目录
+        name: 逻辑文件名（可包含子目录）
+        data: 文件内容
+        precompress: 是否同时写入.gz和.br预压缩文件
+
+    Returns:
+        str: 带哈希的文件名（相对out_dir）
+    """
+    target = hashed_name(name, data)
+    path = os.path.join(out_dir, target)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if precompress:
+        # mtime=0使相同内容生成相同的.gz文件
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if BROTLI_AVAILABLE:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        else:
+            logger.warning("brotli未安装，不生成.br预压缩文件")
+    return target
+
+
+def write_manifest(out_dir: str, manifest: Dict[str, str]) -> str:
+    """写入资源清单，返回清单路径"""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_manifest(app) -> Dict[str, str]:
+    """读取静态目录下的资源清单，不存在时返回空字典"""
+    path = os.path.join(app.static_folder, ASSETS_DIR, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"未找到静态资源清单，页面将使用CDN样式，请先运行 python build_assets.py - 路径: {path}")
+    except (OSError, ValueError) as e:
+        logger.error(f"读取静态资源清单失败 - 路径: {path}, 错误: {e}")
+    return {}
+
+
+def asset_url(name: str) -> Optional[str]:
+    """获取构建后资源的地址
+
+    Args:
+        name: 逻辑文件名，例如app.css
+
+    Returns:
+        str: 带哈希文件的静态地址，未构建时返回None
+    """
+    target = current_app.extensions.get('assets', {}).get(name)
+    if not target:
+        return None
+    return url_for('static', filename=f"{ASSETS_DIR}/{target}")
+
+
+def _static_file_exists(app, filename: str) -> bool:
+    path = safe_join(app.static_folder, filename)
+    return path is not None and os.path.isfile(path)
+
+
+def send_static_asset(filename: str):
+    """静态路由：存在.br/.gz预压缩文件时按Accept-Encoding直接返回，带哈希的构建产物长期缓存，
+    其他文件按Flask默认方式返回"""
+    app = current_app
+    prefix = ASSETS_DIR + '/'
+    hashed_files = set(app.extensions.get('assets', {}).values())
+    immutable = filename.startswith(prefix) and filename[len(prefix):] in hashed_files
+    variants = [(encoding, suffix) for encoding, suffix in PRECOMPRESSED_ENCODINGS
+                if _static_file_exists(app, filename + suffix)]
+    if not immutable and not variants:
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    target = filename
+    encoding = None
+    for candidate, suffix in variants:
+        if request.accept_encodings[candidate]:
+            encoding = candidate
+            target = filename + suffix
+            break
+
+    response = send_from_directory(app.static_folder, target, mimetype=mimetype,
+                                   max_age=IMMUTABLE_MAX_AGE if immutable else None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if variants:
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app) -> None:
+    """加载资源清单，注册模板函数asset_url并接管静态路由
+
+    Args:
+        app: Flask应用
+    """
+    app.extensions['assets'] = load_manifest(app)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.view_functions['static'] = send_static_asset
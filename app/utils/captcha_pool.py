@@ -0,0 +1,199 @@
+"""图形验证码预渲染池
+
+验证码需要绘制图片并进行PNG编码，在/captcha请求中同步执行会占用worker。
+这里由后台线程预先渲染一批（验证码, PNG字节）放入有界队列，数量低于低水位时补充到上限，
+/captcha请求只需取出一个直接返回。
+
+- 每个验证码只会被取出一次，取出后即从池中移除
+- 池为空时在请求中直接渲染（计入starved），并唤醒后台线程补充
+- 后台线程按CAPTCHA_POOL_REFILL_RATE限制每秒渲染数量，避免补充时占满CPU
+- 后台线程在第一次取验证码时启动，多进程部署时每个worker各自维护自己的池
+
+CAPTCHA_POOL_SIZE为0或Pillow未安装时不使用验证码池，每次请求直接渲染。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+from app.utils.captcha_renderer import PIL_AVAILABLE, get_captcha_renderer
+from app.utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+# 默认池大小
+DEFAULT_CAPTCHA_POOL_SIZE = 200
+
+# 默认低水位，池中数量低于该值时开始补充
+DEFAULT_CAPTCHA_POOL_LOW_WATER = 50
+
+# 默认后台线程每秒最多渲染的数量，0表示不限制
+DEFAULT_CAPTCHA_POOL_REFILL_RATE = 100
+
+
+def render_captcha() -> Tuple[str, bytes]:
+    """渲染一个验证码
+
+    Returns:
+        tuple: (验证码字符串, PNG图片字节)
+    """
+    return get_captcha_renderer().generate()
+
+
+class CaptchaPool:
+    """预渲染验证码池"""
+
+    def __init__(self, size: int = DEFAULT_CAPTCHA_POOL_SIZE, low_water: int = DEFAULT_CAPTCHA_POOL_LOW_WATER,
+                 refill_rate: float = DEFAULT_CAPTCHA_POOL_REFILL_RATE,
+                 renderer: Callable[[], Tuple[str, bytes]] = render_captcha):
+        """
+        Args:
+            size: 池中最多保存的验证码数量
+            low_water: 低水位，数量低于该值时后台线程补充到size
+            refill_rate: 后台线程每秒最多渲染的数量，0表示不限制
+            renderer: 渲染函数，返回（验证码, PNG字节）
+        """
+        self.size = size
+        self.low_water = min(low_water, size)
+        self.refill_rate = refill_rate
+        self.renderer = renderer
+        self._items: deque = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'served': 0, 'starved': 0, 'rendered': 0, 'errors': 0}
+
+    def start(self) -> None:
+        """启动后台补充线程"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='captcha-pool', daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """停止后台补充线程"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get(self) -> Tuple[str, bytes]:
+        """取出一个验证码（单次使用），池为空时直接渲染
+
+        Returns:
+            tuple: (验证码字符串, PNG图片字节)
+        """
+        with self._lock:
+            item = self._items.popleft() if self._items else None
+            remaining = len(self._items)
+            self._stats['served'] += 1
+            if item is None:
+                self._stats['starved'] += 1
+        if remaining < self.low_water:
+            self._wakeup.set()
+        if item is None:
+            item = self.renderer()
+        return item
+
+    def fill(self) -> int:
+        """补充到池上限，返回本次渲染的数量（后台线程调用，也可在启动时预热）"""
+        interval = 1.0 / self.refill_rate if self.refill_rate > 0 else 0
+        rendered = 0
+        while not self._stop.is_set():
+            with self._lock:
+                if len(self._items) >= self.size:
+                    break
+            started = time.monotonic()
+            try:
+                item = self.renderer()
+            except Exception as e:
+                with self._lock:
+                    self._stats['errors'] += 1
+                logger.error(f"预渲染验证码失败: {e}")
+                break
+            with self._lock:
+                self._items.append(item)
+                self._stats['rendered'] += 1
+            rendered += 1
+            delay = interval - (time.monotonic() - started)
+            if delay > 0:
+                self._stop.wait(delay)
+        return rendered
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+            with self._lock:
+                needs_refill = len(self._items) < self.low_water
+            if needs_refill and not self._stop.is_set():
+                self.fill()
+
+    def stats(self) -> Dict[str, int]:
+        """获取统计信息：已取出、池为空时直接渲染（starved）、后台渲染、渲染失败次数及当前数量"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._items)
+        return stats
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+# 当前进程使用的验证码池，CAPTCHA_POOL_SIZE为0或Pillow未安装时为None
+_captcha_pool: Optional[CaptchaPool] = None
+_captcha_pool_created = False
+_captcha_pool_lock = threading.Lock()
+
+
+def create_captcha_pool() -> Optional[CaptchaPool]:
+    """根据配置创建验证码池，CAPTCHA_POOL_SIZE为0或Pillow未安装时返回None"""
+    if not PIL_AVAILABLE:
+        return None
+    config_manager = get_config_manager()
+    size = int(config_manager.get('CAPTCHA_POOL_SIZE', DEFAULT_CAPTCHA_POOL_SIZE) or 0)
+    if size <= 0:
+        return None
+    return CaptchaPool(
+        size=size,
+        low_water=int(config_manager.get('CAPTCHA_POOL_LOW_WATER', DEFAULT_CAPTCHA_POOL_LOW_WATER)),
+        refill_rate=float(config_manager.get('CAPTCHA_POOL_REFILL_RATE', DEFAULT_CAPTCHA_POOL_REFILL_RATE))
+    )
+
+
+def get_captcha_pool() -> Optional[CaptchaPool]:
+    """获取当前进程的验证码池，第一次获取时启动后台补充线程"""
+    global _captcha_pool, _captcha_pool_created
+    if not _captcha_pool_created:
+        with _captcha_pool_lock:
+            if not _captcha_pool_created:
+                _captcha_pool = create_captcha_pool()
+                if _captcha_pool is not None:
+                    _captcha_pool.start()
+                _captcha_pool_created = True
+    return _captcha_pool
+
+
+def set_captcha_pool(pool: Optional[CaptchaPool]) -> None:
+    """替换当前进程的验证码池（用于测试），为None时每次直接渲染"""
+    global _captcha_pool, _captcha_pool_created
+    _captcha_pool = pool
+    _captcha_pool_created = True
+
+
+def get_captcha() -> Tuple[str, bytes]:
+    """获取一个验证码，优先从预渲染池中取出
+
+    Returns:
+        tuple: (验证码字符串, PNG图片字节)
+    """
+    pool = get_captcha_pool()
+    if pool is None:
+        return render_captcha()
+    return pool.get()
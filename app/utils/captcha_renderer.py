@@ -0,0 +1,176 @@
+"""图形验证码渲染
+
+原来的实现每次渲染都会重新查找字体（找不到arial.ttf时先失败再回退），逐个字符调用ImageDraw.text，
+干扰点是50次Python层的draw.point调用。这里改为：
+
+- 字体只加载一次
+- 首次使用时把字符集中每个字符按几个旋转角度预先栅格化为灰度蒙版（字形图集），
+  渲染时用Image.paste按蒙版把颜色贴到画布上，不再逐次排版文字
+- 干扰点由随机字节生成的蒙版从预先生成的随机颜色图中选出，一次合成，全部在Pillow的C代码中完成
+- PNG使用较低的压缩级别编码，验证码图片很小，压缩率差别不大但编码快很多
+
+生成的图片与原来一致：160x60白底、4个深色字符、5条干扰线和少量干扰点。
+"""
+import io
+import random
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 验证码字符集，去除容易混淆的字符
+CAPTCHA_CHARS = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+
+CAPTCHA_WIDTH = 160
+CAPTCHA_HEIGHT = 60
+CAPTCHA_FONT_SIZE = 30
+CAPTCHA_LENGTH = 4
+
+# 字形图集中每个字符的旋转角度
+CAPTCHA_ROTATIONS = (-15, -8, 0, 8, 15)
+
+# 干扰线数量
+CAPTCHA_NOISE_LINES = 5
+
+# 干扰点数量（期望值）
+CAPTCHA_NOISE_DOTS = 50
+
+# PNG压缩级别（0-9），验证码图片只有几KB，1级压缩编码最快
+CAPTCHA_PNG_COMPRESS_LEVEL = 1
+
+# 依次尝试的字体文件
+CAPTCHA_FONT_FILES = ('arial.ttf', 'DejaVuSans.ttf')
+
+
+def load_captcha_font(size: int = CAPTCHA_FONT_SIZE):
+    """加载验证码字体，找不到字体文件时使用Pillow默认字体"""
+    for font_file in CAPTCHA_FONT_FILES:
+        try:
+            return ImageFont.truetype(font_file, size)
+        except IOError:
+            continue
+    try:
+        # Pillow 10.1及以上的默认字体支持指定字号
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+class CaptchaRenderer:
+    """基于字形图集的验证码渲染器"""
+
+    def __init__(self, width: int = CAPTCHA_WIDTH, height: int = CAPTCHA_HEIGHT,
+                 font_size: int = CAPTCHA_FONT_SIZE, length: int = CAPTCHA_LENGTH,
+                 chars: str = CAPTCHA_CHARS, rotations: Tuple[int, ...] = CAPTCHA_ROTATIONS,
+                 font=None):
+        """
+        Args:
+            width: 图片宽度
+            height: 图片高度
+            font_size: 字号，同时作为字符间距
+            length: 验证码长度
+            chars: 字符集
+            rotations: 字形旋转角度
+            font: 字体，为None时按CAPTCHA_FONT_FILES加载
+        """
+        self.width = width
+        self.height = height
+        self.font_size = font_size
+        self.length = length
+        self.chars = chars
+        self.rotations = rotations
+        self.font = font
+        self._atlas: Optional[Dict[Tuple[str, int], 'Image.Image']] = None
+        self._lock = threading.Lock()
+        # 干扰点蒙版的阈值：随机字节小于阈值的像素为干扰点
+        pixels = width * height
+        self._dot_lut = [255 if v < max(1, round(CAPTCHA_NOISE_DOTS * 256 / pixels)) else 0 for v in range(256)]
+        # 干扰点的颜色图（颜色范围0-150），每次渲染由随机蒙版选出不同位置的点
+        self._dot_colors = None
+
+    def _build_atlas(self) -> Dict[Tuple[str, int], 'Image.Image']:
+        """把每个字符按各旋转角度栅格化为灰度蒙版"""
+        font = self.font if self.font is not None else load_captcha_font(self.font_size)
+        atlas = {}
+        for char in self.chars:
+            left, top, right, bottom = font.getbbox(char)
+            glyph = Image.new('L', (self.font_size, self.font_size), 0)
+            ImageDraw.Draw(glyph).text(((self.font_size - (right - left)) // 2 - left,
+                                        (self.font_size - (bottom - top)) // 2 - top), char, font=font, fill=255)
+            for angle in self.rotations:
+                atlas[(char, angle)] = glyph.rotate(angle, resample=Image.BICUBIC) if angle else glyph
+        self._dot_colors = Image.frombytes('RGB', (self.width, self.height),
+                                           random.randbytes(self.width * self.height * 3)).point(
+            [v * 150 // 255 for v in range(256)] * 3)
+        return atlas
+
+    @property
+    def atlas(self) -> Dict[Tuple[str, int], 'Image.Image']:
+        """字形图集，第一次使用时创建"""
+        if self._atlas is None:
+            with self._lock:
+                if self._atlas is None:
+                    self._atlas = self._build_atlas()
+        return self._atlas
+
+    def render(self, code: str) -> 'Image.Image':
+        """绘制验证码图片
+
+        Args:
+            code: 验证码字符串，字符必须在字符集中
+
+        Returns:
+            Image: RGB图片
+        """
+        atlas = self.atlas
+        width, height = self.width, self.height
+        image = Image.new('RGB', (width, height), (255, 255, 255))
+
+        # 按字形蒙版贴上字符，每个字符使用不同的颜色和轻微的旋转
+        x = (width - self.font_size * len(code)) // 2
+        y = (height - self.font_size) // 2
+        for i, char in enumerate(code):
+            color = (random.randint(30, 100), random.randint(30, 100), random.randint(30, 100))
+            image.paste(color, (x + i * self.font_size, y), atlas[(char, random.choice(self.rotations))])
+
+        # 添加干扰线
+        draw = ImageDraw.Draw(image)
+        for _ in range(CAPTCHA_NOISE_LINES):
+            line_color = (random.randint(0, 200), random.randint(0, 200), random.randint(0, 200))
+            draw.line([(random.randint(0, width), random.randint(0, height)),
+                       (random.randint(0, width), random.randint(0, height))],
+                      fill=line_color, width=random.randint(1, 2))
+
+        # 添加干扰点：随机字节生成的蒙版选出像素，颜色取自预先生成的随机颜色图
+        mask = Image.frombytes('L', (width, height), random.randbytes(width * height)).point(self._dot_lut)
+        image.paste(self._dot_colors, (0, 0), mask)
+        return image
+
+    def generate(self) -> Tuple[str, bytes]:
+        """生成随机验证码并编码为PNG
+
+        Returns:
+            tuple: (验证码字符串, PNG图片字节)
+        """
+        code = ''.join(random.choice(self.chars) for _ in range(self.length))
+        img_io = io.BytesIO()
+        self.render(code).save(img_io, format='PNG', compress_level=CAPTCHA_PNG_COMPRESS_LEVEL)
+        return code, img_io.getvalue()
+
+
+_captcha_renderer: Optional[CaptchaRenderer] = None
+_captcha_renderer_lock = threading.Lock()
+
+
+def get_captcha_renderer() -> CaptchaRenderer:
+    """获取当前进程的验证码渲染器（字体和字形图集只加载一次）"""
+    global _captcha_renderer
+    if _captcha_renderer is None:
+        with _captcha_renderer_lock:
+            if _captcha_renderer is None:
+                _captcha_renderer = CaptchaRenderer()
+    return _captcha_renderer
@@ -0,0 +1,261 @@
+"""无状态图形验证码令牌
+
+默认情况下/captcha把答案、时间戳和尝试次数写入Flask的cookie会话，每次获取图片都会返回Set-Cookie。
+启用CAPTCHA_TOKEN_ENABLED后，随图片一起签发一个令牌：
+
+    <过期时间(8位十六进制)>.<随机数(16位十六进制)>.<签发标记(16位十六进制)>.<MAC(32位十六进制)>
+
+签发标记 = HMAC-SHA256(SECRET_KEY, "captcha-nonce:<过期时间>:<随机数>")，证明过期时间和随机数由本服务签发；
+MAC = HMAC-SHA256(SECRET_KEY, "captcha:<大写答案>:<过期时间>:<随机数>")，令牌本身不包含答案。
+登录时用提交的答案重新计算MAC即可校验，不需要读写会话。
+
+每个令牌只能校验一次：签发标记有效、未过期的令牌无论答案是否正确都会记录其随机数，再次提交时拒绝。
+伪造的令牌（过期时间超出有效期、格式不符或签发标记错误）在记录随机数之前就被拒绝，不会占用随机数集合。
+随机数记录在进程内的有界集合中（按过期时间自动清理），多worker部署时可配置
+CAPTCHA_NONCE_REDIS_URL使用Redis的SET NX在各worker间共享。
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.utils import _get_state_secret
+from app.utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 默认令牌有效期（秒），与会话模式的验证码有效期一致
+DEFAULT_CAPTCHA_TOKEN_MAX_AGE = 300
+
+# 进程内最多记录的随机数数量
+DEFAULT_CAPTCHA_NONCE_MAX_KEYS = 100000
+
+CAPTCHA_TOKEN_MAC_LENGTH = 32
+
+CAPTCHA_TOKEN_NONCE_LENGTH = 16
+
+CAPTCHA_TOKEN_TAG_LENGTH = 16
+
+# 允许的各worker之间的时钟偏差（秒），过期时间晚于当前时间+有效期+偏差的令牌不可能由本服务签发
+CAPTCHA_TOKEN_CLOCK_SKEW = 30
+
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+# Redis中随机数键的前缀
+CAPTCHA_NONCE_KEY_PREFIX = 'captcha:nonce:'
+
+
+def _captcha_mac(secret: bytes, answer: str, expires_at: str, nonce: str) -> str:
+    message = f"captcha:{answer.strip().upper()}:{expires_at}:{nonce}"
+    return hmac.new(secret, message.encode('utf-8'), hashlib.sha256).hexdigest()[:CAPTCHA_TOKEN_MAC_LENGTH]
+
+
+def _captcha_tag(secret: bytes, expires_at: str, nonce: str) -> str:
+    message = f"captcha-nonce:{expires_at}:{nonce}"
+    return hmac.new(secret, message.encode('utf-8'), hashlib.sha256).hexdigest()[:CAPTCHA_TOKEN_TAG_LENGTH]
+
+
+def _is_hex(value: str, length: int) -> bool:
+    return len(value) == length and set(value) <= HEX_DIGITS
+
+
+class MemoryNonceStore:
+    """进程内的已使用随机数集合"""
+
+    def __init__(self, max_keys: int = DEFAULT_CAPTCHA_NONCE_MAX_KEYS):
+        """
+        Args:
+            max_keys: 最多记录的随机数数量，超出时淘汰最早记录的随机数
+        """
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # 随机数 -> 过期时间，令牌有效期固定，插入顺序即过期顺序
+        self._seen: OrderedDict = OrderedDict()
+
+    def add(self, nonce: str, expires_at: float) -> bool:
+        """记录随机数
+
+        Args:
+            nonce: 随机数
+            expires_at: 令牌过期时间戳，过期后不再需要记录
+
+        Returns:
+            bool: 首次记录返回True，已记录过返回False
+        """
+        now = time.time()
+        with self._lock:
+            while self._seen:
+                oldest, oldest_expiry = next(iter(self._seen.items()))
+                if oldest_expiry > now and len(self._seen) < self.max_keys:
+                    break
+                del self._seen[oldest]
+            if nonce in self._seen:
+                return False
+            self._seen[nonce] = expires_at
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._seen)
+
+
+class RedisNonceStore:
+    """Redis中的已使用随机数集合，多个worker共享"""
+
+    def __init__(self, client=None, url: Optional[str] = None):
+        """
+        Args:
+            client: Redis客户端
+            url: Redis地址，未传入client时使用
+        """
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("redis库未安装，无法使用Redis记录验证码随机数")
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def add(self, nonce: str, expires_at: float) -> bool:
+        """记录随机数，键在令牌过期后自动删除"""
+        ttl_ms = max(1, int((expires_at - time.time()) * 1000))
+        return bool(self.client.set(CAPTCHA_NONCE_KEY_PREFIX + nonce, 1, nx=True, px=ttl_ms))
+
+
+class CaptchaTokenSigner:
+    """签发和校验验证码令牌"""
+
+    def __init__(self, nonce_store=None, max_age: int = DEFAULT_CAPTCHA_TOKEN_MAX_AGE):
+        """
+        Args:
+            nonce_store: 已使用随机数集合，默认使用进程内集合
+            max_age: 令牌有效期（秒）
+        """
+        self.nonce_store = nonce_store if nonce_store is not None else MemoryNonceStore()
+        self.max_age = max_age
+        self._stats = {'issued': 0, 'verified': 0, 'rejected': 0, 'replayed': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def issue(self, answer: str, now: Optional[float] = None) -> str:
+        """为验证码答案签发令牌
+
+        Args:
+            answer: 验证码答案
+            now: 签发时间戳，默认为当前时间
+
+        Returns:
+            str: 令牌
+        """
+        expires_at = f"{int((now if now is not None else time.time()) + self.max_age):08x}"
+        nonce = secrets.token_hex(CAPTCHA_TOKEN_NONCE_LENGTH // 2)
+        secret = _get_state_secret()
+        self._count('issued')
+        return (f"{expires_at}.{nonce}.{_captcha_tag(secret, expires_at, nonce)}."
+                f"{_captcha_mac(secret, answer, expires_at, nonce)}")
+
+    def verify(self, token: Optional[str], answer: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """校验令牌和答案，令牌只能使用一次
+
+        Args:
+            token: 提交的令牌
+            answer: 提交的验证码答案
+
+        Returns:
+            tuple: (是否通过, 错误信息)
+        """
+        parts = token.split('.') if isinstance(token, str) else []
+        if (len(parts) != 4 or not _is_hex(parts[0], 8) or not _is_hex(parts[1], CAPTCHA_TOKEN_NONCE_LENGTH)
+                or not _is_hex(parts[2], CAPTCHA_TOKEN_TAG_LENGTH) or not _is_hex(parts[3], CAPTCHA_TOKEN_MAC_LENGTH)):
+            self._count('rejected')
+            return False, '验证码已失效，请刷新重试'
+        expires_at, nonce, tag, mac = parts
+        expiry = int(expires_at, 16)
+        now = time.time()
+        if expiry < now:
+            self._count('rejected')
+            return False, '验证码已过期'
+        secret = _get_state_secret()
+        # 先确认过期时间和随机数由本服务签发，伪造的令牌不能写入随机数集合
+        if expiry > now + self.max_age + CAPTCHA_TOKEN_CLOCK_SKEW or \
+                not hmac.compare_digest(_captcha_tag(secret, expires_at, nonce), tag):
+            self._count('rejected')
+            return False, '验证码已失效，请刷新重试'
+
+        # 答案错误也会消耗令牌，避免对同一令牌反复猜测；随机数集合不可用时只校验MAC和有效期
+        try:
+            first_use = self.nonce_store.add(nonce, expiry)
+        except Exception as e:
+            logger.error(f"记录验证码随机数失败: {e}")
+            first_use = True
+        if not first_use:
+            self._count('replayed')
+            return False, '验证码已使用，请刷新重试'
+        if not answer or not hmac.compare_digest(_captcha_mac(secret, answer, expires_at, nonce), mac):
+            self._count('rejected')
+            return False, '验证码错误'
+        self._count('verified')
+        return True, None
+
+    def stats(self) -> Dict[str, int]:
+        """获取统计信息：签发、校验通过、拒绝、重放次数"""
+        with self._lock:
+            return dict(self._stats)
+
+
+def captcha_image_data_uri(png_bytes: bytes) -> str:
+    """把验证码PNG转换为可直接嵌入页面的data URI"""
+    return 'data:image/png;base64,' + base64.b64encode(png_bytes).decode('ascii')
+
+
+def captcha_token_enabled() -> bool:
+    """是否启用无状态验证码令牌"""
+    enabled = get_config_manager().get('CAPTCHA_TOKEN_ENABLED', False)
+    return str(enabled).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+_captcha_token_signer: Optional[CaptchaTokenSigner] = None
+_captcha_token_signer_lock = threading.Lock()
+
+
+def create_captcha_token_signer() -> CaptchaTokenSigner:
+    """根据配置创建验证码令牌签发器"""
+    config_manager = get_config_manager()
+    redis_url = config_manager.get('CAPTCHA_NONCE_REDIS_URL')
+    if redis_url:
+        nonce_store = RedisNonceStore(url=redis_url)
+    else:
+        nonce_store = MemoryNonceStore(
+            max_keys=int(config_manager.get('CAPTCHA_NONCE_MAX_KEYS', DEFAULT_CAPTCHA_NONCE_MAX_KEYS)))
+    return CaptchaTokenSigner(
+        nonce_store=nonce_store,
+        max_age=int(config_manager.get('CAPTCHA_TOKEN_MAX_AGE', DEFAULT_CAPTCHA_TOKEN_MAX_AGE))
+    )
+
+
+def get_captcha_token_signer() -> CaptchaTokenSigner:
+    """获取当前进程的验证码令牌签发器"""
+    global _captcha_token_signer
+    if _captcha_token_signer is None:
+        with _captcha_token_signer_lock:
+            if _captcha_token_signer is None:
+                _captcha_token_signer = create_captcha_token_signer()
+    return _captcha_token_signer
+
+
+def set_captcha_token_signer(signer: Optional[CaptchaTokenSigner]) -> None:
+    """替换当前进程的验证码令牌签发器（用于测试），为None时下次获取会按配置重新创建"""
+    global _captcha_token_signer
+    _captcha_token_signer = signer
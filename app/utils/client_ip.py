@@ -0,0 +1,118 @@
+"""客户端IP解析
+
+只信任来自可信代理（TRUSTED_PROXIES配置的CIDR列表）的转发头，不发起任何网络请求：
+
+1. 直连对端不是可信代理时，直接使用对端地址，忽略所有转发头（客户端可以任意伪造）
+2. 对端是可信代理时，从右向左遍历 X-Forwarded-For + 对端地址，跳过可信代理，第一个非可信地址即客户端IP
+3. 没有X-Forwarded-For时，依次使用可信代理设置的 X-Real-IP、CF-Connecting-IP
+4. 以上都无法得到有效地址时，使用对端地址
+
+使用Cloudflare等CDN时，需要将CDN的回源地址段加入TRUSTED_PROXIES。
+"""
+import ipaddress
+import logging
+from functools import lru_cache
+from typing import Mapping, Optional, Sequence, Tuple, Union
+
+from flask import request
+
+from app.utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+# 默认只信任本机的反向代理
+DEFAULT_TRUSTED_PROXIES = '127.0.0.1/32,::1/128'
+
+# 可信代理设置的单值客户端IP头，仅在没有X-Forwarded-For时使用
+SINGLE_IP_HEADERS = ('X-Real-IP', 'CF-Connecting-IP')
+
+
+@lru_cache(maxsize=16)
+def parse_trusted_proxies(value: Optional[str]) -> Tuple[IPNetwork, ...]:
+    """解析逗号分隔的可信代理CIDR列表，忽略无效项
+
+    Args:
+        value: 例如 "127.0.0.1/32, 10.0.0.0/8"
+
+    Returns:
+        tuple: 网段列表
+    """
+    networks = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"忽略无效的可信代理配置: {item}")
+    return tuple(networks)
+
+
+@lru_cache(maxsize=4096)
+def _parse_ip(value: str) -> Optional[IPAddress]:
+    """解析单个地址，兼容带端口的写法（1.2.3.4:5678、[::1]:5678），无效时返回None"""
+    value = value.strip()
+    if value.startswith('['):
+        value = value[1:value.find(']')] if ']' in value else value[1:]
+    elif value.count(':') == 1:
+        value = value.split(':', 1)[0]
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    # IPv4映射的IPv6地址（::ffff:1.2.3.4）按IPv4处理
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+def _is_trusted(address: IPAddress, trusted: Sequence[IPNetwork]) -> bool:
+    return any(address.version == network.version and address in network for network in trusted)
+
+
+def resolve_client_ip(remote_addr: Optional[str], headers: Mapping[str, str],
+                      trusted: Sequence[IPNetwork]) -> Optional[str]:
+    """根据直连对端地址和请求头解析客户端IP
+
+    Args:
+        remote_addr: 直连对端地址
+        headers: 请求头
+        trusted: 可信代理网段
+
+    Returns:
+        str: 客户端IP
+    """
+    peer = _parse_ip(remote_addr) if remote_addr else None
+    if peer is None or not _is_trusted(peer, trusted):
+        return remote_addr
+
+    forwarded_for = headers.get('X-Forwarded-For')
+    if forwarded_for:
+        client = peer
+        for hop in reversed(forwarded_for.split(',')):
+            address = _parse_ip(hop)
+            if address is None:
+                # 无法解析的地址之前的内容不可信，使用最后一个可信代理记录的地址
+                break
+            client = address
+            if not _is_trusted(address, trusted):
+                break
+        return str(client)
+
+    for header in SINGLE_IP_HEADERS:
+        value = headers.get(header)
+        address = _parse_ip(value) if value else None
+        if address is not None:
+            return str(address)
+
+    return remote_addr
+
+
+def get_client_ip() -> Optional[str]:
+    """获取当前请求的客户端IP，可信代理通过TRUSTED_PROXIES配置"""
+    trusted = parse_trusted_proxies(get_config_manager().get('TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES))
+    return resolve_client_ip(request.remote_addr, request.headers, trusted)
@@ -0,0 +1,244 @@
+"""响应压缩
+
+auth蓝图返回的HTML页面有20-40KB（大部分是内联的标记和脚本），/api/*的JSON响应也都未经压缩直接发送。
+CompressionMiddleware包装Flask的wsgi_app，按Accept-Encoding协商br或gzip（需要安装brotli才会使用br）：
+
+- 只压缩文本类响应（HTML、JSON、CSS、JS、SVG等），PNG验证码等已压缩的格式、已带Content-Encoding的响应
+  （如静态路由返回的预压缩文件）、小于min_size的响应、没有Content-Length的流式响应（SSE）原样返回
+- 压缩结果按(编码, 响应体摘要)放入有上限的LRU缓存，内容完全相同的响应（如同一个登录页）只压缩一次
+- 压缩后设置Content-Encoding、Content-Length、Vary: Accept-Encoding，强ETag改为弱ETag
+
+要求被包装的应用在返回响应体之前调用start_response，Flask/Werkzeug的响应都是如此。
+"""
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 默认最小压缩字节数，更小的响应压缩收益不抵开销
+DEFAULT_COMPRESSION_MIN_SIZE = 500
+
+# 默认gzip压缩级别
+DEFAULT_COMPRESSION_GZIP_LEVEL = 6
+
+# 默认brotli压缩质量，动态响应使用较低的质量换取速度
+DEFAULT_COMPRESSION_BROTLI_QUALITY = 4
+
+# 默认压缩结果缓存条数，0为不缓存
+DEFAULT_COMPRESSION_CACHE_SIZE = 256
+
+# 超过该字节数的响应不缓存压缩结果
+MAX_CACHED_BODY = 256 * 1024
+
+# 超过该字节数的响应不压缩，避免把大文件读入内存
+MAX_COMPRESSED_BODY = 4 * 1024 * 1024
+
+# 可压缩的非text/*类型
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+
+# 不压缩的text/*类型：SSE需要逐条发送
+UNCOMPRESSIBLE_TEXT_TYPES = {'text/event-stream'}
+
+# 不压缩的状态码：无响应体、未修改、部分内容
+SKIP_STATUS = {204, 206, 304}
+
+
+def is_compressible(mimetype: str) -> bool:
+    """响应类型是否值得压缩"""
+    mimetype = mimetype.split(';', 1)[0].strip().lower()
+    if mimetype.startswith('text/'):
+        return mimetype not in UNCOMPRESSIBLE_TEXT_TYPES
+    return mimetype in COMPRESSIBLE_TYPES or mimetype.endswith(('+json', '+xml'))
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """按Accept-Encoding选择压缩编码，质量相同时优先br
+
+    Args:
+        accept_encoding: 请求头Accept-Encoding
+
+    Returns:
+        str: 'br'、'gzip'，客户端都不接受时返回None
+    """
+    if not accept_encoding:
+        return None
+    accept = parse_accept_header(accept_encoding)
+    gzip_quality = accept['gzip']
+    brotli_quality = accept['br'] if BROTLI_AVAILABLE else 0
+    if brotli_quality and brotli_quality >= gzip_quality:
+        return 'br'
+    if gzip_quality:
+        return 'gzip'
+    return None
+
+
+class CompressionMiddleware:
+    """按Accept-Encoding压缩响应的WSGI中间件"""
+
+    def __init__(self, app, min_size: int = DEFAULT_COMPRESSION_MIN_SIZE,
+                 gzip_level: int = DEFAULT_COMPRESSION_GZIP_LEVEL,
+                 brotli_quality: int = DEFAULT_COMPRESSION_BROTLI_QUALITY,
+                 cache_size: int = DEFAULT_COMPRESSION_CACHE_SIZE):
+        """
+        Args:
+            app: 被包装的WSGI应用
+            min_size: 最小压缩字节数
+            gzip_level: gzip压缩级别（1-9）
+            brotli_quality: brotli压缩质量（0-11）
+            cache_size: 压缩结果缓存条数，0为不缓存
+        """
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'compressed': 0, 'skipped': 0, 'cache_hits': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        """压缩响应体，内容相同的响应直接使用缓存的结果"""
+        key = None
+        if self.cache_size and len(body) <= MAX_CACHED_BODY:
+            key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self._stats['cache_hits'] += 1
+                    return cached
+
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+        if key is not None:
+            with self._lock:
+                self._cache[key] = compressed
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return compressed
+
+    def _should_compress(self, environ: Dict[str, Any], status: str, headers: Headers) -> bool:
+        """根据请求和响应头判断是否可以压缩（不看响应体）"""
+        if environ.get('REQUEST_METHOD') == 'HEAD' or int(status.split(' ', 1)[0]) in SKIP_STATUS:
+            return False
+        if 'Content-Encoding' in headers or 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        if not is_compressible(headers.get('Content-Type', '')):
+            return False
+        # 没有Content-Length的是流式响应，不能缓冲
+        length = headers.get('Content-Length', type=int)
+        return length is not None and self.min_size <= length <= MAX_COMPRESSED_BODY
+
+    def __call__(self, environ, start_response):
+        captured: Dict[str, Any] = {}
+        written: List[bytes] = []
+
+        def capture(status, headers, exc_info=None):
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+            return written.append
+
+        app_iter = self.app(environ, capture)
+        status = captured['status']
+        headers = Headers(captured['headers'])
+
+        if not self._should_compress(environ, status, headers):
+            self._count('skipped')
+            start_response(status, captured['headers'], captured['exc_info'])
+            if written:
+                return written + _drain(app_iter)
+            return app_iter
+
+        body = b''.join(written) + b''.join(_drain(app_iter))
+        _add_vary(headers)
+        encoding = negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or len(body) < self.min_size:
+            self._count('skipped')
+            headers['Content-Length'] = str(len(body))
+            start_response(status, headers.to_wsgi_list(), captured['exc_info'])
+            return [body]
+
+        compressed = self.compress(body, encoding)
+        with self._lock:
+            self._stats['compressed'] += 1
+            self._stats['bytes_in'] += len(body)
+            self._stats['bytes_out'] += len(compressed)
+        headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(compressed))
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            headers['ETag'] = 'W/' + etag
+        start_response(status, headers.to_wsgi_list(), captured['exc_info'])
+        return [compressed]
+
+    def stats(self) -> Dict[str, Any]:
+        """获取压缩统计（压缩、跳过、缓存命中的响应数，压缩前后字节数，缓存条数）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cache_entries'] = len(self._cache)
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else 0
+        return stats
+
+
+def _drain(app_iter) -> List[bytes]:
+    """读取完整的响应体并关闭迭代器"""
+    try:
+        return list(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+
+def _add_vary(headers: Headers) -> None:
+    """在Vary中加入Accept-Encoding，压缩与否都要加上，缓存才会按编码分别保存"""
+    values = [value.strip() for value in headers.get('Vary', '').split(',') if value.strip()]
+    if 'accept-encoding' not in (value.lower() for value in values) and '*' not in values:
+        headers['Vary'] = ', '.join(values + ['Accept-Encoding'])
+
+
+def init_compression(app) -> Optional[CompressionMiddleware]:
+    """按配置用压缩中间件包装app.wsgi_app
+
+    Args:
+        app: Flask应用
+
+    Returns:
+        CompressionMiddleware: 压缩中间件，COMPRESSION_ENABLED关闭时返回None
+    """
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return None
+    middleware = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=app.config.get('COMPRESSION_MIN_SIZE', DEFAULT_COMPRESSION_MIN_SIZE),
+        gzip_level=app.config.get('COMPRESSION_GZIP_LEVEL', DEFAULT_COMPRESSION_GZIP_LEVEL),
+        brotli_quality=app.config.get('COMPRESSION_BROTLI_QUALITY', DEFAULT_COMPRESSION_BROTLI_QUALITY),
+        cache_size=app.config.get('COMPRESSION_CACHE_SIZE', DEFAULT_COMPRESSION_CACHE_SIZE),
+    )
+    app.wsgi_app = middleware
+    if not BROTLI_AVAILABLE:
+        logger.info("brotli未安装，响应压缩只使用gzip")
+    return middleware
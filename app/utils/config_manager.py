@@ -1,5 +1,6 @@
 """配置管理器模块"""
 import os
+from collections.abc import Mapping
 from typing import Any, Dict, Optional
 import logging
 
@@ -24,7 +25,8 @@ class ConfigManager:
         
         优先级：
         1. 环境变量
-        2. Flask配置对象
+        2. Flask配置对象（app.config按键读取，配置类按属性读取），包括配置类中的默认值和各环境的覆盖值，
+           例如DevelopmentConfig的SCAN_STATE_BACKEND、TestingConfig的EXPIRY_REAPER_ENABLED
         3. 默认值
         
         Args:
@@ -43,9 +45,12 @@ class ConfigManager:
         # 从环境变量获取
         value = os.environ.get(key)
         
-        # 如果环境变量不存在，尝试从Flask配置对象获取
+        # 如果环境变量不存在，尝试从Flask配置对象获取（app.config为字典，配置类为属性）
         if value is None and self.config_obj:
-            value = getattr(self.config_obj, key, default)
+            if isinstance(self.config_obj, Mapping):
+                value = self.config_obj.get(key, default)
+            else:
+                value = getattr(self.config_obj, key, default)
         elif value is None:
             value = default
         
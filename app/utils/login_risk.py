@@ -0,0 +1,171 @@
+"""登录风险评估（自适应图形验证码）
+
+大部分登录来自从不失败的正常客户端，每次都生成PIL验证码图片并写入session没有必要。
+自适应模式下，只有当某个IP或登录账号在时间窗口内的失败次数达到阈值后才要求图形验证码，
+正常登录既不渲染验证码图片，也不修改session中的验证码字段。
+
+失败次数使用滑动窗口计数（当前窗口与上一窗口按时间比例加权），每个键只保存三个数字，
+键的数量有上限，超出时淘汰最久未更新的键。计数保存在进程内，多worker部署时各自统计。
+
+通过配置项LOGIN_CAPTCHA_MODE选择：adaptive（默认，按风险要求验证码）或always（每次都要求验证码）。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.utils.config_manager import get_config_manager
+
+# 默认阈值：窗口内失败3次后要求验证码
+DEFAULT_CAPTCHA_FAILURE_THRESHOLD = 3
+
+# 默认时间窗口（秒）
+DEFAULT_CAPTCHA_FAILURE_WINDOW = 900
+
+# 最多跟踪的键数量
+DEFAULT_LOGIN_RISK_MAX_KEYS = 100000
+
+
+class LoginRiskTracker:
+    """按IP和登录账号统计登录失败次数，决定是否需要图形验证码"""
+
+    def __init__(self, threshold: int = DEFAULT_CAPTCHA_FAILURE_THRESHOLD,
+                 window: float = DEFAULT_CAPTCHA_FAILURE_WINDOW,
+                 max_keys: int = DEFAULT_LOGIN_RISK_MAX_KEYS, always: bool = False):
+        """
+        Args:
+            threshold: 窗口内失败次数达到该值后要求验证码
+            window: 时间窗口（秒）
+            max_keys: 最多跟踪的键数量
+            always: 为True时每次登录都要求验证码（关闭自适应）
+        """
+        self.threshold = threshold
+        self.window = window
+        self.max_keys = max_keys
+        self.always = always
+        self._lock = threading.Lock()
+        # 键 -> [当前窗口开始时间, 上一窗口失败次数, 当前窗口失败次数]
+        self._counters: OrderedDict = OrderedDict()
+        self._stats = {'logins': 0, 'captcha_required': 0, 'failures': 0}
+
+    @staticmethod
+    def _keys(ip: Optional[str], username: Optional[str]):
+        keys = []
+        if ip:
+            keys.append(f"ip:{ip}")
+        if username:
+            keys.append(f"user:{username.strip().lower()}")
+        return keys
+
+    def _roll(self, counter, now) -> None:
+        """按当前时间滚动窗口"""
+        elapsed = now - counter[0]
+        if elapsed >= 2 * self.window:
+            counter[:] = [now, 0, 0]
+        elif elapsed >= self.window:
+            counter[:] = [counter[0] + self.window, counter[2], 0]
+
+    def _estimate(self, key, now) -> float:
+        """估算窗口内的失败次数，需持有锁"""
+        counter = self._counters.get(key)
+        if counter is None:
+            return 0
+        self._roll(counter, now)
+        weight = 1 - (now - counter[0]) / self.window
+        return counter[1] * weight + counter[2]
+
+    def _prune(self, now) -> None:
+        """清理已过期的键，超出容量时淘汰最久未更新的键，需持有锁"""
+        while self._counters:
+            key, counter = next(iter(self._counters.items()))
+            if now - counter[0] < 2 * self.window and len(self._counters) <= self.max_keys:
+                break
+            del self._counters[key]
+
+    def captcha_required(self, ip: Optional[str], username: Optional[str] = None) -> bool:
+        """判断本次登录是否需要图形验证码
+
+        Args:
+            ip: 客户端IP
+            username: 登录账号，展示登录页时未知
+
+        Returns:
+            bool: 是否需要验证码
+        """
+        if self.always:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            return any(self._estimate(key, now) >= self.threshold for key in self._keys(ip, username))
+
+    def record_attempt(self, captcha_required: bool) -> None:
+        """记录一次登录提交，用于统计需要验证码的比例"""
+        with self._lock:
+            self._stats['logins'] += 1
+            if captcha_required:
+                self._stats['captcha_required'] += 1
+
+    def record_failure(self, ip: Optional[str], username: Optional[str] = None) -> None:
+        """记录一次登录失败（验证码错误、密码错误、用户不存在）"""
+        now = time.monotonic()
+        with self._lock:
+            self._stats['failures'] += 1
+            for key in self._keys(ip, username):
+                counter = self._counters.get(key)
+                if counter is None:
+                    counter = self._counters[key] = [now, 0, 0]
+                else:
+                    self._roll(counter, now)
+                    self._counters.move_to_end(key)
+                counter[2] += 1
+            self._prune(now)
+
+    def record_success(self, username: Optional[str]) -> None:
+        """登录成功后清除该账号的失败计数
+
+        IP的失败计数不清除，避免攻击者用自己的账号登录成功来重置IP计数。
+        """
+        if not username:
+            return
+        with self._lock:
+            self._counters.pop(f"user:{username.strip().lower()}", None)
+
+    def stats(self) -> Dict:
+        """获取统计信息：登录次数、需要验证码的次数及比例、失败次数、跟踪的键数量"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tracked_keys'] = len(self._counters)
+        stats['captcha_ratio'] = stats['captcha_required'] / stats['logins'] if stats['logins'] else 0.0
+        return stats
+
+
+_login_risk_tracker: Optional[LoginRiskTracker] = None
+_login_risk_tracker_lock = threading.Lock()
+
+
+def create_login_risk_tracker() -> LoginRiskTracker:
+    """根据配置创建登录风险跟踪器"""
+    config_manager = get_config_manager()
+    mode = (config_manager.get('LOGIN_CAPTCHA_MODE', 'adaptive') or 'adaptive').lower()
+    return LoginRiskTracker(
+        threshold=int(config_manager.get('LOGIN_CAPTCHA_FAILURE_THRESHOLD', DEFAULT_CAPTCHA_FAILURE_THRESHOLD)),
+        window=float(config_manager.get('LOGIN_CAPTCHA_FAILURE_WINDOW', DEFAULT_CAPTCHA_FAILURE_WINDOW)),
+        max_keys=int(config_manager.get('LOGIN_RISK_MAX_KEYS', DEFAULT_LOGIN_RISK_MAX_KEYS)),
+        always=mode == 'always'
+    )
+
+
+def get_login_risk_tracker() -> LoginRiskTracker:
+    """获取当前进程的登录风险跟踪器"""
+    global _login_risk_tracker
+    if _login_risk_tracker is None:
+        with _login_risk_tracker_lock:
+            if _login_risk_tracker is None:
+                _login_risk_tracker = create_login_risk_tracker()
+    return _login_risk_tracker
+
+
+def set_login_risk_tracker(tracker: Optional[LoginRiskTracker]) -> None:
+    """替换当前进程的登录风险跟踪器（用于测试），为None时下次获取会按配置重新创建"""
+    global _login_risk_tracker
+    _login_risk_tracker = tracker
@@ -0,0 +1,119 @@
+"""SMTP邮件发送
+
+send_smtp_email按MAIL_*配置建立SMTP连接并发送一封HTML邮件，失败时抛出异常，由调用方决定是否重试。
+deliver_email在SMTP_POOL_SIZE大于0时改用进程内的SMTP连接池（见app.utils.smtp_pool），复用已登录的连接。
+dispatch_email是业务代码发送邮件的入口：启用EMAIL_OUTBOX_ENABLED（默认）时只把邮件写入email_outbox表后立即返回，
+由后台发送线程投递（见app.models.email_outbox）；关闭时在当前请求中同步发送。
+"""
+import logging
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, Optional
+
+from app.utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+# 默认SMTP连接和读写超时（秒）
+DEFAULT_MAIL_TIMEOUT = 10
+
+
+def _flag(value: Any) -> bool:
+    """读取布尔型配置，兼容环境变量中的字符串值"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def get_smtp_settings() -> Dict[str, Any]:
+    """从配置读取SMTP连接参数"""
+    config_manager = get_config_manager()
+    username = config_manager.get('MAIL_USERNAME')
+    return {
+        'server': config_manager.get('MAIL_SERVER'),
+        'port': int(config_manager.get('MAIL_PORT', 587) or 587),
+        'username': username,
+        'password': config_manager.get('MAIL_PASSWORD'),
+        'sender': config_manager.get('MAIL_DEFAULT_SENDER') or username,
+        'use_tls': _flag(config_manager.get('MAIL_USE_TLS', True)),
+        'use_ssl': _flag(config_manager.get('MAIL_USE_SSL', False)),
+        'timeout': float(config_manager.get('MAIL_TIMEOUT', DEFAULT_MAIL_TIMEOUT) or DEFAULT_MAIL_TIMEOUT),
+    }
+
+
+def build_email_message(sender: str, recipient: str, subject: str, content: str) -> MIMEMultipart:
+    """构造HTML邮件"""
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    msg.attach(MIMEText(content, 'html', 'utf-8'))
+    return msg
+
+
+def send_smtp_email(recipient: str, subject: str, content: str, settings: Optional[Dict[str, Any]] = None) -> None:
+    """建立SMTP连接并发送一封邮件
+
+    Args:
+        recipient: 收件人
+        subject: 主题
+        content: HTML正文
+        settings: SMTP连接参数，默认使用get_smtp_settings()
+
+    Raises:
+        smtplib.SMTPException, OSError: 连接、认证或发送失败
+    """
+    settings = settings or get_smtp_settings()
+    smtp_class = smtplib.SMTP_SSL if settings['use_ssl'] else smtplib.SMTP
+    with smtp_class(settings['server'], settings['port'], timeout=settings['timeout']) as server:
+        if settings['use_tls'] and not settings['use_ssl']:
+            server.starttls()
+        if settings.get('username') and settings.get('password'):
+            server.login(settings['username'], settings['password'])
+        server.send_message(build_email_message(settings['sender'], recipient, subject, content))
+
+
+def deliver_email(recipient: str, subject: str, content: str) -> None:
+    """立即发送一封邮件，SMTP_POOL_SIZE大于0时复用连接池中已登录的连接
+
+    Raises:
+        smtplib.SMTPException, OSError: 发送失败
+    """
+    if int(get_config_manager().get('SMTP_POOL_SIZE', 2) or 0) > 0:
+        from app.utils.smtp_pool import get_smtp_transport
+        get_smtp_transport().send(recipient, subject, content)
+    else:
+        send_smtp_email(recipient, subject, content)
+
+
+def email_outbox_enabled() -> bool:
+    """是否通过email_outbox表异步发送邮件"""
+    return _flag(get_config_manager().get('EMAIL_OUTBOX_ENABLED', True))
+
+
+def dispatch_email(recipient: str, subject: str, content: str) -> bool:
+    """发送邮件，启用发件箱时写入email_outbox后立即返回
+
+    Args:
+        recipient: 收件人
+        subject: 主题
+        content: HTML正文
+
+    Returns:
+        bool: 是否已写入发件箱（同步发送时为是否发送成功）
+    """
+    if email_outbox_enabled():
+        from app.models.email_outbox import enqueue_email
+        try:
+            enqueue_email(recipient, subject, content)
+            return True
+        except Exception as e:
+            logger.error(f"邮件写入发件箱失败 - 收件人: {recipient}, 错误: {e}")
+            return False
+    try:
+        deliver_email(recipient, subject, content)
+        return True
+    except Exception as e:
+        logger.error(f"发送邮件失败 - 收件人: {recipient}, 错误: {e}")
+        return False
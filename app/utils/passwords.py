@@ -0,0 +1,361 @@
+"""密码哈希
+
+支持的存储格式（user.password列）：
+- scrypt$n=16384,r=8,p=1$<salt>$<hash>        默认，内存困难型KDF
+- pbkdf2_sha256$600000$<salt>$<hash>           无法使用scrypt（OpenSSL不支持）时使用
+- 64位十六进制字符串                             历史的无盐SHA-256，只用于校验，登录成功后会重新哈希
+
+参数编码在哈希值中，调整成本参数后旧哈希仍可校验，并在下次登录成功时按新参数重新哈希。
+
+哈希计算放在有界线程池中执行（hashlib的scrypt/pbkdf2_hmac计算时会释放GIL），
+同时进行的哈希计算数量不超过PASSWORD_HASH_WORKERS，不会占满所有请求线程的CPU。
+
+成本参数可通过校准命令按目标耗时选择：
+    python -m app.utils.passwords --target-ms 250
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from app.utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+# 默认scrypt参数（约16MB内存）
+DEFAULT_SCRYPT_N = 2 ** 14
+DEFAULT_SCRYPT_R = 8
+DEFAULT_SCRYPT_P = 1
+
+# 默认PBKDF2-SHA256迭代次数
+DEFAULT_PBKDF2_ITERATIONS = 600000
+
+# 盐和派生密钥长度（字节）
+SALT_LENGTH = 16
+KEY_LENGTH = 32
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+
+class PasswordHasher:
+    """密码哈希算法基类"""
+
+    algorithm = ''
+
+    def encode(self, password: str, salt: Optional[bytes] = None) -> str:
+        """计算密码哈希，返回带算法和参数的存储格式"""
+        raise NotImplementedError
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """校验密码与存储的哈希是否匹配"""
+        raise NotImplementedError
+
+    def params(self) -> Dict[str, int]:
+        """当前成本参数"""
+        return {}
+
+    def needs_update(self, encoded: str) -> bool:
+        """存储的哈希是否不是当前算法和参数生成的"""
+        return True
+
+
+class ScryptHasher(PasswordHasher):
+    """scrypt哈希"""
+
+    algorithm = 'scrypt'
+
+    def __init__(self, n: int = DEFAULT_SCRYPT_N, r: int = DEFAULT_SCRYPT_R, p: int = DEFAULT_SCRYPT_P):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        # scrypt需要约128*n*r字节内存，maxmem需大于该值
+        maxmem = 128 * r * (n + p + 2) + 1024 * 1024
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=maxmem, dklen=KEY_LENGTH)
+
+    @staticmethod
+    def _parse(encoded: str) -> Tuple[Dict[str, int], bytes, bytes]:
+        _, params, salt, key = encoded.split('$')
+        parsed = dict(item.split('=') for item in params.split(','))
+        return {name: int(parsed[name]) for name in ('n', 'r', 'p')}, _b64decode(salt), _b64decode(key)
+
+    def encode(self, password, salt=None):
+        salt = salt or secrets.token_bytes(SALT_LENGTH)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return f"scrypt$n={self.n},r={self.r},p={self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password, encoded):
+        params, salt, key = self._parse(encoded)
+        return hmac.compare_digest(self._derive(password, salt, **params), key)
+
+    def params(self):
+        return {'n': self.n, 'r': self.r, 'p': self.p}
+
+    def needs_update(self, encoded):
+        try:
+            return not encoded.startswith('scrypt$') or self._parse(encoded)[0] != self.params()
+        except ValueError:
+            return True
+
+
+class Pbkdf2Hasher(PasswordHasher):
+    """PBKDF2-SHA256哈希"""
+
+    algorithm = 'pbkdf2_sha256'
+
+    def __init__(self, iterations: int = DEFAULT_PBKDF2_ITERATIONS):
+        self.iterations = iterations
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, iterations: int) -> bytes:
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations, dklen=KEY_LENGTH)
+
+    def encode(self, password, salt=None):
+        salt = salt or secrets.token_bytes(SALT_LENGTH)
+        key = self._derive(password, salt, self.iterations)
+        return f"pbkdf2_sha256${self.iterations}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password, encoded):
+        _, iterations, salt, key = encoded.split('$')
+        return hmac.compare_digest(self._derive(password, _b64decode(salt), int(iterations)), _b64decode(key))
+
+    def params(self):
+        return {'iterations': self.iterations}
+
+    def needs_update(self, encoded):
+        parts = encoded.split('$')
+        return len(parts) != 4 or parts[0] != self.algorithm or parts[1] != str(self.iterations)
+
+
+class LegacySha256Hasher(PasswordHasher):
+    """历史的无盐SHA-256哈希，只用于校验旧密码"""
+
+    algorithm = 'sha256'
+
+    @staticmethod
+    def matches_format(encoded: str) -> bool:
+        return len(encoded) == 64 and all(c in '0123456789abcdef' for c in encoded.lower())
+
+    def encode(self, password, salt=None):
+        raise ValueError("SHA-256不再用于生成新的密码哈希")
+
+    def verify(self, password, encoded):
+        return hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), encoded.lower())
+
+
+HASHERS = {
+    'scrypt': ScryptHasher,
+    'pbkdf2_sha256': Pbkdf2Hasher,
+}
+
+
+def identify_hasher(encoded: str) -> Optional[PasswordHasher]:
+    """根据存储格式识别哈希算法，无法识别时返回None"""
+    if not encoded:
+        return None
+    if encoded.startswith('scrypt$'):
+        return ScryptHasher()
+    if encoded.startswith('pbkdf2_sha256$'):
+        return Pbkdf2Hasher()
+    if LegacySha256Hasher.matches_format(encoded):
+        return LegacySha256Hasher()
+    return None
+
+
+def create_password_hasher(algorithm: Optional[str] = None) -> PasswordHasher:
+    """根据配置创建密码哈希算法
+
+    Args:
+        algorithm: 算法名称（scrypt/pbkdf2_sha256），为None时读取PASSWORD_HASHER配置
+
+    Returns:
+        PasswordHasher: 哈希算法实例
+    """
+    config_manager = get_config_manager()
+    algorithm = (algorithm or config_manager.get('PASSWORD_HASHER', 'scrypt') or 'scrypt').lower()
+
+    if algorithm == 'scrypt':
+        if hasattr(hashlib, 'scrypt'):
+            return ScryptHasher(
+                n=int(config_manager.get('PASSWORD_SCRYPT_N', DEFAULT_SCRYPT_N)),
+                r=int(config_manager.get('PASSWORD_SCRYPT_R', DEFAULT_SCRYPT_R)),
+                p=int(config_manager.get('PASSWORD_SCRYPT_P', DEFAULT_SCRYPT_P)),
+            )
+        logger.warning("当前OpenSSL不支持scrypt，改用PBKDF2-SHA256")
+    elif algorithm != 'pbkdf2_sha256':
+        logger.warning(f"未知的密码哈希算法: {algorithm}，改用PBKDF2-SHA256")
+
+    return Pbkdf2Hasher(iterations=int(config_manager.get('PASSWORD_PBKDF2_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS)))
+
+
+# 当前进程使用的哈希算法和线程池
+_password_hasher: Optional[PasswordHasher] = None
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """获取当前进程用于生成新哈希的算法"""
+    global _password_hasher
+    if _password_hasher is None:
+        with _lock:
+            if _password_hasher is None:
+                _password_hasher = create_password_hasher()
+    return _password_hasher
+
+
+def set_password_hasher(hasher: Optional[PasswordHasher]) -> None:
+    """替换当前进程的哈希算法（用于测试），为None时下次获取会按配置重新创建"""
+    global _password_hasher
+    _password_hasher = hasher
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        with _lock:
+            if _hash_executor is None:
+                workers = int(get_config_manager().get('PASSWORD_HASH_WORKERS', 0) or 0) or os.cpu_count() or 1
+                _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _hash_executor
+
+
+def hash_password(password: str) -> str:
+    """使用当前算法计算密码哈希（在哈希线程池中执行）
+
+    Args:
+        password: 明文密码
+
+    Returns:
+        str: 带算法和参数的哈希值
+    """
+    hasher = get_password_hasher()
+    return _get_executor().submit(hasher.encode, password).result()
+
+
+def verify_password(password: str, encoded: str) -> Tuple[bool, bool]:
+    """校验密码（在哈希线程池中执行）
+
+    Args:
+        password: 明文密码
+        encoded: 存储的哈希值
+
+    Returns:
+        tuple: (是否匹配, 是否需要按当前算法重新哈希)
+    """
+    if not password or not encoded:
+        return False, False
+    hasher = identify_hasher(encoded)
+    if hasher is None:
+        logger.warning("无法识别的密码哈希格式")
+        return False, False
+    try:
+        matched = _get_executor().submit(hasher.verify, password, encoded).result()
+    except (ValueError, TypeError, KeyError) as e:
+        logger.warning(f"密码哈希格式错误: {e}")
+        return False, False
+    return matched, matched and get_password_hasher().needs_update(encoded)
+
+
+def verify_user_password(user, password: str) -> bool:
+    """校验用户密码，旧算法或旧参数的哈希在校验成功后按当前算法重新哈希并写回user表
+
+    页面登录和/api/login都通过这里校验，历史的无盐SHA-256哈希无论从哪个入口登录都会被升级。
+
+    Args:
+        user: 用户对象（需要id、username、password属性）
+        password: 输入的明文密码
+
+    Returns:
+        bool: 密码是否正确
+    """
+    from app.models.db import db
+    from app.models.user_repository import get_user_repository
+
+    matched, needs_rehash = verify_password(password, user.password)
+    if matched and needs_rehash:
+        try:
+            encoded = hash_password(password)
+            get_user_repository().update_fields(user.id, password=encoded)
+            user.password = encoded
+            logger.info(f"用户密码哈希已升级 - 用户名: {user.username}")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"升级用户密码哈希失败 - 用户名: {user.username}, 错误: {e}")
+    return matched
+
+
+def measure_hash_time(hasher: PasswordHasher, rounds: int = 3) -> float:
+    """测量哈希算法单次计算耗时（毫秒，取最小值）"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hasher.encode('calibration-password')
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples)
+
+
+def calibrate(algorithm: str = 'scrypt', target_ms: float = 250) -> Tuple[PasswordHasher, float]:
+    """选择单次哈希耗时不超过目标值的最大成本参数
+
+    scrypt按2的幂增大n（r=8, p=1），PBKDF2按目标耗时线性估算迭代次数。
+
+    Args:
+        algorithm: 算法名称（scrypt/pbkdf2_sha256）
+        target_ms: 目标单次哈希耗时（毫秒）
+
+    Returns:
+        tuple: (哈希算法实例, 实测单次耗时毫秒)
+    """
+    if algorithm == 'scrypt':
+        best = ScryptHasher(n=2 ** 12)
+        best_ms = measure_hash_time(best)
+        n = best.n * 2
+        while n <= 2 ** 20:
+            candidate = ScryptHasher(n=n)
+            elapsed = measure_hash_time(candidate)
+            if elapsed > target_ms:
+                break
+            best, best_ms = candidate, elapsed
+            n *= 2
+        return best, best_ms
+
+    probe = Pbkdf2Hasher(iterations=100000)
+    iterations = max(int(probe.iterations * target_ms / measure_hash_time(probe)) // 10000 * 10000, 100000)
+    hasher = Pbkdf2Hasher(iterations=iterations)
+    return hasher, measure_hash_time(hasher)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按目标耗时校准密码哈希成本参数')
+    parser.add_argument('--algorithm', default='scrypt', choices=sorted(HASHERS), help='哈希算法')
+    parser.add_argument('--target-ms', type=float, default=250, help='目标单次哈希耗时（毫秒）')
+    args = parser.parse_args()
+
+    hasher, elapsed = calibrate(args.algorithm, args.target_ms)
+    print(f"算法: {hasher.algorithm}, 单次耗时: {elapsed:.1f}ms, 单核每秒可处理登录: {1000 / elapsed:.1f}")
+    print("将以下配置写入环境变量文件：")
+    print(f"PASSWORD_HASHER={hasher.algorithm}")
+    for name, value in hasher.params().items():
+        key = 'PASSWORD_PBKDF2_ITERATIONS' if name == 'iterations' else f"PASSWORD_SCRYPT_{name.upper()}"
+        print(f"{key}={value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""接口限流
+
+登录、发送邮箱验证码、图形验证码等接口每次请求都会产生数据库写入、PIL绘图或SMTP连接，
+这里按IP、登录账号、邮箱分别限流，超出限制的请求在视图函数执行前直接返回429和Retry-After，
+不做任何数据库操作（未登录请求也不会触发当前用户加载）。
+
+限流算法为GCRA（通用信元速率算法），等价于平滑的滑动窗口：每个键只保存一个"理论到达时间"，
+窗口内允许的突发数即规则中的次数，超出后按 窗口/次数 的间隔逐个放行。
+
+- MemoryRateLimitBackend：进程内计数，单进程部署或各worker独立限流
+- RedisRateLimitBackend：Lua脚本原子更新，多worker/多节点共享同一限额
+
+通过配置项RATE_LIMIT_BACKEND（memory/redis）选择后端，规则配置形如"10/minute"、"5/300"，
+为空时关闭该规则。使用方式：
+
+    @bp.route('/login', methods=['GET', 'POST'])
+    @rate_limit('login', ip='RATE_LIMIT_LOGIN_IP', username='RATE_LIMIT_LOGIN_USERNAME', methods=('POST',))
+    def login():
+        ...
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from typing import Dict, Optional, Tuple
+
+from flask import Response, jsonify, request
+
+from app.utils.config_manager import get_config_manager
+from app.utils.client_ip import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入redis客户端，未安装时Redis后端不可用
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 进程内最多保存的限流键数量，超出时优先淘汰最久未访问的键
+DEFAULT_RATE_LIMIT_MAX_KEYS = 100000
+
+_PERIOD_UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_RATE_PATTERN = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day|s)?s?\s*$')
+
+
+@lru_cache(maxsize=64)
+def parse_rate(rate: Optional[str]) -> Optional[Tuple[int, float]]:
+    """解析限流规则
+
+    Args:
+        rate: 形如"10/minute"、"100/hour"、"5/300"（秒）、"3/10minute"的规则
+
+    Returns:
+        tuple: (次数, 窗口秒数)，规则为空或次数为0时返回None
+    """
+    if not rate:
+        return None
+    match = _RATE_PATTERN.match(str(rate).lower())
+    if not match:
+        raise ValueError(f"无效的限流规则: {rate}")
+    count, multiplier, unit = match.groups()
+    if not multiplier and not unit:
+        raise ValueError(f"无效的限流规则: {rate}")
+    period = int(multiplier or 1) * _PERIOD_UNITS.get(unit or 's', 1)
+    if int(count) <= 0 or period <= 0:
+        return None
+    return int(count), float(period)
+
+
+class RateLimitBackend:
+    """限流计数后端接口"""
+
+    def hit(self, key: str, limit: int, period: float) -> float:
+        """记录一次请求
+
+        Args:
+            key: 限流键
+            limit: 窗口内允许的次数
+            period: 窗口秒数
+
+        Returns:
+            float: 允许时返回0，拒绝时返回需要等待的秒数
+        """
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """进程内GCRA实现，每个键只保存理论到达时间"""
+
+    def __init__(self, max_keys: int = DEFAULT_RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # 键 -> 理论到达时间，按最近访问排序
+        self._tats: OrderedDict = OrderedDict()
+
+    def hit(self, key, limit, period):
+        now = time.monotonic()
+        interval = period / limit
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            new_tat = tat + interval
+            if new_tat - now > period:
+                return new_tat - now - period
+            self._tats[key] = new_tat
+            self._tats.move_to_end(key)
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now):
+        """清理已恢复满额的键，超出容量时淘汰最久未访问的键，需持有锁"""
+        while self._tats:
+            key, tat = next(iter(self._tats.items()))
+            if tat > now and len(self._tats) <= self.max_keys:
+                break
+            del self._tats[key]
+
+    def reset(self):
+        with self._lock:
+            self._tats.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tats)
+
+
+# 原子执行GCRA：使用Redis服务器时间，返回需要等待的秒数（字符串，避免浮点数被截断为整数）
+_GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+local wait = new_tat - now - period
+if wait > 0 then return tostring(wait) end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """基于Redis的共享实现，多个worker/节点共用同一限额"""
+
+    KEY_PREFIX = 'rate_limit:'
+
+    def __init__(self, client=None, url: Optional[str] = None):
+        """
+        Args:
+            client: 已创建的Redis客户端（兼容redis-py接口）
+            url: Redis连接地址，未提供client时使用
+        """
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("redis库未安装，无法使用Redis限流后端")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self._script = client.register_script(_GCRA_SCRIPT)
+
+    def hit(self, key, limit, period):
+        wait = self._script(keys=[f"{self.KEY_PREFIX}{key}"], args=[period / limit, period])
+        return float(wait.decode('utf-8') if isinstance(wait, bytes) else wait)
+
+    def reset(self):
+        for key in self.client.scan_iter(f"{self.KEY_PREFIX}*"):
+            self.client.delete(key)
+
+
+class RateLimiter:
+    """限流器，记录每条规则的放行和拒绝次数"""
+
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._errors = 0
+
+    def _count(self, rule: str, outcome: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(rule, {'allowed': 0, 'shed': 0})
+            counters[outcome] += 1
+
+    def hit(self, rule: str, value: str, limit: int, period: float) -> float:
+        """检查并记录一次请求
+
+        Args:
+            rule: 规则名称，如login:ip
+            value: 限流对象（IP、账号、邮箱）
+            limit: 窗口内允许的次数
+            period: 窗口秒数
+
+        Returns:
+            float: 允许时返回0，拒绝时返回需要等待的秒数；后端异常时放行
+        """
+        try:
+            wait = self.backend.hit(f"{rule}:{value}", limit, period)
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            logger.error(f"限流后端异常，本次请求放行 - 规则: {rule}, 错误: {e}")
+            return 0.0
+        self._count(rule, 'shed' if wait > 0 else 'allowed')
+        return wait
+
+    def stats(self) -> Dict:
+        """获取统计信息：每条规则的放行和拒绝（shed）次数，以及后端异常次数"""
+        with self._lock:
+            stats = {rule: dict(counters) for rule, counters in self._stats.items()}
+            stats['errors'] = self._errors
+        return stats
+
+
+def _request_field(name: str) -> str:
+    """从表单或JSON请求体中读取字段，统一为小写用于限流键"""
+    value = request.form.get(name)
+    if value is None:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            value = data.get(name)
+    return str(value).strip().lower() if value else ''
+
+
+# 限流对象的取值方式
+KEY_FUNCTIONS = {
+    'ip': get_client_ip,
+    'username': lambda: _request_field('username'),
+    'email': lambda: _request_field('email'),
+}
+
+
+def _too_many_requests(wait: float, as_json: bool) -> Response:
+    retry_after = max(1, math.ceil(wait))
+    message = f'请求过于频繁，请{retry_after}秒后重试'
+    if as_json:
+        response = jsonify({'success': False, 'message': message})
+    else:
+        response = Response(message, mimetype='text/plain')
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(name: str, methods: Optional[Tuple[str, ...]] = None, as_json: bool = False, **rules):
+    """路由限流装饰器，放在@bp.route之下
+
+    Args:
+        name: 规则名称前缀，用于限流键和统计
+        methods: 只限流这些HTTP方法，为None时限流所有方法
+        as_json: 拒绝时返回JSON（供前端fetch调用的接口使用）
+        **rules: 限流对象（ip/username/email）-> 规则配置项名称，按顺序检查，
+                 前面的规则拒绝时不再消耗后面规则的额度；请求中缺少对应字段时跳过该规则
+    """
+    for by in rules:
+        if by not in KEY_FUNCTIONS:
+            raise ValueError(f"不支持的限流对象: {by}")
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if methods is None or request.method in methods:
+                limiter = get_rate_limiter()
+                if limiter is not None:
+                    config_manager = get_config_manager()
+                    for by, config_key in rules.items():
+                        rate = parse_rate(config_manager.get(config_key))
+                        value = KEY_FUNCTIONS[by]() if rate else None
+                        if not value:
+                            continue
+                        rule = f"{name}:{by}"
+                        wait = limiter.hit(rule, value, *rate)
+                        if wait > 0:
+                            logger.debug(f"请求被限流 - 规则: {rule}, IP: {get_client_ip()}, 需等待: {wait:.1f}秒")
+                            return _too_many_requests(wait, as_json)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# 当前进程使用的限流器，RATE_LIMIT_ENABLED关闭时为None
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_created = False
+_rate_limiter_lock = threading.Lock()
+
+
+def create_rate_limiter(backend: Optional[str] = None) -> Optional[RateLimiter]:
+    """根据配置创建限流器
+
+    Args:
+        backend: 后端类型（memory/redis），为None时读取RATE_LIMIT_BACKEND配置
+
+    Returns:
+        RateLimiter: 限流器，RATE_LIMIT_ENABLED关闭时返回None
+    """
+    config_manager = get_config_manager()
+    enabled = config_manager.get('RATE_LIMIT_ENABLED', True)
+    if str(enabled).lower() in ('false', '0', 'no', 'off'):
+        return None
+
+    backend = (backend or config_manager.get('RATE_LIMIT_BACKEND', 'memory') or 'memory').lower()
+    if backend == 'redis':
+        url = (config_manager.get('RATE_LIMIT_REDIS_URL')
+               or config_manager.get('SCAN_STATE_REDIS_URL', 'redis://localhost:6379/0'))
+        try:
+            limiter = RateLimiter(RedisRateLimitBackend(url=url))
+            logger.info("接口限流使用Redis共享计数")
+            return limiter
+        except Exception as e:
+            logger.error(f"创建Redis限流后端失败，改用进程内计数: {e}")
+
+    max_keys = int(config_manager.get('RATE_LIMIT_MAX_KEYS', DEFAULT_RATE_LIMIT_MAX_KEYS))
+    return RateLimiter(MemoryRateLimitBackend(max_keys=max_keys))
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """获取当前进程的限流器，未启用时返回None"""
+    global _rate_limiter, _rate_limiter_created
+    if not _rate_limiter_created:
+        with _rate_limiter_lock:
+            if not _rate_limiter_created:
+                _rate_limiter = create_rate_limiter()
+                _rate_limiter_created = True
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]) -> None:
+    """替换当前进程的限流器（用于测试或自定义后端），为None时关闭限流"""
+    global _rate_limiter, _rate_limiter_created
+    _rate_limiter = limiter
+    _rate_limiter_created = True
@@ -0,0 +1,261 @@
+"""企业微信扫码状态事件通知
+
+扫码页面原先每1~2秒轮询一次扫码状态，这里提供按state的状态变更通知：
+回调处理完成后发布事件，SSE/长轮询接口在事件到达前挂起等待，
+一个打开的扫码页面只占用一个连接。
+
+- ScanEventBus：进程内通知，基于按state的threading.Condition
+- RedisScanEventBus：在进程内通知的基础上，通过Redis发布/订阅在多个worker间转发事件
+
+通过配置项SCAN_EVENT_BUS（local/redis）选择实现，使用get_scan_event_bus()获取当前进程的实例。
+"""
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+from app.utils.config_manager import get_config_manager
+
+logger = logging.getLogger(__name__)
+
+# 尝试导入redis客户端，未安装时只能使用进程内通知
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 事件保留时间（秒），回调完成后才建立连接的订阅者仍能拿到最终状态
+DEFAULT_EVENT_RETENTION = 600
+
+# 终止状态，收到后SSE流结束
+TERMINAL_SCAN_STATUSES = frozenset(('confirmed', 'failed', 'expired', 'invalid'))
+
+# SSE心跳间隔（秒），同时也是兜底读取存储的间隔
+SSE_HEARTBEAT_INTERVAL = 15
+
+# 长轮询单次最长等待时间（秒）
+MAX_LONG_POLL_WAIT = 30
+
+
+class ScanEventBus:
+    """进程内扫码状态事件通知"""
+
+    # 每发布多少次事件执行一次过期清理
+    PRUNE_INTERVAL = 256
+
+    def __init__(self, retention: int = DEFAULT_EVENT_RETENTION):
+        self.retention = retention
+        self._lock = threading.Lock()
+        # state -> (状态, 发布时间)
+        self._events: Dict[str, tuple] = {}
+        # state -> [Condition, 等待者数量]，只为有等待者的state创建
+        self._waiters: Dict[str, list] = {}
+        self._published = 0
+
+    def _prune(self, now):
+        expired = [state for state, (_, published_at) in self._events.items()
+                   if now - published_at > self.retention]
+        for state in expired:
+            del self._events[state]
+
+    def _publish_local(self, state: str, status: str) -> None:
+        with self._lock:
+            now = time.time()
+            self._events[state] = (status, now)
+            self._published += 1
+            if self._published % self.PRUNE_INTERVAL == 0:
+                self._prune(now)
+            entry = self._waiters.get(state)
+            if entry:
+                entry[0].notify_all()
+
+    def publish(self, state: str, status: str) -> None:
+        """发布state的状态变更"""
+        if state:
+            self._publish_local(state, status)
+
+    def latest(self, state: str) -> Optional[str]:
+        """获取state最近一次发布的状态，不访问存储"""
+        with self._lock:
+            event = self._events.get(state)
+            if event is None or time.time() - event[1] > self.retention:
+                return None
+            return event[0]
+
+    def wait(self, state: str, timeout: float, last_status: Optional[str] = None) -> Optional[str]:
+        """等待state的状态变为不同于last_status的值
+
+        Args:
+            state: 扫码状态标识
+            timeout: 最长等待时间（秒）
+            last_status: 调用方已知的状态
+
+        Returns:
+            str: 新状态，超时返回None
+        """
+        deadline = time.monotonic() + max(timeout, 0)
+        with self._lock:
+            entry = self._waiters.get(state)
+            if entry is None:
+                entry = self._waiters[state] = [threading.Condition(self._lock), 0]
+            entry[1] += 1
+            try:
+                while True:
+                    event = self._events.get(state)
+                    if event is not None and event[0] != last_status:
+                        return event[0]
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    entry[0].wait(remaining)
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._waiters[state]
+
+
+class RedisScanEventBus(ScanEventBus):
+    """通过Redis发布/订阅在多个worker间转发扫码状态事件"""
+
+    CHANNEL = 'scan_state_events'
+
+    def __init__(self, client=None, url: Optional[str] = None, retention: int = DEFAULT_EVENT_RETENTION):
+        """
+        Args:
+            client: 已创建的Redis客户端（兼容redis-py接口）
+            url: Redis连接地址，未提供client时使用
+            retention: 事件保留时间（秒）
+        """
+        super().__init__(retention=retention)
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("redis库未安装，无法使用Redis扫码事件通知")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.CHANNEL)
+        self._listener = threading.Thread(target=self._listen, name='scan-event-listener', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                message = self._pubsub.get_message(timeout=1.0)
+                if not message:
+                    continue
+                data = message.get('data')
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+                event = json.loads(data)
+                self._publish_local(event['state'], event['status'])
+            except Exception as e:
+                logger.warning(f"接收Redis扫码事件失败: {e}")
+                time.sleep(1)
+
+    def publish(self, state, status):
+        if not state:
+            return
+        try:
+            self.client.publish(self.CHANNEL, json.dumps({'state': state, 'status': status}))
+        except Exception as e:
+            # Redis不可用时至少通知本进程的等待者
+            logger.error(f"发布Redis扫码事件失败 - state: {state}, 错误: {e}")
+            self._publish_local(state, status)
+
+
+def format_sse(data: dict, event: Optional[str] = None) -> str:
+    """将数据格式化为一条SSE消息"""
+    message = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{message}" if event else message
+
+
+def iter_scan_status_events(state: str, status: str, deadline: float, render: Callable[[str], dict],
+                            reload_status: Optional[Callable[[], Optional[str]]] = None,
+                            bus: Optional[ScanEventBus] = None,
+                            heartbeat: int = SSE_HEARTBEAT_INTERVAL) -> Iterator[str]:
+    """按SSE格式逐条产出扫码状态，直到进入终止状态或二维码过期
+
+    Args:
+        state: 扫码状态标识
+        status: 当前状态
+        deadline: 二维码过期时间戳
+        render: 将状态转换为响应数据的函数
+        reload_status: 心跳时从存储重新读取状态的函数，用于兜底其他worker发布的事件
+        bus: 事件通知实例，默认使用get_scan_event_bus()
+        heartbeat: 心跳间隔（秒）
+
+    Yields:
+        str: SSE消息
+    """
+    bus = bus or get_scan_event_bus()
+    yield f"retry: 3000\n{format_sse(render(status))}"
+    while status not in TERMINAL_SCAN_STATUSES:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            yield format_sse(render('expired'))
+            return
+        new_status = bus.wait(state, min(heartbeat, remaining), last_status=status)
+        if new_status is None and reload_status is not None and time.time() < deadline:
+            new_status = reload_status()
+            if new_status == status:
+                new_status = None
+        if new_status is None:
+            yield ": keepalive\n\n"
+            continue
+        status = new_status
+        yield format_sse(render(status))
+
+
+# 当前进程使用的事件通知实例
+_scan_event_bus: Optional[ScanEventBus] = None
+_scan_event_bus_lock = threading.Lock()
+
+
+def create_scan_event_bus(backend: Optional[str] = None) -> ScanEventBus:
+    """根据配置创建扫码事件通知
+
+    Args:
+        backend: 实现类型（local/redis），为None时读取SCAN_EVENT_BUS配置
+
+    Returns:
+        ScanEventBus: 事件通知实例
+    """
+    config_manager = get_config_manager()
+    backend = (backend or config_manager.get('SCAN_EVENT_BUS', 'local') or 'local').lower()
+
+    if backend == 'redis':
+        url = config_manager.get('SCAN_EVENT_REDIS_URL') or config_manager.get('SCAN_STATE_REDIS_URL', 'redis://localhost:6379/0')
+        try:
+            bus = RedisScanEventBus(url=url)
+            logger.info("扫码事件通知使用Redis发布/订阅")
+            return bus
+        except Exception as e:
+            logger.error(f"创建Redis扫码事件通知失败，改用进程内通知: {e}")
+
+    return ScanEventBus()
+
+
+def get_scan_event_bus() -> ScanEventBus:
+    """获取当前进程的扫码事件通知实例
+
+    Returns:
+        ScanEventBus: 事件通知实例
+    """
+    global _scan_event_bus
+    if _scan_event_bus is None:
+        with _scan_event_bus_lock:
+            if _scan_event_bus is None:
+                _scan_event_bus = create_scan_event_bus()
+    return _scan_event_bus
+
+
+def set_scan_event_bus(bus: Optional[ScanEventBus]) -> None:
+    """替换当前进程的扫码事件通知实例（用于测试或自定义实现）
+
+    Args:
+        bus: 事件通知实例，为None时下次获取会按配置重新创建
+    """
+    global _scan_event_bus
+    _scan_event_bus = bus
@@ -0,0 +1,336 @@
+"""保持连接的SMTP发送
+
+原来每封邮件都新建smtplib.SMTP连接，经过TCP握手、STARTTLS、AUTH后只发一封就quit()。
+SmtpTransport在进程内保持少量已登录的连接并复用：
+
+- 取出空闲超过noop_after秒的连接时先发送NOOP检查，失败则重新连接
+- 服务器返回421、连接断开或超时时丢弃该连接，重新连接后重发一次
+- 每个连接最多发送max_messages封邮件后主动quit()，空闲超过idle_timeout秒的连接也会关闭
+- send_many在同一个连接上连续发送多封邮件
+- 记录每次发送的耗时（不含等待空闲连接的时间）
+
+连接数由pool_size限制，连接都在使用中时发送线程等待有连接归还。
+"""
+import atexit
+import logging
+import smtplib
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.utils.config_manager import get_config_manager
+from app.utils.mailer import build_email_message, get_smtp_settings
+
+logger = logging.getLogger(__name__)
+
+# 默认连接池大小
+DEFAULT_SMTP_POOL_SIZE = 2
+
+# 默认每个连接最多发送的邮件数
+DEFAULT_SMTP_MAX_MESSAGES = 100
+
+# 默认空闲多久（秒）后取出连接时先发送NOOP检查
+DEFAULT_SMTP_NOOP_AFTER = 10
+
+# 默认空闲多久（秒）后关闭连接，应小于服务器的空闲超时
+DEFAULT_SMTP_IDLE_TIMEOUT = 60
+
+# 默认等待空闲连接的最长时间（秒）
+DEFAULT_SMTP_ACQUIRE_TIMEOUT = 30
+
+# 需要丢弃连接并重新连接的错误
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, socket.timeout, ConnectionError)
+
+
+def _should_reconnect(error: Exception) -> bool:
+    """错误是否由连接失效引起，重新连接后可以重发"""
+    if isinstance(error, RECONNECT_ERRORS):
+        return True
+    # 421：服务器即将关闭连接
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code == 421
+
+
+class _PooledConnection:
+    """已登录的SMTP连接"""
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SmtpTransport:
+    """复用已登录连接的SMTP发送"""
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None, pool_size: int = DEFAULT_SMTP_POOL_SIZE,
+                 max_messages: int = DEFAULT_SMTP_MAX_MESSAGES, noop_after: float = DEFAULT_SMTP_NOOP_AFTER,
+                 idle_timeout: float = DEFAULT_SMTP_IDLE_TIMEOUT,
+                 acquire_timeout: float = DEFAULT_SMTP_ACQUIRE_TIMEOUT,
+                 connect: Optional[Callable[[Dict[str, Any]], smtplib.SMTP]] = None):
+        """
+        Args:
+            settings: SMTP连接参数，默认使用get_smtp_settings()
+            pool_size: 最多同时保持的连接数
+            max_messages: 每个连接最多发送的邮件数
+            noop_after: 连接空闲超过该时间（秒）时，使用前先发送NOOP检查
+            idle_timeout: 连接空闲超过该时间（秒）时直接关闭
+            acquire_timeout: 等待空闲连接的最长时间（秒）
+            connect: 建立并登录连接的函数，默认按settings连接
+        """
+        self.settings = settings or get_smtp_settings()
+        self.pool_size = max(1, pool_size)
+        self.max_messages = max(1, max_messages)
+        self.noop_after = noop_after
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._connect = connect or self._open
+        # 空闲连接，后进先出：最近用过的连接最不容易被服务器断开
+        self._idle: deque = deque()
+        self._open_count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._stats = {'sent': 0, 'failed': 0, 'connects': 0, 'reconnects': 0, 'noops': 0,
+                       'recycled': 0, 'send_ms_total': 0.0, 'send_ms_max': 0.0}
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _open(self, settings: Dict[str, Any]) -> smtplib.SMTP:
+        """建立连接并登录"""
+        smtp_class = smtplib.SMTP_SSL if settings['use_ssl'] else smtplib.SMTP
+        smtp = smtp_class(settings['server'], settings['port'], timeout=settings['timeout'])
+        try:
+            if settings['use_tls'] and not settings['use_ssl']:
+                smtp.starttls()
+            if settings.get('username') and settings.get('password'):
+                smtp.login(settings['username'], settings['password'])
+        except Exception:
+            self._close_quietly(smtp)
+            raise
+        return smtp
+
+    @staticmethod
+    def _close_quietly(smtp: smtplib.SMTP, graceful: bool = False) -> None:
+        try:
+            if graceful:
+                smtp.quit()
+            else:
+                smtp.close()
+        except Exception:
+            pass
+
+    def _new_connection(self) -> _PooledConnection:
+        connection = _PooledConnection(self._connect(self.settings))
+        self._count('connects')
+        return connection
+
+    def _discard(self, connection: _PooledConnection, graceful: bool = False) -> None:
+        """关闭连接并释放名额"""
+        self._close_quietly(connection.smtp, graceful)
+        with self._cond:
+            self._open_count -= 1
+            self._cond.notify()
+
+    def _is_alive(self, connection: _PooledConnection) -> bool:
+        """NOOP检查连接是否可用"""
+        self._count('noops')
+        try:
+            return connection.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> _PooledConnection:
+        """取出一个可用连接，没有空闲连接且未达到上限时新建"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("SMTP连接池已关闭")
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._open_count < self.pool_size:
+                    self._open_count += 1
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待SMTP连接超过{self.acquire_timeout}秒")
+                self._cond.wait(remaining)
+
+        if connection is not None:
+            idle = time.monotonic() - connection.last_used
+            if idle > self.idle_timeout or (idle > self.noop_after and not self._is_alive(connection)):
+                self._close_quietly(connection.smtp)
+                self._count('reconnects')
+                connection = None
+        if connection is None:
+            try:
+                connection = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._open_count -= 1
+                    self._cond.notify()
+                raise
+        return connection
+
+    def _release(self, connection: _PooledConnection) -> None:
+        """归还连接，达到发送上限的连接关闭"""
+        if connection.sent >= self.max_messages:
+            self._count('recycled')
+            self._discard(connection, graceful=True)
+            return
+        connection.last_used = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self._open_count -= 1
+                closed = True
+            else:
+                self._idle.append(connection)
+                closed = False
+            self._cond.notify()
+        if closed:
+            self._close_quietly(connection.smtp, graceful=True)
+
+    def _send_on(self, connection: _PooledConnection, recipient: str, subject: str,
+                 content: str) -> Tuple[_PooledConnection, float]:
+        """在指定连接上发送一封邮件，连接失效时重新连接并重发一次
+
+        Returns:
+            tuple: (发送后使用的连接, 发送耗时毫秒)
+        """
+        message = build_email_message(self.settings['sender'], recipient, subject, content)
+        start = time.perf_counter()
+        try:
+            connection.smtp.send_message(message)
+        except Exception as e:
+            if not _should_reconnect(e):
+                raise
+            logger.warning(f"SMTP连接已失效，重新连接后重发 - 收件人: {recipient}, 错误: {e}")
+            self._close_quietly(connection.smtp)
+            self._count('reconnects')
+            connection.smtp = self._connect(self.settings)
+            connection.sent = 0
+            self._count('connects')
+            connection.smtp.send_message(message)
+        elapsed = (time.perf_counter() - start) * 1000
+        connection.sent += 1
+        with self._stats_lock:
+            self._stats['sent'] += 1
+            self._stats['send_ms_total'] += elapsed
+            self._stats['send_ms_max'] = max(self._stats['send_ms_max'], elapsed)
+        return connection, elapsed
+
+    def send(self, recipient: str, subject: str, content: str) -> float:
+        """发送一封邮件
+
+        Args:
+            recipient: 收件人
+            subject: 主题
+            content: HTML正文
+
+        Returns:
+            float: 发送耗时（毫秒）
+
+        Raises:
+            smtplib.SMTPException, OSError: 重新连接后仍发送失败
+        """
+        connection = self._acquire()
+        try:
+            connection, elapsed = self._send_on(connection, recipient, subject, content)
+        except Exception:
+            self._count('failed')
+            self._discard(connection)
+            raise
+        self._release(connection)
+        return elapsed
+
+    def send_many(self, messages: Iterable[Tuple[str, str, str]]) -> List[Tuple[bool, Any]]:
+        """在同一个连接上连续发送多封邮件，达到每连接上限时换用新连接
+
+        Args:
+            messages: (收件人, 主题, HTML正文)列表
+
+        Returns:
+            list: 每封邮件的结果，成功为(True, 耗时毫秒)，失败为(False, 异常)
+        """
+        results = []
+        connection = None
+        for recipient, subject, content in messages:
+            try:
+                if connection is None:
+                    connection = self._acquire()
+                connection, elapsed = self._send_on(connection, recipient, subject, content)
+                results.append((True, elapsed))
+            except Exception as e:
+                self._count('failed')
+                results.append((False, e))
+                if connection is not None:
+                    self._discard(connection)
+                    connection = None
+                continue
+            if connection.sent >= self.max_messages:
+                self._release(connection)
+                connection = None
+        if connection is not None:
+            self._release(connection)
+        return results
+
+    def close(self) -> None:
+        """关闭所有空闲连接，正在使用的连接归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            self._close_quietly(connection.smtp, graceful=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取发送统计（发送成功、失败、建立连接、重新连接、NOOP检查、达到上限关闭的连接数，平均和最大发送耗时）"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total = stats.pop('send_ms_total')
+        stats['send_ms_avg'] = round(total / stats['sent'], 2) if stats['sent'] else 0
+        stats['send_ms_max'] = round(stats['send_ms_max'], 2)
+        with self._cond:
+            stats['open'] = self._open_count
+            stats['idle'] = len(self._idle)
+        return stats
+
+
+_smtp_transport: Optional[SmtpTransport] = None
+_smtp_transport_lock = threading.Lock()
+
+
+def create_smtp_transport() -> SmtpTransport:
+    """根据配置创建SMTP连接池"""
+    config_manager = get_config_manager()
+    return SmtpTransport(
+        pool_size=int(config_manager.get('SMTP_POOL_SIZE', DEFAULT_SMTP_POOL_SIZE)),
+        max_messages=int(config_manager.get('SMTP_POOL_MAX_MESSAGES', DEFAULT_SMTP_MAX_MESSAGES)),
+        noop_after=float(config_manager.get('SMTP_POOL_NOOP_AFTER', DEFAULT_SMTP_NOOP_AFTER)),
+        idle_timeout=float(config_manager.get('SMTP_POOL_IDLE_TIMEOUT', DEFAULT_SMTP_IDLE_TIMEOUT)),
+    )
+
+
+def get_smtp_transport() -> SmtpTransport:
+    """获取当前进程的SMTP连接池"""
+    global _smtp_transport
+    if _smtp_transport is None:
+        with _smtp_transport_lock:
+            if _smtp_transport is None:
+                _smtp_transport = create_smtp_transport()
+                atexit.register(_smtp_transport.close)
+    return _smtp_transport
+
+
+def set_smtp_transport(transport: Optional[SmtpTransport]) -> None:
+    """替换当前进程的SMTP连接池（用于测试），为None时下次获取会按配置重新创建"""
+    global _smtp_transport
+    _smtp_transport = transport
@@ -0,0 +1,49 @@
+"""页面模板加载
+
+页面模板原来是写在路由函数中的多KB字符串字面量，通过render_template_string渲染，
+Jinja每次请求都要重新解析、编译一遍。现在模板放在app/templates下，通过Flask的模板加载器按名称加载，
+编译结果缓存在Jinja环境中，每个进程只编译一次：
+
+- 启动时预先编译全部模板（TEMPLATE_PRECOMPILE），第一个请求不再承担编译开销
+- 配置TEMPLATE_BYTECODE_CACHE_DIR时把编译结果写入字节码缓存，新启动的worker直接加载
+- 去除块标签所在行的缩进和换行（trim_blocks、lstrip_blocks），减小输出
+"""
+import logging
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+def configure_templates(app) -> None:
+    """设置Jinja环境选项，必须在第一次使用app.jinja_env之前调用
+
+    Args:
+        app: Flask应用
+    """
+    options = dict(app.jinja_options, trim_blocks=True, lstrip_blocks=True)
+    cache_dir = app.config.get('TEMPLATE_BYTECODE_CACHE_DIR')
+    if cache_dir:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            options['bytecode_cache'] = FileSystemBytecodeCache(cache_dir)
+        except OSError as e:
+            logger.error(f"创建模板字节码缓存目录失败 - 目录: {cache_dir}, 错误: {e}")
+    app.jinja_options = options
+
+
+def precompile_templates(app) -> int:
+    """编译全部HTML模板并放入Jinja环境的缓存
+
+    Args:
+        app: Flask应用
+
+    Returns:
+        int: 编译的模板数量
+    """
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    logger.info(f"页面模板已预编译，数量: {len(names)}")
+    return len(names)
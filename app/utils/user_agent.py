@@ -0,0 +1,125 @@
+"""User-Agent解析
+
+使用一条预编译的正则对User-Agent做一次扫描，同时提取浏览器、版本、平台和设备类型，
+解析结果按User-Agent字符串缓存（LRU，容量有限）。实际流量中不同的User-Agent很少，
+同一个User-Agent只解析一次。
+
+所有需要浏览器/平台信息的地方（登录日志、企业微信回调、绑定确认）都应使用parse_user_agent，
+保证同一个User-Agent在各处得到相同的结果。
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+# 参与缓存的User-Agent最大长度，超长部分不影响识别结果
+MAX_USER_AGENT_LENGTH = 512
+
+# 解析结果缓存容量
+CACHE_SIZE = 1024
+
+# 单次扫描同时匹配浏览器标识（带版本）和平台/移动端标识，只在单词起始处尝试匹配
+_USER_AGENT_RE = re.compile(
+    r'\b(?:(EdgiOS|EdgA|Edg|Edge|OPR|CriOS|FxiOS|Firefox|Chrome|Version|Safari|MSIE|Trident)'
+    r'[/ ](\d+(?:\.\d+)?)'
+    r'|(Windows|iPhone|iPad|iPod|Android|Macintosh|CrOS|Linux|Mobile))'
+)
+
+# 爬虫标识，使用小写子串判断（比不限位置的正则匹配快得多）
+_BOT_MARKERS = ('bot', 'crawler', 'spider')
+
+# 浏览器标识 -> 浏览器名称，按优先级排列（Edge/Opera的User-Agent中同时包含Chrome和Safari）
+_BROWSER_PRIORITY = (
+    ('Edg', 'Edge'),
+    ('EdgA', 'Edge'),
+    ('EdgiOS', 'Edge'),
+    ('Edge', 'Edge Legacy'),
+    ('OPR', 'Opera'),
+    ('CriOS', 'Chrome'),
+    ('FxiOS', 'Firefox'),
+    ('Firefox', 'Firefox'),
+    ('Chrome', 'Chrome'),
+    ('Safari', 'Safari'),
+    ('MSIE', 'Internet Explorer'),
+    ('Trident', 'Internet Explorer'),
+)
+
+# 平台标识 -> 平台名称，按优先级排列（iPad的User-Agent包含Mac OS X，Android的包含Linux）
+_PLATFORM_PRIORITY = (
+    ('iPhone', 'iOS'),
+    ('iPad', 'iOS'),
+    ('iPod', 'iOS'),
+    ('Android', 'Android'),
+    ('Windows', 'Windows'),
+    ('Macintosh', 'macOS'),
+    ('CrOS', 'ChromeOS'),
+    ('Linux', 'Linux'),
+)
+
+
+class UserAgentInfo(NamedTuple):
+    """User-Agent解析结果"""
+    browser: str
+    version: str
+    platform: str
+    device: str  # desktop / mobile / tablet / bot
+
+    @property
+    def browser_label(self) -> str:
+        """浏览器名称和版本，例如 "Chrome 120.0"，用于日志记录"""
+        return f"{self.browser} {self.version}" if self.version else self.browser
+
+
+UNKNOWN_USER_AGENT = UserAgentInfo('Unknown', '', 'Unknown', 'desktop')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse(user_agent: str) -> UserAgentInfo:
+    browsers = {}
+    platforms = set()
+    for token, version, platform in _USER_AGENT_RE.findall(user_agent):
+        if token:
+            browsers.setdefault(token, version)
+        else:
+            platforms.add(platform)
+    mobile = 'Mobile' in platforms
+    lowered = user_agent.lower()
+    bot = any(marker in lowered for marker in _BOT_MARKERS)
+
+    browser, version = 'Unknown', ''
+    for token, name in _BROWSER_PRIORITY:
+        if token in browsers:
+            browser, version = name, browsers[token]
+            if token == 'Safari':
+                # Safari/后是WebKit版本号，浏览器版本在Version/中
+                version = browsers.get('Version', version)
+            elif token == 'Trident':
+                # Trident/7.0只出现在IE11的User-Agent中（IE11不再带MSIE）
+                version = '11'
+            break
+
+    platform = next((name for token, name in _PLATFORM_PRIORITY if token in platforms), 'Unknown')
+
+    if bot:
+        device = 'bot'
+    elif 'iPad' in platforms or (platform == 'Android' and not mobile):
+        device = 'tablet'
+    elif mobile or platform == 'iOS':
+        device = 'mobile'
+    else:
+        device = 'desktop'
+
+    return UserAgentInfo(browser, version, platform, device)
+
+
+def parse_user_agent(user_agent: str) -> UserAgentInfo:
+    """解析User-Agent
+
+    Args:
+        user_agent: User-Agent请求头
+
+    Returns:
+        UserAgentInfo: 浏览器、版本、平台和设备类型，无法识别的字段为Unknown
+    """
+    if not user_agent:
+        return UNKNOWN_USER_AGENT
+    return _parse(user_agent[:MAX_USER_AGENT_LENGTH])
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""图形验证码性能基准
+
+对比每次请求直接渲染验证码与从预渲染池中取出的单次耗时（不需要数据库），
+并统计池在指定请求速率下因补充不及而直接渲染（starved）的比例。
+
+运行方式：
+    python benchmarks/bench_captcha.py [--requests 2000] [--pool-size 200] [--refill-rate 0]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import PIL_AVAILABLE
+from app.utils.captcha_pool import CaptchaPool, render_captcha
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图形验证码性能基准')
+    parser.add_argument('--requests', type=int, default=2000, help='请求数')
+    parser.add_argument('--pool-size', type=int, default=200, help='池大小')
+    parser.add_argument('--low-water', type=int, default=50, help='低水位')
+    parser.add_argument('--refill-rate', type=float, default=0, help='后台每秒最多渲染数量，0为不限制')
+    args = parser.parse_args()
+
+    if not PIL_AVAILABLE:
+        print('Pillow未安装，无法渲染验证码')
+        return
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        render_captcha()
+    inline = time.perf_counter() - start
+
+    pool = CaptchaPool(size=args.pool_size, low_water=args.low_water, refill_rate=args.refill_rate)
+    pool.fill()
+    pool.start()
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        pool.get()
+    pooled = time.perf_counter() - start
+    pool.stop(5)
+    stats = pool.stats()
+
+    print(f"{'方式':>8} | {'单次(µs)':>10} | {'请求/秒':>10} | {'starved':>8}")
+    print('-' * 46)
+    print(f"{'inline':>8} | {inline / args.requests * 1e6:>10.1f} | {args.requests / inline:>10.0f} | {'-':>8}")
+    print(f"{'pool':>8} | {pooled / args.requests * 1e6:>10.1f} | {args.requests / pooled:>10.0f} | "
+          f"{stats['starved'] / args.requests:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""客户端IP解析性能基准
+
+测量resolve_client_ip在常见请求形态下的单次解析耗时（不发起网络请求，不需要数据库）：
+直连请求、单层代理、多层代理链以及伪造X-Forwarded-For的直连请求。
+
+运行方式：
+    python benchmarks/bench_client_ip.py [--iterations 100000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.client_ip import resolve_client_ip, parse_trusted_proxies
+
+TRUSTED = parse_trusted_proxies('127.0.0.1/32,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16')
+
+SCENARIOS = (
+    ('direct', '203.0.113.7', {}),
+    ('one-proxy', '127.0.0.1', {'X-Forwarded-For': '203.0.113.7'}),
+    ('proxy-chain', '10.0.0.1', {'X-Forwarded-For': '198.51.100.1, 203.0.113.7, 192.168.1.2, 10.0.0.2'}),
+    ('real-ip', '127.0.0.1', {'X-Real-IP': '203.0.113.7'}),
+    ('spoofed', '203.0.113.7', {'X-Forwarded-For': '1.2.3.4', 'X-Real-IP': '5.6.7.8'}),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='客户端IP解析性能基准')
+    parser.add_argument('--iterations', type=int, default=100000, help='每种场景的解析次数')
+    args = parser.parse_args()
+
+    print(f"{'场景':>12} | {'结果':>15} | {'单次(µs)':>9}")
+    print('-' * 44)
+    for name, remote_addr, headers in SCENARIOS:
+        result = resolve_client_ip(remote_addr, headers, TRUSTED)
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            resolve_client_ip(remote_addr, headers, TRUSTED)
+        elapsed = (time.perf_counter() - start) / args.iterations * 1e6
+        print(f"{name:>12} | {result:>15} | {elapsed:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
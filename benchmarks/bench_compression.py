@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""响应压缩性能基准
+
+用auth蓝图各页面的实际渲染结果、/api风格的JSON响应和PNG验证码，对比不压缩、gzip、br（安装了brotli时）
+在每个响应上传输的字节数和每个请求的CPU耗时（process_time），以及压缩结果缓存命中时的CPU耗时。
+
+运行方式：
+    python benchmarks/bench_compression.py [--requests 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response, jsonify, render_template
+
+from app import app
+from app.utils.captcha_renderer import PIL_AVAILABLE, get_captcha_renderer
+from app.utils.compression import BROTLI_AVAILABLE, CompressionMiddleware
+from bench_templates import PAGES
+
+
+def collect_bodies():
+    """渲染各页面，返回 路由 -> (响应体, mimetype)"""
+    bodies = {}
+    with app.test_request_context('/'):
+        for route in ('/login', '/register', '/user_center', '/wechat_corp_login', '/wechat_callback (确认绑定)'):
+            name, context = PAGES[route]
+            bodies[route] = (render_template(name, **context).encode('utf-8'), 'text/html')
+    history = [{'id': i, 'username': 'alice', 'ip_address': '10.0.0.1', 'browser': 'Chrome', 'platform': 'Windows',
+                'success': True, 'login_type': 'default', 'created_at': datetime.now(timezone.utc).isoformat()}
+               for i in range(20)]
+    with app.app_context():
+        bodies['/api/login_history'] = (jsonify({'success': True, 'data': history}).get_data(), 'application/json')
+    if PIL_AVAILABLE:
+        bodies['/captcha'] = (get_captcha_renderer().generate()[1], 'image/png')
+    return bodies
+
+
+def build_client(bodies, cache_size):
+    """创建返回固定响应体、由压缩中间件包装的应用，返回(测试客户端, 路由 -> 地址)"""
+    bench_app = Flask(__name__)
+    urls = {}
+    for i, (route, (body, mimetype)) in enumerate(bodies.items()):
+        urls[route] = f'/r{i}'
+        bench_app.add_url_rule(urls[route], f'r{i}',
+                               lambda body=body, mimetype=mimetype: Response(body, mimetype=mimetype))
+    bench_app.wsgi_app = CompressionMiddleware(bench_app.wsgi_app, cache_size=cache_size)
+    return bench_app.test_client(), urls
+
+
+def measure(client, url, accept_encoding, requests):
+    """返回(传输字节数, 每请求CPU毫秒)"""
+    headers = {'Accept-Encoding': accept_encoding}
+    size = len(client.get(url, headers=headers).data)
+    start = time.process_time()
+    for _ in range(requests):
+        client.get(url, headers=headers)
+    return size, (time.process_time() - start) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='响应压缩性能基准')
+    parser.add_argument('--requests', type=int, default=200, help='每种方式请求的次数')
+    args = parser.parse_args()
+
+    bodies = collect_bodies()
+    uncached, urls = build_client(bodies, cache_size=0)
+    cached, _ = build_client(bodies, cache_size=256)
+    encodings = [('identity', '不压缩'), ('gzip', 'gzip')] + ([('br', 'br')] if BROTLI_AVAILABLE else [])
+
+    print(f"每种方式请求次数: {args.requests}{'' if BROTLI_AVAILABLE else '（brotli未安装，不测试br）'}")
+    print(f"{'路由':<28}{'方式':<10}{'传输字节':>10}{'CPU(ms)':>10}{'缓存命中CPU(ms)':>18}")
+    for route in bodies:
+        for accept_encoding, label in encodings:
+            size, cpu = measure(uncached, urls[route], accept_encoding, args.requests)
+            _, cached_cpu = measure(cached, urls[route], accept_encoding, args.requests)
+            print(f"{route:<28}{label:<10}{size:>10}{cpu:>10.3f}{cached_cpu:>18.3f}")
+
+
+if __name__ == '__main__':
+    main()
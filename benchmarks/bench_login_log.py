@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""登录日志写入方式性能基准
+
+对比同步写入（每次登录尝试在请求中add+commit）和异步批量写入（入队后由后台线程多行INSERT）
+两种方式下，验证码错误的登录请求（撞库时最常见的请求）的延迟分布。
+
+需要可用的MySQL数据库（使用.env.development中的配置），运行方式：
+    python benchmarks/bench_login_log.py [--requests 500] [--threads 8]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.models.db import LoginLog, db
+from app.models.login_log_writer import LoginLogWriter, get_login_log_writer, set_login_log_writer
+
+BENCH_USERNAME = 'bench_login_log_user'
+
+
+def login_attempt(_):
+    """发送一次验证码错误的登录请求，返回耗时（毫秒）"""
+    client = app.test_client()
+    start = time.perf_counter()
+    client.post('/login', data={'username': BENCH_USERNAME, 'password': 'wrong', 'captcha': 'XXXX'})
+    return (time.perf_counter() - start) * 1000
+
+
+def run(requests, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(login_attempt, range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='登录日志写入方式性能基准')
+    parser.add_argument('--requests', type=int, default=500, help='每种方式的登录请求数')
+    parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+    args = parser.parse_args()
+
+    def p99(samples):
+        return statistics.quantiles(samples, n=100)[98]
+
+    original_writer = get_login_log_writer()
+    print(f"{'写入方式':>8} | {'p50(ms)':>9} | {'p99(ms)':>9} | {'写入行数':>8}")
+    print('-' * 46)
+
+    try:
+        # 同步写入
+        set_login_log_writer(None)
+        samples = run(args.requests, args.threads)
+        print(f"{'sync':>8} | {statistics.median(samples):>9.3f} | {p99(samples):>9.3f} | {args.requests:>8}")
+
+        # 异步批量写入
+        writer = LoginLogWriter(app)
+        writer.start()
+        set_login_log_writer(writer)
+        samples = run(args.requests, args.threads)
+        writer.stop()
+        stats = writer.stats()
+        print(f"{'async':>8} | {statistics.median(samples):>9.3f} | {p99(samples):>9.3f} | {stats['written']:>8}")
+        print(f"异步写入统计: {stats}")
+    finally:
+        set_login_log_writer(original_writer)
+        with app.app_context():
+            LoginLog.query.filter_by(username=BENCH_USERNAME).delete(synchronize_session=False)
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""密码哈希成本性能基准
+
+对每一档成本参数测量单次哈希耗时和单核每秒可处理的登录数，并测量在哈希线程池中
+并发校验时的总吞吐，用于选择PASSWORD_SCRYPT_N / PASSWORD_PBKDF2_ITERATIONS（不需要数据库）。
+
+运行方式：
+    python benchmarks/bench_password_hash.py [--logins 64]
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.passwords import ScryptHasher, Pbkdf2Hasher, measure_hash_time
+
+COSTS = (
+    ScryptHasher(n=2 ** 12),
+    ScryptHasher(n=2 ** 13),
+    ScryptHasher(n=2 ** 14),
+    ScryptHasher(n=2 ** 15),
+    ScryptHasher(n=2 ** 16),
+    Pbkdf2Hasher(iterations=100000),
+    Pbkdf2Hasher(iterations=300000),
+    Pbkdf2Hasher(iterations=600000),
+    Pbkdf2Hasher(iterations=1200000),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='密码哈希成本性能基准')
+    parser.add_argument('--logins', type=int, default=64, help='并发吞吐测试的登录次数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='哈希线程池大小')
+    args = parser.parse_args()
+
+    print(f"哈希线程池大小: {args.workers}")
+    print(f"{'算法':>14} | {'参数':>18} | {'单次(ms)':>9} | {'登录/秒/核':>10} | {'线程池总吞吐':>12}")
+    print('-' * 78)
+    for hasher in COSTS:
+        encoded = hasher.encode('bench-password')
+        elapsed = measure_hash_time(hasher)
+
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            start = time.perf_counter()
+            list(executor.map(lambda _: hasher.verify('bench-password', encoded), range(args.logins)))
+            throughput = args.logins / (time.perf_counter() - start)
+
+        params = ','.join(f"{name}={value}" for name, value in hasher.params().items())
+        print(f"{hasher.algorithm:>14} | {params:>18} | {elapsed:>9.1f} | {1000 / elapsed:>10.1f} | {throughput:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""注册流程数据库访问性能基准
+
+在已有大量用户（默认10万）的用户表上，对比注册一个用户时原来的方式
+（get_users()读取整张表判重 + save_users()逐个用户查询并回写）与UserRepository
+（按唯一索引判重 + 单条INSERT）的耗时和SQL语句数量。
+
+需要可用的MySQL数据库（使用.env.development中的配置），运行方式：
+    python benchmarks/bench_register.py [--users 100000] [--registrations 3] [--keep]
+"""
+
+import os
+import sys
+import time
+import argparse
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app
+from app.models import get_users, save_users
+from app.models.db import User, db
+from app.models.user_repository import get_user_repository
+
+BENCH_PREFIX = 'bench_reg_'
+
+# 基准用户使用的固定密码哈希，避免生成10万个哈希
+BENCH_PASSWORD_HASH = 'pbkdf2_sha256$1$bench$bench'
+
+
+def seed_users(count, batch_size=5000):
+    """补足基准用户数量（多行INSERT）"""
+    existing = User.query.filter(User.username.like(f"{BENCH_PREFIX}%")).count()
+    for start in range(existing, count, batch_size):
+        rows = [{'username': f"{BENCH_PREFIX}{i}", 'display_name': f"{BENCH_PREFIX}{i}",
+                 'password': BENCH_PASSWORD_HASH, 'email': f"{BENCH_PREFIX}{i}@example.com"}
+                for i in range(start, min(start + batch_size, count))]
+        db.session.execute(User.__table__.insert(), rows)
+        db.session.commit()
+    return max(existing, count)
+
+
+def legacy_register(username):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        users = get_users()
+        if username in users:
+            return
+        users[username] = {'password': BENCH_PASSWORD_HASH, 'email': f"{username}@example.com",
+                           'display_name': username}
+        save_users(users)
+
+
+def repository_register(username):
+    repository = get_user_repository()
+    if repository.exists_username(username):
+        return
+    repository.create_user(username, BENCH_PASSWORD_HASH, email=f"{username}@example.com")
+
+
+def measure(register, name, registrations):
+    statements = []
+
+    def count_statement(*_):
+        statements.append(1)
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        start = time.perf_counter()
+        for i in range(registrations):
+            register(f"{BENCH_PREFIX}{name}_{i}_{int(time.time() * 1000)}")
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+    return elapsed / registrations, len(statements) / registrations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='注册流程数据库访问性能基准')
+    parser.add_argument('--users', type=int, default=100000, help='用户表中预先存在的用户数')
+    parser.add_argument('--registrations', type=int, default=3, help='每种方式注册的用户数')
+    parser.add_argument('--keep', action='store_true', help='保留基准用户，便于重复运行')
+    args = parser.parse_args()
+
+    with app.app_context():
+        try:
+            total = seed_users(args.users)
+            print(f"用户表中的基准用户: {total}")
+            print(f"{'方式':>10} | {'单次注册(ms)':>12} | {'SQL语句数':>10}")
+            print('-' * 40)
+            for name, register in (('repository', repository_register), ('legacy', legacy_register)):
+                seconds, statements = measure(register, name, args.registrations)
+                print(f"{name:>10} | {seconds * 1000:>12.1f} | {statements:>10.0f}")
+        finally:
+            if not args.keep:
+                User.query.filter(User.username.like(f"{BENCH_PREFIX}%")).delete(synchronize_session=False)
+                db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
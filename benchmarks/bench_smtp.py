@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""SMTP发送性能基准
+
+对比每封邮件新建连接（send_smtp_email）与复用连接池（SmtpTransport）的每秒发送数量。
+默认在本机启动一个只接收不投递的SMTP服务器（优先使用aiosmtpd，未安装时使用Python 3.11及以下自带的smtpd），
+也可以用--host/--port指定其他测试SMTP服务器（如MailHog）。本地服务器没有TLS和认证，
+连接池在真实服务器上省去的STARTTLS和AUTH开销会更大。
+
+运行方式：
+    python benchmarks/bench_smtp.py [--messages 500] [--threads 2] [--host 127.0.0.1 --port 1025]
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.mailer import send_smtp_email
+from app.utils.smtp_pool import SmtpTransport
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_local_smtp_server():
+    """启动本地SMTP服务器，返回(端口, 停止函数)"""
+    port = _free_port()
+    try:
+        from aiosmtpd.controller import Controller
+
+        class Handler:
+            async def handle_DATA(self, server, session, envelope):
+                return '250 OK'
+
+        controller = Controller(Handler(), hostname='127.0.0.1', port=port)
+        controller.start()
+        return port, controller.stop
+    except ImportError:
+        pass
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import asyncore
+        import smtpd
+
+    class SinkServer(smtpd.SMTPServer):
+        def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+            return None
+
+    server = SinkServer(('127.0.0.1', port), None, decode_data=False)
+    thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.1, 'use_poll': True}, daemon=True)
+    thread.start()
+
+    def stop():
+        server.close()
+        thread.join(1)
+
+    return port, stop
+
+
+def run(send, messages, threads):
+    """并发发送messages封邮件，返回耗时秒数"""
+    content = '<p>您的验证码是：<strong>123456</strong></p>'
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda i: send(f'user{i}@example.com', '验证码', content), range(messages)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SMTP发送性能基准')
+    parser.add_argument('--messages', type=int, default=500, help='每种方式发送的邮件数')
+    parser.add_argument('--threads', type=int, default=2, help='并发发送线程数（同时也是连接池大小）')
+    parser.add_argument('--max-messages', type=int, default=100, help='连接池每个连接最多发送的邮件数')
+    parser.add_argument('--host', default=None, help='测试SMTP服务器地址，默认在本机启动')
+    parser.add_argument('--port', type=int, default=25, help='测试SMTP服务器端口')
+    args = parser.parse_args()
+
+    stop = None
+    if args.host:
+        host, port = args.host, args.port
+    else:
+        host = '127.0.0.1'
+        port, stop = start_local_smtp_server()
+
+    settings = {'server': host, 'port': port, 'username': None, 'password': None,
+                'sender': 'bench@example.com', 'use_tls': False, 'use_ssl': False, 'timeout': 10}
+    try:
+        unpooled = run(lambda *message: send_smtp_email(*message, settings=settings), args.messages, args.threads)
+        transport = SmtpTransport(settings=settings, pool_size=args.threads, max_messages=args.max_messages)
+        pooled = run(transport.send, args.messages, args.threads)
+        stats = transport.stats()
+        transport.close()
+    finally:
+        if stop:
+            stop()
+
+    print(f"SMTP服务器: {host}:{port}, 邮件数: {args.messages}, 线程数: {args.threads}")
+    print(f"{'方式':<16}{'总耗时(s)':>12}{'封/秒':>12}{'连接数':>10}")
+    print(f"{'每封新建连接':<16}{unpooled:>12.3f}{args.messages / unpooled:>12.1f}{args.messages:>10}")
+    print(f"{'连接池':<16}{pooled:>12.3f}{args.messages / pooled:>12.1f}{stats['connects']:>10}")
+    print(f"连接池单次发送耗时: 平均 {stats['send_ms_avg']}ms, 最大 {stats['send_ms_max']}ms")
+
+
+if __name__ == '__main__':
+    main()
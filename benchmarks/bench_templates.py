@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""页面模板渲染性能基准
+
+对比原来的render_template_string（每次请求重新解析、编译模板源码）与从app/templates按名称加载的
+render_template（每个进程只编译一次）在各页面上的单次渲染耗时。
+
+运行方式：
+    python benchmarks/bench_templates.py [--requests 500]
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template, render_template_string
+
+from app import app
+from app.routes.auth import format_datetime_with_timezone
+
+WECHAT_USER = {'userid': 'zhangsan', 'name': '张三', 'avatar': 'https://example.com/a.png'}
+TEST_INFO = {'state': 'L_abc', 'test_mode': True, 'test_callback_url': '/wechat_callback?state=L_abc&code=test',
+             'test_hint': '测试模式'}
+
+# 路由 -> (模板名, 渲染参数)
+PAGES = {
+    '/login': ('auth/login.html', {'error_message': None, 'wechat_qrcode_url': None, 'user_ip': '10.0.0.1',
+                                   'captcha_required': True, 'captcha_token': None, 'captcha_image': None}),
+    '/register': ('auth/register.html', {'error_message': None, 'username': '', 'display_name': '', 'email': ''}),
+    '/user_center': ('auth/user_center.html', {
+        'username': 'alice', 'display_name': 'Alice', 'login_type': 'default',
+        'user_info': {'email': 'alice@example.com', 'created_at': datetime.now(timezone.utc)},
+        'login_history': [SimpleNamespace(created_at=datetime.now(timezone.utc), ip_address='10.0.0.1',
+                                          browser='Chrome', platform='Windows', success=True,
+                                          login_type='default', error_message=None) for _ in range(10)],
+        'wechat_binded': False, 'bind_success': False,
+        'format_datetime_with_timezone': format_datetime_with_timezone,
+        'current_time': datetime.now(timezone.utc), 'current_year': 2024, 'user_id': 1, 'user_avatar': None,
+        'wechat_info': None, 'last_login_time': datetime.now(timezone.utc), 'last_login_ip': '10.0.0.1',
+        'real_ip': '10.0.0.1'}),
+    '/change_display_name': ('auth/change_display_name.html', {'username': 'alice', 'current_display_name': 'Alice',
+                                                               'error_message': None, 'success_message': None}),
+    '/change_password': ('auth/change_password.html', {'username': 'alice', 'login_type': 'default',
+                                                       'error_message': None, 'success_message': None}),
+    '/wechat_corp_login': ('auth/wechat_login.html', {'state': 'L_abc', 'qrcode_url': 'https://example.com/qr'}),
+    '/wechat_corp_login?mode=test': ('auth/wechat_login_test.html', {'state': 'L_abc', 'qrcode_url': '/cb',
+                                                                     'test_info': TEST_INFO}),
+    '/bind_wechat_corp?mode=test': ('auth/wechat_bind_test.html', {'qrcode_url': '/cb', 'test_info': TEST_INFO}),
+    '/wechat_callback (用户不存在)': ('auth/wechat_user_not_exist.html', {'wechat_user_info': WECHAT_USER}),
+    '/wechat_callback (确认绑定)': ('auth/wechat_bind_confirm.html', {
+        'wechat_user_info': WECHAT_USER, 'user_display_name': 'Alice', 'is_already_bound': False,
+        'bound_username': None}),
+    '/wechat_callback (登录失败)': ('auth/wechat_login_failed.html', {'error_message': '登录失败'}),
+    '/wechat_callback (绑定失败)': ('auth/wechat_bind_failed.html', {'error_message': '绑定失败'}),
+    '/confirm_wechat_bind (已被绑定)': ('auth/wechat_bind_conflict.html', {}),
+}
+
+
+def timed(render, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        output = render()
+    return (time.perf_counter() - start) / requests * 1000, len(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='页面模板渲染性能基准')
+    parser.add_argument('--requests', type=int, default=500, help='每个页面渲染的次数')
+    args = parser.parse_args()
+
+    print(f"每个页面渲染次数: {args.requests}")
+    print(f"{'路由':<34}{'字符串模板(ms)':>16}{'预编译模板(ms)':>16}{'加速':>8}{'输出字节':>10}")
+    with app.test_request_context('/'):
+        for route, (name, context) in PAGES.items():
+            source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+            before, _ = timed(lambda: render_template_string(source, **context), args.requests)
+            after, size = timed(lambda: render_template(name, **context), args.requests)
+            print(f"{route:<34}{before:>16.3f}{after:>16.3f}{before / after:>7.1f}x{size:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""User-Agent解析性能基准
+
+在一组真实User-Agent上对比三种方式的单次解析耗时（不需要数据库）：
+- legacy：原extract_browser_info/extract_platform_info的逐个re.search方式
+- uncached：单条预编译正则扫描，不使用缓存
+- cached：parse_user_agent（预编译正则 + LRU缓存），模拟实际流量中少量User-Agent反复出现
+
+运行方式：
+    python benchmarks/bench_user_agent.py [--iterations 20000]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.user_agent import parse_user_agent, _parse
+
+CORPUS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.2210.91',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 MicroMessenger/8.0.44(0x18002c2e) NetType/WIFI Language/zh_CN',
+    'Mozilla/5.0 (iPad; CPU OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/120.0.6099.119 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.6099.144 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 13; V2227A Build/TP1A.220624.014; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/107.0.5304.141 Mobile Safari/537.36 wxwork/4.1.16 MicroMessenger/7.0.1 Language/zh ColorScheme/Light',
+    'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.198 Safari/537.36 wxwork/4.1.16 (MicroMessenger/6.2) WindowsWechat',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 OPR/106.0.0.0',
+    'Mozilla/5.0 (Windows NT 10.0; WOW64; Trident/7.0; rv:11.0) like Gecko',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+)
+
+
+def legacy_parse(user_agent):
+    """原实现：每次调用逐个执行re.search"""
+    browser = 'Unknown'
+    for pattern, name in ((r'Edg/(\d+\.\d+)', 'Edge'), (r'Edge/(\d+\.\d+)', 'Edge Legacy'),
+                          (r'Chrome/(\d+\.\d+)', 'Chrome'), (r'Firefox/(\d+\.\d+)', 'Firefox'),
+                          (r'Safari/(\d+\.\d+)', 'Safari'), (r'MSIE (\d+\.\d+)', 'Internet Explorer'),
+                          (r'Trident/(\d+\.\d+)', 'Internet Explorer')):
+        match = re.search(pattern, user_agent)
+        if match and not (name == 'Safari' and 'Chrome' in user_agent):
+            browser = f'{name} {match.group(1)}'
+            break
+    platform = 'Unknown'
+    for token, name in (('Windows', 'Windows'), ('Macintosh', 'macOS'), ('Linux', 'Linux'),
+                        ('iPhone', 'iOS'), ('Android', 'Android')):
+        if token in user_agent:
+            platform = name
+            break
+    return browser, platform
+
+
+def uncached_parse(user_agent):
+    return _parse.__wrapped__(user_agent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='User-Agent解析性能基准')
+    parser.add_argument('--iterations', type=int, default=20000, help='解析次数')
+    args = parser.parse_args()
+
+    # 按长尾分布抽样，少数User-Agent占大部分流量
+    rng = random.Random(0)
+    weights = [1.0 / (rank + 1) for rank in range(len(CORPUS))]
+    samples = rng.choices(CORPUS, weights=weights, k=args.iterations)
+
+    print(f"{'方式':>9} | {'单次(µs)':>9}")
+    print('-' * 22)
+    for name, func in (('legacy', legacy_parse), ('uncached', uncached_parse), ('cached', parse_user_agent)):
+        _parse.cache_clear()
+        start = time.perf_counter()
+        for user_agent in samples:
+            func(user_agent)
+        elapsed = (time.perf_counter() - start) / len(samples) * 1e6
+        print(f"{name:>9} | {elapsed:>9.3f}")
+    print(f"缓存命中统计: {_parse.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
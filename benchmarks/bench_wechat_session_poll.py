@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""企业微信扫码状态轮询性能基准
+
+对比整表读取（get_wechat_sessions）和按state读取（get_wechat_session）两种方式下，
+单次轮询的耗时随未完成会话数量增长的变化情况。
+
+需要可用的MySQL数据库（使用.env.development中的配置），运行方式：
+    python benchmarks/bench_wechat_session_poll.py [--sizes 100,500,2000] [--polls 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.models import get_wechat_sessions, get_wechat_session, save_wechat_session, clean_wechat_sessions
+from app.models.db import WechatSession, db
+
+
+def seed_sessions(count, prefix):
+    """批量写入指定数量的待扫码会话"""
+    now = time.time()
+    states = [f"{prefix}{i:06d}" for i in range(count)]
+    db.session.bulk_save_objects([
+        WechatSession(state=state, created_at=datetime.fromtimestamp(now)) for state in states
+    ])
+    db.session.commit()
+    return states
+
+
+def time_polls(poll_func, states, polls):
+    """执行polls次轮询，返回每次耗时（毫秒）"""
+    samples = []
+    for i in range(polls):
+        state = states[i % len(states)]
+        start = time.perf_counter()
+        poll_func(state)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='企业微信扫码状态轮询性能基准')
+    parser.add_argument('--sizes', default='100,500,2000', help='未完成会话数量，逗号分隔')
+    parser.add_argument('--polls', type=int, default=200, help='每种规模下的轮询次数')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    prefix = 'BENCH_'
+
+    print(f"{'会话数':>8} | {'整表读取 p50(ms)':>16} | {'整表读取 p99(ms)':>16} | {'按state p50(ms)':>15} | {'按state p99(ms)':>15}")
+    print('-' * 84)
+
+    with app.app_context():
+        for size in sizes:
+            states = seed_sessions(size, prefix)
+            # 目标state作为最后一个会话写入，模拟真实的单个二维码页面
+            target = f"{prefix}target"
+            save_wechat_session(target, {'timestamp': time.time(), 'action': 'login', 'scan_status': 'pending'})
+
+            try:
+                full_scan = time_polls(lambda state: get_wechat_sessions().get(state), [target], args.polls)
+                keyed = time_polls(get_wechat_session, [target], args.polls)
+            finally:
+                clean_wechat_sessions(states + [target])
+
+            def p99(samples):
+                return statistics.quantiles(samples, n=100)[98]
+
+            print(f"{size:>8} | {statistics.median(full_scan):>16.3f} | {p99(full_scan):>16.3f} | "
+                  f"{statistics.median(keyed):>15.3f} | {p99(keyed):>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
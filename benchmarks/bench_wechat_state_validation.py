@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""企业微信回调state校验性能基准
+
+对比随机state（每次回调先读取扫码状态存储）和签名state（先校验签名，仅有效state访问存储）
+两种模式下，validate_state_and_get_session_info对有效回调和伪造回调的校验耗时。
+
+默认使用database后端，需要可用的MySQL数据库（使用.env.development中的配置），运行方式：
+    python benchmarks/bench_wechat_state_validation.py [--backend database|memory|redis] [--callbacks 500]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.models.scan_state import create_scan_state_store, set_scan_state_store
+from app.routes.auth import validate_state_and_get_session_info
+from app.utils import generate_signed_wechat_state
+
+IP_ADDRESS = '10.0.0.1'
+
+
+def random_state(i):
+    return f"L_bench{i:017d}"
+
+
+def signed_state(i):
+    return generate_signed_wechat_state('L', ip_address=IP_ADDRESS, mode='production')
+
+
+def forge(state):
+    """修改state最后一位，模拟伪造的回调"""
+    return state[:-1] + ('0' if state[-1] != '0' else '1')
+
+
+def time_callbacks(store, states, valid):
+    """对每个state执行一次回调校验，返回每次耗时（毫秒）"""
+    samples = []
+    for state in states:
+        if valid:
+            store.put(state, {'timestamp': time.time(), 'ip_address': IP_ADDRESS, 'action': 'login'})
+            target = state
+        else:
+            target = forge(state)
+        start = time.perf_counter()
+        validate_state_and_get_session_info(target, 'bench_code', IP_ADDRESS)
+        samples.append((time.perf_counter() - start) * 1000)
+        store.delete(state)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='企业微信回调state校验性能基准')
+    parser.add_argument('--backend', default='database', help='扫码状态存储后端（memory/redis/database）')
+    parser.add_argument('--callbacks', type=int, default=500, help='每种场景的回调次数')
+    args = parser.parse_args()
+
+    def p99(samples):
+        return statistics.quantiles(samples, n=100)[98]
+
+    print(f"{'模式':>8} | {'场景':>6} | {'p50(ms)':>9} | {'p99(ms)':>9}")
+    print('-' * 44)
+
+    with app.app_context():
+        store = create_scan_state_store(args.backend)
+        set_scan_state_store(store)
+        try:
+            for mode, make_state in (('random', random_state), ('signed', signed_state)):
+                states = [make_state(i) for i in range(args.callbacks)]
+                for scenario, valid in (('valid', True), ('forged', False)):
+                    samples = time_callbacks(store, states, valid)
+                    print(f"{mode:>8} | {scenario:>6} | {statistics.median(samples):>9.3f} | {p99(samples):>9.3f}")
+        finally:
+            set_scan_state_store(None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""构建页面使用的静态资源
+
+1. 在frontend目录运行 npm run build:css，Tailwind扫描app/templates和frontend/src中用到的类，生成压缩后的样式
+2. 读取frontend/node_modules/font-awesome的样式，只保留模板和前端源码中用到的图标，字体文件加内容哈希复制
+3. 合并写入app/static/dist/app.<hash>.css及.gz/.br预压缩文件，更新manifest.json
+
+旧版本的带哈希文件不会删除，发布期间仍引用旧文件的页面可以继续加载。
+
+运行方式：
+    cd frontend && npm install && cd ..
+    python build_assets.py [--skip-npm]
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+from app.utils.assets import (ASSETS_DIR, BROTLI_AVAILABLE, find_icon_classes, prune_font_awesome,
+                              rewrite_font_urls, write_asset, write_manifest)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_DIR = os.path.join(BASE_DIR, 'frontend')
+TAILWIND_OUTPUT = os.path.join(FRONTEND_DIR, 'build', 'tailwind.min.css')
+FONT_AWESOME_DIR = os.path.join(FRONTEND_DIR, 'node_modules', 'font-awesome')
+SOURCE_PATHS = [os.path.join(BASE_DIR, 'app', 'templates'), os.path.join(FRONTEND_DIR, 'src'),
+                os.path.join(FRONTEND_DIR, 'index.html')]
+OUTPUT_DIR = os.path.join(BASE_DIR, 'app', 'static', ASSETS_DIR)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='构建页面使用的静态资源')
+    parser.add_argument('--skip-npm', action='store_true', help='不运行npm run build:css，直接使用已生成的Tailwind样式')
+    args = parser.parse_args()
+
+    if not args.skip_npm:
+        subprocess.run(['npm', 'run', 'build:css'], cwd=FRONTEND_DIR, check=True)
+    if not os.path.isfile(TAILWIND_OUTPUT):
+        sys.exit(f"未找到Tailwind样式: {TAILWIND_OUTPUT}")
+    if not os.path.isdir(FONT_AWESOME_DIR):
+        sys.exit(f"未找到font-awesome，请先在frontend目录运行 npm install: {FONT_AWESOME_DIR}")
+
+    manifest = {}
+    fonts = {}
+    fonts_dir = os.path.join(FONT_AWESOME_DIR, 'fonts')
+    for name in sorted(os.listdir(fonts_dir)):
+        target = write_asset(OUTPUT_DIR, f'fonts/{name}', read_bytes(os.path.join(fonts_dir, name)))
+        manifest[f'fonts/{name}'] = target
+        fonts[name] = os.path.basename(target)
+
+    font_awesome = read_bytes(os.path.join(FONT_AWESOME_DIR, 'css', 'font-awesome.min.css')).decode('utf-8')
+    used = find_icon_classes(SOURCE_PATHS)
+    icons = rewrite_font_urls(prune_font_awesome(font_awesome, used), fonts)
+    css = icons.encode('utf-8') + b'\n' + read_bytes(TAILWIND_OUTPUT)
+
+    manifest['app.css'] = write_asset(OUTPUT_DIR, 'app.css', css, precompress=True)
+    manifest_path = write_manifest(OUTPUT_DIR, manifest)
+
+    path = os.path.join(OUTPUT_DIR, manifest['app.css'])
+    print(f"用到的图标类: {len(used)}, Font Awesome: {len(font_awesome)} -> {len(icons)} 字节")
+    print(f"{'文件':<40}{'字节':>10}")
+    for suffix in ('', '.gz', '.br') if BROTLI_AVAILABLE else ('', '.gz'):
+        print(f"{manifest['app.css'] + suffix:<40}{os.path.getsize(path + suffix):>10}")
+    print(f"资源清单: {manifest_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -37,6 +37,7 @@ class Config:
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or MAIL_USERNAME
     MAIL_USE_TLS = True
     MAIL_USE_SSL = False
+    MAIL_TIMEOUT = int(os.environ.get('MAIL_TIMEOUT', 10))  # SMTP连接和读写超时（秒）
     
     # 微信企业号配置
     WECHAT_CORP_ID = os.environ.get('WECHAT_CORP_ID') or 'wx1234567890abcdef'
@@ -46,9 +47,116 @@ class Config:
     
     # 不再需要数据文件路径，所有数据都存储在MySQL中
     
+    # 可信反向代理（逗号分隔的CIDR），只有来自这些地址的请求才使用X-Forwarded-For等转发头确定客户端IP
+    TRUSTED_PROXIES = os.environ.get('TRUSTED_PROXIES', '127.0.0.1/32,::1/128')
+    
+    # 企业微信扫码状态存储配置
+    # memory: 进程内TTL映射（单进程开发环境）; redis: Redis共享存储（多进程/多节点，默认）;
+    # database: wechat_session表（每次状态查询和SSE保活都会读表，生产环境不允许使用）
+    SCAN_STATE_BACKEND = os.environ.get('SCAN_STATE_BACKEND', 'redis')
+    SCAN_STATE_REDIS_URL = os.environ.get('SCAN_STATE_REDIS_URL', 'redis://localhost:6379/0')
+    # 扫码状态有效期，同时用于wechat_session表的expires_at、二维码有效期和回调校验
+    SCAN_STATE_TTL = int(os.environ.get('SCAN_STATE_TTL', 600))  # 10分钟
+    # 扫码状态事件通知：local为进程内通知，redis通过发布/订阅在多个worker间转发事件
+    SCAN_EVENT_BUS = os.environ.get('SCAN_EVENT_BUS', 'local')
+    SCAN_EVENT_REDIS_URL = os.environ.get('SCAN_EVENT_REDIS_URL')  # 未设置时使用SCAN_STATE_REDIS_URL
+    
+    # 企业微信state签名配置：启用后state携带签发时间、操作类型、模式和IP摘要并使用SECRET_KEY签名，
+    # 回调时可在访问存储前拒绝伪造或过期的state（多进程部署需通过环境变量设置统一的SECRET_KEY）
+    WECHAT_STATE_SIGNED = os.environ.get('WECHAT_STATE_SIGNED', 'false').lower() == 'true'
+    WECHAT_STATE_MAX_AGE = int(os.environ.get('WECHAT_STATE_MAX_AGE', SCAN_STATE_TTL))
+    WECHAT_STATE_BIND_IP = os.environ.get('WECHAT_STATE_BIND_IP', 'true').lower() == 'true'
+    
+    # 密码哈希：scrypt（默认）或pbkdf2_sha256，成本参数可用 python -m app.utils.passwords 按目标耗时校准
+    PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'scrypt')
+    PASSWORD_SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', 16384))
+    PASSWORD_SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', 8))
+    PASSWORD_SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', 1))
+    PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  # 同时进行的哈希计算数，0表示CPU核数
+    
+    # 接口限流：规则为"次数/时间窗口"（如 10/minute、5/300 表示300秒5次），设置为空时关闭该规则
+    # memory: 每个worker独立计数; redis: 多worker/多节点共享限额（未设置RATE_LIMIT_REDIS_URL时使用SCAN_STATE_REDIS_URL）
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL')
+    RATE_LIMIT_LOGIN_IP = os.environ.get('RATE_LIMIT_LOGIN_IP', '30/minute')
+    RATE_LIMIT_LOGIN_USERNAME = os.environ.get('RATE_LIMIT_LOGIN_USERNAME', '10/minute')
+    RATE_LIMIT_VERIFICATION_IP = os.environ.get('RATE_LIMIT_VERIFICATION_IP', '10/hour')
+    RATE_LIMIT_VERIFICATION_EMAIL = os.environ.get('RATE_LIMIT_VERIFICATION_EMAIL', '1/minute')
+    RATE_LIMIT_CAPTCHA_IP = os.environ.get('RATE_LIMIT_CAPTCHA_IP', '60/minute')
+    
+    # 登录图形验证码：adaptive为IP或登录账号在窗口内失败次数达到阈值后才要求验证码，always为每次登录都要求
+    LOGIN_CAPTCHA_MODE = os.environ.get('LOGIN_CAPTCHA_MODE', 'adaptive')
+    LOGIN_CAPTCHA_FAILURE_THRESHOLD = int(os.environ.get('LOGIN_CAPTCHA_FAILURE_THRESHOLD', 3))
+    LOGIN_CAPTCHA_FAILURE_WINDOW = int(os.environ.get('LOGIN_CAPTCHA_FAILURE_WINDOW', 900))  # 15分钟
+    
+    # 图形验证码预渲染池：后台线程保持池中数量在低水位以上，/captcha直接取出；池大小设置为0时关闭
+    CAPTCHA_POOL_SIZE = int(os.environ.get('CAPTCHA_POOL_SIZE', 200))
+    CAPTCHA_POOL_LOW_WATER = int(os.environ.get('CAPTCHA_POOL_LOW_WATER', 50))
+    CAPTCHA_POOL_REFILL_RATE = float(os.environ.get('CAPTCHA_POOL_REFILL_RATE', 100))  # 后台每秒最多渲染数量，0为不限制
+    
+    # 无状态验证码令牌：开启后验证码答案通过SECRET_KEY签名的令牌校验，获取验证码和登录校验都不读写session
+    # 令牌只能使用一次，已使用的随机数默认记录在进程内，多worker部署时可配置Redis共享
+    CAPTCHA_TOKEN_ENABLED = os.environ.get('CAPTCHA_TOKEN_ENABLED', 'false').lower() == 'true'
+    CAPTCHA_TOKEN_MAX_AGE = int(os.environ.get('CAPTCHA_TOKEN_MAX_AGE', 300))  # 5分钟
+    CAPTCHA_NONCE_REDIS_URL = os.environ.get('CAPTCHA_NONCE_REDIS_URL', '')
+    
+    # 邮件发件箱：请求只把邮件写入email_outbox表，后台线程池用SELECT ... FOR UPDATE SKIP LOCKED领取并发送
+    # 失败的邮件按指数退避重试，达到最大次数后标记为dead；关闭时在请求中同步发送
+    EMAIL_OUTBOX_ENABLED = os.environ.get('EMAIL_OUTBOX_ENABLED', 'true').lower() == 'true'
+    EMAIL_OUTBOX_WORKERS = int(os.environ.get('EMAIL_OUTBOX_WORKERS', 2))  # 发送线程数，0为本进程不发送
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 10))  # 每个线程每次领取的邮件数
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL', 2))  # 秒，本进程入队时立即唤醒
+    EMAIL_OUTBOX_LEASE = int(os.environ.get('EMAIL_OUTBOX_LEASE', 120))  # 秒，超时未完成的邮件会被重新领取
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+    EMAIL_OUTBOX_BACKOFF_BASE = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_BASE', 30))  # 第n次失败后等待base*2^(n-1)秒
+    EMAIL_OUTBOX_BACKOFF_MAX = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_MAX', 3600))
+    EMAIL_OUTBOX_RETENTION = int(os.environ.get('EMAIL_OUTBOX_RETENTION', 86400))  # 已发送或放弃的邮件保留时间（秒）
+    
+    # SMTP连接池：每个进程保持最多SMTP_POOL_SIZE个已登录的连接并复用，设置为0时每封邮件新建连接
+    SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 2))
+    SMTP_POOL_MAX_MESSAGES = int(os.environ.get('SMTP_POOL_MAX_MESSAGES', 100))  # 每个连接最多发送的邮件数
+    SMTP_POOL_NOOP_AFTER = int(os.environ.get('SMTP_POOL_NOOP_AFTER', 10))  # 秒，空闲超过该时间的连接使用前先NOOP检查
+    SMTP_POOL_IDLE_TIMEOUT = int(os.environ.get('SMTP_POOL_IDLE_TIMEOUT', 60))  # 秒，空闲超过该时间的连接直接关闭
+    
+    # 页面模板：启动时预编译app/templates下的全部模板；配置字节码缓存目录后新启动的worker直接加载编译结果
+    TEMPLATE_PRECOMPILE = os.environ.get('TEMPLATE_PRECOMPILE', 'true').lower() == 'true'
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR', '')
+    
+    # 响应压缩：按Accept-Encoding用br（需要安装brotli）或gzip压缩文本类响应，内容相同的响应复用缓存的压缩结果
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 500))  # 字节，更小的响应不压缩
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))  # 缓存的压缩结果条数，0为不缓存
+    
+    # 用户资料进程内缓存：有效期内直接使用，过期后按updated_at版本号续期；设置为0时关闭缓存
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # 秒
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+    
     # 验证码配置
     VERIFICATION_CODE_LENGTH = 6
-    VERIFICATION_CODE_EXPIRE = 600  # 10分钟
+    VERIFICATION_CODE_EXPIRE = int(os.environ.get('VERIFICATION_CODE_EXPIRE', 600))  # 10分钟，同时用于verification表的expires_at
+    
+    # 过期数据后台清理：按expires_at分批删除wechat_session、verification和email_outbox中的过期行
+    EXPIRY_REAPER_ENABLED = os.environ.get('EXPIRY_REAPER_ENABLED', 'true').lower() == 'true'
+    EXPIRY_REAPER_INTERVAL = int(os.environ.get('EXPIRY_REAPER_INTERVAL', 60))  # 秒
+    EXPIRY_REAPER_BATCH_SIZE = int(os.environ.get('EXPIRY_REAPER_BATCH_SIZE', 1000))  # 每条DELETE最多删除的行数
+    
+    # 登录日志异步批量写入：请求只入队，后台线程每攒够一批或每隔一段时间执行一条多行INSERT
+    LOGIN_LOG_ASYNC = os.environ.get('LOGIN_LOG_ASYNC', 'true').lower() == 'true'
+    LOGIN_LOG_QUEUE_SIZE = int(os.environ.get('LOGIN_LOG_QUEUE_SIZE', 10000))
+    LOGIN_LOG_BATCH_SIZE = int(os.environ.get('LOGIN_LOG_BATCH_SIZE', 200))
+    LOGIN_LOG_FLUSH_INTERVAL_MS = int(os.environ.get('LOGIN_LOG_FLUSH_INTERVAL_MS', 200))
+    LOGIN_LOG_OVERFLOW = os.environ.get('LOGIN_LOG_OVERFLOW', 'drop')  # drop: 队列满时丢弃并计数; block: 短暂等待后丢弃
+    # 登录请求在记录日志上最多等待的时间（毫秒），超时或数据库写入失败时日志落盘到本地文件
+    LOGIN_LOG_BUDGET_MS = int(os.environ.get('LOGIN_LOG_BUDGET_MS', 50))
+    # 登录日志落盘文件（数据库恢复后由后台线程回放），设置为空时不落盘
+    LOGIN_LOG_SPILL_PATH = os.environ.get('LOGIN_LOG_SPILL_PATH', os.path.join(BASE_DIR, 'data', 'login_log.spill'))
+    LOGIN_LOG_SPILL_FSYNC_BATCH = int(os.environ.get('LOGIN_LOG_SPILL_FSYNC_BATCH', 64))  # 每累计多少条执行一次fsync
+    LOGIN_LOG_SPILL_FSYNC_INTERVAL_MS = int(os.environ.get('LOGIN_LOG_SPILL_FSYNC_INTERVAL_MS', 100))
+    LOGIN_LOG_REPLAY_INTERVAL = int(os.environ.get('LOGIN_LOG_REPLAY_INTERVAL', 30))  # 秒
     
     # 应用配置
     DEBUG = os.environ.get('DEBUG') == 'True'
@@ -79,6 +187,9 @@ class MySQLConfig(Config):
 class DevelopmentConfig(MySQLConfig):
     DEBUG = True
     APP_ENV = 'development'
+    
+    # 开发环境单进程运行，扫码状态默认保存在进程内
+    SCAN_STATE_BACKEND = os.environ.get('SCAN_STATE_BACKEND', 'memory')
 
 # 生产环境配置
 class ProductionConfig(MySQLConfig):
@@ -96,12 +207,16 @@ class ProductionConfig(MySQLConfig):
         # 确保必要的环境变量已设置
         if not self.SECRET_KEY:
             raise ValueError("Production environment requires SECRET_KEY to be set")
+        # 扫码状态轮询不能落到wechat_session表上
+        if self.SCAN_STATE_BACKEND.lower() == 'database':
+            raise ValueError("Production environment requires SCAN_STATE_BACKEND=redis (or memory for a single process), not database")
 
 # 测试环境配置
 class TestingConfig(MySQLConfig):
     DEBUG = False
     TESTING = True
     APP_ENV = 'testing'
+    EXPIRY_REAPER_ENABLED = False
     
     # 测试环境使用特定的MySQL配置
     DB_HOST = os.environ.get('TEST_DB_HOST', '192.168.7.7')
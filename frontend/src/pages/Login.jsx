@@ -1,6 +1,10 @@
 import React, { useState, useEffect, useRef } from 'react'
 import { useNavigate } from 'react-router-dom'
 
+// 长轮询失败后的首次重试等待时间和最长等待时间（毫秒）
+const LONG_POLL_RETRY_DELAY = 1000
+const LONG_POLL_MAX_RETRY_DELAY = 30000
+
 function Login() {
   const [formData, setFormData] = useState({
     username: '',
@@ -12,11 +16,12 @@ function Login() {
   const [wechatLoginState, setWechatLoginState] = useState('')
   const [scanStatus, setScanStatus] = useState('init') // init, scanning, scanned, confirmed, expired
   const [qrcodeExpiryTimer, setQrcodeExpiryTimer] = useState(null)
-  const [checkStatusTimer, setCheckStatusTimer] = useState(null)
   const [showPassword, setShowPassword] = useState(false) // 添加密码可见性切换
   const [isLoading, setIsLoading] = useState(false) // 添加加载状态
   const navigate = useNavigate()
   const qrcodeRef = useRef(null)
+  const statusSourceRef = useRef(null) // 扫码状态SSE连接
+  const watchingStateRef = useRef(null) // 正在等待状态推送的state
 
   useEffect(() => {
     // 获取企业微信登录二维码URL
@@ -69,57 +74,79 @@ function Login() {
     // 清理函数
     return () => {
       if (qrcodeExpiryTimer) clearTimeout(qrcodeExpiryTimer)
-      if (checkStatusTimer) clearInterval(checkStatusTimer)
+      stopStatusCheck()
     }
   }, [])
   
-  // 启动登录状态检查
+  // 停止接收登录状态
+  const stopStatusCheck = () => {
+    watchingStateRef.current = null
+    if (statusSourceRef.current) {
+      statusSourceRef.current.close()
+      statusSourceRef.current = null
+    }
+  }
+  
+  // 启动登录状态检查：优先使用服务器推送（SSE），不支持时使用长轮询
   const startStatusCheck = (state) => {
-    // 清除之前可能存在的定时器
-    if (checkStatusTimer) clearInterval(checkStatusTimer)
-    
-    // 每2秒检查一次登录状态
-    const timer = setInterval(() => {
-      checkLoginStatus(state)
-    }, 2000)
+    // 关闭之前可能存在的连接
+    stopStatusCheck()
+    watchingStateRef.current = state
     
-    setCheckStatusTimer(timer)
+    if (window.EventSource) {
+      const source = new EventSource(`/api/wechat_login_events/${state}`)
+      source.onmessage = (event) => handleLoginStatus(JSON.parse(event.data))
+      source.onerror = () => {
+        // 连接被关闭且不再重连时改用长轮询
+        if (source.readyState === EventSource.CLOSED && watchingStateRef.current === state) {
+          statusSourceRef.current = null
+          longPollLoginStatus(state)
+        }
+      }
+      statusSourceRef.current = source
+    } else {
+      longPollLoginStatus(state)
+    }
   }
   
-  // 检查登录状态
-  const checkLoginStatus = async (state) => {
-    try {
-      // 修复API URL格式，使用正确的路径参数格式
-      const response = await fetch(`/api/check_wechat_login/${state}`)
-      const data = await response.json()
-      
-      if (data.success) {
-        if (data.status === 'scanned') {
-          setScanStatus('scanned')
-          // 已扫码状态下，缩短检查间隔
-          if (checkStatusTimer) {
-            clearInterval(checkStatusTimer)
-            const timer = setInterval(() => {
-              checkLoginStatus(state)
-            }, 1000) // 缩短到1秒检查一次
-            setCheckStatusTimer(timer)
-          }
-        } else if (data.status === 'confirmed') {
-          setScanStatus('confirmed')
-          // 清除定时器
-          if (checkStatusTimer) clearInterval(checkStatusTimer)
-          if (qrcodeExpiryTimer) clearTimeout(qrcodeExpiryTimer)
-          // 登录成功，跳转到首页
-          setTimeout(() => {
-            navigate('/')
-          }, 1000)
-        } else if (data.status === 'expired') {
-          setScanStatus('expired')
-          if (checkStatusTimer) clearInterval(checkStatusTimer)
+  // 长轮询：服务器在状态变化或等待超时后才返回
+  // 请求失败（网络错误或服务器返回错误）时等待后重试，连续失败时等待时间翻倍，避免服务故障期间反复请求
+  const longPollLoginStatus = async (state) => {
+    let retryDelay = LONG_POLL_RETRY_DELAY
+    while (watchingStateRef.current === state) {
+      try {
+        const response = await fetch(`/api/check_wechat_login/${state}?wait=25`)
+        const data = await response.json()
+        if (!response.ok || !data.success) {
+          throw new Error(data.message || `HTTP ${response.status}`)
         }
+        retryDelay = LONG_POLL_RETRY_DELAY
+        if (watchingStateRef.current === state) handleLoginStatus(data)
+      } catch (error) {
+        console.error('检查登录状态失败:', error)
+        await new Promise(resolve => setTimeout(resolve, retryDelay))
+        retryDelay = Math.min(retryDelay * 2, LONG_POLL_MAX_RETRY_DELAY)
       }
-    } catch (error) {
-      console.error('检查登录状态失败:', error)
+    }
+  }
+  
+  // 处理登录状态
+  const handleLoginStatus = (data) => {
+    if (!data.success) return
+    
+    if (data.status === 'scanned') {
+      setScanStatus('scanned')
+    } else if (data.status === 'confirmed') {
+      setScanStatus('confirmed')
+      stopStatusCheck()
+      if (qrcodeExpiryTimer) clearTimeout(qrcodeExpiryTimer)
+      // 登录成功，跳转到首页
+      setTimeout(() => {
+        navigate('/')
+      }, 1000)
+    } else if (data.status === 'expired' || data.status === 'failed') {
+      setScanStatus('expired')
+      stopStatusCheck()
     }
   }
   
@@ -127,7 +154,7 @@ function Login() {
   const refreshQrcode = () => {
     // 清除之前的定时器
     if (qrcodeExpiryTimer) clearTimeout(qrcodeExpiryTimer)
-    if (checkStatusTimer) clearInterval(checkStatusTimer)
+    stopStatusCheck()
     
     // 重新获取二维码
     fetch('/api/wechat_qrcode')
@@ -0,0 +1,23 @@
+/** 服务端渲染页面（app/templates）与前端源码共用的Tailwind配置，由 npm run build:css 生成压缩后的样式 */
+export default {
+  content: {
+    relative: true,
+    files: ['../app/templates/**/*.html', './index.html', './src/**/*.{js,jsx}'],
+  },
+  theme: {
+    extend: {
+      colors: {
+        primary: '#3b82f6',
+        secondary: '#10b981',
+        accent: '#8b5cf6',
+        warning: '#f59e0b',
+        danger: '#ef4444',
+        wechat: '#07C160',
+        wechat_corp: '#0084ff',
+      },
+      fontFamily: {
+        sans: ['Inter', 'system-ui', 'sans-serif'],
+      },
+    },
+  },
+}
@@ -0,0 +1,185 @@
+import unittest
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+
+from flask import Flask, render_template_string
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as main_app
+from app.utils.assets import (ASSETS_DIR, find_icon_classes, hashed_name, init_assets, prune_font_awesome,
+                              rewrite_font_urls, write_asset, write_manifest)
+
+# font-awesome.min.css的片段
+FONT_AWESOME_CSS = (
+    "/*! Font Awesome 4.7.0 */"
+    "@font-face{font-family:'FontAwesome';src:url('../fonts/fontawesome-webfont.eot?v=4.7.0');"
+    "src:url('../fonts/fontawesome-webfont.woff2?v=4.7.0') format('woff2')}"
+    ".fa{display:inline-block;font:normal normal normal 14px/1 FontAwesome}"
+    ".fa-spin{animation:fa-spin 2s infinite linear}"
+    "@keyframes fa-spin{0%{transform:rotate(0deg)}100%{transform:rotate(359deg)}}"
+    ".fa-glass:before{content:\"\\f000\"}"
+    ".fa-remove:before,.fa-close:before,.fa-times:before{content:\"\\f00d\"}"
+    ".fa-user:before{content:\"\\f007\"}"
+    ".sr-only{position:absolute}"
+)
+
+
+class TestAssetBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_find_icon_classes(self):
+        """测试从模板和JSX中提取fa-*类名"""
+        with open(os.path.join(self.tmp, 'page.html'), 'w', encoding='utf-8') as f:
+            f.write('<i class="fa fa-user-circle text-2xl"></i><i class="fa fa-spinner fa-spin"></i>')
+        with open(os.path.join(self.tmp, 'Home.jsx'), 'w', encoding='utf-8') as f:
+            f.write('<i className="fa fa-sign-out text-xl"></i>')
+        with open(os.path.join(self.tmp, 'notes.txt'), 'w', encoding='utf-8') as f:
+            f.write('fa-glass')
+
+        used = find_icon_classes([self.tmp])
+
+        self.assertEqual(used, {'fa-user-circle', 'fa-spinner', 'fa-spin', 'fa-sign-out'})
+
+    def test_prune_font_awesome(self):
+        """测试只保留用到的图标，@规则和公共规则原样保留"""
+        css = prune_font_awesome(FONT_AWESOME_CSS, {'fa-times', 'fa-spin'})
+
+        self.assertIn('@font-face', css)
+        self.assertIn('@keyframes fa-spin{0%{transform:rotate(0deg)}100%{transform:rotate(359deg)}}', css)
+        self.assertIn('.fa{display:inline-block', css)
+        self.assertIn('.sr-only{', css)
+        self.assertIn('.fa-times:before{content:"\\f00d"}', css)
+        self.assertNotIn('fa-close', css)
+        self.assertNotIn('fa-glass', css)
+        self.assertNotIn('fa-user', css)
+
+    def test_rewrite_font_urls(self):
+        """测试字体地址替换为带哈希的文件，保留查询参数"""
+        css = rewrite_font_urls(FONT_AWESOME_CSS, {'fontawesome-webfont.woff2': 'fontawesome-webfont.abc.woff2'})
+
+        self.assertIn("url('fonts/fontawesome-webfont.abc.woff2?v=4.7.0')", css)
+        self.assertIn("url('fonts/fontawesome-webfont.eot?v=4.7.0')", css)
+        self.assertNotIn('../fonts/', css)
+
+    def test_write_asset(self):
+        """测试文件名带内容哈希，并生成内容一致的.gz文件"""
+        data = b'.a{color:red}' * 100
+        target = write_asset(self.tmp, 'app.css', data, precompress=True)
+
+        self.assertEqual(target, hashed_name('app.css', data))
+        self.assertNotEqual(target, hashed_name('app.css', data + b' '))
+        with open(os.path.join(self.tmp, target + '.gz'), 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), data)
+        # 相同内容重复构建得到相同的文件
+        with open(os.path.join(self.tmp, target + '.gz'), 'rb') as f:
+            first = f.read()
+        write_asset(self.tmp, 'app.css', data, precompress=True)
+        with open(os.path.join(self.tmp, target + '.gz'), 'rb') as f:
+            self.assertEqual(f.read(), first)
+
+
+class TestAssetServing(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.css = b'.a{color:red}' * 100
+        out_dir = os.path.join(self.tmp, ASSETS_DIR)
+        self.target = write_asset(out_dir, 'app.css', self.css, precompress=True)
+        write_manifest(out_dir, {'app.css': self.target})
+        with open(os.path.join(self.tmp, 'robots.txt'), 'w') as f:
+            f.write('User-agent: *')
+        with open(os.path.join(self.tmp, 'legacy.js'), 'wb') as f:
+            f.write(b'console.log(1);')
+        with open(os.path.join(self.tmp, 'legacy.js.gz'), 'wb') as f:
+            f.write(gzip.compress(b'console.log(1);'))
+
+        self.app = Flask(__name__, static_folder=self.tmp, static_url_path='/static')
+        init_assets(self.app)
+        self.client = self.app.test_client()
+
+    def test_asset_url(self):
+        """测试模板中按清单引用带哈希的文件"""
+        with self.app.test_request_context('/'):
+            html = render_template_string("{{ asset_url('app.css') }}|{{ asset_url('missing.css') }}")
+        self.assertEqual(html, f'/static/{ASSETS_DIR}/{self.target}|None')
+
+    def test_serves_gzip_variant(self):
+        """测试接受gzip时返回预压缩文件和immutable缓存头"""
+        response = self.client.get(f'/static/{ASSETS_DIR}/{self.target}', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(response.data), self.css)
+        response.close()
+
+    def test_serves_identity_without_accept_encoding(self):
+        """测试不支持压缩的客户端得到原文件"""
+        response = self.client.get(f'/static/{ASSETS_DIR}/{self.target}', headers={'Accept-Encoding': 'identity'})
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, self.css)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        response.close()
+
+    def test_other_static_files_unchanged(self):
+        """测试清单以外的静态文件不使用长期缓存"""
+        response = self.client.get('/static/robots.txt', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response.headers.get('Cache-Control', ''))
+        response.close()
+        self.assertEqual(self.client.get(f'/static/{ASSETS_DIR}/manifest.json.gz').status_code, 404)
+
+
+    def test_precompressed_sibling_for_plain_static_file(self):
+        """测试不带哈希的静态文件存在.gz时同样直接返回，但不使用长期缓存"""
+        response = self.client.get('/static/legacy.js', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('javascript', response.mimetype)
+        self.assertEqual(gzip.decompress(response.data), b'console.log(1);')
+        self.assertNotIn('immutable', response.headers.get('Cache-Control', ''))
+        response.close()
+
+
+class TestPageStyles(unittest.TestCase):
+
+    def render_page(self, manifest):
+        original = main_app.extensions.get('assets')
+        main_app.extensions['assets'] = manifest
+        try:
+            with main_app.test_request_context('/'):
+                return main_app.jinja_env.get_template('auth/wechat_login_failed.html').render(error_message='x')
+        finally:
+            main_app.extensions['assets'] = original
+
+    def test_uses_built_stylesheet(self):
+        """测试构建后页面引用带哈希的样式，不再加载CDN"""
+        html = self.render_page({'app.css': 'app.0123456789ab.css'})
+
+        self.assertIn(f'/static/{ASSETS_DIR}/app.0123456789ab.css', html)
+        self.assertNotIn('cdn.tailwindcss.com', html)
+        self.assertNotIn('cdn.jsdelivr.net', html)
+
+    def test_falls_back_to_cdn(self):
+        """测试未构建时回退到CDN"""
+        html = self.render_page({})
+
+        self.assertIn('cdn.tailwindcss.com', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import itertools
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.utils import PIL_AVAILABLE
+from app.utils.config_manager import ConfigManager
+from app.utils.captcha_pool import (CaptchaPool, create_captcha_pool, get_captcha, set_captcha_pool,
+                                    render_captcha)
+
+
+def counting_renderer():
+    """按顺序生成不同验证码的渲染函数"""
+    counter = itertools.count()
+    return lambda: (f"C{next(counter):03d}", b'png')
+
+
+class TestCaptchaPool(unittest.TestCase):
+
+    def test_fill_and_single_use(self):
+        """测试预热后依次取出不同的验证码，取出后从池中移除"""
+        pool = CaptchaPool(size=3, low_water=1, refill_rate=0, renderer=counting_renderer())
+
+        self.assertEqual(pool.fill(), 3)
+        self.assertEqual(pool.fill(), 0)
+        codes = [pool.get()[0] for _ in range(3)]
+
+        self.assertEqual(codes, ['C000', 'C001', 'C002'])
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(pool.stats()['starved'], 0)
+
+    def test_starved_renders_inline(self):
+        """测试池为空时在请求中直接渲染并计数"""
+        pool = CaptchaPool(size=2, low_water=1, refill_rate=0, renderer=counting_renderer())
+
+        self.assertEqual(pool.get(), ('C000', b'png'))
+        stats = pool.stats()
+        self.assertEqual(stats['starved'], 1)
+        self.assertEqual(stats['served'], 1)
+
+    def test_background_refill(self):
+        """测试后台线程在低于低水位时补充到上限"""
+        pool = CaptchaPool(size=5, low_water=2, refill_rate=0, renderer=counting_renderer())
+        pool.start()
+        self.addCleanup(pool.stop, 5)
+
+        for _ in range(200):
+            if len(pool) == 5:
+                break
+            pool._stop.wait(0.01)
+        self.assertEqual(len(pool), 5)
+
+        for _ in range(4):
+            pool.get()
+        for _ in range(200):
+            if len(pool) == 5:
+                break
+            pool._stop.wait(0.01)
+        self.assertEqual(len(pool), 5)
+        self.assertEqual(pool.stats()['rendered'], 9)
+
+    def test_renderer_error_stops_fill(self):
+        """测试渲染失败时停止本轮补充并计数"""
+        def broken():
+            raise OSError('font missing')
+        pool = CaptchaPool(size=3, low_water=1, refill_rate=0, renderer=broken)
+
+        self.assertEqual(pool.fill(), 0)
+        self.assertEqual(pool.stats()['errors'], 1)
+
+    def test_pool_disabled(self):
+        """测试池大小为0时不创建验证码池"""
+        config_manager = ConfigManager({'CAPTCHA_POOL_SIZE': 0})
+        with patch('app.utils.captcha_pool.get_config_manager', new=lambda: config_manager):
+            self.assertIsNone(create_captcha_pool())
+
+
+class TestCaptchaRoute(unittest.TestCase):
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.pool = CaptchaPool(size=2, low_water=1, refill_rate=0, renderer=counting_renderer())
+        self.pool.fill()
+        set_captcha_pool(self.pool)
+        self.addCleanup(set_captcha_pool, None)
+
+    @patch('app.utils.rate_limit.get_rate_limiter', return_value=None)
+    def test_captcha_served_from_pool(self, mock_get_rate_limiter):
+        """测试/captcha从池中取出验证码并保存到session"""
+        response = self.client.get('/captcha')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'png')
+        with self.client.session_transaction() as session:
+            self.assertEqual(session['captcha'], 'C000')
+        self.assertEqual(len(self.pool), 1)
+
+    @unittest.skipUnless(PIL_AVAILABLE, "Pillow未安装")
+    def test_render_captcha_png(self):
+        """测试默认渲染函数返回PNG字节"""
+        code, png_bytes = render_captcha()
+
+        self.assertEqual(len(code), 4)
+        self.assertTrue(png_bytes.startswith(b'\x89PNG'))
+        set_captcha_pool(None)
+        self.assertTrue(get_captcha()[1].startswith(b'\x89PNG'))
+
+
+if __name__ == '__main__':
+    unittest.main()
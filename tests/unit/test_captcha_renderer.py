@@ -0,0 +1,43 @@
+import unittest
+import os
+import io
+import sys
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.captcha_renderer import (PIL_AVAILABLE, CAPTCHA_CHARS, CAPTCHA_ROTATIONS, CaptchaRenderer,
+                                          load_captcha_font)
+
+if PIL_AVAILABLE:
+    from PIL import Image
+
+
+@unittest.skipUnless(PIL_AVAILABLE, "Pillow未安装")
+class TestCaptchaRenderer(unittest.TestCase):
+
+    def test_generate_png(self):
+        """测试生成160x60的PNG图片，字符区域有深色像素"""
+        code, png_bytes = CaptchaRenderer().generate()
+
+        self.assertEqual(len(code), 4)
+        self.assertTrue(all(c in CAPTCHA_CHARS for c in code))
+        image = Image.open(io.BytesIO(png_bytes))
+        self.assertEqual(image.size, (160, 60))
+        darkest = min(min(pixel) for pixel in image.convert('RGB').crop((20, 15, 140, 45)).getdata())
+        self.assertLessEqual(darkest, 100)
+
+    def test_font_and_atlas_loaded_once(self):
+        """测试字体和字形图集只在第一次渲染时加载"""
+        renderer = CaptchaRenderer()
+        with patch('app.utils.captcha_renderer.load_captcha_font', wraps=load_captcha_font) as mock_load:
+            for _ in range(5):
+                renderer.generate()
+
+        mock_load.assert_called_once()
+        self.assertEqual(len(renderer.atlas), len(CAPTCHA_CHARS) * len(CAPTCHA_ROTATIONS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import os
+import sys
+import time
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.utils.config_manager import ConfigManager
+from app.utils.login_risk import LoginRiskTracker, set_login_risk_tracker
+from app.utils.captcha_token import (CaptchaTokenSigner, MemoryNonceStore, RedisNonceStore,
+                                     set_captcha_token_signer)
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+class TestCaptchaTokenSigner(unittest.TestCase):
+
+    def setUp(self):
+        self.signer = CaptchaTokenSigner(max_age=300)
+
+    def test_verify_ignores_case_and_single_use(self):
+        """测试答案忽略大小写，令牌只能使用一次"""
+        token = self.signer.issue('AB3D')
+
+        self.assertEqual(self.signer.verify(token, 'ab3d'), (True, None))
+        self.assertEqual(self.signer.verify(token, 'AB3D'), (False, '验证码已使用，请刷新重试'))
+        self.assertEqual(self.signer.stats()['replayed'], 1)
+
+    def test_wrong_answer_consumes_token(self):
+        """测试答案错误时令牌同样失效，无法对同一令牌反复猜测"""
+        token = self.signer.issue('AB3D')
+
+        self.assertEqual(self.signer.verify(token, 'XXXX'), (False, '验证码错误'))
+        self.assertFalse(self.signer.verify(token, 'AB3D')[0])
+
+    def test_expired_and_tampered_tokens(self):
+        """测试过期和被篡改的令牌被拒绝"""
+        expired = self.signer.issue('AB3D', now=time.time() - 301)
+        self.assertEqual(self.signer.verify(expired, 'AB3D'), (False, '验证码已过期'))
+
+        expires_at, nonce, tag, mac = self.signer.issue('AB3D').split('.')
+        extended = f"{int(expires_at, 16) + 3600:08x}.{nonce}.{tag}.{mac}"
+        self.assertEqual(self.signer.verify(extended, 'AB3D'), (False, '验证码已失效，请刷新重试'))
+        self.assertFalse(self.signer.verify('garbage', 'AB3D')[0])
+        self.assertFalse(self.signer.verify(None, 'AB3D')[0])
+
+    def test_forged_tokens_not_recorded(self):
+        """测试伪造的令牌在记录随机数之前被拒绝，不占用随机数集合"""
+        store = MemoryNonceStore()
+        signer = CaptchaTokenSigner(nonce_store=store, max_age=300)
+        expires_at, nonce, tag, mac = signer.issue('AB3D').split('.')
+
+        forged = [
+            # 过期时间远在有效期之外
+            f"ffffffff.{nonce}.{tag}.{mac}",
+            f"ffffffff.0123456789abcdef.{'0' * 16}.{'0' * 32}",
+            # 签发标记错误
+            f"{expires_at}.0123456789abcdef.{tag}.{mac}",
+            f"{expires_at}.{nonce}.{'0' * 16}.{mac}",
+            # 随机数长度不符
+            f"{expires_at}.{nonce}00.{tag}.{mac}",
+            f"{expires_at}.{nonce}.{mac}",
+        ]
+        for token in forged:
+            self.assertEqual(signer.verify(token, 'AB3D'), (False, '验证码已失效，请刷新重试'), token)
+        self.assertEqual(len(store), 0)
+
+        # 被拒绝的伪造令牌不影响真实令牌
+        self.assertTrue(signer.verify(f"{expires_at}.{nonce}.{tag}.{mac}", 'AB3D')[0])
+        self.assertEqual(len(store), 1)
+
+    @unittest.skipUnless(FAKEREDIS_AVAILABLE, "fakeredis未安装")
+    def test_forged_tokens_not_written_to_redis(self):
+        """测试伪造的令牌不会在Redis中写入随机数键"""
+        client = fakeredis.FakeRedis()
+        signer = CaptchaTokenSigner(nonce_store=RedisNonceStore(client=client))
+        expires_at, nonce, tag, mac = signer.issue('AB3D').split('.')
+
+        self.assertFalse(signer.verify(f"ffffffff.{nonce}.{tag}.{mac}", 'AB3D')[0])
+        self.assertFalse(signer.verify(f"{expires_at}.{nonce}.{'0' * 16}.{mac}", 'AB3D')[0])
+        self.assertEqual(client.keys('captcha:nonce:*'), [])
+
+    def test_memory_nonce_store_prunes_expired(self):
+        """测试随机数集合清理已过期的随机数，并限制数量"""
+        store = MemoryNonceStore(max_keys=2)
+        now = time.time()
+        self.assertTrue(store.add('a', now - 1))
+        self.assertTrue(store.add('b', now + 60))
+        self.assertEqual(len(store), 1)
+
+        store.add('c', now + 60)
+        store.add('d', now + 60)
+        self.assertEqual(len(store), 2)
+        self.assertFalse(store.add('d', now + 60))
+
+    @unittest.skipUnless(FAKEREDIS_AVAILABLE, "fakeredis未安装")
+    def test_redis_nonce_store_shared(self):
+        """测试多个签发器通过Redis共享已使用的随机数"""
+        client = fakeredis.FakeRedis()
+        first = CaptchaTokenSigner(nonce_store=RedisNonceStore(client=client))
+        second = CaptchaTokenSigner(nonce_store=RedisNonceStore(client=client))
+        token = first.issue('AB3D')
+
+        self.assertTrue(first.verify(token, 'AB3D')[0])
+        self.assertFalse(second.verify(token, 'AB3D')[0])
+
+    def test_nonce_store_error_fails_open(self):
+        """测试随机数集合异常时仍按MAC和有效期校验"""
+        store = MagicMock()
+        store.add.side_effect = RuntimeError('down')
+        signer = CaptchaTokenSigner(nonce_store=store)
+
+        self.assertTrue(signer.verify(signer.issue('AB3D'), 'AB3D')[0])
+
+
+class TestCaptchaTokenRoutes(unittest.TestCase):
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        # 令牌使用当前应用的SECRET_KEY签名，测试中的签发和校验也在应用上下文中进行
+        context = app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        self.signer = CaptchaTokenSigner()
+        set_captcha_token_signer(self.signer)
+        self.addCleanup(set_captcha_token_signer, None)
+        set_login_risk_tracker(LoginRiskTracker(always=True))
+        self.addCleanup(set_login_risk_tracker, None)
+
+        config_manager = ConfigManager({'CAPTCHA_TOKEN_ENABLED': 'true'})
+        for target, kwargs in (('app.utils.captcha_token.get_config_manager', {'new': lambda: config_manager}),
+                               ('app.routes.auth.get_captcha', {'return_value': ('AB3D', b'png')}),
+                               ('app.routes.auth.save_login_log', {}),
+                               ('app.utils.rate_limit.get_rate_limiter', {'return_value': None})):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_captcha_does_not_write_session(self):
+        """测试令牌模式下获取验证码不写入session，也不返回Set-Cookie"""
+        response = self.client.get('/captcha')
+
+        self.assertEqual(response.data, b'png')
+        self.assertNotIn('Set-Cookie', response.headers)
+        self.assertTrue(self.signer.verify(response.headers['X-Captcha-Token'], 'AB3D')[0])
+
+        data = self.client.get('/captcha?format=json').get_json()
+        self.assertTrue(data['captcha_image'].startswith('data:image/png;base64,'))
+        self.assertTrue(self.signer.verify(data['captcha_token'], 'ab3d')[0])
+
+    @patch('app.routes.auth.User')
+    def test_login_verifies_token_once(self, mock_user_model):
+        """测试登录时用令牌校验验证码，同一令牌不能重复提交"""
+        mock_user_model.query.filter_by.return_value.first.return_value = None
+        page = self.client.get('/login').data
+        self.assertIn(b'name="captcha_token"', page)
+        self.assertIn(b'data:image/png;base64,', page)
+
+        form = {'username': 'alice', 'password': 'wrong', 'captcha': 'ab3d',
+                'captcha_token': self.signer.issue('AB3D')}
+        first = self.client.post('/login', data=form)
+        second = self.client.post('/login', data=form)
+
+        self.assertIn('用户名或密码错误'.encode('utf-8'), first.data)
+        self.assertIn('验证码已使用'.encode('utf-8'), second.data)
+        mock_user_model.query.filter_by.assert_called_once()
+        with self.client.session_transaction() as session:
+            self.assertNotIn('captcha', session)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.client_ip import resolve_client_ip, parse_trusted_proxies, get_client_ip
+
+TRUSTED = parse_trusted_proxies('127.0.0.1/32, 10.0.0.0/8, ::1/128')
+
+
+class TestClientIp(unittest.TestCase):
+
+    def test_untrusted_peer_ignores_headers(self):
+        """测试对端不是可信代理时忽略所有转发头"""
+        headers = {'X-Forwarded-For': '1.1.1.1', 'X-Real-IP': '2.2.2.2', 'CF-Connecting-IP': '3.3.3.3'}
+
+        self.assertEqual(resolve_client_ip('8.8.8.8', headers, TRUSTED), '8.8.8.8')
+
+    def test_forwarded_for_right_to_left(self):
+        """测试从右向左跳过可信代理，客户端伪造的最左侧地址不生效"""
+        headers = {'X-Forwarded-For': '6.6.6.6, 203.0.113.7, 10.0.0.2'}
+
+        self.assertEqual(resolve_client_ip('10.0.0.1', headers, TRUSTED), '203.0.113.7')
+
+    def test_forwarded_for_all_trusted(self):
+        """测试所有地址都是可信代理时使用最左侧地址"""
+        headers = {'X-Forwarded-For': '10.0.0.3, 10.0.0.2'}
+
+        self.assertEqual(resolve_client_ip('127.0.0.1', headers, TRUSTED), '10.0.0.3')
+
+    def test_forwarded_for_invalid_hop(self):
+        """测试遇到无法解析的地址时停止，使用最后一个可信代理记录的地址"""
+        headers = {'X-Forwarded-For': '203.0.113.7, garbage, 10.0.0.2'}
+
+        self.assertEqual(resolve_client_ip('127.0.0.1', headers, TRUSTED), '10.0.0.2')
+
+    def test_forwarded_for_with_port_and_ipv6(self):
+        """测试带端口的地址和IPv4映射的IPv6地址"""
+        self.assertEqual(resolve_client_ip('127.0.0.1', {'X-Forwarded-For': '203.0.113.7:5555'}, TRUSTED),
+                         '203.0.113.7')
+        self.assertEqual(resolve_client_ip('::ffff:127.0.0.1', {'X-Forwarded-For': '[2001:db8::1]:443'}, TRUSTED),
+                         '2001:db8::1')
+
+    def test_single_ip_headers_from_trusted_peer(self):
+        """测试没有X-Forwarded-For时使用可信代理设置的X-Real-IP/CF-Connecting-IP"""
+        self.assertEqual(resolve_client_ip('127.0.0.1', {'X-Real-IP': '203.0.113.7'}, TRUSTED), '203.0.113.7')
+        self.assertEqual(resolve_client_ip('127.0.0.1', {'CF-Connecting-IP': '203.0.113.8'}, TRUSTED), '203.0.113.8')
+        self.assertEqual(resolve_client_ip('127.0.0.1', {'X-Real-IP': 'unknown'}, TRUSTED), '127.0.0.1')
+
+    def test_parse_trusted_proxies_skips_invalid(self):
+        """测试忽略无效的CIDR配置"""
+        networks = parse_trusted_proxies('10.0.0.0/8, not-a-cidr, ,192.168.1.1')
+
+        self.assertEqual([str(network) for network in networks], ['10.0.0.0/8', '192.168.1.1/32'])
+
+    def test_get_client_ip_no_network_io(self):
+        """测试请求上下文中解析客户端IP不发起网络请求"""
+        from app import app
+
+        with patch('requests.get') as mock_get, \
+             app.test_request_context('/', headers={'X-Forwarded-For': '203.0.113.7'},
+                                      environ_base={'REMOTE_ADDR': '127.0.0.1'}):
+            self.assertEqual(get_client_ip(), '203.0.113.7')
+        mock_get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
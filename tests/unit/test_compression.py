@@ -0,0 +1,135 @@
+import unittest
+import os
+import sys
+import gzip
+import json
+
+from flask import Flask, Response, jsonify
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.compression import BROTLI_AVAILABLE, CompressionMiddleware, negotiate_encoding
+
+PAGE = '<html><body>' + '<div class="flex items-center">登录</div>' * 200 + '</body></html>'
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 8
+
+
+class TestNegotiateEncoding(unittest.TestCase):
+
+    def test_gzip(self):
+        """测试只接受gzip或gzip质量更高时选择gzip"""
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate_encoding('br;q=0.5, gzip'), 'gzip')
+
+    def test_not_accepted(self):
+        """测试不接受压缩时返回None"""
+        self.assertIsNone(negotiate_encoding(''))
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+
+    def test_brotli_preferred(self):
+        """测试同时接受br和gzip时，安装了brotli则优先br"""
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'br' if BROTLI_AVAILABLE else 'gzip')
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+
+        @app.route('/page')
+        def page():
+            return PAGE
+
+        @app.route('/api/data')
+        def data():
+            return jsonify({'items': [{'id': i, 'name': f'user{i}'} for i in range(100)]})
+
+        @app.route('/small')
+        def small():
+            return 'ok'
+
+        @app.route('/captcha')
+        def captcha():
+            return Response(PNG, mimetype='image/png')
+
+        @app.route('/events')
+        def events():
+            return Response(iter([b'data: 1\n\n'] * 100), mimetype='text/event-stream')
+
+        @app.route('/etag')
+        def etag():
+            response = Response(PAGE + '<!-- etag -->')
+            response.set_etag('v1')
+            return response
+
+        self.middleware = CompressionMiddleware(app.wsgi_app, cache_size=2)
+        app.wsgi_app = self.middleware
+        self.client = app.test_client()
+
+    def get(self, path, accept_encoding='gzip'):
+        return self.client.get(path, headers={'Accept-Encoding': accept_encoding})
+
+    def test_compresses_html(self):
+        """测试HTML按gzip压缩并设置相关响应头"""
+        response = self.get('/page')
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data).decode('utf-8'), PAGE)
+        self.assertLess(len(response.data), len(PAGE.encode('utf-8')) / 5)
+
+    def test_compresses_json(self):
+        """测试/api JSON响应被压缩"""
+        response = self.get('/api/data')
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))['items']), 100)
+
+    def test_identity_client(self):
+        """测试不接受压缩的客户端得到原文，仍带Vary"""
+        response = self.get('/page', accept_encoding='identity')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_data(as_text=True), PAGE)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_skips_small_and_binary(self):
+        """测试小响应和PNG验证码不压缩"""
+        self.assertNotIn('Content-Encoding', self.get('/small').headers)
+        response = self.get('/captcha')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, PNG)
+
+    def test_skips_streaming(self):
+        """测试SSE流式响应原样返回"""
+        response = self.get('/events')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, b'data: 1\n\n' * 100)
+
+    def test_weakens_etag(self):
+        """测试压缩后强ETag改为弱ETag"""
+        response = self.get('/etag')
+
+        self.assertEqual(response.headers['ETag'], 'W/"v1"')
+
+    def test_lru_cache(self):
+        """测试内容相同的响应只压缩一次，缓存条数不超过上限"""
+        first = self.get('/page').data
+        second = self.get('/page').data
+        self.assertEqual(first, second)
+        self.assertEqual(self.middleware.stats()['cache_hits'], 1)
+
+        self.get('/api/data')
+        self.get('/etag')
+        stats = self.middleware.stats()
+        self.assertEqual(stats['cache_entries'], 2)
+        self.assertEqual(stats['compressed'], 4)
+        self.assertLess(stats['ratio'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
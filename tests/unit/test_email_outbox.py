@@ -0,0 +1,187 @@
+import unittest
+import os
+import sys
+import socket
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.dialects import mysql
+
+from app import app
+from app.models.email_outbox import (
+    EmailOutboxWorker, claim_emails, mark_email_failed, mark_email_sent, retry_delay, enqueue_email,
+    set_email_outbox_worker, STATUS_DEAD, STATUS_PENDING, STATUS_SENDING
+)
+from app.utils.mailer import send_smtp_email
+
+# 本地SMTP服务器，用于测试真实的SMTP发送（未安装aiosmtpd时跳过）
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.handlers import Message
+    AIOSMTPD_AVAILABLE = True
+except ImportError:
+    AIOSMTPD_AVAILABLE = False
+
+
+def _compile(statement):
+    return statement.compile(dialect=mysql.dialect())
+
+
+class TestEmailOutboxStatements(unittest.TestCase):
+
+    def setUp(self):
+        self.app_context = app.app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        patcher = patch('app.models.email_outbox.db')
+        self.mock_db = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_claim_uses_skip_locked(self):
+        """测试领取邮件使用FOR UPDATE SKIP LOCKED，并在同一事务中标记为sending"""
+        now = datetime(2024, 1, 1, 12, 0, 0)
+        created_at = now - timedelta(seconds=5)
+        self.mock_db.session.execute.return_value.mappings.return_value = [
+            {'id': 7, 'recipient': 'a@example.com', 'subject': 's', 'content': 'c', 'attempts': 1,
+             'created_at': created_at}
+        ]
+
+        emails = claim_emails(10, lease_seconds=60, now=now)
+
+        select_sql = str(_compile(self.mock_db.session.execute.call_args_list[0][0][0]))
+        self.assertIn('FOR UPDATE SKIP LOCKED', select_sql)
+        self.assertIn('ORDER BY email_outbox.id', select_sql)
+        update_statement = _compile(self.mock_db.session.execute.call_args_list[1][0][0])
+        self.assertTrue(str(update_statement).startswith('UPDATE email_outbox SET'))
+        self.assertEqual(update_statement.params['status'], STATUS_SENDING)
+        self.assertEqual(update_statement.params['locked_until'], now + timedelta(seconds=60))
+        self.mock_db.session.commit.assert_called_once()
+        self.assertEqual(emails[0]['attempts'], 2)
+
+    def test_claim_nothing_to_send(self):
+        """测试没有可发送的邮件时只执行领取查询"""
+        self.mock_db.session.execute.return_value.mappings.return_value = []
+
+        self.assertEqual(claim_emails(10), [])
+        self.assertEqual(self.mock_db.session.execute.call_count, 1)
+        self.mock_db.session.commit.assert_called_once()
+
+    def test_mark_failed_backoff_and_dead_letter(self):
+        """测试失败后按指数退避重新排队，达到最大次数后标记为dead"""
+        now = datetime(2024, 1, 1, 12, 0, 0)
+
+        status = mark_email_failed(7, 2, 'SMTPServerDisconnected', max_attempts=3, backoff_base=30, now=now)
+        params = _compile(self.mock_db.session.execute.call_args[0][0]).params
+        self.assertEqual(status, STATUS_PENDING)
+        self.assertEqual(params['next_attempt_at'], now + timedelta(seconds=60))
+        self.assertIsNone(params['locked_until'])
+
+        status = mark_email_failed(7, 3, 'x' * 1000, max_attempts=3, now=now)
+        params = _compile(self.mock_db.session.execute.call_args[0][0]).params
+        self.assertEqual(status, STATUS_DEAD)
+        self.assertEqual(len(params['last_error']), 500)
+        self.assertIsNotNone(params['expires_at'])
+
+    def test_mark_sent_records_latency(self):
+        """测试发送成功时记录从入队到发送成功的耗时"""
+        now = datetime(2024, 1, 1, 12, 0, 0)
+
+        latency_ms = mark_email_sent(7, now - timedelta(milliseconds=1500), now=now)
+
+        params = _compile(self.mock_db.session.execute.call_args[0][0]).params
+        self.assertEqual(latency_ms, 1500)
+        self.assertEqual(params['latency_ms'], 1500)
+        self.assertEqual(params['sent_at'], now)
+
+    def test_enqueue_single_insert_wakes_worker(self):
+        """测试入队只插入一行并唤醒本进程的发送线程"""
+        worker = MagicMock()
+        set_email_outbox_worker(worker)
+        self.addCleanup(set_email_outbox_worker, None)
+
+        enqueue_email('a@example.com', 'subject', 'content')
+
+        self.mock_db.session.add.assert_called_once()
+        self.mock_db.session.commit.assert_called_once()
+        worker.notify.assert_called_once()
+
+    def test_retry_delay(self):
+        """测试退避时间按2的幂增长并有上限"""
+        self.assertEqual([retry_delay(n, 30, 100) for n in (1, 2, 3, 4)], [30, 60, 100, 100])
+
+
+class TestEmailOutboxWorker(unittest.TestCase):
+
+    def _email(self, email_id, attempts=1):
+        return {'id': email_id, 'recipient': f'user{email_id}@example.com', 'subject': 's', 'content': 'c',
+                'attempts': attempts, 'created_at': datetime.utcnow()}
+
+    @patch('app.models.email_outbox.mark_email_sent', return_value=120)
+    @patch('app.models.email_outbox.mark_email_failed')
+    @patch('app.models.email_outbox.claim_emails')
+    def test_run_once_sends_and_retries(self, mock_claim, mock_failed, mock_sent):
+        """测试发送成功的邮件记录耗时，失败的邮件交给重试逻辑"""
+        mock_claim.return_value = [self._email(1), self._email(2, attempts=5)]
+        mock_failed.return_value = STATUS_DEAD
+
+        def sender(recipient, subject, content):
+            if recipient == 'user2@example.com':
+                raise ConnectionRefusedError('refused')
+
+        worker = EmailOutboxWorker(app, sender, max_attempts=5)
+        self.assertEqual(worker.run_once(), 2)
+
+        mock_sent.assert_called_once()
+        self.assertEqual(mock_failed.call_args[0][:2], (2, 5))
+        stats = worker.stats()
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(stats['dead'], 1)
+        self.assertEqual(stats['latency_ms_avg'], 120)
+
+    @patch('app.models.email_outbox.mark_email_sent', side_effect=RuntimeError('db down'))
+    @patch('app.models.email_outbox.claim_emails')
+    def test_result_write_failure_leaves_lease(self, mock_claim, mock_sent):
+        """测试发送结果写入失败时不中断本批其他邮件，邮件等待租约到期后重新领取"""
+        mock_claim.return_value = [self._email(1), self._email(2)]
+        sent = []
+
+        worker = EmailOutboxWorker(app, lambda recipient, subject, content: sent.append(recipient))
+        worker.run_once()
+
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(worker.stats()['errors'], 2)
+
+    @unittest.skipUnless(AIOSMTPD_AVAILABLE, 'aiosmtpd未安装')
+    @patch('app.models.email_outbox.mark_email_sent', return_value=0)
+    @patch('app.models.email_outbox.claim_emails')
+    def test_delivers_to_local_smtp_server(self, mock_claim, mock_sent):
+        """测试通过本地SMTP服务器实际投递"""
+        received = []
+
+        class Handler(Message):
+            def handle_message(self, message):
+                received.append(message)
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        controller = Controller(Handler(), hostname='127.0.0.1', port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+
+        settings = {'server': '127.0.0.1', 'port': port, 'username': None, 'password': None,
+                    'sender': 'noreply@example.com', 'use_tls': False, 'use_ssl': False, 'timeout': 5}
+        mock_claim.return_value = [self._email(1)]
+        worker = EmailOutboxWorker(app, lambda *args: send_smtp_email(*args, settings=settings))
+        worker.run_once()
+
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]['To'], 'user1@example.com')
+        self.assertEqual(worker.stats()['sent'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import _apply_wechat_session_info, _wechat_session_to_dict
+from app.models.expiry import purge_expired, run_expiry_reaper_once, get_ttl, expiry_now, EXPIRY_POLICY
+from app.models.db import db, WechatSession
+
+
+class TestExpiry(unittest.TestCase):
+
+    def _results(self, *rowcounts):
+        results = []
+        for rowcount in rowcounts:
+            result = MagicMock()
+            result.rowcount = rowcount
+            results.append(result)
+        return results
+
+    def test_purge_expired_in_chunks(self):
+        """测试分批删除直到不足一批"""
+        now = datetime(2024, 1, 1, 12, 0, 0)
+        with patch.object(db.session, 'execute', side_effect=self._results(100, 100, 37)) as mock_execute, \
+             patch.object(db.session, 'commit') as mock_commit:
+            purged = purge_expired('wechat_session', batch_size=100, now=now)
+
+        self.assertEqual(purged, 237)
+        self.assertEqual(mock_execute.call_count, 3)
+        self.assertEqual(mock_commit.call_count, 3)
+        statement, params = mock_execute.call_args[0]
+        self.assertIn('DELETE FROM wechat_session WHERE expires_at <= :now LIMIT :limit', str(statement))
+        self.assertEqual(params, {'now': now, 'limit': 100})
+
+    def test_purge_expired_unknown_table(self):
+        """测试未配置TTL策略的表不允许清理"""
+        with self.assertRaises(ValueError):
+            purge_expired('user')
+
+    def test_run_expiry_reaper_once_reports_per_table(self):
+        """测试每张表分别报告删除行数，单表失败不影响其他表"""
+        def fake_purge(table, batch_size):
+            if table == 'verification':
+                raise RuntimeError('db down')
+            return 5
+
+        with patch('app.models.expiry.purge_expired', side_effect=fake_purge):
+            report = run_expiry_reaper_once(batch_size=10)
+
+        self.assertEqual(report, {'wechat_session': 5, 'verification': -1, 'email_outbox': 5})
+
+    def test_get_ttl_from_config(self):
+        """测试TTL从配置读取"""
+        with patch.dict(os.environ, {'SCAN_STATE_TTL': '120'}):
+            with patch('app.models.expiry.get_config_manager') as mock_get_config_manager:
+                mock_get_config_manager.return_value.get.return_value = '120'
+                self.assertEqual(get_ttl('wechat_session'), 120)
+        self.assertEqual(set(EXPIRY_POLICY), {'wechat_session', 'verification', 'email_outbox'})
+
+    @patch('app.models.get_ttl', return_value=600)
+    def test_wechat_session_times_in_utc(self, mock_get_ttl):
+        """测试wechat_session与其他表一样按UTC写入expires_at，读取的timestamp与写入一致"""
+        session = WechatSession(state='L_state1')
+        _apply_wechat_session_info(session, {'timestamp': 1700000000})
+
+        self.assertEqual(session.created_at, datetime(2023, 11, 14, 22, 13, 20))
+        self.assertEqual(session.expires_at, datetime(2023, 11, 14, 22, 23, 20))
+        self.assertEqual(_wechat_session_to_dict(session)['timestamp'], 1700000000)
+        self.assertLess(abs((expiry_now() - datetime.utcnow()).total_seconds()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
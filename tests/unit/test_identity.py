@@ -0,0 +1,271 @@
+import unittest
+import os
+import sys
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import g, session
+from sqlalchemy import create_engine, event
+from app import app
+from app.models.db import LoginLog, User, db
+from app.models.user_cache import UserCache, get_user_cache, set_user_cache
+from app.routes.identity import get_current_user_for_update, load_current_user
+from config import TestingConfig
+
+
+def make_user(**fields):
+    values = dict(id=1, username='testuser', display_name='测试用户', email='test@example.com',
+                  password='', wechat_corp_userid=None, wechat_corp_name=None, wechat_corp_avatar=None,
+                  wechat_corp_binded_at=None, created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1))
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+class TestLoadCurrentUser(unittest.TestCase):
+
+    @patch('app.routes.identity.get_user_profile')
+    def test_loads_by_primary_key(self, mock_get_user_profile):
+        """测试按会话中的user_id通过用户资料缓存加载当前用户"""
+        user = make_user(id=7)
+        mock_get_user_profile.return_value = user
+
+        with app.test_request_context('/user_center'):
+            session['user_id'] = 7
+            load_current_user()
+            self.assertIs(g.current_user, user)
+
+        mock_get_user_profile.assert_called_once_with(user_id=7)
+
+    @patch('app.routes.identity.get_user_profile')
+    def test_legacy_session_upgraded(self, mock_get_user_profile):
+        """测试只有username的旧会话查询一次后补写user_id"""
+        user = make_user(id=3)
+        mock_get_user_profile.return_value = user
+
+        with app.test_request_context('/user_center'):
+            session['username'] = 'testuser'
+            load_current_user()
+            self.assertIs(g.current_user, user)
+            self.assertEqual(session['user_id'], 3)
+
+        mock_get_user_profile.assert_called_once_with(username='testuser')
+
+    @patch('app.routes.identity.get_user_profile', return_value=None)
+    def test_deleted_user_logged_out(self, mock_get_user_profile):
+        """测试会话中的用户已被删除时清除登录状态"""
+
+        with app.test_request_context('/user_center'):
+            session.update(user_id=7, username='testuser', login_type='default')
+            load_current_user()
+            self.assertIsNone(g.current_user)
+            self.assertNotIn('user_id', session)
+            self.assertNotIn('username', session)
+
+    @patch('app.routes.identity.get_user_profile')
+    def test_anonymous_requests_not_queried(self, mock_get_user_profile):
+        """测试未登录请求和扫码状态轮询不查询用户"""
+        with app.test_request_context('/user_center'):
+            load_current_user()
+        with app.test_request_context('/check_wechat_scan_status'):
+            session['user_id'] = 7
+            load_current_user()
+
+        mock_get_user_profile.assert_not_called()
+
+    @patch('app.routes.identity.db')
+    def test_user_for_update_loads_orm_object(self, mock_db):
+        """测试需要修改用户时按主键加载ORM对象，已是ORM对象时直接返回"""
+        orm_user = User(id=7, username='testuser')
+        mock_db.session.get.return_value = orm_user
+
+        with app.test_request_context('/user_center'):
+            g.current_user = make_user(id=7)
+            self.assertIs(get_current_user_for_update(), orm_user)
+            g.current_user = orm_user
+            self.assertIs(get_current_user_for_update(), orm_user)
+
+        self.assertEqual(mock_db.session.get.call_count, 1)
+        self.assertEqual(mock_db.session.get.call_args[0][1], 7)
+
+
+class TestCurrentUserQueries(unittest.TestCase):
+    """已登录请求只按user_id加载一次用户资料，路由内不再按username查询"""
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'testuser'
+            sess['login_type'] = 'default'
+
+        profile_patcher = patch('app.routes.identity.get_user_profile')
+        self.mock_get_user_profile = profile_patcher.start()
+        self.addCleanup(profile_patcher.stop)
+        self.mock_get_user_profile.return_value = make_user()
+
+        user_patcher = patch('app.routes.auth.User')
+        self.mock_user_model = user_patcher.start()
+        self.addCleanup(user_patcher.stop)
+
+        log_patcher = patch('app.routes.auth.LoginLog')
+        mock_login_log = log_patcher.start()
+        self.addCleanup(log_patcher.stop)
+        mock_login_log.query.filter_by.return_value.order_by.return_value.limit.return_value.all.return_value = []
+
+    def assert_single_user_query(self):
+        self.mock_get_user_profile.assert_called_once_with(user_id=1)
+        self.mock_user_model.query.filter_by.assert_not_called()
+
+    def test_index(self):
+        response = self.client.get('/')
+        self.assertIn('/user_center', response.location)
+        self.assert_single_user_query()
+
+    def test_login_redirects(self):
+        response = self.client.get('/login')
+        self.assertEqual(response.status_code, 302)
+        self.assert_single_user_query()
+
+    def test_user_center(self):
+        response = self.client.get('/user_center')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('测试用户'.encode('utf-8'), response.data)
+        self.assert_single_user_query()
+
+    def test_change_display_name(self):
+        response = self.client.get('/change_display_name')
+        self.assertEqual(response.status_code, 200)
+        self.assert_single_user_query()
+
+    def test_change_password(self):
+        response = self.client.get('/change_password')
+        self.assertEqual(response.status_code, 200)
+        self.assert_single_user_query()
+
+    def test_api_user_info(self):
+        response = self.client.get('/api/user_info')
+        self.assertEqual(response.get_json()['user']['username'], 'testuser')
+        self.assert_single_user_query()
+
+    def test_logout_not_queried(self):
+        response = self.client.get('/logout')
+        self.assertEqual(response.status_code, 302)
+        self.mock_get_user_profile.assert_not_called()
+
+
+class TestRouteSqlStatements(unittest.TestCase):
+    """在测试MySQL库上统计各路由实际执行的SQL语句数，路由新增查询时测试失败
+
+    使用TestingConfig的数据库（TEST_DB_*环境变量），数据库不可用时跳过。
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        uri = TestingConfig.SQLALCHEMY_DATABASE_URI
+        probe = create_engine(uri, connect_args={'connect_timeout': 3})
+        try:
+            probe.connect().close()
+        except Exception as e:
+            raise unittest.SkipTest(f"测试MySQL数据库不可用: {e}")
+        finally:
+            probe.dispose()
+
+        cls.original_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
+        with app.app_context():
+            db.create_all()
+            user = User(username=f"sqlcount_{uuid.uuid4().hex[:12]}", display_name='测试用户', password='x')
+            db.session.add(user)
+            db.session.commit()
+            cls.user_id = user.id
+            cls.username = user.username
+            for success in (False, True):
+                db.session.add(LoginLog(user_id=user.id, username=user.username, ip_address='127.0.0.1',
+                                        login_type='default', success=success))
+            db.session.commit()
+            cls.engine = db.engine
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            LoginLog.query.filter_by(user_id=cls.user_id).delete()
+            User.query.filter_by(id=cls.user_id).delete()
+            db.session.commit()
+        app.config['SQLALCHEMY_DATABASE_URI'] = cls.original_uri
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.user_id
+            sess['username'] = self.username
+            sess['login_type'] = 'default'
+
+        # 每个用例使用空的用户资料缓存，第一次请求按主键加载
+        self.addCleanup(set_user_cache, get_user_cache())
+        set_user_cache(UserCache(ttl=30))
+
+        self.statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            self.statements.append(statement)
+
+        event.listen(self.engine, 'before_cursor_execute', count)
+        self.addCleanup(event.remove, self.engine, 'before_cursor_execute', count)
+
+    def assert_statements(self, expected):
+        self.assertEqual(len(self.statements), expected, self.statements)
+        # 不再按登录账号查询用户或登录日志
+        for statement in self.statements:
+            self.assertNotIn('username =', statement)
+
+    def test_index(self):
+        self.client.get('/')
+        self.assert_statements(1)
+
+    def test_login_redirects(self):
+        self.assertEqual(self.client.get('/login').status_code, 302)
+        self.assert_statements(1)
+
+    def test_user_center(self):
+        """测试用户中心只执行加载用户和按user_id查询登录历史两条语句"""
+        response = self.client.get('/user_center')
+        self.assertEqual(response.status_code, 200)
+        self.assert_statements(2)
+        self.assertIn('login_log.user_id =', self.statements[1])
+
+    def test_change_display_name(self):
+        self.assertEqual(self.client.get('/change_display_name').status_code, 200)
+        self.assert_statements(1)
+
+    def test_change_password(self):
+        self.assertEqual(self.client.get('/change_password').status_code, 200)
+        self.assert_statements(1)
+
+    def test_api_user_info(self):
+        self.assertEqual(self.client.get('/api/user_info').get_json()['user']['id'], self.user_id)
+        self.assert_statements(1)
+
+    def test_logout(self):
+        self.client.get('/logout')
+        self.assert_statements(0)
+
+    def test_cached_user_not_queried(self):
+        """测试缓存中已有当前用户时，后续请求不再查询用户"""
+        self.client.get('/api/user_info')
+        self.statements.clear()
+
+        self.assertEqual(self.client.get('/api/user_info').get_json()['user']['id'], self.user_id)
+        self.assert_statements(0)
+        self.assertEqual(self.client.get('/user_center').status_code, 200)
+        self.assert_statements(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.login_log_spill import LoginLogSpill, SpillReplayer, read_records, REPLAY_SUFFIX
+from app.models import login_log_writer
+from app.models.login_log_writer import LoginLogWriter, record_login_log, write_login_logs
+from app.models.db import db
+
+
+class TestLoginLogSpill(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'login_log.spill')
+        self.spill = LoginLogSpill(self.path, fsync_batch=3, fsync_interval_ms=60000)
+        self.addCleanup(self.spill.close)
+
+    def active_path(self):
+        return f"{self.path}.{os.getpid()}"
+
+    def test_append_and_read(self):
+        """测试追加的记录可以原样读出"""
+        created_at = datetime(2024, 1, 1, 8, 0, tzinfo=timezone.utc)
+        self.spill.append([
+            {'record_id': 'a' * 32, 'username': '用户1', 'success': False, 'created_at': created_at},
+            {'record_id': 'b' * 32, 'username': 'user2', 'success': True},
+        ])
+        self.spill.close()
+
+        rows = list(read_records(self.active_path()))
+
+        self.assertEqual([row['record_id'] for row in rows], ['a' * 32, 'b' * 32])
+        self.assertEqual(rows[0]['username'], '用户1')
+        self.assertEqual(rows[0]['created_at'], created_at)
+
+    def test_truncated_tail_ignored(self):
+        """测试末尾不完整的记录被丢弃，之前的记录仍可读出"""
+        self.spill.append([{'record_id': 'a' * 32}, {'record_id': 'b' * 32}])
+        self.spill.close()
+        with open(self.active_path(), 'r+b') as f:
+            f.truncate(os.path.getsize(self.active_path()) - 3)
+
+        rows = list(read_records(self.active_path()))
+
+        self.assertEqual([row['record_id'] for row in rows], ['a' * 32])
+
+    def test_fsync_batching(self):
+        """测试累计fsync_batch条记录后才执行一次fsync"""
+        with patch('app.models.login_log_spill.os.fsync') as mock_fsync:
+            for i in range(5):
+                self.spill.append([{'record_id': str(i)}])
+            self.assertEqual(mock_fsync.call_count, 1)
+
+            self.spill.append([{'record_id': '5'}])
+            self.assertEqual(mock_fsync.call_count, 2)
+
+    def test_replay_writes_and_removes(self):
+        """测试回放将记录分批写回数据库并删除文件"""
+        self.spill.append([{'record_id': str(i), 'username': f'user{i}'} for i in range(5)])
+        batches = []
+        with patch('app.models.login_log_writer.write_login_logs',
+                   side_effect=lambda rows: batches.append(rows) or len(rows)):
+            replayed = self.spill.replay(batch_size=2)
+
+        self.assertEqual(replayed, 5)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertFalse(self.spill.has_pending())
+
+        # 回放后继续追加写入新文件
+        self.spill.append([{'record_id': '5'}])
+        self.assertTrue(self.spill.has_pending())
+
+    def test_replay_failure_keeps_file(self):
+        """测试回放失败时保留待回放文件，下次重试"""
+        self.spill.append([{'record_id': 'a' * 32}])
+        with patch('app.models.login_log_writer.write_login_logs', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                self.spill.replay()
+
+        pending = self.spill.pending_files()
+        self.assertEqual(len(pending), 1)
+        self.assertTrue(pending[0].endswith(REPLAY_SUFFIX))
+
+        replayer = SpillReplayer(MagicMock(), self.spill)
+        with patch('app.models.login_log_writer.write_login_logs', side_effect=lambda rows: len(rows)):
+            self.assertEqual(replayer.run_once(), 1)
+        self.assertFalse(self.spill.has_pending())
+
+    def test_replay_dead_process_file(self):
+        """测试回放已退出进程遗留的文件"""
+        orphan = LoginLogSpill(self.path)
+        orphan.append([{'record_id': 'a' * 32}])
+        orphan.close()
+        os.replace(self.active_path(), f"{self.path}.999999999")
+
+        with patch('app.models.login_log_spill._pid_alive', return_value=False), \
+             patch('app.models.login_log_writer.write_login_logs', side_effect=lambda rows: len(rows)):
+            self.assertTrue(self.spill.has_pending())
+            self.assertEqual(self.spill.replay(), 1)
+
+
+class TestLoginLogFallback(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.spill = LoginLogSpill(os.path.join(self.tmpdir, 'login_log.spill'))
+        self.addCleanup(self.spill.close)
+
+    def spilled_rows(self):
+        self.spill.close()
+        return [row for path, _ in self.spill._active_files() for row in read_records(path)]
+
+    def test_writer_spills_failed_batch(self):
+        """测试批量写入失败的日志追加到落盘文件"""
+        writer = LoginLogWriter(MagicMock(), spill=self.spill)
+        writer.submit(username='user1', ip_address='10.0.0.1', success=False)
+        with patch('app.models.login_log_writer.write_login_logs', side_effect=RuntimeError('db down')):
+            writer.flush()
+
+        self.assertEqual(writer.stats()['spilled'], 1)
+        rows = self.spilled_rows()
+        self.assertEqual(rows[0]['username'], 'user1')
+        self.assertEqual(len(rows[0]['record_id']), 32)
+
+    def test_writer_spills_on_overflow(self):
+        """测试队列满时日志落盘而不是丢弃"""
+        writer = LoginLogWriter(MagicMock(), max_queue=1, spill=self.spill)
+
+        results = [writer.submit(username=f'user{i}', ip_address='10.0.0.1', success=False) for i in range(2)]
+
+        self.assertEqual(results, [True, True])
+        self.assertEqual(writer.stats()['dropped'], 0)
+        self.assertEqual(writer.stats()['spilled'], 1)
+
+    def test_sync_write_over_budget_spills(self):
+        """测试同步写入超过等待预算时立即返回并落盘"""
+        from app import app
+
+        def slow_write(rows):
+            time.sleep(0.5)
+            return len(rows)
+
+        with patch.object(login_log_writer, '_login_log_writer', None), \
+             patch.object(login_log_writer, '_login_log_spill', self.spill), \
+             patch.object(login_log_writer, '_login_log_budget', 0.02), \
+             patch('app.models.login_log_writer.write_login_logs', side_effect=slow_write), \
+             app.app_context():
+            start = time.perf_counter()
+            result = record_login_log(username='user1', ip_address='10.0.0.1', success=False)
+            elapsed = time.perf_counter() - start
+
+        self.assertTrue(result)
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual(self.spilled_rows()[0]['username'], 'user1')
+
+
+class TestWriteLoginLogsIdempotent(unittest.TestCase):
+
+    def test_insert_ignore_on_mysql(self):
+        """测试MySQL下使用INSERT IGNORE并补全record_id"""
+        from sqlalchemy.dialects import mysql
+
+        with patch.object(db.session, 'execute') as mock_execute, \
+             patch.object(db.session, 'commit'):
+            write_login_logs([{'username': 'user1', 'ip_address': '10.0.0.1', 'success': True}])
+
+        statement = mock_execute.call_args[0][0]
+        self.assertIn('INSERT IGNORE INTO login_log', str(statement.compile(dialect=mysql.dialect())))
+        self.assertEqual(len(statement.compile().params['record_id_m0']), 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
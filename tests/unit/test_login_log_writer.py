@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+import time
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.login_log_writer import LoginLogWriter, write_login_logs, _normalize_row, LOGIN_LOG_FIELDS
+from app.models.db import db
+
+
+class TestLoginLogWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        patcher = patch('app.models.login_log_writer.write_login_logs',
+                        side_effect=lambda rows: self.batches.append(list(rows)) or len(rows))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_by_size(self):
+        """测试攒够batch_size条后写入一批"""
+        writer = LoginLogWriter(MagicMock(), batch_size=3, flush_interval_ms=1000)
+        writer.start()
+        try:
+            for i in range(6):
+                writer.submit(username=f'user{i}', ip_address='10.0.0.1', success=False)
+
+            deadline = time.time() + 5
+            while writer.stats()['written'] < 6 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            writer.stop()
+
+        self.assertEqual([len(batch) for batch in self.batches], [3, 3])
+        self.assertEqual(writer.stats()['batches'], 2)
+
+    def test_flush_interval(self):
+        """测试不足一批时在攒批时间到达后写入"""
+        writer = LoginLogWriter(MagicMock(), batch_size=100, flush_interval_ms=20)
+        writer.start()
+        try:
+            writer.submit(username='user1', ip_address='10.0.0.1', success=True)
+            deadline = time.time() + 5
+            while not self.batches and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            writer.stop()
+
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(self.batches[0][0]['username'], 'user1')
+
+    def test_drop_when_full(self):
+        """测试队列满时丢弃并计数"""
+        writer = LoginLogWriter(MagicMock(), max_queue=2)
+
+        results = [writer.submit(username=f'user{i}', ip_address='10.0.0.1', success=False) for i in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(writer.stats()['dropped'], 1)
+        self.assertEqual(writer.stats()['queued'], 2)
+
+    def test_stop_flushes_queue(self):
+        """测试停止时写入队列中剩余的日志"""
+        writer = LoginLogWriter(MagicMock(), batch_size=2)
+        for i in range(5):
+            writer.submit(username=f'user{i}', ip_address='10.0.0.1', success=False)
+
+        writer.stop()
+
+        self.assertEqual(sum(len(batch) for batch in self.batches), 5)
+        self.assertEqual(writer.stats()['queued'], 0)
+
+    def test_write_failure_counted(self):
+        """测试写入失败时计数，不影响后续日志"""
+        writer = LoginLogWriter(MagicMock(), batch_size=10)
+        writer.submit(username='user1', ip_address='10.0.0.1', success=False)
+        with patch('app.models.login_log_writer.write_login_logs', side_effect=RuntimeError('db down')):
+            writer.flush()
+
+        self.assertEqual(writer.stats()['failed'], 1)
+
+
+class TestWriteLoginLogs(unittest.TestCase):
+
+    def test_single_multi_row_insert(self):
+        """测试一批日志只执行一条INSERT并提交一次"""
+        with patch.object(db.session, 'execute') as mock_execute, \
+             patch.object(db.session, 'commit') as mock_commit:
+            written = write_login_logs([
+                {'username': 'user1', 'ip_address': '10.0.0.1', 'success': True},
+                {'username': 'user2', 'ip_address': '10.0.0.2', 'success': False, 'error_message': '密码错误'},
+            ])
+
+        self.assertEqual(written, 2)
+        mock_execute.assert_called_once()
+        mock_commit.assert_called_once()
+        self.assertIn('INSERT INTO login_log', str(mock_execute.call_args[0][0]))
+
+    def test_normalize_row(self):
+        """测试补全所有列"""
+        row = _normalize_row({'username': 'user1', 'ip_address': '10.0.0.1', 'success': True})
+
+        self.assertEqual(set(row), set(LOGIN_LOG_FIELDS))
+        self.assertEqual(row['login_type'], 'default')
+        self.assertIsNotNone(row['created_at'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.utils.login_risk import LoginRiskTracker, set_login_risk_tracker
+
+
+class TestLoginRiskTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('app.utils.login_risk.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tracker = LoginRiskTracker(threshold=3, window=60)
+
+    def test_captcha_required_after_threshold(self):
+        """测试IP或账号失败次数达到阈值后才要求验证码"""
+        for _ in range(2):
+            self.tracker.record_failure('1.1.1.1', 'Alice')
+        self.assertFalse(self.tracker.captcha_required('1.1.1.1', 'alice'))
+
+        self.tracker.record_failure('2.2.2.2', 'alice')
+        # 账号在不同IP上累计失败
+        self.assertTrue(self.tracker.captcha_required('3.3.3.3', 'alice'))
+        self.assertFalse(self.tracker.captcha_required('1.1.1.1'))
+        self.assertFalse(self.tracker.captcha_required('3.3.3.3', 'bob'))
+
+    def test_success_clears_username_only(self):
+        """测试登录成功清除账号计数，IP计数保留"""
+        for _ in range(3):
+            self.tracker.record_failure('1.1.1.1', 'alice')
+        self.tracker.record_success('alice')
+
+        self.assertFalse(self.tracker.captcha_required(None, 'alice'))
+        self.assertTrue(self.tracker.captcha_required('1.1.1.1'))
+
+    def test_sliding_window_decay(self):
+        """测试失败计数随滑动窗口衰减"""
+        for _ in range(4):
+            self.tracker.record_failure('1.1.1.1')
+
+        self.now += 75  # 上一窗口权重为0.75，估算值为3
+        self.assertTrue(self.tracker.captcha_required('1.1.1.1'))
+        self.now += 10  # 权重约0.58，估算值约2.3
+        self.assertFalse(self.tracker.captcha_required('1.1.1.1'))
+
+        self.now += 120
+        self.tracker.record_failure('2.2.2.2')
+        self.assertEqual(self.tracker.stats()['tracked_keys'], 1)
+
+    def test_stats_and_always_mode(self):
+        """测试统计需要验证码的比例，always模式每次都要求验证码"""
+        self.tracker.record_attempt(False)
+        self.tracker.record_attempt(False)
+        self.tracker.record_attempt(False)
+        self.tracker.record_attempt(True)
+
+        self.assertEqual(self.tracker.stats()['captcha_ratio'], 0.25)
+        self.assertTrue(LoginRiskTracker(always=True).captcha_required('1.1.1.1'))
+
+
+class TestAdaptiveCaptchaLogin(unittest.TestCase):
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.tracker = LoginRiskTracker(threshold=2, window=60)
+        set_login_risk_tracker(self.tracker)
+        self.addCleanup(set_login_risk_tracker, None)
+
+        for target in ('app.routes.auth.save_login_log', 'app.routes.auth.get_captcha'):
+            patcher = patch(target)
+            setattr(self, target.rsplit('.', 1)[1], patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_login_page_without_captcha(self):
+        """测试无失败记录时登录页不加载验证码图片"""
+        response = self.client.get('/login')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'src="/captcha"', response.data)
+
+    @patch('app.routes.auth.verify_user_password', return_value=True)
+    @patch('app.routes.auth.User')
+    def test_clean_login_skips_captcha(self, mock_user_model, mock_verify):
+        """测试正常登录不校验验证码，也不写入会话中的验证码字段"""
+        mock_user_model.query.filter_by.return_value.first.return_value = MagicMock(id=1, username='alice')
+
+        response = self.client.post('/login', data={'username': 'alice', 'password': 'secret'})
+
+        self.assertEqual(response.status_code, 302)
+        with self.client.session_transaction() as session:
+            self.assertNotIn('captcha', session)
+            self.assertNotIn('captcha_attempts', session)
+        self.get_captcha.assert_not_called()
+        self.assertEqual(self.tracker.stats()['captcha_ratio'], 0.0)
+
+    @patch('app.routes.auth.User')
+    def test_captcha_required_after_failures(self, mock_user_model):
+        """测试多次失败后登录页显示验证码，未填写验证码的提交被拒绝"""
+        mock_user_model.query.filter_by.return_value.first.return_value = None
+        form = {'username': 'alice', 'password': 'wrong'}
+
+        first = self.client.post('/login', data=form)
+        self.assertNotIn(b'src="/captcha"', first.data)
+        second = self.client.post('/login', data=form)
+        self.assertIn(b'src="/captcha"', second.data)
+
+        third = self.client.post('/login', data=form)
+        self.assertIn('请输入图形验证码'.encode('utf-8'), third.data)
+        self.assertEqual(mock_user_model.query.filter_by.call_count, 2)
+        self.assertIn(b'src="/captcha"', self.client.get('/login').data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入要测试的函数和模块
 from app.models import get_users, save_users, get_verifications, save_verifications, get_wechat_sessions, save_wechat_sessions
+from app.models import get_wechat_session, update_wechat_session_status, delete_wechat_session
 from app.models.db import User, Verification, WechatSession, db
 from app import app
 
@@ -129,9 +130,9 @@ class TestModels(unittest.TestCase):
         mock_verification2.code = '654321'
         mock_verification2.created_at = 987654321
         
-        # 模拟Verification.query.all()返回模拟验证码
+        # 模拟Verification.query.filter().all()返回未过期的验证码
         with patch('app.models.Verification.query') as mock_query:
-            mock_query.all.return_value = [mock_verification1, mock_verification2]
+            mock_query.filter.return_value.all.return_value = [mock_verification1, mock_verification2]
             
             # 调用被测试函数
             verifications = get_verifications()
@@ -244,5 +245,80 @@ class TestModels(unittest.TestCase):
                 self.assertEqual(mock_add.call_count, 2)  # 添加两个会话
                 mock_commit.assert_called_once()
 
+    def test_get_wechat_session(self):
+        """测试按state获取单个微信会话，只查询对应的一行"""
+        import time
+        mock_session = MagicMock()
+        mock_session.state = 'L_state123'
+        mock_session.created_at = time.time() - 10
+        mock_session.action = 'login'
+        mock_session.ip_address = '10.0.0.1'
+        mock_session.mode = 'production'
+        mock_session.scan_status = 'pending'
+        mock_session.payload = '{"callback_count":0}'
+        
+        with patch('app.models.WechatSession.query') as mock_query:
+            mock_query.filter_by.return_value.filter.return_value.first.return_value = mock_session
+            
+            session_info = get_wechat_session('L_state123')
+            
+            # 只按state过滤，不做全表读取
+            mock_query.filter_by.assert_called_once_with(state='L_state123')
+            mock_query.all.assert_not_called()
+            self.assertEqual(session_info['action'], 'login')
+            self.assertEqual(session_info['ip_address'], '10.0.0.1')
+            self.assertEqual(session_info['scan_status'], 'pending')
+            self.assertEqual(session_info['callback_count'], 0)
+            self.assertEqual(session_info['timestamp'], mock_session.created_at)
+    
+    def test_get_wechat_session_not_found(self):
+        """测试state不存在时返回None"""
+        with patch('app.models.WechatSession.query') as mock_query:
+            mock_query.filter_by.return_value.filter.return_value.first.return_value = None
+            
+            self.assertIsNone(get_wechat_session('missing_state'))
+    
+    def test_get_wechat_session_expired(self):
+        """测试过期会话由expires_at条件排除，读取时不执行删除"""
+        with patch('app.models.WechatSession.query') as mock_query, \
+             patch('app.models.delete_wechat_session') as mock_delete:
+            mock_query.filter_by.return_value.filter.return_value.first.return_value = None
+            
+            self.assertIsNone(get_wechat_session('old_state'))
+            # 过滤条件为expires_at > 当前时间
+            condition = mock_query.filter_by.return_value.filter.call_args[0][0]
+            self.assertEqual(condition.left.name, 'expires_at')
+            mock_delete.assert_not_called()
+    
+    def test_update_wechat_session_status(self):
+        """测试状态迁移只执行一条带条件的UPDATE"""
+        with patch('app.models.WechatSession.query') as mock_query, \
+             patch.object(db.session, 'commit'):
+            live = mock_query.filter_by.return_value.filter.return_value
+            conditional = live.filter_by.return_value
+            conditional.update.return_value = 1
+            
+            self.assertTrue(update_wechat_session_status('L_state123', 'confirmed', from_status='pending'))
+            mock_query.filter_by.assert_called_once_with(state='L_state123')
+            live.filter_by.assert_called_once_with(scan_status='pending')
+            conditional.update.assert_called_once_with({'scan_status': 'confirmed'}, synchronize_session=False)
+    
+    def test_update_wechat_session_status_already_used(self):
+        """测试状态已不是pending时迁移失败"""
+        with patch('app.models.WechatSession.query') as mock_query, \
+             patch.object(db.session, 'commit'):
+            mock_query.filter_by.return_value.filter.return_value.filter_by.return_value.update.return_value = 0
+            
+            self.assertFalse(update_wechat_session_status('L_state123', 'confirmed', from_status='pending'))
+    
+    def test_delete_wechat_session(self):
+        """测试按state删除单个微信会话"""
+        with patch('app.models.WechatSession.query') as mock_query, \
+             patch.object(db.session, 'commit') as mock_commit:
+            
+            self.assertTrue(delete_wechat_session('L_state123'))
+            mock_query.filter_by.assert_called_once_with(state='L_state123')
+            mock_commit.assert_called_once()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import hashlib
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.passwords import (ScryptHasher, Pbkdf2Hasher, hash_password, verify_password,
+                                 set_password_hasher, identify_hasher, calibrate, LegacySha256Hasher,
+                                 verify_user_password)
+
+
+class TestPasswords(unittest.TestCase):
+
+    def setUp(self):
+        # 测试使用低成本参数
+        set_password_hasher(ScryptHasher(n=2 ** 10))
+        self.addCleanup(set_password_hasher, None)
+
+    def test_scrypt_roundtrip(self):
+        """测试scrypt哈希带参数和随机盐，可正确校验"""
+        encoded = hash_password('password123')
+
+        self.assertTrue(encoded.startswith('scrypt$n=1024,r=8,p=1$'))
+        self.assertNotEqual(encoded, hash_password('password123'))
+        self.assertEqual(verify_password('password123', encoded), (True, False))
+        self.assertEqual(verify_password('wrong', encoded), (False, False))
+
+    def test_pbkdf2_roundtrip(self):
+        """测试PBKDF2哈希可正确校验，不是当前算法时需要重新哈希"""
+        encoded = Pbkdf2Hasher(iterations=1000).encode('password123')
+
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(verify_password('password123', encoded), (True, True))
+        self.assertFalse(verify_password('wrong', encoded)[0])
+
+    def test_legacy_sha256_needs_rehash(self):
+        """测试历史SHA-256哈希可校验，校验成功时标记需要重新哈希"""
+        legacy = hashlib.sha256('password123'.encode()).hexdigest()
+
+        self.assertIsInstance(identify_hasher(legacy), LegacySha256Hasher)
+        self.assertEqual(verify_password('password123', legacy), (True, True))
+        self.assertEqual(verify_password('wrong', legacy), (False, False))
+
+    def test_cost_change_needs_rehash(self):
+        """测试成本参数调整后旧参数的哈希需要重新哈希"""
+        encoded = hash_password('password123')
+        set_password_hasher(ScryptHasher(n=2 ** 11))
+
+        self.assertEqual(verify_password('password123', encoded), (True, True))
+
+    def test_invalid_hash(self):
+        """测试无法识别或格式错误的哈希校验失败"""
+        self.assertEqual(verify_password('password123', 'plaintext'), (False, False))
+        self.assertEqual(verify_password('password123', 'scrypt$broken'), (False, False))
+        self.assertEqual(verify_password('', hash_password('x')), (False, False))
+
+    def test_calibrate(self):
+        """测试校准选择不超过目标耗时的最大成本参数"""
+        timings = {2 ** 12: 5.0, 2 ** 13: 10.0, 2 ** 14: 20.0, 2 ** 15: 40.0}
+        with patch('app.utils.passwords.measure_hash_time', side_effect=lambda hasher: timings[hasher.n]):
+            hasher, elapsed = calibrate('scrypt', target_ms=25)
+
+        self.assertEqual((hasher.n, elapsed), (2 ** 14, 20.0))
+
+
+class TestLoginRehash(unittest.TestCase):
+
+    def setUp(self):
+        set_password_hasher(ScryptHasher(n=2 ** 10))
+        self.addCleanup(set_password_hasher, None)
+        patcher = patch('app.models.user_repository.get_user_repository')
+        self.mock_repository = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def make_legacy_user(self):
+        user = type('User', (), {})()
+        user.id = 1
+        user.username = 'testuser'
+        user.display_name = 'testuser'
+        user.email = 'test@example.com'
+        user.created_at = datetime.now(timezone.utc)
+        user.password = hashlib.sha256('password123'.encode()).hexdigest()
+        return user
+
+    def test_legacy_hash_upgraded_on_login(self):
+        """测试登录成功时历史SHA-256哈希被替换为scrypt哈希"""
+        user = self.make_legacy_user()
+
+        self.assertTrue(verify_user_password(user, 'password123'))
+        self.assertTrue(user.password.startswith('scrypt$'))
+        self.mock_repository.update_fields.assert_called_once_with(1, password=user.password)
+
+        # 重新哈希后仍可登录，且不再重复写入
+        self.assertTrue(verify_user_password(user, 'password123'))
+        self.mock_repository.update_fields.assert_called_once()
+
+    def test_wrong_password_not_rehashed(self):
+        """测试密码错误时不修改哈希"""
+        user = self.make_legacy_user()
+        legacy = user.password
+
+        self.assertFalse(verify_user_password(user, 'wrong'))
+        self.assertEqual(user.password, legacy)
+        self.mock_repository.update_fields.assert_not_called()
+
+    @patch('app.routes.api.User')
+    def test_api_login_upgrades_legacy_hash(self, mock_user_model):
+        """测试通过/api/login登录成功时历史SHA-256哈希同样被替换"""
+        from app import app
+
+        user = self.make_legacy_user()
+        mock_user_model.query.filter_by.return_value.first.return_value = user
+        app.config['TESTING'] = True
+
+        response = app.test_client().post('/api/login', json={'email': 'test@example.com', 'password': 'password123'})
+
+        self.assertTrue(response.get_json()['success'])
+        self.assertTrue(user.password.startswith('scrypt$'))
+        self.mock_repository.update_fields.assert_called_once_with(1, password=user.password)
+
+
+if __name__ == '__main__':
+    unittest.main()
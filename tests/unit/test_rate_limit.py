@@ -0,0 +1,159 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.utils.config_manager import ConfigManager
+from app.utils.rate_limit import (parse_rate, MemoryRateLimitBackend, RedisRateLimitBackend,
+                                  RateLimiter, set_rate_limiter)
+
+try:
+    import fakeredis
+    import lupa  # fakeredis执行Lua脚本需要lupa
+    FAKEREDIS_LUA_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_LUA_AVAILABLE = False
+
+
+class TestParseRate(unittest.TestCase):
+
+    def test_parse_rate(self):
+        """测试解析限流规则"""
+        self.assertEqual(parse_rate('10/minute'), (10, 60.0))
+        self.assertEqual(parse_rate('5/300'), (5, 300.0))
+        self.assertEqual(parse_rate('3/10minutes'), (3, 600.0))
+        self.assertIsNone(parse_rate(''))
+        self.assertIsNone(parse_rate('0/minute'))
+        with self.assertRaises(ValueError):
+            parse_rate('10 per minute')
+
+
+class TestMemoryRateLimitBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('app.utils.rate_limit.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_smooth(self):
+        """测试窗口内允许突发到上限，之后按 窗口/次数 的间隔恢复额度"""
+        backend = MemoryRateLimitBackend()
+
+        self.assertEqual([backend.hit('k', 3, 60) for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(backend.hit('k', 3, 60), 20.0)
+
+        self.now += 20
+        self.assertEqual(backend.hit('k', 3, 60), 0.0)
+        self.assertGreater(backend.hit('k', 3, 60), 0)
+        # 其他键不受影响
+        self.assertEqual(backend.hit('other', 3, 60), 0.0)
+
+    def test_prune_recovered_and_excess_keys(self):
+        """测试清理已恢复满额的键，超出容量时淘汰最久未访问的键"""
+        backend = MemoryRateLimitBackend(max_keys=2)
+        backend.hit('a', 1, 10)
+        self.now += 11
+        backend.hit('b', 1, 10)
+        self.assertEqual(len(backend), 1)
+
+        backend.hit('c', 1, 10)
+        backend.hit('d', 1, 10)
+        self.assertEqual(len(backend), 2)
+        self.assertEqual(backend.hit('b', 1, 10), 0.0)
+
+
+@unittest.skipUnless(FAKEREDIS_LUA_AVAILABLE, "fakeredis或lupa未安装")
+class TestRedisRateLimitBackend(unittest.TestCase):
+
+    def test_shared_limit(self):
+        """测试多个实例共享同一限额"""
+        client = fakeredis.FakeRedis(decode_responses=True)
+        first, second = RedisRateLimitBackend(client=client), RedisRateLimitBackend(client=client)
+
+        self.assertEqual(first.hit('k', 2, 60), 0.0)
+        self.assertEqual(second.hit('k', 2, 60), 0.0)
+        self.assertGreater(first.hit('k', 2, 60), 0)
+
+
+def limits(**rules):
+    """使用指定的限流规则配置"""
+    config_manager = ConfigManager(rules)
+    return patch('app.utils.rate_limit.get_config_manager', new=lambda: config_manager)
+
+
+class TestRateLimitedRoutes(unittest.TestCase):
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.limiter = RateLimiter(MemoryRateLimitBackend())
+        set_rate_limiter(self.limiter)
+        self.addCleanup(set_rate_limiter, None)
+
+    @limits(RATE_LIMIT_CAPTCHA_IP='2/minute')
+    @patch('app.routes.auth.get_captcha')
+    def test_captcha_rejected_before_rendering(self, mock_generate):
+        """测试超出限额时返回429和Retry-After，且不再绘制验证码"""
+        mock_generate.return_value = ('ABCD', b'png')
+
+        codes = [self.client.get('/captcha').status_code for _ in range(3)]
+
+        self.assertEqual(codes, [200, 200, 429])
+        response = self.client.get('/captcha')
+        self.assertEqual(int(response.headers['Retry-After']), 30)
+        self.assertEqual(mock_generate.call_count, 2)
+        self.assertEqual(self.limiter.stats()['captcha:ip'], {'allowed': 2, 'shed': 2})
+
+    @limits(RATE_LIMIT_VERIFICATION_EMAIL='1/minute', RATE_LIMIT_VERIFICATION_IP='10/minute')
+    @patch('app.routes.auth.get_user_repository')
+    def test_verification_limited_per_email(self, mock_get_user_repository):
+        """测试同一邮箱重复发送验证码时在访问数据库前被拒绝"""
+        mock_exists_email = mock_get_user_repository.return_value.exists_email
+        mock_exists_email.return_value = True
+
+        self.client.post('/send_verification', data={'email': 'taken@example.com'})
+        response = self.client.post('/send_verification', data={'email': 'Taken@example.com'})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(response.get_json()['success'])
+        self.assertIn('Retry-After', response.headers)
+        mock_exists_email.assert_called_once()
+
+        # 其他邮箱不受影响
+        response = self.client.post('/send_verification', data={'email': 'other@example.com'})
+        self.assertNotEqual(response.status_code, 429)
+
+    @limits(RATE_LIMIT_LOGIN_IP='100/minute', RATE_LIMIT_LOGIN_USERNAME='2/minute')
+    @patch('app.routes.auth.save_login_log')
+    @patch('app.routes.auth.User')
+    def test_login_limited_per_username(self, mock_user_model, mock_save_login_log):
+        """测试同一账号连续登录超出限额时拒绝，登录页GET请求不限流"""
+        mock_user_model.query.filter_by.return_value.first.return_value = None
+        form = {'username': 'victim', 'password': 'wrong', 'captcha': '1234'}
+
+        codes = [self.client.post('/login', data=form).status_code for _ in range(3)]
+
+        self.assertEqual(codes[-1], 429)
+        self.assertNotIn(429, codes[:2])
+        self.assertEqual(self.client.get('/login').status_code, 200)
+
+    @limits(RATE_LIMIT_CAPTCHA_IP='1/minute')
+    @patch('app.routes.auth.get_captcha')
+    def test_backend_error_fails_open(self, mock_generate):
+        """测试限流后端异常时放行请求"""
+        mock_generate.return_value = ('ABCD', b'png')
+
+        with patch.object(MemoryRateLimitBackend, 'hit', side_effect=RuntimeError('down')):
+            codes = [self.client.get('/captcha').status_code for _ in range(2)]
+
+        self.assertEqual(codes, [200, 200])
+        self.assertEqual(self.limiter.stats()['errors'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -45,17 +45,13 @@ class TestRoutes(unittest.TestCase):
         self.assertIn('登录'.encode('utf-8'), response.data)
         self.assertIn('企业微信登录'.encode('utf-8'), response.data)
     
-    @patch('app.routes.auth.get_users')
-    def test_login_post_success(self, mock_get_users):
+    @patch('app.routes.auth.User')
+    def test_login_post_success(self, mock_user_model):
         """测试登录成功的情况"""
         # 模拟用户数据
         import hashlib
-        mock_get_users.return_value = {
-            'testuser': {
-                'password': hashlib.sha256('password123'.encode()).hexdigest(),
-                'login_type': 'default'
-            }
-        }
+        mock_user_model.query.filter_by.return_value.first.return_value = MagicMock(
+            id=1, username='testuser', password=hashlib.sha256('password123'.encode()).hexdigest())
         
         # 发送登录请求
         response = self.client.post('/login', data={
@@ -72,11 +68,12 @@ class TestRoutes(unittest.TestCase):
             self.assertEqual(session['username'], 'testuser')
             self.assertEqual(session['login_type'], 'default')
     
-    @patch('app.routes.auth.get_users')
-    def test_login_post_failure(self, mock_get_users):
+    @patch('app.routes.auth.User')
+    def test_login_post_failure(self, mock_user_model):
         """测试登录失败的情况"""
         # 模拟用户数据
-        mock_get_users.return_value = {'testuser': {'password': 'wronghash', 'login_type': 'default'}}
+        mock_user_model.query.filter_by.return_value.first.return_value = MagicMock(
+            id=1, username='testuser', password='wronghash')
         
         # 发送错误的登录请求
         response = self.client.post('/login', data={
@@ -95,13 +92,15 @@ class TestRoutes(unittest.TestCase):
         self.assertIn('注册'.encode('utf-8'), response.data)
         self.assertIn('发送验证码'.encode('utf-8'), response.data)
     
-    @patch('app.routes.auth.get_users')
+    @patch('app.routes.auth.get_user_repository')
     @patch('app.routes.auth.verify_code')
-    @patch('app.routes.auth.save_users')
-    def test_register_post_success(self, mock_save_users, mock_verify_code, mock_get_users):
+    def test_register_post_success(self, mock_verify_code, mock_get_user_repository):
         """测试注册成功的情况"""
         # 模拟用户不存在
-        mock_get_users.return_value = {}
+        mock_repository = mock_get_user_repository.return_value
+        mock_repository.exists_username.return_value = False
+        # 模拟创建的新用户
+        mock_repository.create_user.return_value = MagicMock(id=5, username='newuser')
         # 模拟验证码验证成功
         mock_verify_code.return_value = True
         
@@ -118,19 +117,20 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(response.location, '/')
         
-        # 验证保存用户被调用
-        mock_save_users.assert_called_once()
+        # 验证创建用户被调用（单条INSERT）
+        mock_repository.create_user.assert_called_once()
         
         # 验证会话被设置
         with self.client.session_transaction() as session:
+            self.assertEqual(session['user_id'], 5)
             self.assertEqual(session['username'], 'newuser')
             self.assertEqual(session['login_type'], 'default')
     
-    @patch('app.routes.auth.get_users')
-    def test_register_post_existing_username(self, mock_get_users):
+    @patch('app.routes.auth.get_user_repository')
+    def test_register_post_existing_username(self, mock_get_user_repository):
         """测试注册时用户名已存在的情况"""
         # 模拟用户名已存在
-        mock_get_users.return_value = {'existinguser': {}}
+        mock_get_user_repository.return_value.exists_username.return_value = True
         
         # 发送注册请求
         response = self.client.post('/register', data={
@@ -146,11 +146,11 @@ class TestRoutes(unittest.TestCase):
         self.assertIn('用户名已存在'.encode('utf-8'), response.data)
     
     @patch('app.routes.auth.verify_code')
-    @patch('app.routes.auth.get_users')
-    def test_register_post_password_mismatch(self, mock_get_users, mock_verify_code):
+    @patch('app.routes.auth.get_user_repository')
+    def test_register_post_password_mismatch(self, mock_get_user_repository, mock_verify_code):
         """测试注册时密码不匹配的情况"""
         # 模拟用户不存在
-        mock_get_users.return_value = {}
+        mock_get_user_repository.return_value.exists_username.return_value = False
         # 模拟验证码验证通过（这样才能到达密码验证逻辑）
         mock_verify_code.return_value = True
         
@@ -167,12 +167,12 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('两次输入的密码不一致'.encode('utf-8'), response.data)
     
-    @patch('app.routes.auth.get_users')
+    @patch('app.routes.auth.get_user_repository')
     @patch('app.routes.auth.verify_code')
-    def test_register_post_invalid_code(self, mock_verify_code, mock_get_users):
+    def test_register_post_invalid_code(self, mock_verify_code, mock_get_user_repository):
         """测试注册时验证码无效的情况"""
         # 模拟用户不存在
-        mock_get_users.return_value = {}
+        mock_get_user_repository.return_value.exists_username.return_value = False
         # 模拟验证码验证失败
         mock_verify_code.return_value = False
         
@@ -189,19 +189,15 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('验证码无效或已过期'.encode('utf-8'), response.data)
     
-    @patch('app.routes.auth.get_users')
-    @patch('app.routes.auth.get_verifications')
-    @patch('app.routes.auth.save_verifications')
+    @patch('app.routes.auth.get_user_repository')
+    @patch('app.routes.auth.get_verification_store')
     @patch('app.routes.auth.generate_verification_code')
     @patch('app.routes.auth.send_email')
     def test_send_verification_success(self, mock_send_email, mock_generate_code, 
-                                      mock_save_verifications, mock_get_verifications, 
-                                      mock_get_users):
+                                      mock_get_verification_store, mock_get_user_repository):
         """测试发送验证码成功的情况"""
         # 模拟用户不存在
-        mock_get_users.return_value = {}
-        # 模拟验证码数据
-        mock_get_verifications.return_value = {}
+        mock_get_user_repository.return_value.exists_email.return_value = False
         # 模拟生成验证码
         mock_generate_code.return_value = '123456'
         # 模拟发送邮件成功
@@ -219,13 +215,13 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(data['message'], '验证码已发送')
         
         # 验证保存验证码被调用
-        mock_save_verifications.assert_called_once()
+        mock_get_verification_store.return_value.issue.assert_called_once_with('test@example.com', '123456')
     
-    @patch('app.routes.auth.get_users')
-    def test_send_verification_invalid_email(self, mock_get_users):
+    @patch('app.routes.auth.get_user_repository')
+    def test_send_verification_invalid_email(self, mock_get_user_repository):
         """测试发送验证码时邮箱格式不正确的情况"""
         # 模拟用户数据
-        mock_get_users.return_value = {}
+        mock_get_user_repository.return_value.exists_email.return_value = False
         
         # 发送无效邮箱
         response = self.client.post('/send_verification', data={
@@ -238,13 +234,11 @@ class TestRoutes(unittest.TestCase):
         self.assertFalse(data['success'])
         self.assertEqual(data['message'], '邮箱格式不正确')
     
-    @patch('app.routes.auth.get_users')
-    def test_send_verification_existing_email(self, mock_get_users):
+    @patch('app.routes.auth.get_user_repository')
+    def test_send_verification_existing_email(self, mock_get_user_repository):
         """测试发送验证码时邮箱已被注册的情况"""
         # 模拟邮箱已存在
-        mock_get_users.return_value = {
-            'user1': {'email': 'existing@example.com'}
-        }
+        mock_get_user_repository.return_value.exists_email.return_value = True
         
         # 发送已注册邮箱
         response = self.client.post('/send_verification', data={
@@ -257,17 +251,16 @@ class TestRoutes(unittest.TestCase):
         self.assertFalse(data['success'])
         self.assertEqual(data['message'], '该邮箱已被注册')
     
-    @patch('app.routes.auth.get_wechat_sessions')
-    @patch('app.routes.auth.save_wechat_sessions')
-    @patch('app.routes.auth.get_users')
-    @patch('app.routes.auth.save_users')
-    def test_wechat_callback(self, mock_save_users, mock_get_users, 
-                            mock_save_wechat_sessions, mock_get_wechat_sessions):
+    @patch('app.routes.auth.get_scan_state_store')
+    @patch('app.routes.auth.get_user_repository')
+    def test_wechat_callback(self, mock_get_user_repository, mock_get_scan_state_store):
         """测试微信回调处理"""
         # 模拟微信会话
-        mock_get_wechat_sessions.return_value = {'valid_state': {'timestamp': 123456789}}
+        mock_store = mock_get_scan_state_store.return_value
+        mock_store.get.return_value = {'timestamp': 123456789}
         # 模拟用户不存在
-        mock_get_users.return_value = {}
+        mock_repository = mock_get_user_repository.return_value
+        mock_repository.exists_username.return_value = False
         
         # 发送回调请求
         response = self.client.get('/wechat_callback?code=test_code&state=valid_state')
@@ -277,16 +270,16 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.location, '/')
         
         # 验证保存用户被调用
-        mock_save_users.assert_called_once()
+        mock_repository.create_user.assert_called_once()
         
         # 验证删除会话被调用
-        mock_save_wechat_sessions.assert_called_once()
+        mock_store.delete.assert_called_once()
     
-    @patch('app.routes.auth.get_wechat_sessions')
-    def test_wechat_callback_invalid_state(self, mock_get_wechat_sessions):
+    @patch('app.routes.auth.get_scan_state_store')
+    def test_wechat_callback_invalid_state(self, mock_get_scan_state_store):
         """测试微信回调处理时state无效的情况"""
         # 模拟微信会话中没有对应的state
-        mock_get_wechat_sessions.return_value = {}
+        mock_get_scan_state_store.return_value.get.return_value = None
         
         # 发送无效state的回调请求
         response = self.client.get('/wechat_callback?code=test_code&state=invalid_state')
@@ -295,6 +288,37 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('无效的请求参数'.encode('utf-8'), response.data)
     
+    @patch('app.routes.auth.get_real_ip', return_value='10.0.0.1')
+    @patch('app.routes.auth.get_scan_state_store')
+    def test_wechat_callback_forged_signed_state(self, mock_get_scan_state_store, mock_get_real_ip):
+        """测试伪造的签名state在访问存储前被拒绝"""
+        from app.utils import generate_signed_wechat_state
+        with app.app_context():
+            state = generate_signed_wechat_state('L', ip_address='10.0.0.1')
+        forged = state[:-1] + ('0' if state[-1] != '0' else '1')
+        
+        response = self.client.get(f'/wechat_callback?code=test_code&state={forged}')
+        
+        self.assertEqual(response.status_code, 400)
+        mock_get_scan_state_store.assert_not_called()
+    
+    @patch('app.routes.auth.get_scan_event_bus')
+    @patch('app.routes.auth.get_scan_state_store')
+    def test_check_wechat_scan_status_long_poll(self, mock_get_scan_state_store, mock_get_scan_event_bus):
+        """测试长轮询等待到回调发布的状态"""
+        import time
+        mock_get_scan_state_store.return_value.get.return_value = {'timestamp': time.time(), 'scan_status': 'pending'}
+        mock_bus = mock_get_scan_event_bus.return_value
+        mock_bus.latest.return_value = None
+        mock_bus.wait.return_value = 'confirmed'
+        
+        response = self.client.get('/check_wechat_scan_status?state=valid_state&wait=25')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'confirmed')
+        self.assertEqual(mock_bus.wait.call_args[0][0], 'valid_state')
+        self.assertEqual(mock_bus.wait.call_args[1]['last_status'], 'pending')
+    
     def test_logout(self):
         """测试退出登录"""
         # 先设置会话
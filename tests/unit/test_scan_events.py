@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import json
+import threading
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.scan_events import ScanEventBus, iter_scan_status_events
+
+
+class TestScanEventBus(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = ScanEventBus()
+
+    def test_wait_receives_published_status(self):
+        """测试等待者在其他线程发布事件后立即返回"""
+        timer = threading.Timer(0.05, self.bus.publish, args=('L_state1', 'confirmed'))
+        timer.start()
+
+        start = time.monotonic()
+        status = self.bus.wait('L_state1', timeout=5, last_status='pending')
+
+        self.assertEqual(status, 'confirmed')
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(self.bus._waiters, {})
+
+    def test_wait_timeout(self):
+        """测试没有事件时等待超时返回None"""
+        self.assertIsNone(self.bus.wait('L_state1', timeout=0.05, last_status='pending'))
+
+    def test_wait_returns_already_published_status(self):
+        """测试订阅前已发布的事件可直接获取"""
+        self.bus.publish('L_state1', 'confirmed')
+
+        self.assertEqual(self.bus.latest('L_state1'), 'confirmed')
+        self.assertEqual(self.bus.wait('L_state1', timeout=0, last_status='pending'), 'confirmed')
+        # 其他state不受影响
+        self.assertIsNone(self.bus.latest('L_state2'))
+
+    def test_iter_scan_status_events(self):
+        """测试SSE流推送初始状态和最终状态后结束"""
+        self.bus.publish('L_state1', 'confirmed')
+
+        messages = list(iter_scan_status_events(
+            'L_state1', 'pending', time.time() + 60, lambda status: {'status': status}, bus=self.bus
+        ))
+
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[0].startswith('retry: 3000\n'))
+        self.assertEqual(json.loads(messages[1][len('data: '):]), {'status': 'confirmed'})
+
+    def test_iter_scan_status_events_expired(self):
+        """测试二维码过期后推送expired并结束"""
+        messages = list(iter_scan_status_events(
+            'L_state1', 'pending', time.time() - 1, lambda status: {'status': status}, bus=self.bus
+        ))
+
+        self.assertEqual(len(messages), 2)
+        self.assertIn('"expired"', messages[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import os
+import sys
+import time
+from unittest.mock import patch
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.scan_state import MemoryScanStateStore, RedisScanStateStore, ScanStateRecord
+from config import Config, ProductionConfig
+
+try:
+    import fakeredis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+
+class ScanStateStoreCases:
+    """各存储后端通用的测试用例"""
+
+    def create_store(self, ttl=600):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.create_store()
+
+    def test_put_and_get(self):
+        """测试写入后可按state读取，额外字段保存在payload中"""
+        now = time.time()
+        self.assertTrue(self.store.put('B_state1', {
+            'timestamp': now,
+            'action': 'bind',
+            'ip_address': '10.0.0.1',
+            'mode': 'test',
+            'username': 'alice',
+            'callback_count': 0
+        }))
+
+        session_info = self.store.get('B_state1')
+        self.assertEqual(session_info['action'], 'bind')
+        self.assertEqual(session_info['ip_address'], '10.0.0.1')
+        self.assertEqual(session_info['mode'], 'test')
+        self.assertEqual(session_info['scan_status'], 'pending')
+        self.assertEqual(session_info['username'], 'alice')
+        self.assertEqual(session_info['callback_count'], 0)
+        self.assertAlmostEqual(session_info['timestamp'], now, places=3)
+
+    def test_get_missing(self):
+        """测试读取不存在的state返回None"""
+        self.assertIsNone(self.store.get('missing'))
+        self.assertIsNone(self.store.get(None))
+
+    def test_update_status_transition_once(self):
+        """测试pending→confirmed只允许成功一次"""
+        self.store.put('L_state1', {'timestamp': time.time()})
+
+        self.assertTrue(self.store.update_status('L_state1', 'confirmed', from_status='pending'))
+        self.assertFalse(self.store.update_status('L_state1', 'confirmed', from_status='pending'))
+        self.assertEqual(self.store.get('L_state1')['scan_status'], 'confirmed')
+
+    def test_update_status_missing(self):
+        """测试更新不存在的state返回False"""
+        self.assertFalse(self.store.update_status('missing', 'confirmed'))
+
+    def test_delete(self):
+        """测试删除后无法再读取"""
+        self.store.put('L_state1', {'timestamp': time.time()})
+        self.assertTrue(self.store.delete('L_state1'))
+        self.assertIsNone(self.store.get('L_state1'))
+
+
+class TestMemoryScanStateStore(ScanStateStoreCases, unittest.TestCase):
+
+    def create_store(self, ttl=600):
+        return MemoryScanStateStore(ttl=ttl)
+
+    def test_expired_record_removed(self):
+        """测试超过TTL的记录在读取时被移除"""
+        store = self.create_store(ttl=60)
+        store.put('L_state1', {'timestamp': time.time()})
+
+        with patch('app.models.scan_state.time.time', return_value=time.time() + 61):
+            self.assertIsNone(store.get('L_state1'))
+            self.assertFalse(store.update_status('L_state1', 'confirmed'))
+        self.assertEqual(len(store), 0)
+
+    def test_record_uses_slots(self):
+        """测试记录对象不带__dict__"""
+        record = ScanStateRecord.from_session_info('L_state1', {'timestamp': time.time()}, 60)
+        self.assertFalse(hasattr(record, '__dict__'))
+
+
+@unittest.skipUnless(FAKEREDIS_AVAILABLE, "fakeredis未安装")
+class TestRedisScanStateStore(ScanStateStoreCases, unittest.TestCase):
+
+    def create_store(self, ttl=600):
+        self.client = fakeredis.FakeRedis(decode_responses=True)
+        return RedisScanStateStore(client=self.client, ttl=ttl)
+
+    def test_native_ttl(self):
+        """测试写入的key带有Redis原生过期时间"""
+        store = self.create_store(ttl=60)
+        store.put('L_state1', {'timestamp': time.time()})
+
+        ttl = self.client.ttl(f"{RedisScanStateStore.KEY_PREFIX}L_state1")
+        self.assertGreater(ttl, 0)
+        self.assertLessEqual(ttl, 60)
+
+
+class TestScanStateBackendConfig(unittest.TestCase):
+
+    def test_production_rejects_database_backend(self):
+        """测试生产配置使用database扫码状态存储时启动报错"""
+        with patch.object(ProductionConfig, 'SECRET_KEY', 'x' * 32), \
+                patch.object(ProductionConfig, 'SCAN_STATE_BACKEND', 'database'):
+            with self.assertRaises(ValueError):
+                ProductionConfig()
+        with patch.object(ProductionConfig, 'SECRET_KEY', 'x' * 32), \
+                patch.object(ProductionConfig, 'SCAN_STATE_BACKEND', 'redis'):
+            ProductionConfig()
+
+    @unittest.skipIf('SCAN_STATE_BACKEND' in os.environ, "环境变量中设置了SCAN_STATE_BACKEND")
+    def test_default_backend_is_redis(self):
+        """测试未配置时默认使用Redis存储"""
+        self.assertEqual(Config.SCAN_STATE_BACKEND, 'redis')
+
+
+if __name__ == '__main__':
+    unittest.main()
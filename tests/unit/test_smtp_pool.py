@@ -0,0 +1,168 @@
+import unittest
+import os
+import sys
+import smtplib
+import socket
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.smtp_pool import SmtpTransport
+
+# 本地SMTP服务器，用于测试真实连接的复用（未安装aiosmtpd时跳过）
+try:
+    from aiosmtpd.controller import Controller
+    AIOSMTPD_AVAILABLE = True
+except ImportError:
+    AIOSMTPD_AVAILABLE = False
+
+SETTINGS = {'server': '127.0.0.1', 'port': 25, 'username': None, 'password': None,
+            'sender': 'noreply@example.com', 'use_tls': False, 'use_ssl': False, 'timeout': 5}
+
+
+class FakeSMTP:
+    """记录调用的SMTP连接，可指定发送失败"""
+
+    def __init__(self, fail_with=None, noop_code=250):
+        self.fail_with = fail_with
+        self.noop_code = noop_code
+        self.sent = []
+        self.quit_called = False
+        self.closed = False
+
+    def send_message(self, message):
+        if self.fail_with is not None:
+            error, self.fail_with = self.fail_with, None
+            raise error
+        self.sent.append(message['To'])
+
+    def noop(self):
+        return self.noop_code, b'OK'
+
+    def quit(self):
+        self.quit_called = True
+
+    def close(self):
+        self.closed = True
+
+
+class TestSmtpTransport(unittest.TestCase):
+
+    def _transport(self, connections, **kwargs):
+        """创建连接池，每次建立连接时依次返回connections中的FakeSMTP"""
+        self.opened = []
+
+        def connect(settings):
+            connection = connections.pop(0) if connections else FakeSMTP()
+            self.opened.append(connection)
+            return connection
+
+        return SmtpTransport(settings=SETTINGS, connect=connect, **kwargs)
+
+    def test_reuses_connection(self):
+        """测试连续发送复用同一个已登录连接"""
+        transport = self._transport([])
+        for i in range(5):
+            elapsed = transport.send(f'user{i}@example.com', 's', 'c')
+            self.assertGreaterEqual(elapsed, 0)
+
+        stats = transport.stats()
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(len(self.opened[0].sent), 5)
+
+    def test_recycles_after_max_messages(self):
+        """测试每个连接达到发送上限后quit并换用新连接"""
+        transport = self._transport([], max_messages=2)
+        for i in range(5):
+            transport.send(f'user{i}@example.com', 's', 'c')
+
+        self.assertEqual(transport.stats()['connects'], 3)
+        self.assertTrue(self.opened[0].quit_called)
+        self.assertTrue(self.opened[1].quit_called)
+        self.assertEqual(transport.stats()['recycled'], 2)
+
+    def test_reconnects_on_421(self):
+        """测试服务器返回421时重新连接并重发"""
+        first = FakeSMTP(fail_with=smtplib.SMTPResponseException(421, b'closing'))
+        transport = self._transport([first])
+
+        transport.send('user@example.com', 's', 'c')
+
+        self.assertTrue(first.closed)
+        self.assertEqual(self.opened[1].sent, ['user@example.com'])
+        self.assertEqual(transport.stats()['reconnects'], 1)
+
+    def test_noop_health_check(self):
+        """测试空闲连接使用前NOOP检查，检查失败时重新连接"""
+        transport = self._transport([FakeSMTP(noop_code=421)], noop_after=0)
+        transport.send('a@example.com', 's', 'c')
+        transport.send('b@example.com', 's', 'c')
+
+        stats = transport.stats()
+        self.assertEqual(stats['noops'], 1)
+        self.assertEqual(stats['connects'], 2)
+        self.assertEqual(self.opened[1].sent, ['b@example.com'])
+
+    def test_permanent_error_discards_connection(self):
+        """测试非连接类错误直接抛出，连接被丢弃并释放名额"""
+        transport = self._transport([FakeSMTP(fail_with=smtplib.SMTPRecipientsRefused({}))], pool_size=1)
+
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            transport.send('bad@example.com', 's', 'c')
+        transport.send('ok@example.com', 's', 'c')
+
+        stats = transport.stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['open'], 1)
+
+    def test_send_many_single_connection(self):
+        """测试批量发送在同一个连接上完成，单封失败不影响其他邮件"""
+        first = FakeSMTP()
+        transport = self._transport([first])
+        messages = [(f'user{i}@example.com', 's', 'c') for i in range(4)]
+
+        results = transport.send_many(messages)
+
+        self.assertTrue(all(ok for ok, _ in results))
+        self.assertEqual(len(first.sent), 4)
+        self.assertEqual(transport.stats()['connects'], 1)
+
+    def test_pool_size_limits_concurrent_connections(self):
+        """测试并发发送时连接数不超过pool_size"""
+        transport = self._transport([], pool_size=2)
+        threads = [threading.Thread(target=lambda i=i: transport.send(f'user{i}@example.com', 's', 'c'))
+                   for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = transport.stats()
+        self.assertEqual(stats['sent'], 20)
+        self.assertLessEqual(stats['connects'], 2)
+
+    @unittest.skipUnless(AIOSMTPD_AVAILABLE, 'aiosmtpd未安装')
+    def test_local_smtp_server(self):
+        """测试对本地SMTP服务器复用真实连接"""
+        class Handler:
+            async def handle_DATA(self, server, session, envelope):
+                return '250 OK'
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        controller = Controller(Handler(), hostname='127.0.0.1', port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+
+        transport = SmtpTransport(settings=dict(SETTINGS, port=port))
+        self.addCleanup(transport.close)
+        for i in range(3):
+            transport.send(f'user{i}@example.com', 's', 'c')
+        self.assertEqual(transport.stats()['connects'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from app.utils.templating import precompile_templates
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                            'app', 'templates')
+
+
+class TestTemplating(unittest.TestCase):
+
+    def test_environment_options(self):
+        """测试模板环境去除块标签空白并开启HTML转义"""
+        self.assertTrue(app.jinja_env.trim_blocks)
+        self.assertTrue(app.jinja_env.lstrip_blocks)
+        self.assertTrue(app.jinja_env.autoescape('auth/login.html'))
+
+    def test_precompile_all_templates(self):
+        """测试app/templates下的全部页面模板都能编译并进入缓存"""
+        files = [name for _, _, names in os.walk(TEMPLATE_DIR) for name in names if name.endswith('.html')]
+        self.assertEqual(precompile_templates(app), len(files))
+        self.assertIs(app.jinja_env.get_template('auth/login.html'), app.jinja_env.get_template('auth/login.html'))
+
+    def test_render_escapes_context(self):
+        """测试按名称渲染的模板对变量做HTML转义"""
+        with app.test_request_context('/'):
+            html = app.jinja_env.get_template('auth/wechat_login_failed.html').render(error_message='<b>x</b>')
+        self.assertIn('&lt;b&gt;x&lt;/b&gt;', html)
+        self.assertNotIn('<b>x</b>', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.user_agent import parse_user_agent, _parse, UNKNOWN_USER_AGENT
+
+
+class TestUserAgent(unittest.TestCase):
+
+    def assertParsed(self, user_agent, browser, version, platform, device):
+        info = parse_user_agent(user_agent)
+        self.assertEqual((info.browser, info.version, info.platform, info.device),
+                         (browser, version, platform, device))
+
+    def test_desktop_browsers(self):
+        """测试桌面浏览器识别，Edge不会被识别为Chrome"""
+        self.assertParsed('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/120.0.0.0 Safari/537.36', 'Chrome', '120.0', 'Windows', 'desktop')
+        self.assertParsed('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/120.0.0.0 Safari/537.36 Edg/120.0.2210.91', 'Edge', '120.0', 'Windows', 'desktop')
+        self.assertParsed('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+                          'Version/17.2 Safari/605.1.15', 'Safari', '17.2', 'macOS', 'desktop')
+        self.assertParsed('Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+                          'Firefox', '121.0', 'Linux', 'desktop')
+        self.assertParsed('Mozilla/5.0 (Windows NT 10.0; WOW64; Trident/7.0; rv:11.0) like Gecko',
+                          'Internet Explorer', '11', 'Windows', 'desktop')
+
+    def test_mobile_devices(self):
+        """测试移动端平台和设备类型，iPad不会被识别为macOS，Android不会被识别为Linux"""
+        self.assertParsed('Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 '
+                          '(KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1',
+                          'Safari', '17.2', 'iOS', 'mobile')
+        self.assertParsed('Mozilla/5.0 (iPad; CPU OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+                          'CriOS/120.0.6099.119 Mobile/15E148 Safari/604.1', 'Chrome', '120.0', 'iOS', 'tablet')
+        self.assertParsed('Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/120.0.6099.144 Mobile Safari/537.36', 'Chrome', '120.0', 'Android', 'mobile')
+        self.assertParsed('Mozilla/5.0 (Linux; Android 13; SM-X700) AppleWebKit/537.36 (KHTML, like Gecko) '
+                          'Chrome/119.0.0.0 Safari/537.36', 'Chrome', '119.0', 'Android', 'tablet')
+
+    def test_bot_and_unknown(self):
+        """测试爬虫和无法识别的User-Agent"""
+        self.assertEqual(parse_user_agent('Mozilla/5.0 (compatible; Googlebot/2.1; '
+                                          '+http://www.google.com/bot.html)').device, 'bot')
+        self.assertEqual(parse_user_agent(''), UNKNOWN_USER_AGENT)
+        self.assertEqual(parse_user_agent('curl/8.4.0').browser_label, 'Unknown')
+
+    def test_cached(self):
+        """测试同一User-Agent只解析一次"""
+        _parse.cache_clear()
+        user_agent = 'Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0'
+        for _ in range(5):
+            parse_user_agent(user_agent)
+
+        info = _parse.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.user_cache import (UserCache, UserProfile, PROFILE_FIELDS, get_user_profile,
+                                   set_user_cache, _invalidate_user, _invalidate_committed_users)
+
+
+def make_profile(user_id=1, username='testuser', wechat_corp_userid=None, updated_at=None, **fields):
+    values = dict.fromkeys(PROFILE_FIELDS)
+    values.update(id=user_id, username=username, wechat_corp_userid=wechat_corp_userid,
+                  updated_at=updated_at or datetime.utcnow() - timedelta(minutes=5), **fields)
+    return UserProfile(**values)
+
+
+class TestUserCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = UserCache(ttl=30, max_entries=2)
+        set_user_cache(self.cache)
+        self.addCleanup(set_user_cache, None)
+
+    def test_lookup_by_each_index(self):
+        """测试按id、username、wechat_corp_userid都能命中同一条目"""
+        profile = make_profile(wechat_corp_userid='wx001')
+        self.cache.put(profile)
+
+        self.assertEqual(self.cache.lookup('id', 1), (profile, True))
+        self.assertEqual(self.cache.lookup('username', 'testuser'), (profile, True))
+        self.assertEqual(self.cache.lookup('wechat_corp_userid', 'wx001'), (profile, True))
+
+    def test_invalidate_removes_all_indexes(self):
+        """测试失效后所有索引都不再命中"""
+        self.cache.put(make_profile(wechat_corp_userid='wx001'))
+        self.cache.invalidate(1)
+
+        self.assertEqual(self.cache.lookup('username', 'testuser'), (None, False))
+        self.assertEqual(self.cache.lookup('wechat_corp_userid', 'wx001'), (None, False))
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        self.cache.put(make_profile(1, 'user1'))
+        self.cache.put(make_profile(2, 'user2'))
+        self.cache.lookup('id', 1)
+        self.cache.put(make_profile(3, 'user3'))
+
+        self.assertIsNone(self.cache.lookup('username', 'user2')[0])
+        self.assertIsNotNone(self.cache.lookup('username', 'user1')[0])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    @patch('app.models.user_cache._load_profile')
+    def test_get_user_profile_hit_and_miss(self, mock_load):
+        """测试第一次读取数据库，之后命中缓存"""
+        mock_load.return_value = make_profile()
+
+        for _ in range(3):
+            self.assertEqual(get_user_profile(username='testuser').id, 1)
+
+        mock_load.assert_called_once_with('username', 'testuser')
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['hits']), (1, 2))
+
+    @patch('app.models.user_cache.db')
+    @patch('app.models.user_cache._load_profile')
+    def test_expired_entry_revalidated_by_version(self, mock_load, mock_db):
+        """测试条目过期后版本号未变化时只查询updated_at并续期"""
+        profile = make_profile()
+        self.cache.ttl = 0
+        self.cache.put(profile)
+        mock_db.session.query.return_value.filter.return_value.scalar.return_value = profile.updated_at
+
+        self.assertEqual(get_user_profile(username='testuser'), profile)
+        mock_load.assert_not_called()
+        self.assertEqual(self.cache.stats()['revalidated'], 1)
+
+    @patch('app.models.user_cache.db')
+    @patch('app.models.user_cache._load_profile')
+    def test_expired_entry_reloaded_when_version_changed(self, mock_load, mock_db):
+        """测试其他worker修改用户后（版本号变化）重新加载"""
+        old = make_profile(display_name='旧名称')
+        new = make_profile(display_name='新名称', updated_at=datetime.utcnow() - timedelta(minutes=1))
+        self.cache.ttl = 0
+        self.cache.put(old)
+        mock_db.session.query.return_value.filter.return_value.scalar.return_value = new.updated_at
+        mock_load.return_value = new
+
+        self.assertEqual(get_user_profile(username='testuser').display_name, '新名称')
+        self.assertEqual(self.cache.stats()['reloaded'], 1)
+
+    def test_write_events_invalidate(self):
+        """测试用户写入事件和事务提交后使缓存失效"""
+        self.cache.put(make_profile(wechat_corp_userid='wx001'))
+        target = MagicMock(id=1, username='testuser', wechat_corp_userid='wx002')
+        session = MagicMock(info={})
+
+        with patch('app.models.user_cache.object_session', return_value=session):
+            _invalidate_user(None, None, target)
+        self.assertIsNone(self.cache.lookup('wechat_corp_userid', 'wx001')[0])
+
+        # 提交前被其他请求重新缓存的旧资料在提交后再次失效
+        self.cache.put(make_profile(wechat_corp_userid='wx001'))
+        _invalidate_committed_users(session)
+        self.assertIsNone(self.cache.lookup('id', 1)[0])
+        self.assertNotIn('user_cache_invalidations', session.info)
+
+    def test_disabled_cache_queries_database(self):
+        """测试关闭缓存时每次都读取数据库"""
+        set_user_cache(None)
+        with patch('app.models.user_cache._load_profile', return_value=make_profile()) as mock_load:
+            get_user_profile(user_id=1)
+            get_user_profile(user_id=1)
+
+        self.assertEqual(mock_load.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import IntegrityError
+
+from app import app
+from app.models.user_cache import UserCache, set_user_cache
+from app.models.user_repository import UserRepository, UserAlreadyExistsError
+
+
+class TestUserRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.app_context = app.app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        patcher = patch('app.models.user_repository.db')
+        self.mock_db = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.repository = UserRepository()
+
+    def test_exists_queries_single_column(self):
+        """测试按唯一索引只查询id判断是否存在"""
+        query = self.mock_db.session.query.return_value.filter.return_value
+        query.first.return_value = (3,)
+        self.assertTrue(self.repository.exists_username('alice'))
+
+        query.first.return_value = None
+        self.assertFalse(self.repository.exists_email('alice@example.com'))
+        self.assertEqual(self.mock_db.session.query.call_count, 2)
+
+    def test_create_user_single_insert(self):
+        """测试创建用户只添加一行并提交一次，显示名称默认为登录账号"""
+        user = self.repository.create_user('alice', 'hash', email='alice@example.com')
+
+        self.mock_db.session.add.assert_called_once_with(user)
+        self.mock_db.session.commit.assert_called_once()
+        self.assertEqual(user.display_name, 'alice')
+
+    def test_create_user_duplicate(self):
+        """测试唯一索引冲突时回滚并报告冲突字段"""
+        self.mock_db.session.commit.side_effect = IntegrityError(
+            'INSERT', {}, Exception("Duplicate entry 'alice@example.com' for key 'user.email'"))
+
+        with self.assertRaises(UserAlreadyExistsError) as context:
+            self.repository.create_user('alice', 'hash', email='alice@example.com')
+
+        self.assertEqual(context.exception.field, 'email')
+        self.mock_db.session.rollback.assert_called_once()
+
+    @patch('app.models.user_repository.User')
+    def test_update_fields(self, mock_user_model):
+        """测试按主键更新指定字段、刷新updated_at并使缓存失效"""
+        cache = UserCache()
+        set_user_cache(cache)
+        self.addCleanup(set_user_cache, None)
+        mock_update = mock_user_model.query.filter.return_value.update
+        mock_update.return_value = 1
+
+        with patch.object(cache, 'invalidate') as mock_invalidate:
+            self.assertTrue(self.repository.update_fields(7, display_name='Alice'))
+
+        values = mock_update.call_args[0][0]
+        self.assertEqual(values['display_name'], 'Alice')
+        self.assertIn('updated_at', values)
+        self.mock_db.session.commit.assert_called_once()
+        mock_invalidate.assert_called_once_with(7)
+
+        with self.assertRaises(ValueError):
+            self.repository.update_fields(7, username='mallory')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,9 @@ from unittest.mock import patch, MagicMock
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.utils import generate_verification_code, generate_wechat_state, send_email, verify_code, generate_captcha, PIL_AVAILABLE
+from app.utils import generate_signed_wechat_state, verify_signed_wechat_state, is_signed_wechat_state
+from app.utils import ConfigManager
+from config import DevelopmentConfig
 
 class TestUtils(unittest.TestCase):
     
@@ -46,51 +49,69 @@ class TestUtils(unittest.TestCase):
             states.add(generate_wechat_state(action='login'))
         self.assertGreater(len(states), 90)  # 期望至少90个不同的状态码
     
+    @patch('app.utils._get_state_secret', return_value=b'test-secret')
+    def test_signed_wechat_state(self, mock_secret):
+        """测试签名state的生成与校验"""
+        state = generate_signed_wechat_state('B', ip_address='10.0.0.1', mode='test')
+        
+        self.assertTrue(is_signed_wechat_state(state))
+        self.assertTrue(state.startswith('BS_'))
+        claims = verify_signed_wechat_state(state, ip_address='10.0.0.1', max_age=600)
+        self.assertEqual(claims['action'], 'bind')
+        self.assertEqual(claims['mode'], 'test')
+        
+        # 普通随机state不是签名格式
+        self.assertFalse(is_signed_wechat_state('L_' + 'a' * 24))
+    
+    @patch('app.utils._get_state_secret', return_value=b'test-secret')
+    def test_signed_wechat_state_rejected(self, mock_secret):
+        """测试篡改、过期、IP不匹配的签名state被拒绝"""
+        state = generate_signed_wechat_state('L', ip_address='10.0.0.1')
+        
+        # 篡改action标识
+        self.assertIsNone(verify_signed_wechat_state('B' + state[1:], ip_address='10.0.0.1', max_age=600))
+        # 篡改MAC
+        forged = state[:-1] + ('0' if state[-1] != '0' else '1')
+        self.assertIsNone(verify_signed_wechat_state(forged, ip_address='10.0.0.1', max_age=600))
+        # IP不匹配
+        self.assertIsNone(verify_signed_wechat_state(state, ip_address='10.0.0.2', max_age=600))
+        # 过期
+        expired = generate_signed_wechat_state('L', issued_at=time.time() - 601)
+        self.assertIsNone(verify_signed_wechat_state(expired, max_age=600))
+        # 其他密钥签发
+        with patch('app.utils._get_state_secret', return_value=b'other-secret'):
+            self.assertIsNone(verify_signed_wechat_state(state, ip_address='10.0.0.1', max_age=600))
+    
+    @patch('app.models.email_outbox.enqueue_email')
     @patch('builtins.print')
-    def test_send_email(self, mock_print):
+    def test_send_email(self, mock_print, mock_enqueue_email):
         """测试邮件发送功能"""
-        # 测试模拟发送邮件
+        # 测试模拟发送邮件（写入发件箱，不在请求中连接SMTP服务器）
         result = send_email('test@example.com', '测试主题', '测试内容')
         
         # 验证结果
         self.assertTrue(result)
+        mock_enqueue_email.assert_called_once_with('test@example.com', '测试主题', '测试内容')
         mock_print.assert_any_call("开发环境：模拟发送邮件到 test@example.com")
         mock_print.assert_any_call("主题：测试主题")
         mock_print.assert_any_call("内容：测试内容")
     
-    @patch('app.models.get_verifications')
-    @patch('app.models.save_verifications')
-    def test_verify_code_success(self, mock_save_verifications, mock_get_verifications):
+    @patch('app.models.verification_store.get_verification_store')
+    def test_verify_code_success(self, mock_get_verification_store):
         """测试验证码验证成功的情况"""
-        # 模拟验证码数据 - 使用1分钟前的时间戳，确保在有效期内
-        current_time = time.time()
-        mock_verifications = {
-            'test@example.com': {
-                'code': '123456',
-                'timestamp': current_time - 60  # 1分钟前生成，在有效期内
-            }
-        }
-        mock_get_verifications.return_value = mock_verifications
-        
-        # 验证正确的验证码
-        with patch('time.time', return_value=current_time):
-            result = verify_code('test@example.com', '123456')
-            
-            # 验证结果和函数调用
-            self.assertTrue(result)
-            mock_save_verifications.assert_called_once_with({})
+        # 条件DELETE删除到一行，验证码正确且在有效期内
+        mock_get_verification_store.return_value.consume.return_value = True
+        
+        result = verify_code('test@example.com', ' 123456 ')
+        
+        # 验证结果和函数调用（提交的验证码去除首尾空白）
+        self.assertTrue(result)
+        mock_get_verification_store.return_value.consume.assert_called_once_with('test@example.com', '123456')
     
-    @patch('app.models.get_verifications')
-    def test_verify_code_wrong_code(self, mock_get_verifications):
+    @patch('app.models.verification_store.get_verification_store')
+    def test_verify_code_wrong_code(self, mock_get_verification_store):
         """测试验证码错误的情况"""
-        # 模拟验证码数据
-        mock_verifications = {
-            'test@example.com': {
-                'code': '123456',
-                'timestamp': time.time()  # 使用当前时间作为时间戳
-            }
-        }
-        mock_get_verifications.return_value = mock_verifications
+        mock_get_verification_store.return_value.consume.return_value = False
         
         # 验证错误的验证码
         result = verify_code('test@example.com', '654321')
@@ -98,35 +119,21 @@ class TestUtils(unittest.TestCase):
         # 验证结果
         self.assertFalse(result)
     
-    @patch('app.models.get_verifications')
-    @patch('app.models.save_verifications')
-    def test_verify_code_expired(self, mock_save_verifications, mock_get_verifications):
+    @patch('app.models.verification_store.get_verification_store')
+    def test_verify_code_expired(self, mock_get_verification_store):
         """测试验证码过期的情况"""
-        # 模拟验证码数据 - 使用11分钟前的时间戳，确保已过期
-        current_time = time.time()
-        mock_verifications = {
-            'test@example.com': {
-                'code': '123456',
-                'timestamp': current_time - 660  # 11分钟前生成，已过期
-            }
-        }
-        mock_get_verifications.return_value = mock_verifications
-        
-        # 验证过期的验证码
-        with patch('time.time', return_value=current_time):
-            # 避免调试逻辑影响测试结果，我们需要确保过期时间设置正确
-            result = verify_code('test@example.com', '123456')
-            
-            # 验证结果
-            self.assertFalse(result)
-            # 验证验证码被删除
-            mock_save_verifications.assert_called()
+        # 过期验证码不满足created_at条件，DELETE影响0行
+        mock_get_verification_store.return_value.consume.return_value = False
+        
+        result = verify_code('test@example.com', '123456')
+        
+        # 验证结果
+        self.assertFalse(result)
     
-    @patch('app.models.get_verifications')
-    def test_verify_code_not_found(self, mock_get_verifications):
+    @patch('app.models.verification_store.get_verification_store')
+    def test_verify_code_not_found(self, mock_get_verification_store):
         """测试验证码不存在的情况"""
-        # 模拟空的验证码数据
-        mock_get_verifications.return_value = {}
+        mock_get_verification_store.return_value.consume.return_value = False
         
         # 验证不存在的邮箱
         result = verify_code('nonexistent@example.com', '123456')
@@ -134,6 +141,15 @@ class TestUtils(unittest.TestCase):
         # 验证结果
         self.assertFalse(result)
     
+    @patch('app.models.verification_store.get_verification_store')
+    def test_verify_code_store_error(self, mock_get_verification_store):
+        """测试数据库异常时验证失败"""
+        mock_get_verification_store.return_value.consume.side_effect = RuntimeError('db down')
+        
+        result = verify_code('test@example.com', '123456')
+        
+        self.assertFalse(result)
+    
     def test_generate_captcha(self):
         """测试图形验证码生成功能"""
         # 生成验证码
@@ -180,5 +196,28 @@ class TestUtils(unittest.TestCase):
         # 验证图片为None
         self.assertIsNone(image)
 
+class TestConfigManager(unittest.TestCase):
+
+    def test_reads_app_config_mapping(self):
+        """测试app.config这类字典按键读取，缺少的键使用默认值"""
+        config_manager = ConfigManager({'CONFIG_MANAGER_TEST_KEY': 'memory'})
+
+        self.assertEqual(config_manager.get('CONFIG_MANAGER_TEST_KEY', 'database'), 'memory')
+        self.assertEqual(config_manager.get('CONFIG_MANAGER_MISSING_KEY', 'database'), 'database')
+
+    def test_reads_config_class_attributes(self):
+        """测试配置类按属性读取"""
+        config_manager = ConfigManager(DevelopmentConfig)
+
+        self.assertEqual(config_manager.get('APP_ENV'), 'development')
+
+    def test_environment_overrides_config(self):
+        """测试环境变量优先于配置对象"""
+        config_manager = ConfigManager({'CONFIG_MANAGER_TEST_KEY': 'memory'})
+
+        with patch.dict(os.environ, {'CONFIG_MANAGER_TEST_KEY': 'redis'}):
+            self.assertEqual(config_manager.get('CONFIG_MANAGER_TEST_KEY', 'database'), 'redis')
+
+
 if __name__ == '__main__':
     unittest.main()
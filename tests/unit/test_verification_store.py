@@ -0,0 +1,129 @@
+import unittest
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.dialects import mysql
+
+from app import app
+from app.models.expiry import get_ttl
+from app.models.verification_store import VerificationStore
+
+
+class FakeVerificationTable:
+    """模拟MySQL对verification表单行DELETE的原子性：同一时刻只有一个DELETE能删除到该行"""
+
+    def __init__(self):
+        self.rows = {}
+        self.lock = threading.Lock()
+
+    def execute(self, statement):
+        params = statement.compile(dialect=mysql.dialect()).params
+        with self.lock:
+            row = self.rows.get(params['email_1'])
+            deleted = 0
+            if row and row[0] == params['code_1'] and row[1] > params['created_at_1']:
+                del self.rows[params['email_1']]
+                deleted = 1
+        return MagicMock(rowcount=deleted)
+
+
+class TestVerificationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.app_context = app.app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        patcher = patch('app.models.verification_store.db')
+        self.mock_db = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = VerificationStore()
+
+    def test_issue_single_upsert(self):
+        """测试签发验证码只执行一条INSERT ... ON DUPLICATE KEY UPDATE"""
+        now = datetime(2024, 1, 1, 12, 0, 0)
+        self.store.issue('test@example.com', '123456', now=now)
+
+        self.mock_db.session.execute.assert_called_once()
+        self.mock_db.session.commit.assert_called_once()
+        compiled = self.mock_db.session.execute.call_args[0][0].compile(dialect=mysql.dialect())
+        sql = str(compiled)
+        self.assertTrue(sql.startswith('INSERT INTO verification'))
+        self.assertIn('ON DUPLICATE KEY UPDATE', sql)
+        self.assertIn('code = VALUES(code)', sql)
+        self.assertEqual(compiled.params['expires_at'], now + timedelta(seconds=get_ttl('verification')))
+
+    def test_consume_single_conditional_delete(self):
+        """测试校验验证码只执行一条带邮箱、验证码和有效期条件的DELETE"""
+        self.mock_db.session.execute.return_value.rowcount = 1
+        now = datetime(2024, 1, 1, 12, 0, 0)
+
+        self.assertTrue(self.store.consume('test@example.com', '123456', now=now))
+
+        compiled = self.mock_db.session.execute.call_args[0][0].compile(dialect=mysql.dialect())
+        sql = str(compiled)
+        self.assertTrue(sql.startswith('DELETE FROM verification WHERE'))
+        self.assertIn('verification.email = %s AND verification.code = %s AND verification.created_at > %s', sql)
+        self.assertEqual(compiled.params['created_at_1'], now - timedelta(seconds=get_ttl('verification')))
+
+        self.mock_db.session.execute.return_value.rowcount = 0
+        self.assertFalse(self.store.consume('test@example.com', '123456', now=now))
+
+    def test_consume_rollback_on_error(self):
+        """测试数据库异常时回滚并抛出"""
+        self.mock_db.session.execute.side_effect = RuntimeError('db down')
+
+        with self.assertRaises(RuntimeError):
+            self.store.consume('test@example.com', '123456')
+        self.mock_db.session.rollback.assert_called_once()
+        self.mock_db.session.commit.assert_not_called()
+
+    def test_concurrent_consume_single_use(self):
+        """测试并发提交同一个验证码时只有一个请求验证通过"""
+        table = FakeVerificationTable()
+        now = datetime.utcnow()
+        table.rows['test@example.com'] = ('123456', now - timedelta(seconds=30))
+        self.mock_db.session.execute.side_effect = table.execute
+
+        workers = 16
+        barrier = threading.Barrier(workers)
+        results = []
+        results_lock = threading.Lock()
+
+        def consume():
+            barrier.wait()
+            result = self.store.consume('test@example.com', '123456', now=now)
+            with results_lock:
+                results.append(result)
+
+        threads = [threading.Thread(target=consume) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), workers)
+        self.assertEqual(results.count(True), 1)
+        self.assertNotIn('test@example.com', table.rows)
+
+    def test_consume_expired_or_wrong_code(self):
+        """测试错误或过期的验证码不会删除记录"""
+        table = FakeVerificationTable()
+        now = datetime.utcnow()
+        self.mock_db.session.execute.side_effect = table.execute
+
+        table.rows['test@example.com'] = ('123456', now - timedelta(seconds=30))
+        self.assertFalse(self.store.consume('test@example.com', '654321', now=now))
+        self.assertIn('test@example.com', table.rows)
+
+        table.rows['test@example.com'] = ('123456', now - timedelta(seconds=get_ttl('verification') + 1))
+        self.assertFalse(self.store.consume('test@example.com', '123456', now=now))
+
+
+if __name__ == '__main__':
+    unittest.main()